@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+#
+# キー数を増やした時の calc_bf / get_bone_prev_next_fno の1回あたりの時間
+# キーフレ検索がキー数に依存しなければ、キー数が増えても時間はほぼ変わらない
+#
+#   python benchmark/bench_bone_frame_lookup.py [--src ビルド済みsrc ...]
+#
+import random
+
+import bench_utils
+
+KEY_COUNTS = [100, 1000, 5000, 20000]
+QUERY_COUNT = 2000
+
+
+def run():
+    from mmd.VmdData import VmdMotion, VmdBoneFrame
+    from module.MMath import MVector3D, MQuaternion
+
+    random.seed(0)
+
+    for key_cnt in KEY_COUNTS:
+        # 3フレームおきにキーがあるモーション
+        motion = VmdMotion()
+        for fno in range(0, key_cnt * 3, 3):
+            bf = VmdBoneFrame(fno)
+            bf.set_name("センター")
+            bf.key = True
+            bf.read = True
+            bf.position = MVector3D(fno * 0.1, 0, 0)
+            bf.rotation = MQuaternion.fromEulerAngles(fno % 90, 0, 0)
+            motion.append_bone_frame(bf)
+        motion.last_motion_frame = key_cnt * 3
+
+        fnos = [random.randrange(0, key_cnt * 3) for _ in range(QUERY_COUNT)]
+
+        def calc_bf():
+            for fno in fnos:
+                motion.calc_bf("センター", fno)
+
+        def get_bone_prev_next_fno():
+            for fno in fnos:
+                motion.get_bone_prev_next_fno("センター", fno=fno, is_key=True)
+
+        calc_bf_us = bench_utils.measure(calc_bf) / QUERY_COUNT * 1e6
+        prev_next_us = bench_utils.measure(get_bone_prev_next_fno) / QUERY_COUNT * 1e6
+        print("keys: {0:6d}  calc_bf: {1:8.1f} us/call  get_bone_prev_next_fno: {2:8.1f} us/call".format(key_cnt, calc_bf_us, prev_next_us), flush=True)
+
+
+if __name__ == '__main__':
+    bench_utils.main(__file__, "calc_bf / get_bone_prev_next_fno のキー数ごとの時間", run)
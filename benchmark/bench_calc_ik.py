@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+#
+# 8リンクの腕チェーン（IKリンク2関節、max_count=10）で、600フレーム分 calc_IK を解いた時の時間
+# IK角度制限なし・ありの両方を計測する
+#
+#   python benchmark/bench_calc_ik.py [--src ビルド済みsrc ...]
+#
+import random
+import time
+
+import bench_utils
+
+FRAME_COUNT = 600
+BONE_NAMES = ["全ての親", "センター", "上半身", "右肩", "右腕", "右腕捩", "右ひじ", "右手首"]
+BONE_POSITIONS = [(0, 0, 0), (0, 8, 0), (0, 11, 0), (-0.5, 15, 0), (-1.5, 15, 0), (-2.5, 13.5, 0), (-3.5, 12, 0), (-5, 10, 0.5)]
+
+
+def create_arm(seed, is_ik_limit):
+    from mmd.VmdData import VmdMotion, VmdBoneFrame
+    from mmd.PmxData import PmxModel, Bone
+    from module.MParams import BoneLinks
+    from module.MMath import MVector3D, MQuaternion
+
+    random.seed(seed)
+
+    model = PmxModel()
+    for bone_idx, (bone_name, position) in enumerate(zip(BONE_NAMES, BONE_POSITIONS)):
+        bone = Bone(bone_name, bone_name, MVector3D(*position) + MVector3D(*[random.uniform(-0.3, 0.3) for _ in range(3)]), bone_idx - 1, 0, 0x0001 | 0x0002 | 0x0008)
+        bone.index = bone_idx
+        bone.tail_index = bone_idx + 1 if bone_idx + 1 < len(BONE_NAMES) else -1
+        model.bones[bone_name] = bone
+        model.bone_indexes[bone_idx] = bone_name
+
+    # 捩りは腕の回転付与
+    model.bones["右腕捩"].flag |= 0x0100
+    model.bones["右腕捩"].effect_index = model.bones["右腕"].index
+    model.bones["右腕捩"].effect_factor = 0.5
+
+    links = BoneLinks()
+    for bone_name in BONE_NAMES:
+        links.append(model.bones[bone_name])
+
+    ik_links = BoneLinks()
+    effector_bone = model.bones["右手首"].copy()
+    effector_bone.degree_limit = 57.0
+    ik_links.append(effector_bone)
+    for bone_name in ["右ひじ", "右腕"]:
+        link_bone = model.bones[bone_name].copy()
+        link_bone.degree_limit = 57.0
+        if is_ik_limit and bone_name == "右ひじ":
+            link_bone.ik_limit_min = MVector3D(-10, -150, -10)
+            link_bone.ik_limit_max = MVector3D(10, 0, 10)
+        ik_links.append(link_bone)
+
+    motion = VmdMotion()
+    for bone_name in BONE_NAMES[:-1]:
+        for fno in sorted(random.sample(range(0, FRAME_COUNT), 8)):
+            bf = VmdBoneFrame(fno)
+            bf.set_name(bone_name)
+            bf.key = True
+            bf.read = True
+            bf.rotation = MQuaternion.fromEulerAngles(random.uniform(-40, 40), random.uniform(-40, 40), random.uniform(-40, 40))
+            motion.append_bone_frame(bf)
+
+    target_positions = [MVector3D(random.uniform(-6, -3), random.uniform(9, 14), random.uniform(-2, 2)) for _ in range(FRAME_COUNT)]
+
+    return model, links, ik_links, motion, target_positions
+
+
+def run():
+    from utils import MServiceUtils
+
+    for is_ik_limit in [False, True]:
+        model, links, ik_links, motion, target_positions = create_arm(3, is_ik_limit)
+
+        start = time.perf_counter()
+        for fno, target_pos in enumerate(target_positions):
+            MServiceUtils.calc_IK(model, links, motion, fno, target_pos, ik_links, max_count=10)
+        elapsed = time.perf_counter() - start
+
+        print("ik_limit: {0!s:5}  {1} frames: {2:7.3f} s  ({3:6.2f} ms/frame)".format(is_ik_limit, FRAME_COUNT, elapsed, elapsed / FRAME_COUNT * 1000), flush=True)
+
+
+if __name__ == '__main__':
+    bench_utils.main(__file__, "calc_IK（8リンク・600フレーム）の時間", run)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+#
+# MMath（MVector3D / MQuaternion / MMatrix4x4）の基本演算1回あたりの時間
+#
+#   python benchmark/bench_mmath.py [--src ビルド済みsrc ...]
+#
+import timeit
+
+import bench_utils
+
+NUMBER = 20000
+
+SETUP = """
+from module.MMath import MVector3D, MQuaternion, MMatrix4x4
+a = MVector3D(1.0, 2.0, 3.0)
+b = MVector3D(-0.5, 0.25, 4.0)
+q1 = MQuaternion.fromEulerAngles(10, 20, 30)
+q2 = MQuaternion.fromEulerAngles(-40, 5, 60)
+m1 = MMatrix4x4()
+m1.translate(a)
+m1.rotate(q1)
+m2 = q2.toMatrix4x4()
+"""
+
+CASES = [
+    ("MVector3D()", "MVector3D(1.0, 2.0, 3.0)"),
+    ("v + v", "a + b"),
+    ("v * f", "a * 0.5"),
+    ("v.copy()", "a.copy()"),
+    ("v.normalized()", "a.normalized()"),
+    ("v.length()", "a.length()"),
+    ("crossProduct", "MVector3D.crossProduct(a, b)"),
+    ("v.data()", "a.data()"),
+    ("MQuaternion()", "MQuaternion(1.0, 0.0, 0.0, 0.0)"),
+    ("q * q", "q1 * q2"),
+    ("q.copy()", "q1.copy()"),
+    ("q.normalized()", "q1.normalized()"),
+    ("q.inverted()", "q1.inverted()"),
+    ("q.effective()", "q1.effective()"),
+    ("slerp", "MQuaternion.slerp(q1, q2, 0.3)"),
+    ("fromEulerAngles", "MQuaternion.fromEulerAngles(10, 20, 30)"),
+    ("q.toMatrix4x4()", "q1.toMatrix4x4()"),
+    ("m * m", "m1 * m2"),
+    ("m * v", "m1 * a"),
+    ("m.rotate(q)", "m1.copy().rotate(q1)"),
+    ("m.translate(v)", "m1.copy().translate(a)"),
+    ("m.inverted()", "m1.inverted()"),
+]
+
+
+def run():
+    for name, stmt in CASES:
+        elapsed = min(timeit.repeat(stmt, SETUP, number=NUMBER, repeat=3)) / NUMBER
+        print("{0:20} {1:8.3f} us".format(name, elapsed * 1e6), flush=True)
+
+
+if __name__ == '__main__':
+    bench_utils.main(__file__, "MMathの基本演算の時間", run)
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+#
+# ベンチマーク用の共通処理
+# 各スクリプトは、ビルド済み（setup.py build_ext --inplace）のsrcディレクトリを対象に計測する
+# --src を複数指定すると、それぞれ別プロセスで計測して並べて出力する（変更前後の比較用）
+#
+#   git worktree add ../motion_supporter_old <比較したいコミット>
+#   (cd ../motion_supporter_old/src && python setup.py build_ext --inplace)
+#   python benchmark/bench_xxx.py --src ../motion_supporter_old/src --src src
+#
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+
+# 計測対象のsrcディレクトリごとに run を実行する
+def main(script_path, description, run):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--src", action="append", default=[], help="ビルド済みのsrcディレクトリ（省略時はこのリポジトリのsrc）")
+    args = parser.parse_args()
+
+    src_dirs = [os.path.abspath(src_dir) for src_dir in (args.src or [SRC_DIR])]
+
+    if len(src_dirs) == 1:
+        sys.path.insert(0, src_dirs[0])
+        print("## {0}".format(src_dirs[0]), flush=True)
+        run()
+        return
+
+    for src_dir in src_dirs:
+        # モジュールが混ざらないように、srcごとに別プロセスで計測する
+        subprocess.run([sys.executable, os.path.abspath(script_path), "--src", src_dir], check=True)
+
+
+# stmt を number 回実行した1回あたりの時間（秒）の最小値
+def measure(stmt, number=1, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            stmt()
+        times.append((time.perf_counter() - start) / number)
+    return min(times)
@@ -9,7 +9,7 @@ a = Analysis(['src\\executor.py'],
              pathex=[],
              binaries=[],
              datas=[],
-             hiddenimports=['pkg_resources', 'wx._adv', 'wx._html', 'bezier', 'quaternion'],
+             hiddenimports=['pkg_resources', 'wx._adv', 'wx._html', 'quaternion'],
              hookspath=[],
              runtime_hooks=[],
              excludes=['mkl','libopenblas', 'tkinter', 'win32comgenpy', 'traitlets', 'PIL', 'IPython', 'pydoc', 'lib2to3', 'pygments', 'matplotlib'],
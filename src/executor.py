@@ -12,7 +12,7 @@ import multiprocessing
 
 from form.MainFrame import MainFrame
 from utils.MLogger import MLogger
-from utils import MFileUtils
+from utils import MFileUtils, MCacheUtils
 from utils.MException import SizingException
 
 VERSION_NAME = "1.06"
@@ -26,6 +26,9 @@ multiprocessing.freeze_support()
 if __name__ == "__main__":
     mydir_path = MFileUtils.get_mydir_path(sys.argv[0])
 
+    # 読み込み結果のキャッシュ
+    MCacheUtils.initialize(os.path.join(mydir_path, "cache"), VERSION_NAME)
+
     if len(sys.argv) > 3 and "--motion_path" in sys.argv:
         if os.name == "nt":
             import winsound  # Windows版のみインポート
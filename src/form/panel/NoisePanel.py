@@ -71,6 +71,14 @@ class NoisePanel(BasePanel):
         self.copy_cnt_ctrl.Bind(wx.EVT_SPINCTRL, self.on_change_file)
         self.setting_sizer.Add(self.copy_cnt_ctrl, 0, wx.ALL, 5)
 
+        # 乱数シード
+        self.noise_seed_txt = wx.StaticText(self, wx.ID_ANY, u"乱数シード", wx.DefaultPosition, wx.DefaultSize, 0)
+        self.setting_sizer.Add(self.noise_seed_txt, 0, wx.ALL, 5)
+
+        self.noise_seed_ctrl = wx.TextCtrl(self, wx.ID_ANY, "", wx.DefaultPosition, wx.Size(120, -1), 0)
+        self.noise_seed_ctrl.SetToolTip(u"ゆらぎを再現したい場合、以前の実行ログに出力された乱数シードを指定して下さい。\n空欄の場合、毎回異なるゆらぎになります。")
+        self.setting_sizer.Add(self.noise_seed_ctrl, 0, wx.ALL, 5)
+
         # やる気係数
         self.motivation_flg_ctrl = wx.CheckBox(self, wx.ID_ANY, u"やる気係数を適用する", wx.DefaultPosition, wx.DefaultSize, 0)
         self.motivation_flg_ctrl.SetToolTip(u"チェックを入れると、やる気係数もランダムに発生します。\nやる気係数は値が大きいほどモーションの振り幅が大きくなります。\n値が小さいほどモーションの振り幅が小さくなります。")
@@ -131,6 +139,11 @@ class NoisePanel(BasePanel):
         if len(output_noise_vmd_path) >= 255 and os.name == "nt":
             logger.error("生成予定のファイルパスがWindowsの制限を超えています。\n生成予定パス: {0}".format(output_noise_vmd_path), decoration=MLogger.DECORATION_BOX)
         
+    # 乱数シード（空欄の場合、None）
+    def get_noise_seed(self):
+        noise_seed = self.noise_seed_ctrl.GetValue().strip()
+        return int(noise_seed) if noise_seed else None
+
     # フォーム無効化
     def disable(self):
         self.noise_vmd_file_ctrl.disable()
@@ -176,6 +189,10 @@ class NoisePanel(BasePanel):
         result = True
         result = self.noise_vmd_file_ctrl.is_valid() and result
 
+        if self.noise_seed_ctrl.GetValue().strip() and not self.noise_seed_ctrl.GetValue().strip().isdecimal():
+            logger.error("乱数シードは0以上の整数で指定して下さい。\n乱数シード: {0}".format(self.noise_seed_ctrl.GetValue()), decoration=MLogger.DECORATION_BOX)
+            result = False
+
         if not result:
             # 終了音
             self.frame.sound_finish()
@@ -2,7 +2,7 @@
 #
 
 from module.MMath cimport MRect, MVector2D, MVector3D, MVector4D, MQuaternion, MMatrix4x4 # noqa
-from module.MParams cimport BoneLinks
+from module.MParams cimport BoneLinks, BoneLinkPlan
 
 
 cdef class Deform:
@@ -138,9 +138,9 @@ cdef class PmxModel:
     cdef public str english_name
     cdef public str comment
     cdef public str english_comment
-    cdef public dict vertices
-    cdef public dict vertex_dict
-    cdef public dict indices
+    cdef public object vertices
+    cdef public object vertex_dict
+    cdef public object indices
     cdef public list textures
     cdef public dict materials
     cdef public dict material_indices
@@ -168,3 +168,6 @@ cdef class PmxModel:
     cdef public dict wrist_entity_vertex
     cdef public dict elbow_entity_vertex
     cdef public dict elbow_middle_entity_vertex
+    cdef public dict link_plans
+
+    cdef BoneLinkPlan c_get_link_plan(self, BoneLinks links)
@@ -6,7 +6,7 @@ from collections import OrderedDict
 import math
 import numpy as np
 
-from module.MParams import BoneLinks # noqa
+from module.MParams import BoneLinks, BoneLinkPlan # noqa
 from module.MMath import MRect, MVector2D, MVector3D, MVector4D, MQuaternion, MMatrix4x4 # noqa
 
 from utils.MException import SizingException # noqa
@@ -203,6 +203,176 @@ cdef class Vertex:
         return Vertex(self.index, self.position.copy(), self.normal.copy(), self.uv.copy(), [euv.copy() for euv in self.extended_uvs], self.deform.copy(), self.edge_factor)   
 
 
+# キーがINDEX(0～件数-1)の列指向辞書
+# 各値を連続した配列で保持し、値は参照された時に初めて生成する
+# 指定INDEXの値の生成（create_value）は、継承先でそれぞれ定義する
+class IndexColumns(dict):
+    def __init__(self, count):
+        dict.__init__(self)
+        self.count = count
+
+    def is_column_index(self, idx):
+        return isinstance(idx, (int, np.integer)) and 0 <= idx < self.count
+
+    def __missing__(self, idx):
+        if not self.is_column_index(idx):
+            raise KeyError(idx)
+
+        value = self.create_value(int(idx))
+        dict.__setitem__(self, int(idx), value)
+        return value
+
+    def get(self, idx, default=None):
+        return self[idx] if idx in self else default
+
+    def __contains__(self, idx):
+        return dict.__contains__(self, idx) or self.is_column_index(idx)
+
+    def __len__(self):
+        return self.count + len([idx for idx in dict.keys(self) if not self.is_column_index(idx)])
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return list(range(self.count)) + [idx for idx in dict.keys(self) if not self.is_column_index(idx)]
+
+    def values(self):
+        return [self[idx] for idx in self.keys()]
+
+    def items(self):
+        return [(idx, self[idx]) for idx in self.keys()]
+
+
+# 頂点データの列指向辞書(key:頂点INDEX)
+class VertexColumns(IndexColumns):
+    def __init__(self, positions, normals, uvs, extended_uvs, deform_types, deform_indexes, deform_weights, sdef_vectors, edge_factors):
+        super().__init__(len(positions))
+        # 位置・法線(N×3)、UV(N×2)、追加UV(N×追加UV数×4)
+        self.positions = positions
+        self.normals = normals
+        self.uvs = uvs
+        self.extended_uvs = extended_uvs
+        # ウェイト変形方式(N)、ボーンINDEX(N×4)、ウェイト(N×4)、SDEF-C,R0,R1(N×3×3)
+        self.deform_types = deform_types
+        self.deform_indexes = deform_indexes
+        self.deform_weights = deform_weights
+        self.sdef_vectors = sdef_vectors
+        # エッジ倍率(N)
+        self.edge_factors = edge_factors
+
+    def create_value(self, idx):
+        cdef list indexes = self.deform_indexes[idx].tolist()
+        cdef list weights = self.deform_weights[idx].tolist()
+        cdef int deform_type = self.deform_types[idx]
+
+        if deform_type == 0:
+            deform = Bdef1(indexes[0])
+        elif deform_type == 1:
+            deform = Bdef2(indexes[0], indexes[1], weights[0])
+        elif deform_type == 2:
+            deform = Bdef4(indexes[0], indexes[1], indexes[2], indexes[3], weights[0], weights[1], weights[2], weights[3])
+        else:
+            sdef_c, sdef_r0, sdef_r1 = [MVector3D(*v) for v in self.sdef_vectors[idx].tolist()]
+            if deform_type == 3:
+                deform = Sdef(indexes[0], indexes[1], weights[0], sdef_c, sdef_r0, sdef_r1)
+            else:
+                deform = Qdef(indexes[0], indexes[1], weights[0], sdef_c, sdef_r0, sdef_r1)
+
+        return Vertex(idx, MVector3D(*self.positions[idx].tolist()), MVector3D(*self.normals[idx].tolist()), MVector2D(*self.uvs[idx].tolist()), \
+                      [MVector4D(*v) for v in self.extended_uvs[idx].tolist()], deform, self.edge_factors[idx].item())
+
+    # ボーンINDEXごとのウェイトが乗っている頂点INDEX（1頂点で同じボーンが複数ある場合、その分重複する）
+    def get_bone_vertex_indexes(self):
+        vertex_idxs = np.repeat(np.arange(self.count)[:, np.newaxis], 4, axis=1)
+        weights = self.deform_weights
+        targets = np.zeros((self.count, 4), dtype=np.bool_)
+
+        # BDEF1
+        targets[self.deform_types == 0, 0] = True
+        # BDEF2
+        bdef2 = self.deform_types == 1
+        targets[bdef2, 0] = weights[bdef2, 0] >= 0
+        targets[bdef2, 1] = (1 - weights[bdef2, 0]) >= 0
+        # BDEF4
+        bdef4 = self.deform_types == 2
+        targets[bdef4] = weights[bdef4] >= 0
+        # SDEF, QDEF
+        targets[self.deform_types >= 3, :2] = True
+
+        bone_idxs = self.deform_indexes[targets]
+        vertex_idxs = vertex_idxs[targets]
+        order = np.argsort(bone_idxs, kind="stable")
+        unique_bone_idxs, counts = np.unique(bone_idxs[order], return_counts=True)
+
+        return dict(zip(unique_bone_idxs.tolist(), np.split(vertex_idxs[order], np.cumsum(counts)[:-1])))
+
+    def __reduce__(self):
+        return (self.__class__, (self.positions, self.normals, self.uvs, self.extended_uvs, self.deform_types, self.deform_indexes, \
+                                 self.deform_weights, self.sdef_vectors, self.edge_factors), dict(dict.items(self)))
+
+    def __setstate__(self, state):
+        dict.update(self, state)
+
+
+# ボーンINDEXごとの頂点データリストの辞書(key:ボーンINDEX)
+# 頂点データリストは参照された時に初めて生成する
+class BoneVertexDict(dict):
+    def __init__(self, vertex_dict, bone_vertex_idxs):
+        dict.__init__(self)
+        self.vertex_dict = vertex_dict
+        self.bone_vertex_idxs = bone_vertex_idxs
+
+    def __missing__(self, bone_idx):
+        vertices = [self.vertex_dict[vertex_idx] for vertex_idx in self.bone_vertex_idxs.pop(bone_idx).tolist()]
+        dict.__setitem__(self, bone_idx, vertices)
+        return vertices
+
+    def get(self, bone_idx, default=None):
+        return self[bone_idx] if bone_idx in self else default
+
+    def __contains__(self, bone_idx):
+        return dict.__contains__(self, bone_idx) or bone_idx in self.bone_vertex_idxs
+
+    def __len__(self):
+        return dict.__len__(self) + len(self.bone_vertex_idxs)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return list(dict.keys(self)) + list(self.bone_vertex_idxs.keys())
+
+    def values(self):
+        return [self[bone_idx] for bone_idx in self.keys()]
+
+    def items(self):
+        return [(bone_idx, self[bone_idx]) for bone_idx in self.keys()]
+
+    def __reduce__(self):
+        return (self.__class__, (self.vertex_dict, self.bone_vertex_idxs), dict(dict.items(self)))
+
+    def __setstate__(self, state):
+        dict.update(self, state)
+
+
+# 面データの列指向辞書(key:面INDEX、値:頂点INDEXリスト)
+class FaceColumns(IndexColumns):
+    def __init__(self, vertex_indexes):
+        super().__init__(len(vertex_indexes))
+        # 頂点INDEX(N×3)
+        self.vertex_indexes = vertex_indexes
+
+    def create_value(self, idx):
+        return self.vertex_indexes[idx].tolist()
+
+    def __reduce__(self):
+        return (self.__class__, (self.vertex_indexes,), dict(dict.items(self)))
+
+    def __setstate__(self, state):
+        dict.update(self, state)
+
+
 # 材質構造-----------------------
 class Material:
     def __init__(self, name, english_name, diffuse_color, alpha, specular_factor, specular_color, ambient_color, flag, edge_color, edge_size, texture_index,
@@ -1106,6 +1276,8 @@ cdef class PmxModel:
         self.elbow_entity_vertex = {}
         # 左右ひじ手首中間頂点
         self.elbow_middle_entity_vertex = {}
+        # ボーンリンクの計算用情報（キー：リンクのボーン名の並び）
+        self.link_plans = {}
     
     # ローカルX軸の取得
     def get_local_x_axis(self, bone_name: str):
@@ -1255,6 +1427,79 @@ cdef class PmxModel:
         # 最後まで回しても取れなかった場合、エラー
         raise SizingException("ボーンリンクの生成に失敗しました。モデル「%s」に「%s」のボーンがあるか確認してください。" % (self.name, ",".join(target_bone_names)))
 
+    # ボーンリンクの計算用情報（同じ並びのリンクは一度だけ生成する）
+    def get_link_plan(self, links: BoneLinks):
+        return self.c_get_link_plan(links)
+
+    cdef BoneLinkPlan c_get_link_plan(self, BoneLinks links):
+        cdef tuple names = tuple(links.all().keys())
+
+        if names in self.link_plans:
+            return self.link_plans[names]
+
+        cdef list indexes = []
+        cdef list positions = []
+        cdef list parent_positions = []
+        cdef list is_model_bones = []
+        cdef list fixed_axes = []
+        cdef list effect_parents = []
+        cdef list local_x_qqs = []
+        cdef list effects
+        cdef str name
+        cdef int n, cnt
+        cdef Bone link_bone, bone, effect_parent_bone, effect_bone
+
+        for n, name in enumerate(names):
+            link_bone = links.get(name)
+            positions.append(link_bone.position)
+            parent_positions.append(MVector3D() if n == 0 else links.get(names[n - 1]).position)
+
+            effects = []
+            if name not in self.bones:
+                indexes.append(-1)
+                is_model_bones.append(False)
+                fixed_axes.append(MVector3D())
+                effect_parents.append(effects)
+                local_x_qqs.append(None)
+                continue
+
+            bone = self.bones[name]
+            indexes.append(bone.index)
+            is_model_bones.append(True)
+            fixed_axes.append(bone.fixed_axis)
+
+            # 付与親をたどる（付与親の親も含む）
+            if bone.getExternalRotationFlag() and bone.effect_index in self.bone_indexes:
+                effect_parent_bone = bone
+                effect_bone = self.bones[self.bone_indexes[bone.effect_index]]
+                cnt = 0
+
+                while cnt < 100:
+                    effects.append((effect_bone.name, effect_parent_bone.effect_factor))
+
+                    if effect_bone.getExternalRotationFlag() and effect_bone.effect_index in self.bone_indexes:
+                        effect_parent_bone = effect_bone
+                        effect_bone = self.bones[self.bone_indexes[effect_bone.effect_index]]
+                    else:
+                        break
+
+                    cnt += 1
+            effect_parents.append(effects)
+
+            # ローカルX軸の向き
+            if n == 0:
+                local_x_qqs.append(None)
+            elif bone.local_x_vector == MVector3D():
+                # ローカル軸が設定されていない場合、自身から親を引いた軸の向き
+                local_x_qqs.append(MQuaternion.fromDirection((bone.position - parent_positions[n]).normalized(), MVector3D(0, 0, 1)))
+            else:
+                # ローカル軸が設定されている場合、その値を採用
+                local_x_qqs.append(MQuaternion.fromDirection(bone.local_x_vector.normalized(), MVector3D(0, 0, 1)))
+
+        self.link_plans[names] = BoneLinkPlan(names, indexes, positions, parent_positions, is_model_bones, fixed_axes, effect_parents, local_x_qqs)
+
+        return self.link_plans[names]
+
     # リンク生成
     def create_link_2_top(self, target_bone_name: str, links: BoneLinks, is_defined: bool):
         if not links:
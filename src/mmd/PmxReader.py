@@ -4,10 +4,13 @@ import struct
 import hashlib
 import random
 import string
+import numpy as np
 
-from mmd.PmxData import PmxModel, Bone, RigidBody, Vertex, Material, Morph, DisplaySlot, RigidBody, Joint, Ik, IkLink, Bdef1, Bdef2, Bdef4, Sdef, Qdef, MaterialMorphData, UVMorphData, BoneMorphData, VertexMorphOffset, GroupMorphData # noqa
+from mmd.PmxData import PmxModel, Bone, RigidBody, Vertex, Material, Morph, DisplaySlot, RigidBody, Joint, Ik, IkLink, Bdef1, Bdef2, Bdef4, Sdef, Qdef, MaterialMorphData, UVMorphData, BoneMorphData, VertexMorphOffset, GroupMorphData, \
+    VertexColumns, BoneVertexDict, FaceColumns # noqa
 from module.MMath import MRect, MVector2D, MVector3D, MVector4D, MQuaternion, MMatrix4x4 # noqa
 from utils.MLogger import MLogger # noqa
+from utils import MCacheUtils
 from utils.MException import SizingException, MKilledException, MParseException
 
 logger = MLogger(__name__, level=1)
@@ -16,6 +19,7 @@ logger = MLogger(__name__, level=1)
 class PmxReader:
     def __init__(self, file_path, is_check=True, is_sizing=True):
         self.file_path = file_path
+        self.digest = None
         self.is_check = is_check
         self.is_sizing = is_sizing
         self.offset = 0
@@ -103,6 +107,13 @@ class PmxReader:
         pmx.path = self.file_path
 
         try:
+            # 同じファイルを同じ設定で読み込んだ結果がキャッシュにある場合、そちらを使う
+            digest = self.hexdigest()
+            cache_kind = "pmx:{0}:{1}".format(self.is_check, self.is_sizing)
+            cache_pmx = MCacheUtils.load_data(cache_kind, digest)
+            if cache_pmx is not None:
+                return cache_pmx
+
             # PMXファイルをバイナリ読み込み
             with open(self.file_path, "rb") as f:
                 self.buffer = f.read()
@@ -182,42 +193,15 @@ class PmxReader:
                 logger.test("english_comment: %s (%s)", pmx.english_comment, self.offset)
 
                 # 頂点データリスト
-                for vertex_idx in range(self.read_int(4)):
-                    position = self.read_Vector3D()
-                    normal = self.read_Vector3D()
-                    uv = self.read_Vector2D()
-
-                    extended_uvs = []
-                    if pmx.extended_uv > 0:
-                        # 追加UVがある場合
-                        for _ in range(pmx.extended_uv):
-                            extended_uvs.append(self.read_Vector4D())
-
-                    deform = self.read_deform()
-                    edge_factor = self.read_float()
-
-                    # 頂点をウェイトボーンごとに分けて保持する
-                    vertex = Vertex(vertex_idx, position, normal, uv, extended_uvs, deform, edge_factor)
-                    for bone_idx in vertex.deform.get_idx_list():
-                        if bone_idx not in pmx.vertices:
-                            pmx.vertices[bone_idx] = []
-                        pmx.vertices[bone_idx].append(vertex)
-                    
-                    # 全頂点データとしても保持
-                    pmx.vertex_dict[vertex.index] = vertex
-                    
+                self.read_vertices(pmx)
+
                 logger.test("len(vertices): %s", len(pmx.vertices))
                 logger.test("vertices.keys: %s", pmx.vertices.keys())
                 logger.info("-- PMX 頂点読み込み完了")
 
                 # 面データリスト
-                for iidx in range(self.read_int(4)):
-                    index_idx = iidx // 3
-                    if index_idx not in pmx.indices.keys():
-                        pmx.indices[index_idx] = []
+                face_array = self.read_faces(pmx)
 
-                    pmx.indices[index_idx].append(self.read_vertex_index_size(self.vertex_index_size))
-                    
                 logger.test("len(indices): %s", len(pmx.indices))
                 
                 logger.info("-- PMX 面読み込み完了")
@@ -270,10 +254,8 @@ class PmxReader:
                     
                     logger.test("material.vertex_count: %s: %s total: %s", material.name, material.vertex_count, total_index_count)
 
-                    for iidx in range(total_index_count, total_index_count + (material.vertex_count // 3)):
-                        pmx.material_indices[material.name].append(iidx)
-                        for iiidx in pmx.indices[iidx]:
-                            pmx.material_vertices[material.name].append(iiidx)
+                    pmx.material_indices[material.name].extend(range(total_index_count, total_index_count + (material.vertex_count // 3)))
+                    pmx.material_vertices[material.name].extend(face_array[total_index_count:(total_index_count + (material.vertex_count // 3))].ravel().tolist())
                 
                     # 全面数加算
                     total_index_count += (material.vertex_count // 3)
@@ -910,7 +892,7 @@ class PmxReader:
                 logger.info("-- PMX ジョイント読み込み完了")
 
             # ハッシュを設定
-            pmx.digest = self.hexdigest()
+            pmx.digest = digest
             logger.test("pmx: %s, hash: %s", pmx.name, pmx.digest)
 
             if self.is_check:
@@ -922,6 +904,8 @@ class PmxReader:
             # pmx.can_upper_sizing = pmx.check_upper_bone_can_sizing()
             # logger.test("pmx: %s, can_upper_sizing: %s", pmx.name, pmx.can_upper_sizing)
 
+            MCacheUtils.save_data(cache_kind, digest, pmx)
+
             return pmx
         except MKilledException as ke:
             # 終了命令
@@ -965,7 +949,11 @@ class PmxReader:
         else:
             return index, pmx.bones[tmp_bone_indexes[parent_index]].index
 
+    # ファイルのハッシュ値（同じReaderでは一度だけ求める）
     def hexdigest(self):
+        if self.digest:
+            return self.digest
+
         sha1 = hashlib.sha1()
 
         with open(self.file_path, 'rb') as f:
@@ -977,7 +965,8 @@ class PmxReader:
         # ファイルパスをハッシュに含める
         sha1.update(self.file_path.encode('utf-8'))
 
-        return sha1.hexdigest()
+        self.digest = sha1.hexdigest()
+        return self.digest
 
     def calc_bone_length(self, bones, bone_indexes):
         for k, v in bones.items():
@@ -1093,6 +1082,126 @@ class PmxReader:
         scalar = self.read_float()
         return MQuaternion(scalar, x, y, z)
 
+    # 頂点データリストの一括読み込み
+    def read_vertices(self, pmx: PmxModel):
+        vertex_count = self.read_int(4)
+        bone_size = self.bone_index_size
+
+        # 位置・法線・UV・追加UVまでの固定長部分
+        head_size = 32 + 16 * pmx.extended_uv
+        # ウェイト変形方式ごとのデフォーム部分のサイズ
+        deform_sizes = [bone_size, bone_size * 2 + 4, bone_size * 4 + 16, bone_size * 2 + 40, bone_size * 2 + 40]
+
+        vertex_sizes = [head_size + 1 + deform_size + 4 for deform_size in deform_sizes]
+
+        # 可変長なので、各頂点の開始位置だけ先に走査する
+        # 同じウェイト変形方式が続く範囲は、頂点サイズ間隔でまとめて位置を決める
+        offsets = np.zeros(vertex_count, dtype=np.int64)
+        offset = self.offset
+        buffer = self.buffer
+        data = np.frombuffer(buffer, dtype=np.uint8)
+        vertex_idx = 0
+        while vertex_idx < vertex_count:
+            deform_type = buffer[offset + head_size]
+            if deform_type > 4:
+                raise MParseException("unknown deform_type: {0}".format(deform_type))
+            vertex_size = vertex_sizes[deform_type]
+            run_count = self.count_deform_run(data, offset + head_size, vertex_size, deform_type, vertex_count - vertex_idx)
+            if run_count == 1:
+                offsets[vertex_idx] = offset
+            else:
+                offsets[vertex_idx:(vertex_idx + run_count)] = offset + vertex_size * np.arange(run_count)
+            vertex_idx += run_count
+            offset += vertex_size * run_count
+        self.offset = offset
+
+        # 各頂点の開始位置から、固定長の構造体として同じ項目をまとめて取り出す
+        # バッファを1byteずつずらした行の並びとして見て、開始位置の行だけを複写する
+        def read_records(record_offsets, names, formats, field_offsets, itemsize):
+            record_dtype = np.dtype({"names": names, "formats": formats, "offsets": field_offsets, "itemsize": itemsize})
+            rows = np.lib.stride_tricks.as_strided(data, shape=(len(data) - itemsize + 1, itemsize), strides=(1, 1), writeable=False)
+            return rows[record_offsets].view(record_dtype)[:, 0]
+
+        heads = read_records(offsets, ["floats", "deform_type"], [("<f4", (head_size // 4,)), "u1"], [0, head_size], head_size + 1)
+        floats = heads["floats"].astype(np.float64)
+        deform_types = heads["deform_type"].astype(np.int64)
+
+        bone_dtype = {1: "i1", 2: "<i2", 4: "<i4"}[bone_size]
+        deform_indexes = np.full((vertex_count, 4), -1, dtype=np.int64)
+        deform_weights = np.zeros((vertex_count, 4), dtype=np.float64)
+        sdef_vectors = np.zeros((vertex_count, 3, 3), dtype=np.float64)
+        edge_factors = np.zeros(vertex_count, dtype=np.float64)
+
+        for deform_type, (index_count, weight_count) in enumerate([(1, 0), (2, 1), (4, 4), (2, 1), (2, 1)]):
+            targets = deform_types == deform_type
+            if not np.any(targets):
+                continue
+
+            # 頂点開始位置からの相対位置
+            names = ["indexes", "edge"]
+            formats = [(bone_dtype, (index_count,)), "<f4"]
+            field_offsets = [head_size + 1, head_size + 1 + deform_sizes[deform_type]]
+            weight_offset = head_size + 1 + bone_size * index_count
+            if weight_count > 0:
+                names.append("weights")
+                formats.append(("<f4", (weight_count,)))
+                field_offsets.append(weight_offset)
+            if deform_type >= 3:
+                # SDEF-C, SDEF-R0, SDEF-R1
+                names.append("sdef")
+                formats.append(("<f4", (3, 3)))
+                field_offsets.append(weight_offset + 4)
+
+            records = read_records(offsets[targets], names, formats, field_offsets, vertex_sizes[deform_type])
+            deform_indexes[targets, :index_count] = records["indexes"]
+            if weight_count > 0:
+                deform_weights[targets, :weight_count] = records["weights"]
+            if deform_type >= 3:
+                sdef_vectors[targets] = records["sdef"]
+            edge_factors[targets] = records["edge"]
+
+        # 全頂点データ
+        pmx.vertex_dict = VertexColumns(floats[:, :3], floats[:, 3:6], floats[:, 6:8], floats[:, 8:].reshape(vertex_count, pmx.extended_uv, 4), \
+                                        deform_types, deform_indexes, deform_weights, sdef_vectors, edge_factors)
+        # 頂点をウェイトボーンごとに分けて保持する
+        pmx.vertices = BoneVertexDict(pmx.vertex_dict, pmx.vertex_dict.get_bone_vertex_indexes())
+
+    # 指定位置の頂点から、同じウェイト変形方式が何頂点続くか数える
+    def count_deform_run(self, data, type_offset: int, vertex_size: int, deform_type: int, max_count: int):
+        buffer = self.buffer
+
+        # 短い範囲は1頂点ずつ確認する
+        run_count = 1
+        while run_count < min(max_count, 8):
+            if buffer[type_offset + vertex_size * run_count] != deform_type:
+                return run_count
+            run_count += 1
+
+        # 長く続く場合は、頂点サイズ間隔のスライスで後続頂点の変形方式だけをまとめて確認する
+        chunk_size = 64
+        while run_count < max_count:
+            chunk_count = min(chunk_size, max_count - run_count)
+            chunk_start = type_offset + vertex_size * run_count
+            mismatches = np.flatnonzero(data[chunk_start:(chunk_start + vertex_size * chunk_count):vertex_size] != deform_type)
+            if len(mismatches) > 0:
+                return run_count + int(mismatches[0])
+            run_count += chunk_count
+            chunk_size *= 2
+
+        return run_count
+
+    # 面データリストの一括読み込み
+    def read_faces(self, pmx: PmxModel):
+        index_count = self.read_int(4)
+        index_dtype = {1: "<u1", 2: "<u2", 4: "<i4"}[self.vertex_index_size]
+
+        face_array = np.frombuffer(self.buffer, dtype=index_dtype, count=index_count, offset=self.offset).astype(np.int64).reshape(-1, 3)
+        self.offset += index_count * self.vertex_index_size
+
+        pmx.indices = FaceColumns(face_array)
+
+        return face_array
+
     def read_deform(self):
         deform_type = self.read_int(1)
 
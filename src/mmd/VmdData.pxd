@@ -67,15 +67,23 @@ cdef class VmdMotion:
 
     cdef c_regist_full_bf(self, int data_set_no, list bone_name_list, int offset, bint is_key)
 
+    cdef c_regist_full_bf_columns(self, str bone_name, list fnos, bint is_key)
+
     cdef list c_get_differ_fnos(self, int data_set_no, list bone_name_list, double limit_degrees, double limit_length)
 
     cdef c_smooth_bf(self, int data_set_no, str bone_name, bint is_rot, bint is_mov, double limit_degrees, int start_fno, int end_fno, bint is_show_log)
 
     cdef c_smooth_filter_bf(self, int data_set_no, str bone_name, bint is_rot, bint is_mov, int loop, dict mconfig, int start_fno, int end_fno, bint is_show_log)
+
+    cdef c_smooth_filter_bf_frames(self, int data_set_no, str bone_name, bint is_rot, bint is_mov, int n, dict mconfig, np.ndarray fnos, list infections, bint is_show_log)
     
     cdef list c_remove_unnecessary_bf(self, int data_set_no, str bone_name, bint is_rot, bint is_mov, \
-                                      double offset, double rot_diff_limit, double mov_diff_limit, int start_fno, int end_fno, bint is_show_log, bint is_force, bint is_sub_remove, 
-                                      dict rot_diff_value_dict, dict mx_diff_value_dict, dict my_diff_value_dict, dict mz_diff_value_dict, list infections)
+                                      double offset, double rot_diff_limit, double mov_diff_limit, int start_fno, int end_fno, bint is_show_log, bint is_sub_remove)
+
+    cdef list c_select_unnecessary_bf_spans(self, int data_set_no, str bone_name, np.ndarray fnos, np.ndarray values, np.ndarray diff_limits, \
+                                            list infections, list active_fnos, double offset, bint is_show_log, bint is_sub_remove)
+
+    cdef c_apply_unnecessary_bf_spans(self, str bone_name, bint is_rot, bint is_mov, list spans)
 
     cdef tuple c_get_infections(self, int data_set_no, str bone_name, bint is_rot, bint is_mov, np.ndarray fnos, list active_fnos)
 
@@ -85,8 +93,14 @@ cdef class VmdMotion:
 
     cdef c_regist_bf(self, VmdBoneFrame bf, str bone_name, int fno, bint copy_interpolation, bint key)
 
+    cdef c_regist_bone_values(self, str bone_name, np.ndarray fnos, np.ndarray positions, np.ndarray rotations)
+
     cdef VmdBoneFrame c_calc_bf(self, str bone_name, int fno, bint is_key, bint is_read, bint is_reset_interpolation)
 
+    cdef tuple c_get_bone_prev_next_fno(self, str bone_name, int fno, bint is_key, bint is_read, long long start_fno, long long end_fno)
+
+    cdef tuple c_sample_bone(self, str bone_name, np.ndarray fnos)
+
     cdef MQuaternion calc_bf_rot(self, VmdBoneFrame prev_bf, VmdBoneFrame fill_bf, VmdBoneFrame next_bf)
 
     cdef MVector3D calc_bf_pos(self, VmdBoneFrame prev_bf, VmdBoneFrame fill_bf, VmdBoneFrame next_bf)
@@ -3,9 +3,11 @@
 import math
 import numpy as np
 cimport numpy as np
+cimport cython
 cimport libc.math as cmath
 from libcpp cimport  list, str, int, float
 import struct
+import bisect
 import _pickle as cPickle
 from libc.math cimport pi, fabs
 from math import ceil, radians, isnan, isinf
@@ -13,13 +15,18 @@ from math import ceil, radians, isnan, isinf
 from utils import MBezierUtils # noqa
 from utils.MLogger import MLogger
 
-from module.MMath import MRect, MVector2D, MVector3D, MVector4D, MQuaternion, MMatrix4x4, get_effective_value # noqa
+from module.MMath import MRect, MVector2D, MVector3D, MVector4D, MQuaternion, MMatrix4x4, MQuaternionArray, get_effective_value, slerp_array # noqa
 
 logger = MLogger(__name__, level=1)
 
 ctypedef np.int_t DTYPE_INT_t
 ctypedef np.float64_t DTYPE_FLOAT_t
 
+# 出力しないサイジング用ボーン
+SIZING_BONE_NAMES = ["SIZING_ROOT_BONE", "頭頂", "右つま先実体", "左つま先実体", "右足底辺", "左足底辺", "右足底実体", "左足底実体", "右足ＩＫ底実体", "左足ＩＫ底実体", "右足IK親底実体", "左足IK親底実体", \
+                     "首根元", "右腕下延長", "左腕下延長", "右腕垂直", "左腕垂直", "センター実体", "左腕ひじ中間", "右腕ひじ中間", "左ひじ手首中間", "右ひじ手首中間", "左手首実体", "右手首実体", \
+                     "左親指先実体", "左人指先実体", "左中指先実体", "左薬指先実体", "左小指先実体", "右親指先実体", "右人指先実体", "右中指先実体", "右薬指先実体", "右小指先実体"]
+
 
 # OneEuroFilter
 # オリジナル：https://www.cristal.univ-lille.fr/~casiez/1euro/
@@ -107,6 +114,74 @@ cdef class OneEuroFilter:
         return self.__x(x, timestamp, alpha=self.__alpha(cutoff))
 
 
+# 複数チャンネル(N×k)のトラック全体にOneEuroFilterをかける
+# 各列にOneEuroFilterを1つずつ作って先頭から順に通したのと同じ値を返す
+# timestamps: 各行のタイムスタンプ(N)（未指定の場合、周波数固定）
+def one_euro_filter_array(values, freq, mincutoff=1.0, beta=0.0, dcutoff=1.0, timestamps=None):
+    if freq <= 0:
+        raise ValueError("freq should be >0")
+    if mincutoff <= 0:
+        raise ValueError("mincutoff should be >0")
+    if dcutoff <= 0:
+        raise ValueError("dcutoff should be >0")
+
+    cdef np.ndarray vs = np.asarray(values, dtype=np.float64)
+    cdef np.ndarray tss = np.full(len(vs), -1, dtype=np.float64) if timestamps is None else np.asarray(timestamps, dtype=np.float64).reshape(-1)
+    if len(tss) != len(vs):
+        raise ValueError("timestamps length mismatch: {0} != {1}".format(len(tss), len(vs)))
+
+    return c_one_euro_filter_array(vs.reshape(len(vs), -1), freq, mincutoff, beta, dcutoff, tss).reshape(np.shape(vs))
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef np.ndarray c_one_euro_filter_array(np.ndarray values, double freq, double mincutoff, double beta, double dcutoff, np.ndarray timestamps):
+    cdef np.ndarray[DTYPE_FLOAT_t, ndim=2] vs = np.ascontiguousarray(values, dtype=np.float64)
+    cdef np.ndarray[DTYPE_FLOAT_t, ndim=1] tss = np.ascontiguousarray(timestamps, dtype=np.float64)
+    cdef Py_ssize_t cnt = len(vs)
+    cdef Py_ssize_t ccnt = np.shape(vs)[1]
+    cdef np.ndarray[DTYPE_FLOAT_t, ndim=2] results = np.empty((cnt, ccnt), dtype=np.float64)
+    # 各列の値用・変化量用LowPassFilterの直前の入力と出力
+    cdef np.ndarray[DTYPE_FLOAT_t, ndim=1] x_ys = np.full(ccnt, -1, dtype=np.float64)
+    cdef np.ndarray[DTYPE_FLOAT_t, ndim=1] x_ss = np.full(ccnt, -1, dtype=np.float64)
+    cdef np.ndarray[DTYPE_FLOAT_t, ndim=1] dx_ys = np.full(ccnt, -1, dtype=np.float64)
+    cdef np.ndarray[DTYPE_FLOAT_t, ndim=1] dx_ss = np.full(ccnt, -1, dtype=np.float64)
+    cdef double lasttime = -1
+    cdef double timestamp, x, prev_x, dx, edx, cutoff, d_alpha, x_alpha
+    cdef Py_ssize_t i, j
+
+    for i in range(cnt):
+        timestamp = tss[i]
+        if lasttime and timestamp and (timestamp - lasttime) != 0:
+            freq = 1.0 / (timestamp - lasttime)
+        lasttime = timestamp
+        d_alpha = one_euro_alpha(freq, dcutoff)
+
+        for j in range(ccnt):
+            x = vs[i, j]
+            prev_x = x_ys[j]
+            dx = 0.0 if prev_x < 0 else (x - prev_x) * freq
+            edx = dx if dx_ys[j] < 0 else d_alpha * dx + (1.0 - d_alpha) * dx_ss[j]
+            dx_ys[j] = dx
+            dx_ss[j] = edx
+            cutoff = mincutoff + beta * fabs(edx)
+
+            if prev_x == x or x_ys[j] < 0:
+                # まったく同じ値の場合、スキップ
+                x_ss[j] = x
+            else:
+                x_alpha = one_euro_alpha(freq, cutoff)
+                x_ss[j] = x_alpha * x + (1.0 - x_alpha) * x_ss[j]
+            x_ys[j] = x
+            results[i, j] = x_ss[j]
+
+    return results
+
+cdef inline double one_euro_alpha(double freq, double cutoff):
+    cdef double te = 1.0 / freq
+    cdef double tau = 1.0 / (2 * pi * cutoff)
+    return max(0.000001, min(1, 1.0 / (1.0 + tau / te)))
+
+
 cdef class VmdBoneFrame:
 
     def __init__(self, fno=0):
@@ -294,6 +369,424 @@ class VmdShowIkFrame:
             fout.write(struct.pack('b', k.onoff))
         
 
+# キーフレの辞書(key:フレーム番号)
+# フレーム番号の昇順リストを保持して、前後キーを二分探索で引けるようにする
+class VmdFrameDict(dict):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fnos = sorted(dict.keys(self))
+
+    def __setitem__(self, fno, frame):
+        if not dict.__contains__(self, fno):
+            bisect.insort(self.fnos, fno)
+        dict.__setitem__(self, fno, frame)
+
+    def __delitem__(self, fno):
+        dict.__delitem__(self, fno)
+        del self.fnos[bisect.bisect_left(self.fnos, fno)]
+
+    def pop(self, fno, *args):
+        if dict.__contains__(self, fno):
+            del self.fnos[bisect.bisect_left(self.fnos, fno)]
+        return dict.pop(self, fno, *args)
+
+    def popitem(self):
+        fno, frame = dict.popitem(self)
+        del self.fnos[bisect.bisect_left(self.fnos, fno)]
+        return fno, frame
+
+    # 複数のキーをまとめて削除する
+    def delete_fnos(self, fnos):
+        cdef set delete_fnos = set([fno for fno in fnos if dict.__contains__(self, fno)])
+        for fno in delete_fnos:
+            dict.__delitem__(self, fno)
+        self.fnos = [fno for fno in self.fnos if fno not in delete_fnos]
+
+    def setdefault(self, fno, frame=None):
+        if not dict.__contains__(self, fno):
+            self[fno] = frame
+        return dict.__getitem__(self, fno)
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self.fnos = sorted(dict.keys(self))
+
+    def clear(self):
+        dict.clear(self)
+        self.fnos = []
+
+    def copy(self):
+        return VmdFrameDict(self)
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
+    # 指定フレーム番号より前のキーのINDEX（なければ-1）
+    def prev_index(self, fno):
+        return bisect.bisect_left(self.fnos, fno) - 1
+
+    # 指定フレーム番号より後のキーのINDEX（なければlen）
+    def next_index(self, fno):
+        return bisect.bisect_right(self.fnos, fno)
+
+    # 指定範囲の補間に必要なキー（範囲の前後のキーを含む）のINDEX範囲
+    def range_indexes(self, start_fno, end_fno):
+        return max(0, self.prev_index(start_fno)), self.next_index(end_fno) + 1
+
+    # 条件に合致するフレーム番号の昇順リスト
+    def filter_fnos(self, start_fno=0, end_fno=9999999999, is_key=False, is_read=False):
+        return [x for x in self.fnos if self[x].fno >= start_fno and self[x].fno <= end_fno and \
+                (not is_key or (is_key and self[x].key)) and (not is_read or (is_read and self[x].read))]
+
+    # ボーンキーフレの値を昇順の配列で取得する
+    # (フレーム番号(N), 位置(N×3), 回転(N×4: w, x, y, z), 補間曲線(N×64))
+    # start_fno, end_fno: 指定した場合、その範囲の補間に必要なキーのみ
+    def bone_arrays(self, start_fno=None, end_fno=None):
+        cdef list target_fnos = self.fnos
+        if start_fno is not None and end_fno is not None:
+            start_idx, end_idx = self.range_indexes(start_fno, end_fno)
+            target_fnos = self.fnos[start_idx:end_idx]
+
+        cdef list frames = [self[fno] for fno in target_fnos]
+        fnos = np.array(target_fnos, dtype=np.int64)
+        positions = np.array([(bf.position.x(), bf.position.y(), bf.position.z()) for bf in frames], dtype=np.float64).reshape(-1, 3)
+        rotations = np.array([(bf.rotation.scalar(), bf.rotation.x(), bf.rotation.y(), bf.rotation.z()) for bf in frames], dtype=np.float64).reshape(-1, 4)
+        interpolations = np.array([bf.interpolation for bf in frames], dtype=np.int64).reshape(-1, 64)
+        return fnos, positions, rotations, interpolations
+
+    # 登録対象のボーンキーフレを出力用に昇順の配列で取得する
+    # (ボーン名バイト列(N), フレーム番号(N), 位置(N×3), 回転(N×4: w, x, y, z), 補間曲線(N×64))
+    def key_bone_arrays(self):
+        cdef list frames = [self[fno] for fno in self.filter_fnos(is_key=True)]
+        cdef VmdBoneFrame bf
+        for bf in frames:
+            if not bf.bname:
+                bf.bname = bf.name.encode('cp932').decode('shift_jis').encode('shift_jis')[:15].ljust(15, b'\x00')   # 15文字制限
+
+        bnames = np.array([bf.bname for bf in frames], dtype=object)
+        fnos = np.array([bf.fno for bf in frames], dtype=np.int64)
+        positions = np.array([(bf.position.x(), bf.position.y(), bf.position.z()) for bf in frames], dtype=np.float64).reshape(-1, 3)
+        rotations = np.array([(bf.rotation.scalar(), bf.rotation.x(), bf.rotation.y(), bf.rotation.z()) for bf in frames], dtype=np.float64).reshape(-1, 4)
+        interpolations = np.array([bf.interpolation for bf in frames], dtype=np.float64).reshape(-1, 64)
+        return bnames, fnos, positions, rotations, interpolations
+
+    # キーフレも含めてコピーする
+    def copy_frames(self):
+        frame_dict = VmdFrameDict()
+        for frame in self.values():
+            frame_dict[frame.fno] = frame.copy()
+        return frame_dict
+
+
+# ボーンキーフレの列指向辞書(key:フレーム番号)
+# 各値を連続した配列で保持し、VmdBoneFrameは参照された時に初めて生成する
+# 配列は書き込み不可で、コピー間で共有する。変更は生成済みのVmdBoneFrame側に入る
+class VmdBoneFrameColumns(VmdFrameDict):
+    def __init__(self, name, bname, fnos, positions, rotations, org_rotations, interpolations, keys, reads):
+        dict.__init__(self)
+        self.name = name
+        self.bname = bname
+        # フレーム番号(N)
+        self.fno_values = freeze_array(fnos, np.int32)
+        # 位置(N×3)
+        self.positions = freeze_array(positions, np.float64)
+        # 回転(N×4: w, x, y, z)
+        self.rotations = freeze_array(rotations, np.float64)
+        self.org_rotations = freeze_array(org_rotations, np.float64)
+        # 補間曲線(N×64)
+        self.interpolations = freeze_array(interpolations, np.uint8)
+        # 登録対象フラグ・読み込みフラグ(N)
+        self.key_flags = freeze_array(keys, np.bool_)
+        self.read_flags = freeze_array(reads, np.bool_)
+
+        # まだVmdBoneFrameを生成していない行(key:フレーム番号, value:行INDEX)
+        # 同じフレーム番号が複数ある場合、先のを採用する
+        self.rows = {}
+        for row, fno in enumerate(self.fno_values.tolist()):
+            if fno not in self.rows:
+                self.rows[fno] = row
+        self.fnos = sorted(self.rows.keys())
+
+    # VmdBoneFrameの辞書から生成する
+    @classmethod
+    def from_frames(cls, name, frames):
+        cdef int n = len(frames)
+        cdef list fnos = sorted(frames.keys())
+        positions = np.zeros((n, 3), dtype=np.float64)
+        rotations = np.zeros((n, 4), dtype=np.float64)
+        org_rotations = np.zeros((n, 4), dtype=np.float64)
+        interpolations = np.zeros((n, 64), dtype=np.int64)
+        keys = np.zeros(n, dtype=np.bool_)
+        reads = np.zeros(n, dtype=np.bool_)
+        bname = b''
+
+        cdef VmdBoneFrame bf
+        for row, fno in enumerate(fnos):
+            bf = frames[fno]
+            bname = bf.bname or bname
+            positions[row] = (bf.position.x(), bf.position.y(), bf.position.z())
+            rotations[row] = (bf.rotation.scalar(), bf.rotation.x(), bf.rotation.y(), bf.rotation.z())
+            org_rotations[row] = (bf.org_rotation.scalar(), bf.org_rotation.x(), bf.org_rotation.y(), bf.org_rotation.z())
+            interpolations[row] = bf.interpolation
+            keys[row] = bf.key
+            reads[row] = bf.read
+
+        # 補間曲線は出力時と同じくMMDの範囲に収める
+        return cls(name, bname, fnos, positions, rotations, org_rotations, np.clip(interpolations, 0, 127), keys, reads)
+
+    # 生成済みのキーフレも配列に詰め直したものを生成する
+    def compact(self):
+        rows = np.fromiter(self.rows.values(), dtype=np.int64, count=len(self.rows))
+        frames = VmdBoneFrameColumns.from_frames(self.name, dict(dict.items(self)))
+        fnos = np.concatenate([self.fno_values[rows], frames.fno_values])
+        order = np.argsort(fnos, kind="stable")
+
+        return VmdBoneFrameColumns(self.name, self.bname or frames.bname, fnos[order], \
+                                   np.concatenate([self.positions[rows], frames.positions])[order], \
+                                   np.concatenate([self.rotations[rows], frames.rotations])[order], \
+                                   np.concatenate([self.org_rotations[rows], frames.org_rotations])[order], \
+                                   np.concatenate([self.interpolations[rows], frames.interpolations])[order], \
+                                   np.concatenate([self.key_flags[rows], frames.key_flags])[order], \
+                                   np.concatenate([self.read_flags[rows], frames.read_flags])[order])
+
+    # 指定行のVmdBoneFrameを生成する
+    def create_frame(self, row):
+        cdef VmdBoneFrame bf = VmdBoneFrame(int(self.fno_values[row]))
+        bf.name = self.name
+        bf.bname = self.bname
+        bf.position = MVector3D(*self.positions[row].tolist())
+        bf.rotation = MQuaternion(*self.rotations[row].tolist())
+        bf.org_rotation = MQuaternion(*self.org_rotations[row].tolist())
+        bf.interpolation = self.interpolations[row].tolist()
+        bf.key = bool(self.key_flags[row])
+        bf.read = bool(self.read_flags[row])
+        return bf
+
+    def __missing__(self, fno):
+        bf = self.create_frame(self.rows.pop(fno))
+        dict.__setitem__(self, fno, bf)
+        return bf
+
+    def get(self, fno, default=None):
+        return self[fno] if fno in self else default
+
+    def __contains__(self, fno):
+        return dict.__contains__(self, fno) or fno in self.rows
+
+    def __len__(self):
+        return dict.__len__(self) + len(self.rows)
+
+    def __iter__(self):
+        return iter(list(self.fnos))
+
+    def keys(self):
+        return list(self.fnos)
+
+    def values(self):
+        return [self[fno] for fno in list(self.fnos)]
+
+    def items(self):
+        return [(fno, self[fno]) for fno in list(self.fnos)]
+
+    def __setitem__(self, fno, frame):
+        if fno not in self:
+            bisect.insort(self.fnos, fno)
+        self.rows.pop(fno, None)
+        dict.__setitem__(self, fno, frame)
+
+    def __delitem__(self, fno):
+        if dict.__contains__(self, fno):
+            dict.__delitem__(self, fno)
+        else:
+            del self.rows[fno]
+        del self.fnos[bisect.bisect_left(self.fnos, fno)]
+
+    def pop(self, fno, *args):
+        if fno not in self:
+            if args:
+                return args[0]
+            raise KeyError(fno)
+        frame = self[fno]
+        del self[fno]
+        return frame
+
+    def popitem(self):
+        if not self.fnos:
+            raise KeyError("popitem(): dictionary is empty")
+        fno = self.fnos[-1]
+        return fno, self.pop(fno)
+
+    def delete_fnos(self, fnos):
+        cdef set delete_fnos = set([fno for fno in fnos if fno in self])
+        for fno in delete_fnos:
+            if dict.__contains__(self, fno):
+                dict.__delitem__(self, fno)
+            else:
+                del self.rows[fno]
+        self.fnos = [fno for fno in self.fnos if fno not in delete_fnos]
+
+    def setdefault(self, fno, frame=None):
+        if fno not in self:
+            self[fno] = frame
+        return self[fno]
+
+    def update(self, *args, **kwargs):
+        for fno, frame in dict(*args, **kwargs).items():
+            self[fno] = frame
+
+    def clear(self):
+        dict.clear(self)
+        self.rows = {}
+        self.fnos = []
+
+    def __eq__(self, other):
+        return dict(self.items()) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    # 配列を共有したまま、辞書部分だけコピーする
+    def copy(self):
+        frame_dict = self.__class__.__new__(self.__class__)
+        dict.__init__(frame_dict, dict.items(self))
+        frame_dict.__dict__.update(self.__dict__)
+        frame_dict.rows = self.rows.copy()
+        frame_dict.fnos = list(self.fnos)
+        return frame_dict
+
+    # 配列を共有したまま、生成済みのキーフレはコピーする
+    def copy_frames(self):
+        frame_dict = self.copy()
+        for fno, frame in dict.items(self):
+            dict.__setitem__(frame_dict, fno, frame.copy())
+        return frame_dict
+
+    def bone_arrays(self, start_fno=None, end_fno=None):
+        cdef list target_fnos = self.fnos
+        if start_fno is not None and end_fno is not None:
+            start_idx, end_idx = self.range_indexes(start_fno, end_fno)
+            target_fnos = self.fnos[start_idx:end_idx]
+
+        fnos = np.array(target_fnos, dtype=np.int64)
+        positions = np.zeros((len(fnos), 3), dtype=np.float64)
+        rotations = np.zeros((len(fnos), 4), dtype=np.float64)
+        interpolations = np.zeros((len(fnos), 64), dtype=np.int64)
+
+        # 未生成の行は配列からまとめてコピーする
+        if len(target_fnos) == len(self.fnos):
+            rows = np.fromiter(self.rows.values(), dtype=np.int64, count=len(self.rows))
+            frame_items = dict.items(self)
+        else:
+            rows = np.array([self.rows[fno] for fno in target_fnos if fno in self.rows], dtype=np.int64)
+            frame_items = [(fno, dict.__getitem__(self, fno)) for fno in target_fnos if dict.__contains__(self, fno)]
+        idxs = np.searchsorted(fnos, self.fno_values[rows])
+        positions[idxs] = self.positions[rows]
+        rotations[idxs] = self.rotations[rows]
+        interpolations[idxs] = self.interpolations[rows]
+
+        # 生成済みのキーフレ
+        for fno, bf in frame_items:
+            idx = bisect.bisect_left(target_fnos, fno)
+            positions[idx] = (bf.position.x(), bf.position.y(), bf.position.z())
+            rotations[idx] = (bf.rotation.scalar(), bf.rotation.x(), bf.rotation.y(), bf.rotation.z())
+            interpolations[idx] = bf.interpolation
+
+        return fnos, positions, rotations, interpolations
+
+    def key_bone_arrays(self):
+        # 未生成の行は配列からまとめて取り出す
+        rows = np.fromiter(self.rows.values(), dtype=np.int64, count=len(self.rows))
+        rows = rows[self.key_flags[rows]]
+        bname = self.bname or self.name.encode('cp932').decode('shift_jis').encode('shift_jis')[:15].ljust(15, b'\x00')
+        row_arrays = (np.array([bname] * len(rows), dtype=object), self.fno_values[rows].astype(np.int64), self.positions[rows], \
+                      self.rotations[rows], self.interpolations[rows].astype(np.float64))
+
+        # 生成済みのキーフレ
+        frame_dict = VmdFrameDict({fno: frame for fno, frame in dict.items(self) if frame.key})
+        frame_arrays = frame_dict.key_bone_arrays()
+
+        order = np.argsort(np.concatenate([self.fno_values[rows], np.array(frame_dict.fnos, dtype=np.int64)]), kind="stable")
+        return tuple(np.concatenate([row_values, frame_values])[order] for row_values, frame_values in zip(row_arrays, frame_arrays))
+
+    def filter_fnos(self, start_fno=0, end_fno=9999999999, is_key=False, is_read=False):
+        # 未生成の行は配列で判定する
+        rows = np.fromiter(self.rows.values(), dtype=np.int64, count=len(self.rows))
+        mask = (self.fno_values[rows] >= start_fno) & (self.fno_values[rows] <= end_fno)
+        if is_key:
+            mask &= self.key_flags[rows]
+        if is_read:
+            mask &= self.read_flags[rows]
+        fnos = set(self.fno_values[rows[mask]].tolist())
+
+        # 生成済みのキーフレ
+        fnos |= set([x for x, frame in dict.items(self) if frame.fno >= start_fno and frame.fno <= end_fno and \
+                     (not is_key or (is_key and frame.key)) and (not is_read or (is_read and frame.read))])
+
+        return sorted(fnos)
+
+    # 未生成の行の位置・回転をまとめて差し替える（配列はコピーしてから書き換える）
+    # 戻り値: 未生成の行がなかったfnosのINDEX
+    def replace_values(self, fnos, positions=None, rotations=None):
+        rows = np.array([self.rows.get(fno, -1) for fno in np.asarray(fnos).tolist()], dtype=np.int64)
+        mask = rows >= 0
+
+        if positions is not None and np.any(mask):
+            values = np.array(self.positions)
+            values[rows[mask]] = np.asarray(positions)[mask]
+            self.positions = freeze_array(values, np.float64)
+        if rotations is not None and np.any(mask):
+            values = np.array(self.rotations)
+            values[rows[mask]] = np.asarray(rotations)[mask]
+            self.rotations = freeze_array(values, np.float64)
+
+        return np.where(~mask)[0]
+
+    def __reduce__(self):
+        return (self.__class__, (self.name, self.bname, self.fno_values, self.positions, self.rotations, self.org_rotations, \
+                                 self.interpolations, self.key_flags, self.read_flags), (self.rows, dict(dict.items(self))))
+
+    def __setstate__(self, state):
+        self.rows, frames = state
+        dict.update(self, frames)
+        self.fnos = sorted(list(self.rows.keys()) + list(frames.keys()))
+
+
+# 書き込み不可の連続配列に変換する
+cdef np.ndarray freeze_array(values, dtype):
+    cdef np.ndarray array_values = np.ascontiguousarray(values, dtype=dtype)
+    array_values.flags.writeable = False
+    return array_values
+
+
+# キーフレ辞書を取得する（素のdictの場合、VmdFrameDictに置き換える）
+cdef object get_frame_dict(dict frames, str name):
+    frame_dict = frames[name]
+    if not isinstance(frame_dict, VmdFrameDict):
+        frame_dict = VmdFrameDict(frame_dict)
+        frames[name] = frame_dict
+    return frame_dict
+
+
+# ボーンキーフレ辞書を列指向に詰め直す（生成済みのキーフレがない場合はそのまま）
+cdef object compact_frame_dict(str bone_name, object frame_dict):
+    if isinstance(frame_dict, VmdBoneFrameColumns):
+        return frame_dict.compact() if dict.__len__(frame_dict) > 0 else frame_dict
+    return VmdBoneFrameColumns.from_frames(bone_name, frame_dict)
+
+
+# 変化量の変曲点のフレーム番号を求める
+# https://teratail.com/questions/162391
+cdef np.ndarray get_infection_fnos(str bone_name, str value_name, np.ndarray fnos, np.ndarray diff_values, double limit):
+    cdef np.ndarray f_prime = np.gradient(diff_values)                                      # 差分近似
+    cdef np.ndarray indices = np.where(np.diff(np.sign(f_prime)))[0]                        # 変曲点を求める。
+    cdef np.ndarray diff_indices = np.where(np.abs(np.diff(diff_values[indices])) > limit)[0]   # 変曲点同士の差異が閾値以上
+    cdef np.ndarray infections = (fnos[1:][indices])[diff_indices]                          # 変曲点のキーフレを再取得する
+
+    logger.debug_info("☆%s: start: %s, end: %s, %s_infections: %s", bone_name, fnos[0], fnos[-1], value_name, infections)
+
+    return infections
+
+
 # https://blog.goo.ne.jp/torisu_tetosuki/e/bc9f1c4d597341b394bd02b64597499d
 # https://w.atwiki.jp/kumiho_k/pages/15.html
 cdef class VmdMotion:
@@ -344,6 +837,17 @@ cdef class VmdMotion:
 
         # 指定ボーン名でキーフレ登録
         for bone_name in bone_name_list:
+            if fnos[-1] - fnos[0] == len(fnos) - 1:
+                # 全フレームに打つ場合、補間曲線は使われないので値を配列でまとめて登録する
+                self.c_regist_full_bf_columns(bone_name, fnos, is_key)
+
+                if fnos[-1] > 0:
+                    if data_set_no == 0:
+                        logger.info("-- %sフレーム目:終了(%s％)【全打ち - %s】", fnos[-1], 100, bone_name)
+                    elif data_set_no > 0:
+                        logger.info("-- %sフレーム目:終了(%s％)【No.%s - 全打ち - %s】", fnos[-1], 100, data_set_no, bone_name)
+                continue
+
             prev_sep_fno = 0
 
             for fno in fnos:
@@ -360,6 +864,38 @@ cdef class VmdMotion:
                         logger.info("-- %sフレーム目:終了(%s％)【No.%s - 全打ち - %s】", fno, round((fno / fnos[-1]) * 100, 3), data_set_no, bone_name)
                         prev_sep_fno = fno // 500
 
+    # 連続したフレーム番号の値を列指向辞書にまとめて登録する
+    # VmdBoneFrameは参照された時に初めて生成する
+    cdef c_regist_full_bf_columns(self, str bone_name, list fnos, bint is_key):
+        cdef int n = len(fnos)
+        cdef np.ndarray full_fnos = np.array(fnos, dtype=np.int64)
+        cdef np.ndarray org_rotations = np.zeros((n, 4), dtype=np.float64)
+        cdef np.ndarray reads = np.zeros(n, dtype=np.bool_)
+        cdef VmdBoneFrame bf
+        cdef bytes bname = b''
+        org_rotations[:, 0] = 1
+
+        positions, rotations = self.c_sample_bone(bone_name, full_fnos)
+
+        if bone_name in self.bones and len(self.bones[bone_name]) > 0:
+            bf_dict = get_frame_dict(self.bones, bone_name)
+
+            # 既存キーは元の回転と読み込みフラグを引き継ぐ
+            for fno in bf_dict.fnos:
+                if fnos[0] <= fno <= fnos[-1]:
+                    bf = bf_dict[fno]
+                    bname = bf.bname or bname
+                    org_rotations[fno - fnos[0]] = (bf.org_rotation.scalar(), bf.org_rotation.x(), bf.org_rotation.y(), bf.org_rotation.z())
+                    reads[fno - fnos[0]] = bf.read
+
+            # 最初のキーより前の先頭フレームは、最初のキーをコピーしたものになる
+            bf = bf_dict[bf_dict.fnos[0]]
+            org_rotations[0] = (bf.org_rotation.scalar(), bf.org_rotation.x(), bf.org_rotation.y(), bf.org_rotation.z())
+
+        self.bones[bone_name] = VmdBoneFrameColumns(bone_name, bname, full_fnos, positions, rotations, org_rotations, \
+                                                    np.tile(np.array(VmdBoneFrame().interpolation, dtype=np.uint8), (n, 1)), \
+                                                    np.logical_or(is_key, reads), reads)
+
     def get_differ_fnos(self, data_set_no: int, bone_name_list: list, limit_degrees: float, limit_length: float):
         return self.c_get_differ_fnos(data_set_no, bone_name_list, limit_degrees, limit_length)
 
@@ -492,16 +1028,13 @@ cdef class VmdMotion:
 
     # フィルターをかける
     cdef c_smooth_filter_bf(self, int data_set_no, str bone_name, bint is_rot, bint is_mov, int loop, dict mconfig, int start_fno, int end_fno, bint is_show_log):
-        cdef int n, fno
-        cdef list active_fnos
-        cdef prev_sep_fno = 0
-        cdef VmdBoneFrame now_bf, start_bf, end_bf, bf
-        cdef MQuaternion filterd_qq
+        cdef int n, row
+        cdef list active_fnos, infections
+        cdef VmdBoneFrame now_bf
         cdef np.ndarray[DTYPE_INT_t, ndim=1] fnos
+        cdef np.ndarray positions, rotations, starts, ends, idxs, seg_idxs, rows, filterd_positions, filterd_rotations
 
         for n in range(loop):
-            prev_sep_fno = 0
-
             # キーフレを取得する
             if start_fno < 0 and end_fno < 0:
                 # 範囲指定がない場合、全範囲
@@ -512,55 +1045,116 @@ cdef class VmdMotion:
 
             fnos = np.array(list(range(active_fnos[0], active_fnos[-1] + 1)), dtype=np.int)
 
-            infections, _, _, _, _ = self.c_get_infections(data_set_no, bone_name, is_rot, is_mov, fnos, active_fnos)
+            infections, _, _ = self.c_get_infections(data_set_no, bone_name, is_rot, is_mov, fnos, active_fnos)
+
+            # S字の単位（変曲点の間）のフレームのINDEX
+            starts = np.array(infections[:-2:2], dtype=np.int64)
+            ends = np.array(infections[2::2], dtype=np.int64)
+            if len(starts) == 0:
+                continue
+            idxs = np.concatenate([np.arange(s + 1, e, dtype=np.int64) for s, e in zip(starts, ends)]) - fnos[0]
+            if len(idxs) == 0:
+                continue
+
+            bf_dict = get_frame_dict(self.bones, bone_name)
+            if not np.all(np.isin(idxs + fnos[0], np.array(bf_dict.fnos, dtype=np.int64))):
+                # キーがないフレームは、直前にフィルタをかけたキーとの補間で値が変わるため、1フレームずつ求め直す
+                self.c_smooth_filter_bf_frames(data_set_no, bone_name, is_rot, is_mov, n, mconfig, fnos, infections, is_show_log)
+                continue
+
+            # フィルタ前の値は1回でまとめて求める
+            positions, rotations = self.c_sample_bone(bone_name, fnos)
+            filterd_positions = positions[idxs]
+            filterd_rotations = rotations[idxs]
 
             # 全区間をフィルタにかける
             if is_mov:
-                prev_sep_fno = 0
-                mxfilter = OneEuroFilter(**mconfig)
-                myfilter = OneEuroFilter(**mconfig)
-                mzfilter = OneEuroFilter(**mconfig)
-
-                # S字の単位で調整
-                for inf_start_fno, inf_end_fno in zip(infections[:-2:2], infections[2::2]):
-                    logger.test("move filter: start: %s, end: %s", inf_start_fno, inf_end_fno)
-
-                    for fno in range(inf_start_fno + 1, inf_end_fno):
-                        now_bf = self.c_calc_bf(bone_name, fno, is_key=False, is_read=False, is_reset_interpolation=False)
-                        now_bf.position = MVector3D(mxfilter(now_bf.position.x()), myfilter(now_bf.position.y()), mzfilter(now_bf.position.z()))
-                        # 補間曲線分割なしでそのまま登録
-                        self.bones[bone_name][fno] = now_bf
-
-                        if is_show_log and fno // 2000 > prev_sep_fno and fnos[-1] > 0:
-                            if data_set_no > 0:
-                                logger.info("-- %sフレーム目:終了(%s％)【No.%s - 移動フィルタリング(%s) - %s】", fno, round((fno / fnos[-1]) * 100, 3), data_set_no, (n + 1), bone_name)
-                            else:
-                                logger.info("-- %sフレーム目:終了(%s％)【移動フィルタリング(%s) - %s】", fno, round((fno / fnos[-1]) * 100, 3), (n + 1), bone_name)
-                            prev_sep_fno = fno // 2000
-            
+                filterd_positions = one_euro_filter_array(filterd_positions, **mconfig)
+
+                if is_show_log and fnos[-1] > 0:
+                    if data_set_no > 0:
+                        logger.info("-- %sフレーム目:終了(%s％)【No.%s - 移動フィルタリング(%s) - %s】", fnos[-1], 100, data_set_no, (n + 1), bone_name)
+                    else:
+                        logger.info("-- %sフレーム目:終了(%s％)【移動フィルタリング(%s) - %s】", fnos[-1], 100, (n + 1), bone_name)
+
             if is_rot:
-                prev_sep_fno = 0
-
-                for inf_start_fno, inf_end_fno in zip(infections[:-2:2], infections[2::2]):
-                    start_bf = self.c_calc_bf(bone_name, inf_start_fno, is_key=False, is_read=False, is_reset_interpolation=False)
-                    end_bf = self.c_calc_bf(bone_name, inf_end_fno, is_key=False, is_read=False, is_reset_interpolation=False)
-
-                    for fno in range(inf_start_fno + 1, inf_end_fno):
-                        now_bf = self.c_calc_bf(bone_name, fno, is_key=False, is_read=False, is_reset_interpolation=False)
-                        # まず前後の中間をそのまま求める
-                        filterd_qq = MQuaternion.slerp(start_bf.rotation, end_bf.rotation, (fno - inf_start_fno) / (inf_end_fno - inf_start_fno))
-                        # 現在の回転にも少し近づける
-                        now_bf.rotation = MQuaternion.slerp(filterd_qq, now_bf.rotation, 0.8)
-                        # 補間曲線分割なしでそのまま登録
-                        self.bones[bone_name][fno] = now_bf
-
-                    if is_show_log and inf_start_fno // 2000 > prev_sep_fno and fnos[-1] > 0:
+                # S字の単位で、まず前後の中間をそのまま求める
+                seg_idxs = np.searchsorted(ends, idxs + fnos[0], side='right')
+                middle_rotations = MQuaternionArray.slerp(rotations[starts[seg_idxs] - fnos[0]], rotations[ends[seg_idxs] - fnos[0]], \
+                                                          (idxs + fnos[0] - starts[seg_idxs]) / (ends[seg_idxs] - starts[seg_idxs]))
+                # 現在の回転にも少し近づける
+                filterd_rotations = MQuaternionArray.slerp(middle_rotations, rotations[idxs], 0.8).data()
+
+                if is_show_log and fnos[-1] > 0:
+                    if data_set_no > 0:
+                        logger.info("-- %sフレーム目:終了(%s％)【No.%s - 回転フィルタリング(%s) - %s】", fnos[-1], 100, data_set_no, (n + 1), bone_name)
+                    else:
+                        logger.info("-- %sフレーム目:終了(%s％)【回転フィルタリング(%s) - %s】", fnos[-1], 100, (n + 1), bone_name)
+
+            # 補間曲線分割なしでそのまま登録（全フレームにキーがある）
+            rows = np.arange(len(idxs))
+            if isinstance(bf_dict, VmdBoneFrameColumns):
+                # 未生成の行は配列のまま差し替える
+                rows = bf_dict.replace_values(idxs + fnos[0], filterd_positions if is_mov else None, filterd_rotations if is_rot else None)
+
+            for row in rows.tolist():
+                now_bf = bf_dict[idxs[row] + fnos[0]]
+
+                if is_mov:
+                    now_bf.position = MVector3D(*filterd_positions[row].tolist())
+                if is_rot:
+                    now_bf.rotation = MQuaternion(*filterd_rotations[row].tolist())
+            
+    # キーがないフレームがある場合のフィルタ（前フレームのフィルタ結果を読み直しながら1フレームずつ求める）
+    cdef c_smooth_filter_bf_frames(self, int data_set_no, str bone_name, bint is_rot, bint is_mov, int n, dict mconfig, np.ndarray fnos, list infections, bint is_show_log):
+        cdef int fno, inf_start_fno, inf_end_fno
+        cdef int prev_sep_fno = 0
+        cdef VmdBoneFrame now_bf, start_bf, end_bf
+        cdef MQuaternion filterd_qq
+
+        if is_mov:
+            mxfilter = OneEuroFilter(**mconfig)
+            myfilter = OneEuroFilter(**mconfig)
+            mzfilter = OneEuroFilter(**mconfig)
+
+            # S字の単位で調整
+            for inf_start_fno, inf_end_fno in zip(infections[:-2:2], infections[2::2]):
+                for fno in range(inf_start_fno + 1, inf_end_fno):
+                    now_bf = self.c_calc_bf(bone_name, fno, is_key=False, is_read=False, is_reset_interpolation=False)
+                    now_bf.position = MVector3D(mxfilter(now_bf.position.x()), myfilter(now_bf.position.y()), mzfilter(now_bf.position.z()))
+                    # 補間曲線分割なしでそのまま登録
+                    self.bones[bone_name][fno] = now_bf
+
+                    if is_show_log and fno // 2000 > prev_sep_fno and fnos[-1] > 0:
                         if data_set_no > 0:
-                            logger.info("-- %sフレーム目:終了(%s％)【No.%s - 回転フィルタリング(%s) - %s】", inf_start_fno, round((inf_start_fno / fnos[-1]) * 100, 3), data_set_no, (n + 1), bone_name)
+                            logger.info("-- %sフレーム目:終了(%s％)【No.%s - 移動フィルタリング(%s) - %s】", fno, round((fno / fnos[-1]) * 100, 3), data_set_no, (n + 1), bone_name)
                         else:
-                            logger.info("-- %sフレーム目:終了(%s％)【回転フィルタリング(%s) - %s】", inf_start_fno, round((inf_start_fno / fnos[-1]) * 100, 3), (n + 1), bone_name)
-                        prev_sep_fno = inf_start_fno // 2000
-            
+                            logger.info("-- %sフレーム目:終了(%s％)【移動フィルタリング(%s) - %s】", fno, round((fno / fnos[-1]) * 100, 3), (n + 1), bone_name)
+                        prev_sep_fno = fno // 2000
+
+        if is_rot:
+            prev_sep_fno = 0
+
+            for inf_start_fno, inf_end_fno in zip(infections[:-2:2], infections[2::2]):
+                start_bf = self.c_calc_bf(bone_name, inf_start_fno, is_key=False, is_read=False, is_reset_interpolation=False)
+                end_bf = self.c_calc_bf(bone_name, inf_end_fno, is_key=False, is_read=False, is_reset_interpolation=False)
+
+                for fno in range(inf_start_fno + 1, inf_end_fno):
+                    now_bf = self.c_calc_bf(bone_name, fno, is_key=False, is_read=False, is_reset_interpolation=False)
+                    # まず前後の中間をそのまま求める
+                    filterd_qq = MQuaternion.slerp(start_bf.rotation, end_bf.rotation, (fno - inf_start_fno) / (inf_end_fno - inf_start_fno))
+                    # 現在の回転にも少し近づける
+                    now_bf.rotation = MQuaternion.slerp(filterd_qq, now_bf.rotation, 0.8)
+                    # 補間曲線分割なしでそのまま登録
+                    self.bones[bone_name][fno] = now_bf
+
+                if is_show_log and inf_start_fno // 2000 > prev_sep_fno and fnos[-1] > 0:
+                    if data_set_no > 0:
+                        logger.info("-- %sフレーム目:終了(%s％)【No.%s - 回転フィルタリング(%s) - %s】", inf_start_fno, round((inf_start_fno / fnos[-1]) * 100, 3), data_set_no, (n + 1), bone_name)
+                    else:
+                        logger.info("-- %sフレーム目:終了(%s％)【回転フィルタリング(%s) - %s】", inf_start_fno, round((inf_start_fno / fnos[-1]) * 100, 3), (n + 1), bone_name)
+                    prev_sep_fno = inf_start_fno // 2000
+
     # 無効なキーを物理削除する
     def remove_unkey_bf(self, data_set_no: int, bone_name: str):
         for fno in self.get_bone_fnos(bone_name):
@@ -574,17 +1168,17 @@ cdef class VmdMotion:
     # https://teratail.com/questions/162391
     def remove_unnecessary_bf(self, data_set_no: int, bone_name: str, is_rot: bint, is_mov: bint, \
                                      offset=0, rot_diff_limit=0.001, mov_diff_limit=0.1, start_fno=-1, end_fno=-1, is_show_log=True, is_force=False, is_sub_remove=False):
-        self.c_remove_unnecessary_bf(data_set_no, bone_name, is_rot, is_mov, offset, rot_diff_limit, mov_diff_limit, start_fno, end_fno, is_show_log, False, is_sub_remove, 
-                                     None, None, None, None, None)
+        self.c_remove_unnecessary_bf(data_set_no, bone_name, is_rot, is_mov, offset, rot_diff_limit, mov_diff_limit, start_fno, end_fno, is_show_log, is_sub_remove)
 
     # 指定ボーンの不要キーを削除する
     # 変曲点を求める
     # https://teratail.com/questions/162391
     cdef list c_remove_unnecessary_bf(self, int data_set_no, str bone_name, bint is_rot, bint is_mov, \
-                                      double offset, double rot_diff_limit, double mov_diff_limit, int r_start_fno, int r_end_fno, bint is_show_log, bint is_force, bint is_sub_remove, 
-                                      dict r_dict, dict mx_dict, dict my_dict, dict mz_dict, list infections):
-        cdef int prev_sep_fno = 0
-        cdef list active_fnos
+                                      double offset, double rot_diff_limit, double mov_diff_limit, int r_start_fno, int r_end_fno, bint is_show_log, bint is_sub_remove):
+        cdef list active_fnos, infections, spans
+        cdef list channel_values = []
+        cdef list diff_limits = []
+        cdef np.ndarray thetas, positions
         cdef np.ndarray[DTYPE_INT_t, ndim=1] fnos
 
         logger.test("self.bones[bone_name].keys(): %s", self.bones[bone_name].keys())
@@ -598,20 +1192,13 @@ cdef class VmdMotion:
             active_fnos = self.get_bone_fnos(bone_name, start_fno=r_start_fno, end_fno=r_end_fno, is_key=True)
 
         if len(active_fnos) <= 2:
-            return
+            return None
         
         fnos = np.array(list(range(active_fnos[0], active_fnos[-1] + 1)), dtype=np.int)
 
         logger.test("remove_unnecessary_bf fnos: %s, %s, active: %s", bone_name, fnos, active_fnos)
 
-        cdef VmdBoneFrame bf = None
-        cdef VmdBoneFrame prev_bf = None
-        cdef VmdBoneFrame next_bf = None
-        cdef MQuaternion prev_rot = None
-        cdef int fidx, fno, prev_fno, next_fno, n
-
-        if not infections:
-            infections, r_dict, mx_dict, my_dict, mz_dict = self.c_get_infections(data_set_no, bone_name, is_rot, is_mov, fnos, active_fnos)
+        infections, thetas, positions = self.c_get_infections(data_set_no, bone_name, is_rot, is_mov, fnos, active_fnos)
 
         logger.debug_info("☆%s: start: %s, end: %s, infections: %s", bone_name, fnos[0], fnos[-1], infections)
 
@@ -619,132 +1206,20 @@ cdef class VmdMotion:
             # 変曲点が間にない場合、終了
             return None
 
-        cdef int iidx = 1
-        cdef int prev_inf_end_fno = 0
-        cdef int inf_start_fno = active_fnos[0]
-        cdef int inf_end_fno = 0
-        cdef list rot_values = []
-        cdef list mx_values = []
-        cdef list my_values = []
-        cdef list mz_values = []
-        cdef list inf_fnos = []
-        cdef bint is_prev_success = False
-        cdef dict rconfig = {"freq": 30, "mincutoff": 5, "beta": 1, "dcutoff": 5}
-        cdef dict mconfig = {"freq": 30, "mincutoff": 5, "beta": 1, "dcutoff": 5}
-        
-        while inf_start_fno <= active_fnos[-1] and iidx < len(infections):
-            rot_values = [0]
-            mx_values = []
-            my_values = []
-            mz_values = []
-            inf_end_fno = infections[iidx]
-            inf_fnos = list(range(inf_start_fno, inf_end_fno + 1))
-
-            for fidx, f in enumerate(inf_fnos):
-                if is_rot and fidx > 0:
-                    rot_values.append(rot_values[fidx - 1] + r_dict[f].calcTheata(r_dict[f - 1]))
-
-                if is_mov:
-                    mx_values.append(mx_dict[f])
-                    my_values.append(my_dict[f])
-                    mz_values.append(mz_dict[f])
-
-            next_bf = None
-
-            # 単調増加としてキーを結合してみる
-            (joined_rot_bzs, rot_inflection) = MBezierUtils.join_value_2_bezier(inf_end_fno, f'{bone_name}R', rot_values, \
-                                                                                offset=offset, diff_limit=rot_diff_limit) if is_rot else (True, [])
-            (joined_mx_bzs, mx_inflection) = MBezierUtils.join_value_2_bezier(inf_end_fno, f'{bone_name}MX', mx_values, \
-                                                                              offset=offset, diff_limit=mov_diff_limit) if is_mov else (True, [])
-            (joined_my_bzs, my_inflection) = MBezierUtils.join_value_2_bezier(inf_end_fno, f'{bone_name}MY', my_values, \
-                                                                              offset=offset, diff_limit=mov_diff_limit) if is_mov else (True, [])
-            (joined_mz_bzs, mz_inflection) = MBezierUtils.join_value_2_bezier(inf_end_fno, f'{bone_name}MZ', mz_values, \
-                                                                              offset=offset, diff_limit=mov_diff_limit) if is_mov else (True, [])
-
-            if joined_rot_bzs and joined_mx_bzs and joined_my_bzs and joined_mz_bzs:
-                next_bf = self.c_calc_bf(bone_name, inf_end_fno, is_key=False, is_read=False, is_reset_interpolation=False)
-
-                # 結合できた場合、補間曲線をnextに設定
-                if is_rot and len(joined_rot_bzs) > 0:
-                    logger.debug_info("☆%s: f: %s(%s), キー:回転補間曲線成功: 1: %s, 2: %s", bone_name, inf_start_fno, inf_end_fno, joined_rot_bzs[1].to_log(), joined_rot_bzs[2].to_log())
-                    self.reset_interpolation_parts(bone_name, next_bf, joined_rot_bzs, MBezierUtils.R_x1_idxs, MBezierUtils.R_y1_idxs, MBezierUtils.R_x2_idxs, MBezierUtils.R_y2_idxs)
-                
-                if is_mov and len(joined_mx_bzs) > 0 and len(joined_my_bzs) > 0 and len(joined_mz_bzs) > 0:
-                    logger.debug_info("☆%s: f: %s(%s), キー:移動X補間曲線成功: 1: %s, 2: %s", bone_name, inf_start_fno, inf_end_fno, joined_mx_bzs[1].to_log(), joined_mx_bzs[2].to_log())
-                    logger.debug_info("☆%s: f: %s(%s), キー:移動Y補間曲線成功: 1: %s, 2: %s", bone_name, inf_start_fno, inf_end_fno, joined_my_bzs[1].to_log(), joined_my_bzs[2].to_log())
-                    logger.debug_info("☆%s: f: %s(%s), キー:移動Z補間曲線成功: 1: %s, 2: %s", bone_name, inf_start_fno, inf_end_fno, joined_mz_bzs[1].to_log(), joined_mz_bzs[2].to_log())
-                    self.reset_interpolation_parts(bone_name, next_bf, joined_mx_bzs, MBezierUtils.MX_x1_idxs, MBezierUtils.MX_y1_idxs, MBezierUtils.MX_x2_idxs, MBezierUtils.MX_y2_idxs)
-                    self.reset_interpolation_parts(bone_name, next_bf, joined_my_bzs, MBezierUtils.MY_x1_idxs, MBezierUtils.MY_y1_idxs, MBezierUtils.MY_x2_idxs, MBezierUtils.MY_y2_idxs)
-                    self.reset_interpolation_parts(bone_name, next_bf, joined_mz_bzs, MBezierUtils.MZ_x1_idxs, MBezierUtils.MZ_y1_idxs, MBezierUtils.MZ_x2_idxs, MBezierUtils.MZ_y2_idxs)
-
-                # 変曲点で登録
-                if bone_name in self.bones and inf_end_fno in self.bones[bone_name]:
-                    self.bones[bone_name][inf_end_fno].key = True
-                    self.bones[bone_name][inf_end_fno].interpolation = next_bf.interpolation
-                    logger.debug_info("◇登録 %s: f: %s, next_bf(%s) rot:%s", bone_name, inf_end_fno, next_bf.fno, next_bf.rotation.toEulerAngles4MMD().to_log())
-                else:
-                    self.c_regist_bf(next_bf, bone_name, inf_end_fno, copy_interpolation=True, key=True)
-                    logger.debug_info("☆登録 %s: f: %s, next_bf(%s) rot:%s", bone_name, inf_end_fno, next_bf.fno, next_bf.rotation.toEulerAngles4MMD().to_log())
-                
-                logger.debug_info("☆%s: f: %s, キーフレ削除: %s-%s", bone_name, inf_end_fno, inf_start_fno + 1, inf_end_fno - 1)
-
-                for f in range(inf_start_fno + 1, inf_end_fno):
-                    # 結合できた場合、区間内を削除
-                    if f in self.bones[bone_name]:
-                        # self.bones[bone_name][f].key = False
-                        del self.bones[bone_name][f]
-                
-                # 成功記録
-                is_prev_success = True
-                # 前回結合最終点を保持
-                prev_inf_end_fno = inf_end_fno
-                # 次のブロックに移動する
-                iidx += 1
-
-                if is_force:
-                    # 細分化で成功した場合はそのまま返す
-                    return [inf_start_fno, inf_end_fno]
-            else:
-                # 結合できなかった場合、開始を現在の変曲点に移す
-                logger.debug_info("★%s: f: %s(%s), キー:補間曲線失敗: rot_inflection: %s, mx_inflection: %s, my_inflection: %s, mz_inflection: %s", \
-                                bone_name, inf_start_fno, inf_end_fno, rot_inflection, mx_inflection, my_inflection, mz_inflection)
-               
-                if is_sub_remove and not is_prev_success:
-                    # 最終処理で一度も成功していない場合、前後に分けて不要キー区分削除処理実施
-                    separate_fno = inf_start_fno + int((inf_end_fno - inf_start_fno) / 2)
-                    activate_fnos = None
-
-                    if inf_start_fno < separate_fno - 1:
-                        logger.debug_info(f"【不要キー削除(区分削除:前) - {bone_name}:{inf_start_fno}-{separate_fno}】")
-                        activate_fnos = self.c_remove_unnecessary_bf(data_set_no, bone_name, is_rot, is_mov, offset, rot_diff_limit, mov_diff_limit, inf_start_fno, separate_fno, False, True, is_sub_remove, 
-                                                                     r_dict, mx_dict, my_dict, mz_dict, [inf_start_fno, separate_fno])
-                        # 前回結合最終点を保持（結合した後ろのを保持）
-                        inf_start_fno = separate_fno
-                    else:
-                        logger.debug_info(f"【不要キー削除(区分削除:後) - {bone_name}:{separate_fno}-{inf_end_fno}】")
-                        activate_fnos = self.c_remove_unnecessary_bf(data_set_no, bone_name, is_rot, is_mov, offset, rot_diff_limit, mov_diff_limit, separate_fno, inf_end_fno, False, True, is_sub_remove, 
-                                                                     r_dict, mx_dict, my_dict, mz_dict, [separate_fno, inf_end_fno])
-                        # 前回結合最終点を保持（結合した後ろのを保持）
-                        inf_start_fno = inf_end_fno
-                else:
-                    # 結合した最後から次へ進める
-                    inf_start_fno = prev_inf_end_fno
-
-                # 失敗記録
-                is_prev_success = False
-                # 次のブロックには移動しない（今回の結合場所までの範囲）
-                prev_inf_end_fno = inf_end_fno
+        # 全フレームの値をチャンネル（回転, 移動X, 移動Y, 移動Z）ごとに並べる
+        if is_rot:
+            # 回転は前フレームとの角度差の累積
+            channel_values.append(np.cumsum(thetas))
+            diff_limits.append(rot_diff_limit)
 
-                if is_force:
-                    return None
+        if is_mov:
+            channel_values.extend([positions[:, 0], positions[:, 1], positions[:, 2]])
+            diff_limits.extend([mov_diff_limit, mov_diff_limit, mov_diff_limit])
 
-            if inf_end_fno // 500 > prev_sep_fno and is_show_log:
-                if data_set_no == 0:
-                    logger.count(f"【不要キー削除 - {bone_name}】", inf_end_fno, list(fnos))
-                else:
-                    logger.count(f"【No.{data_set_no} - 不要キー削除 - {bone_name}】", inf_end_fno, list(fnos))
+        spans = self.c_select_unnecessary_bf_spans(data_set_no, bone_name, fnos, np.array(channel_values, dtype=np.float64), np.array(diff_limits, dtype=np.float64), \
+                                                   infections, active_fnos, offset, is_show_log, is_sub_remove)
 
-                prev_sep_fno = inf_end_fno // 500
+        self.c_apply_unnecessary_bf_spans(bone_name, is_rot, is_mov, spans)
 
         # キーフレを取得する
         if r_start_fno < 0 and r_end_fno < 0:
@@ -757,117 +1232,175 @@ cdef class VmdMotion:
             logger.debug("【不要キー削除 - %s】 active(range): %s", bone_name, activate_fnos)
         
         return activate_fnos
-    
-    cdef tuple c_get_infections(self, int data_set_no, str bone_name, bint is_rot, bint is_mov, np.ndarray fnos, list active_fnos):
-        cdef dict r_dict = {}
-        cdef dict mx_dict = {}
-        cdef dict my_dict = {}
-        cdef dict mz_dict = {}
-        cdef dict rot_diff_value_dict = {}
-        cdef dict mx_diff_value_dict = {}
-        cdef dict my_diff_value_dict = {}
-        cdef dict mz_diff_value_dict = {}
-        cdef np.ndarray[DTYPE_INT_t, ndim=1] r_infections = np.array([], dtype=np.int)
-        cdef np.ndarray[DTYPE_INT_t, ndim=1] mx_infections = np.array([], dtype=np.int)
-        cdef np.ndarray[DTYPE_INT_t, ndim=1] my_infections = np.array([], dtype=np.int)
-        cdef np.ndarray[DTYPE_INT_t, ndim=1] mz_infections = np.array([], dtype=np.int)
-
-        for fidx, fno in enumerate(fnos):
-            bf = self.c_calc_bf(bone_name, fno, is_key=False, is_read=False, is_reset_interpolation=False)
-            logger.test("*%s: f: %s, bf(%s):rot:%s", bone_name, fno, bf.fno, bf.rotation.toEulerAngles4MMD().to_log())
 
-            if is_mov:
-                mx_dict[fno] = bf.position.x()
-                my_dict[fno] = bf.position.y()
-                mz_dict[fno] = bf.position.z()
-            
-            if is_rot:
-                r_dict[fno] = bf.rotation
+    # 不要キー削除で結合する区間を選ぶ
+    # 変曲点を終点候補として、始点から結合できる所まで区間を伸ばし、結合できなくなったら最後に結合できた変曲点から始め直す
+    # 終点候補は数個ずつまとめて評価する（全部結合できた場合は次の候補数を倍にする）
+    # 戻り値: (始点, 終点, チャンネルごとの補間曲線) のリスト
+    cdef list c_select_unnecessary_bf_spans(self, int data_set_no, str bone_name, np.ndarray fnos, np.ndarray values, np.ndarray diff_limits, \
+                                            list infections, list active_fnos, double offset, bint is_show_log, bint is_sub_remove):
+        cdef list spans = []
+        cdef list results, sub_results
+        cdef list joined_bzs = None
+        cdef np.ndarray key_fnos = np.array(active_fnos, dtype=np.int64)
+        cdef int first_fno = fnos[0]
+        cdef int inf_start_fno = infections[0]
+        cdef int inf_end_fno, separate_fno, key_fno
+        cdef int iidx = 1
+        cdef int joined_iidx = 0
+        cdef int cnt = 4
+        cdef int ridx
+        cdef int prev_sep_fno = 0
 
-        # 変化量
-        for fidx, fno in enumerate(fnos):
-            if is_rot:
-                if fidx == 0:
-                    rot_diff_value_dict[fno] = 0
-                    prev_rot = MQuaternion()
+        while iidx < len(infections):
+            # 始点から複数の変曲点まで結合してみる
+            results = MBezierUtils.join_values_2_bezier(values, np.full(len(infections[iidx:(iidx + cnt)]), inf_start_fno - first_fno), \
+                                                        np.array(infections[iidx:(iidx + cnt)]) - first_fno, diff_limits, offset)
+            ridx = 0
+            while ridx < len(results) and results[ridx] is not None:
+                ridx += 1
+
+            if ridx > 0:
+                # 結合できた最後の変曲点を保持
+                joined_iidx = iidx + ridx - 1
+                joined_bzs = results[ridx - 1]
+                logger.debug_info("☆%s: f: %s(%s), キー:補間曲線成功", bone_name, inf_start_fno, infections[joined_iidx])
+
+            if ridx == len(results):
+                # 全部結合できた場合、さらに先の変曲点まで伸ばしてみる
+                iidx += ridx
+                cnt = min(cnt * 2, 64)
+            elif joined_bzs:
+                # 結合できなくなった場合、結合できた所までで確定して、そこから始め直す
+                spans.append((inf_start_fno, infections[joined_iidx], joined_bzs))
+                inf_start_fno = infections[joined_iidx]
+                iidx = joined_iidx + 1
+                joined_bzs = None
+                cnt = 4
+            else:
+                # 次の変曲点とも結合できなかった場合
+                inf_end_fno = infections[iidx]
+                logger.debug_info("★%s: f: %s(%s), キー:補間曲線失敗", bone_name, inf_start_fno, inf_end_fno)
+
+                separate_fno = inf_start_fno + int((inf_end_fno - inf_start_fno) / 2)
+
+                if is_sub_remove and inf_start_fno < separate_fno - 1:
+                    # 前半だけ結合してみる（間にキーが2つ以上ある場合のみ）
+                    logger.debug_info(f"【不要キー削除(区分削除:前) - {bone_name}:{inf_start_fno}-{separate_fno}】")
+                    sub_results = [None]
+                    if np.count_nonzero((key_fnos > inf_start_fno) & (key_fnos <= separate_fno)) >= 2:
+                        sub_results = MBezierUtils.join_values_2_bezier(values, [inf_start_fno - first_fno], [separate_fno - first_fno], diff_limits, offset)
+
+                    if sub_results[0] is not None:
+                        # 結合できた場合、分割点をキーにして、そこから次の変曲点まで結合してみる
+                        spans.append((inf_start_fno, separate_fno, sub_results[0]))
+                        inf_start_fno = separate_fno
+                    else:
+                        # 結合できなかった場合、分割点までの最後のキーから次の変曲点まで結合してみる
+                        key_fno = key_fnos[np.searchsorted(key_fnos, separate_fno, side='right') - 1]
+                        if key_fno > inf_start_fno:
+                            inf_start_fno = key_fno
+                        else:
+                            inf_start_fno = inf_end_fno
+                            iidx += 1
                 else:
-                    rot = r_dict[fno]
-                    rot_diff_value_dict[fno] = rot.calcTheata(prev_rot)
-                    prev_rot = rot
+                    if is_sub_remove and np.count_nonzero((key_fnos >= separate_fno) & (key_fnos <= inf_end_fno)) > 2:
+                        # 後半だけ結合してみる
+                        logger.debug_info(f"【不要キー削除(区分削除:後) - {bone_name}:{separate_fno}-{inf_end_fno}】")
+                        sub_results = MBezierUtils.join_values_2_bezier(values, [separate_fno - first_fno], [inf_end_fno - first_fno], diff_limits, offset)
+                        if sub_results[0] is not None:
+                            spans.append((separate_fno, inf_end_fno, sub_results[0]))
 
-            if is_mov:
-                if fidx == 0:
-                    mx_diff_value_dict[fno] = 0
-                    my_diff_value_dict[fno] = 0
-                    mz_diff_value_dict[fno] = 0
+                    # 結合できなかった区間はそのまま残して、次の変曲点から始める
+                    inf_start_fno = inf_end_fno
+                    iidx += 1
+
+                cnt = 4
+
+            if inf_start_fno // 500 > prev_sep_fno and is_show_log:
+                if data_set_no == 0:
+                    logger.count(f"【不要キー削除 - {bone_name}】", inf_start_fno, list(fnos))
                 else:
-                    mx_diff_value_dict[fno] = mx_dict[fno] - mx_dict[fnos[fidx - 1]]
-                    my_diff_value_dict[fno] = my_dict[fno] - my_dict[fnos[fidx - 1]]
-                    mz_diff_value_dict[fno] = mz_dict[fno] - mz_dict[fnos[fidx - 1]]
+                    logger.count(f"【No.{data_set_no} - 不要キー削除 - {bone_name}】", inf_start_fno, list(fnos))
+
+                prev_sep_fno = inf_start_fno // 500
+
+        if joined_bzs:
+            # 最後まで結合できた区間
+            spans.append((inf_start_fno, infections[joined_iidx], joined_bzs))
+
+        return spans
+
+    # 選んだ区間の補間曲線を終点に設定し、区間内のキーをまとめて削除する
+    cdef c_apply_unnecessary_bf_spans(self, str bone_name, bint is_rot, bint is_mov, list spans):
+        cdef set delete_fnos = set()
+        cdef VmdBoneFrame bf
+        cdef int inf_start_fno, inf_end_fno, cidx
+
+        for inf_start_fno, inf_end_fno, joined_bzs in spans:
+            if inf_end_fno not in self.bones[bone_name]:
+                # 終点にキーがない場合、登録する
+                bf = self.c_calc_bf(bone_name, inf_end_fno, is_key=False, is_read=False, is_reset_interpolation=False)
+                self.c_regist_bf(bf, bone_name, inf_end_fno, copy_interpolation=False, key=True)
+
+            # 結合できた補間曲線を終点に設定
+            bf = self.bones[bone_name][inf_end_fno]
+            bf.key = True
+
+            cidx = 0
+            if is_rot:
+                self.reset_interpolation_parts(bone_name, bf, joined_bzs[cidx], MBezierUtils.R_x1_idxs, MBezierUtils.R_y1_idxs, MBezierUtils.R_x2_idxs, MBezierUtils.R_y2_idxs)
+                cidx += 1
+
+            if is_mov:
+                self.reset_interpolation_parts(bone_name, bf, joined_bzs[cidx], MBezierUtils.MX_x1_idxs, MBezierUtils.MX_y1_idxs, MBezierUtils.MX_x2_idxs, MBezierUtils.MX_y2_idxs)
+                self.reset_interpolation_parts(bone_name, bf, joined_bzs[cidx + 1], MBezierUtils.MY_x1_idxs, MBezierUtils.MY_y1_idxs, MBezierUtils.MY_x2_idxs, MBezierUtils.MY_y2_idxs)
+                self.reset_interpolation_parts(bone_name, bf, joined_bzs[cidx + 2], MBezierUtils.MZ_x1_idxs, MBezierUtils.MZ_y1_idxs, MBezierUtils.MZ_x2_idxs, MBezierUtils.MZ_y2_idxs)
+
+            logger.debug_info("☆%s: f: %s, キーフレ削除: %s-%s", bone_name, inf_end_fno, inf_start_fno + 1, inf_end_fno - 1)
+            delete_fnos.update(range(inf_start_fno + 1, inf_end_fno))
+
+        # 結合できた区間内のキーをまとめて削除
+        get_frame_dict(self.bones, bone_name).delete_fnos(delete_fnos)
+    
+    # 全フレームの値から変曲点を求める
+    # 戻り値: (変曲点のキーフレ番号リスト, 前フレームとの回転角度差(N), 位置(N×3))
+    cdef tuple c_get_infections(self, int data_set_no, str bone_name, bint is_rot, bint is_mov, np.ndarray fnos, list active_fnos):
+        cdef np.ndarray thetas = np.zeros(len(fnos))
+        cdef np.ndarray rot_diff_values, mov_diff_values
+        cdef np.ndarray infections = np.array([active_fnos[0], active_fnos[-1]], dtype=np.int64)
+        cdef np.ndarray positions, rotations
+        cdef int axis
+
+        # 全フレームの値をまとめて求める
+        positions, rotations = self.c_sample_bone(bone_name, fnos)
 
         # 全変化量から変曲点を求める
-        # https://teratail.com/questions/162391
         if is_rot:
-            rf_prime = np.gradient(list(rot_diff_value_dict.values()))                                                      # 差分近似
-            r_indices = np.where(np.diff(np.sign(rf_prime)))[0]                                                             # 変曲点を求める。
-            r_diff_indices = np.where(np.abs(np.diff(np.array(list(rot_diff_value_dict.values()))[r_indices])) > 0.001)     # 変曲点同士の差異が閾値以上
-            r_infections = (fnos[1:][r_indices])[r_diff_indices]                                                            # 変曲点のキーフレを再取得する
-
-            logger.debug_info("☆%s: start: %s, end: %s, rf_prime: %s", bone_name, fnos[0], fnos[-1], list(rf_prime))
-            logger.debug_info("☆%s: start: %s, end: %s, sign: %s", bone_name, fnos[0], fnos[-1], list(np.sign(rf_prime)))
-            logger.debug_info("☆%s: start: %s, end: %s, diff: %s", bone_name, fnos[0], fnos[-1], list(np.diff(np.sign(rf_prime))))
-            logger.debug_info("☆%s: start: %s, end: %s, r_indices: %s", bone_name, fnos[0], fnos[-1], list(fnos[r_indices]))
-            logger.debug_info("☆%s: start: %s, end: %s, index_diff: %s", bone_name, fnos[0], fnos[-1], list(np.diff(np.array(list(rot_diff_value_dict.values()))[r_indices])))
-            logger.debug_info("☆%s: start: %s, end: %s, r_diff_indices: %s", bone_name, fnos[0], fnos[-1], list((fnos[r_indices])[r_diff_indices]))
+            # 前フレームとの回転角度差
+            rotations = MQuaternionArray(rotations).normalized().data()
+            thetas[1:] = np.arccos(np.clip(np.sum(rotations[1:] * rotations[:-1], axis=1), -1, 1))
+
+            # 先頭は0、2番目は単位回転との差を変化量とする
+            rot_diff_values = thetas.copy()
+            if len(fnos) > 1:
+                rot_diff_values[1] = np.arccos(np.clip(rotations[1, 0], -1, 1))
+
+            infections = np.union1d(infections, get_infection_fnos(bone_name, "r", fnos, rot_diff_values, 0.001))
 
         if is_mov:
-            mxf_prime = np.gradient(list(mx_diff_value_dict.values()))
-            mx_indices = np.where(np.diff(np.sign(mxf_prime)))[0]
-            mx_diff_indices = np.where(np.abs(np.diff(np.array(list(mx_diff_value_dict.values()))[mx_indices])) > 0.003)
-            mx_infections = (fnos[1:][mx_indices])[mx_diff_indices]
-
-            logger.debug_info("☆%s: start: %s, end: %s, mxf_prime: %s", bone_name, fnos[0], fnos[-1], list(mxf_prime))
-            logger.debug_info("☆%s: start: %s, end: %s, sign: %s", bone_name, fnos[0], fnos[-1], list(np.sign(mxf_prime)))
-            logger.debug_info("☆%s: start: %s, end: %s, diff: %s", bone_name, fnos[0], fnos[-1], list(np.diff(np.sign(mxf_prime))))
-            logger.debug_info("☆%s: start: %s, end: %s, mx_indices: %s", bone_name, fnos[0], fnos[-1], list(fnos[mx_indices]))
-            logger.debug_info("☆%s: start: %s, end: %s, index_diff: %s", bone_name, fnos[0], fnos[-1], list(np.diff(np.array(list(mx_diff_value_dict.values()))[mx_indices])))
-            logger.debug_info("☆%s: start: %s, end: %s, mx_diff_indices: %s", bone_name, fnos[0], fnos[-1], list((fnos[mx_indices])[mx_diff_indices]))
-
-            myf_prime = np.gradient(list(my_diff_value_dict.values()))
-            my_indices = np.where(np.diff(np.sign(myf_prime)))[0]
-            my_diff_indices = np.where(np.abs(np.diff(np.array(list(my_diff_value_dict.values()))[my_indices])) > 0.003)
-            my_infections = (fnos[1:][my_indices])[my_diff_indices]
-
-            logger.debug_info("☆%s: start: %s, end: %s, myf_prime: %s", bone_name, fnos[0], fnos[-1], list(myf_prime))
-            logger.debug_info("☆%s: start: %s, end: %s, sign: %s", bone_name, fnos[0], fnos[-1], list(np.sign(myf_prime)))
-            logger.debug_info("☆%s: start: %s, end: %s, diff: %s", bone_name, fnos[0], fnos[-1], list(np.diff(np.sign(myf_prime))))
-            logger.debug_info("☆%s: start: %s, end: %s, my_indices: %s", bone_name, fnos[0], fnos[-1], list(fnos[my_indices]))
-            logger.debug_info("☆%s: start: %s, end: %s, index_diff: %s", bone_name, fnos[0], fnos[-1], list(np.diff(np.array(list(my_diff_value_dict.values()))[my_indices])))
-            logger.debug_info("☆%s: start: %s, end: %s, my_diff_indices: %s", bone_name, fnos[0], fnos[-1], list((fnos[my_indices])[my_diff_indices]))
-
-            mzf_prime = np.gradient(list(mz_diff_value_dict.values()))
-            mz_indices = np.where(np.diff(np.sign(mzf_prime)))[0]
-            mz_diff_indices = np.where(np.abs(np.diff(np.array(list(mz_diff_value_dict.values()))[mz_indices])) > 0.003)
-            mz_infections = (fnos[1:][mz_indices])[mz_diff_indices]
-
-            logger.debug_info("☆%s: start: %s, end: %s, mzf_prime: %s", bone_name, fnos[0], fnos[-1], list(mzf_prime))
-            logger.debug_info("☆%s: start: %s, end: %s, sign: %s", bone_name, fnos[0], fnos[-1], list(np.sign(mzf_prime)))
-            logger.debug_info("☆%s: start: %s, end: %s, diff: %s", bone_name, fnos[0], fnos[-1], list(np.diff(np.sign(mzf_prime))))
-            logger.debug_info("☆%s: start: %s, end: %s, mz_indices: %s", bone_name, fnos[0], fnos[-1], list(fnos[mz_indices]))
-            logger.debug_info("☆%s: start: %s, end: %s, index_diff: %s", bone_name, fnos[0], fnos[-1], list(np.diff(np.array(list(mz_diff_value_dict.values()))[mz_indices])))
-            logger.debug_info("☆%s: start: %s, end: %s, mz_diff_indices: %s", bone_name, fnos[0], fnos[-1], list((fnos[mz_indices])[mz_diff_indices]))
+            for axis, value_name in enumerate(["mx", "my", "mz"]):
+                mov_diff_values = np.zeros(len(fnos))
+                mov_diff_values[1:] = np.diff(positions[:, axis])
+
+                infections = np.union1d(infections, get_infection_fnos(bone_name, value_name, fnos, mov_diff_values, 0.003))
 
         # 各値の変曲点の和集合かつ有効なキーフレのみ対象とする
-        infections = sorted(set(set([active_fnos[0], active_fnos[-1]]) | set(r_infections) | set(mx_infections) | set(my_infections) | set(mz_infections) | set([active_fnos[-1]])) & set(active_fnos))
+        infections = np.intersect1d(infections, np.array(active_fnos, dtype=np.int64))
         logger.debug_info("☆%s: start: %s, end: %s, active_fnos: %s", bone_name, fnos[0], fnos[-1], active_fnos)
-        logger.debug_info("☆%s: start: %s, end: %s, r_infections: %s", bone_name, fnos[0], fnos[-1], list(r_infections))
-        logger.debug_info("☆%s: start: %s, end: %s, mx_infections: %s", bone_name, fnos[0], fnos[-1], list(mx_infections))
-        logger.debug_info("☆%s: start: %s, end: %s, my_infections: %s", bone_name, fnos[0], fnos[-1], list(my_infections))
-        logger.debug_info("☆%s: start: %s, end: %s, mz_infections: %s", bone_name, fnos[0], fnos[-1], list(mz_infections))
-
         logger.debug_info("☆%s: start: %s, end: %s, infections: %s", bone_name, fnos[0], fnos[-1], infections)
 
-        return (infections, r_dict, mx_dict, my_dict, mz_dict)
+        return (infections.tolist(), thetas, positions)
 
     # 平滑化
     cdef dict c_smooth_values(self, dict value_dict, dict config):
@@ -922,12 +1455,34 @@ cdef class VmdMotion:
         cdef int prev_fno, next_fno
         cdef VmdBoneFrame prev_bf, next_bf
         if key:
-            prev_fno, next_fno = self.get_bone_prev_next_fno(bone_name, fno=fno, is_key=True)
+            prev_fno, next_fno = self.c_get_bone_prev_next_fno(bone_name, fno, True, False, 0, 9999999999)
 
             prev_bf = self.c_calc_bf(bone_name, prev_fno, is_key=False, is_read=False, is_reset_interpolation=False)
             next_bf = self.c_calc_bf(bone_name, next_fno, is_key=False, is_read=False, is_reset_interpolation=False)
             self.split_bf_by_fno(bone_name, prev_bf, next_bf, fno)
 
+    # 位置・回転をまとめて登録（フレーム番号の昇順に登録する。positions, rotationsがNoneの場合は今の値のまま）
+    # 登録済みのキーは値だけ差し替え、キーがないフレームは補間曲線分割ありで登録する
+    def regist_bone_values(self, bone_name: str, fnos, positions=None, rotations=None):
+        self.c_regist_bone_values(bone_name, np.asarray(fnos, dtype=np.int64).reshape(-1), \
+                                  None if positions is None else np.asarray(positions, dtype=np.float64).reshape(-1, 3), \
+                                  None if rotations is None else np.asarray(rotations, dtype=np.float64).reshape(-1, 4))
+
+    cdef c_regist_bone_values(self, str bone_name, np.ndarray fnos, np.ndarray positions, np.ndarray rotations):
+        cdef int row, fno
+        cdef VmdBoneFrame bf
+
+        for row, fno in enumerate(fnos.tolist()):
+            bf = self.c_calc_bf(bone_name, fno, is_key=False, is_read=False, is_reset_interpolation=False)
+
+            if positions is not None:
+                bf.position = MVector3D(*positions[row].tolist())
+            if rotations is not None:
+                bf.rotation = MQuaternion(*rotations[row].tolist())
+
+            if not (fno in self.bones[bone_name] and bf.key):
+                self.c_regist_bf(bf, bone_name, fno, False, True)
+
     # 補間曲線を考慮した指定フレーム番号の位置
     # https://www55.atwiki.jp/kumiho_k/pages/15.html
     # https://harigane.at.webry.info/201103/article_1.html
@@ -940,49 +1495,51 @@ cdef class VmdMotion:
         cdef VmdBoneFrame fill_bf = VmdBoneFrame(fno)
 
         if bone_name not in self.bones:
-            self.bones[bone_name] = {fno: fill_bf}
+            self.bones[bone_name] = VmdFrameDict({fno: fill_bf})
             fill_bf.set_name(bone_name)
             return fill_bf
         
         # 条件に合致するフレーム番号を探す
         # is_key: 登録対象のキーを探す
         # is_read: データ読み込み時のキーを探す
-        if fno in self.bones[bone_name] and (not is_key or (is_key and self.bones[bone_name][fno].key)) and (not is_read or (is_read and self.bones[bone_name][fno].read)):
+        bf_dict = get_frame_dict(self.bones, bone_name)
+
+        if fno in bf_dict and (not is_key or (is_key and bf_dict[fno].key)) and (not is_read or (is_read and bf_dict[fno].read)):
             # 合致するキーが見つかった場合、それを返す
-            return self.bones[bone_name][fno]
+            return bf_dict[fno]
         else:
             # 合致するキーが見つからなかった場合
             if is_key or is_read:
                 # 既存キーのみ探している場合はNone
                 return None
 
-        # 番号より前のフレーム番号
-        cdef list before_fnos = [x for x in sorted(self.bones[bone_name].keys()) if (x < fno)]
-        # 番号より後のフレーム番号
-        cdef list after_fnos = [x for x in sorted(self.bones[bone_name].keys()) if (x > fno)]
+        # 番号より前後のフレーム番号（昇順リストを二分探索）
+        cdef list fnos = bf_dict.fnos
+        cdef Py_ssize_t prev_idx = bf_dict.prev_index(fno)
+        cdef Py_ssize_t next_idx = bf_dict.next_index(fno)
 
-        if len(after_fnos) == 0 and len(before_fnos) == 0:
+        if next_idx >= len(fnos) and prev_idx < 0:
             fill_bf.set_name(bone_name)
             return fill_bf
 
-        if len(after_fnos) == 0:
+        if next_idx >= len(fnos):
             # 番号より前があって、後のがない場合、前のをコピーして返す
-            fill_bf = self.bones[bone_name][before_fnos[-1]].copy()
+            fill_bf = bf_dict[fnos[prev_idx]].copy()
             fill_bf.fno = fno
             fill_bf.key = False
             fill_bf.read = False
             return fill_bf
         
-        if len(before_fnos) == 0:
+        if prev_idx < 0:
             # 番号より後があって、前がない場合、後のをコピーして返す
-            fill_bf = self.bones[bone_name][after_fnos[0]].copy()
+            fill_bf = bf_dict[fnos[next_idx]].copy()
             fill_bf.fno = fno
             fill_bf.key = False
             fill_bf.read = False
             return fill_bf
 
-        cdef VmdBoneFrame prev_bf = self.bones[bone_name][before_fnos[-1]]
-        cdef VmdBoneFrame next_bf = self.bones[bone_name][after_fnos[0]]
+        cdef VmdBoneFrame prev_bf = bf_dict[fnos[prev_idx]]
+        cdef VmdBoneFrame next_bf = bf_dict[fnos[next_idx]]
 
         # 名前をコピー
         fill_bf.name = prev_bf.name
@@ -1032,6 +1589,75 @@ cdef class VmdMotion:
 
         return fill_bf
 
+    # 指定ボーンの複数フレームの位置(N×3)・回転(N×4: w, x, y, z)をまとめて求める
+    # 各フレームの値はcalc_bfと同じ
+    def sample_bone(self, bone_name: str, fnos):
+        return self.c_sample_bone(bone_name, np.asarray(fnos, dtype=np.int64).reshape(-1))
+
+    cdef tuple c_sample_bone(self, str bone_name, np.ndarray fnos):
+        cdef np.ndarray positions = np.zeros((len(fnos), 3), dtype=np.float64)
+        cdef np.ndarray rotations = np.zeros((len(fnos), 4), dtype=np.float64)
+        rotations[:, 0] = 1
+
+        if bone_name not in self.bones or len(self.bones[bone_name]) == 0:
+            return positions, rotations
+
+        # 指定フレームの補間に必要なキーだけを取得する
+        key_fnos, key_positions, key_rotations, key_interpolations = get_frame_dict(self.bones, bone_name).bone_arrays(np.min(fnos), np.max(fnos)) \
+            if len(fnos) > 0 else get_frame_dict(self.bones, bone_name).bone_arrays()
+
+        # 番号より前後のキーのINDEX
+        cdef np.ndarray prev_idxs = np.searchsorted(key_fnos, fnos, side='left') - 1
+        cdef np.ndarray next_idxs = np.searchsorted(key_fnos, fnos, side='right')
+
+        # キーがある場合はそのまま、後のキーがない場合は前のキー、前のキーがない場合は後のキーをコピー
+        cdef np.ndarray is_exact = (next_idxs - prev_idxs) == 2
+        cdef np.ndarray is_between = ~is_exact & (prev_idxs >= 0) & (next_idxs < len(key_fnos))
+        cdef np.ndarray copy_idxs = np.where(is_exact, next_idxs - 1, np.where(next_idxs >= len(key_fnos), prev_idxs, next_idxs))
+        positions[~is_between] = key_positions[copy_idxs[~is_between]]
+        rotations[~is_between] = key_rotations[copy_idxs[~is_between]]
+
+        if not np.any(is_between):
+            return positions, rotations
+
+        # 補間曲線を元に間を埋める
+        cdef np.ndarray prev_idx = prev_idxs[is_between]
+        cdef np.ndarray next_idx = next_idxs[is_between]
+        cdef np.ndarray starts = key_fnos[prev_idx]
+        cdef np.ndarray nows = fnos[is_between]
+        cdef np.ndarray ends = key_fnos[next_idx]
+        cdef np.ndarray next_interpolations = key_interpolations[next_idx]
+
+        # 回転
+        cdef np.ndarray prev_rotations = key_rotations[prev_idx]
+        cdef np.ndarray next_rotations = key_rotations[next_idx]
+        cdef np.ndarray fill_rotations = prev_rotations.copy()
+        cdef np.ndarray is_rot = np.any(prev_rotations != next_rotations, axis=1)
+        _, ry, _ = MBezierUtils.evaluate_array(next_interpolations[:, MBezierUtils.R_x1_idxs[3]], next_interpolations[:, MBezierUtils.R_y1_idxs[3]], \
+                                              next_interpolations[:, MBezierUtils.R_x2_idxs[3]], next_interpolations[:, MBezierUtils.R_y2_idxs[3]], \
+                                              starts, nows, ends)
+        fill_rotations[is_rot] = slerp_array(prev_rotations[is_rot], next_rotations[is_rot], ry[is_rot])
+        rotations[is_between] = fill_rotations
+
+        # 移動
+        cdef np.ndarray prev_positions = key_positions[prev_idx]
+        cdef np.ndarray next_positions = key_positions[next_idx]
+        cdef np.ndarray fill_positions = prev_positions.copy()
+        cdef np.ndarray is_pos = np.any(prev_positions != next_positions, axis=1)
+        _, xy, _ = MBezierUtils.evaluate_array(next_interpolations[:, MBezierUtils.MX_x1_idxs[3]], next_interpolations[:, MBezierUtils.MX_y1_idxs[3]], \
+                                              next_interpolations[:, MBezierUtils.MX_x2_idxs[3]], next_interpolations[:, MBezierUtils.MX_y2_idxs[3]], \
+                                              starts, nows, ends)
+        _, yy, _ = MBezierUtils.evaluate_array(next_interpolations[:, MBezierUtils.MY_x1_idxs[3]], next_interpolations[:, MBezierUtils.MY_y1_idxs[3]], \
+                                              next_interpolations[:, MBezierUtils.MY_x2_idxs[3]], next_interpolations[:, MBezierUtils.MY_y2_idxs[3]], \
+                                              starts, nows, ends)
+        _, zy, _ = MBezierUtils.evaluate_array(next_interpolations[:, MBezierUtils.MZ_x1_idxs[3]], next_interpolations[:, MBezierUtils.MZ_y1_idxs[3]], \
+                                              next_interpolations[:, MBezierUtils.MZ_x2_idxs[3]], next_interpolations[:, MBezierUtils.MZ_y2_idxs[3]], \
+                                              starts, nows, ends)
+        fill_positions[is_pos] = (prev_positions + ((next_positions - prev_positions) * np.stack([xy, yy, zy], axis=1)))[is_pos]
+        positions[is_between] = fill_positions
+
+        return positions, rotations
+
     # 補間曲線を元に、回転ボーンの値を求める
     cdef MQuaternion calc_bf_rot(self, VmdBoneFrame prev_bf, VmdBoneFrame fill_bf, VmdBoneFrame next_bf):
         cdef double rx, ry, rt
@@ -1248,9 +1874,12 @@ cdef class VmdMotion:
         keys = []
         for morph_name in morph_names:
             if morph_name in self.morphs:
-                keys.extend([x for x in self.morphs[morph_name].keys() if self.morphs[morph_name][x].fno >= start_fno and self.morphs[morph_name][x].fno <= end_fno and \
-                            (not is_key or (is_key and self.morphs[morph_name][x].key)) and (not is_read or (is_read and self.morphs[morph_name][x].read))])
+                keys.extend(get_frame_dict(self.morphs, morph_name).filter_fnos(start_fno, end_fno, is_key, is_read))
         
+        if len(morph_names) == 1:
+            # 1モーフのみの場合、既に重複なしの昇順
+            return keys
+
         # 重複を除いた昇順フレーム番号リストを返す
         return sorted(list(set(keys)))
 
@@ -1268,7 +1897,7 @@ cdef class VmdMotion:
         regist_mf.ratio = get_effective_value(mf.ratio)
 
         if morph_name not in self.morphs:
-            self.morphs[morph_name] = {}
+            self.morphs[morph_name] = VmdFrameDict()
 
         if isnan(regist_mf.ratio) or isinf(regist_mf.ratio):
             logger.debug("*** c_regist_mf: (%s)%s", regist_mf.fno, regist_mf.ratio)
@@ -1288,51 +1917,53 @@ cdef class VmdMotion:
 
         if morph_name not in self.morphs:
             fill_mf.set_name(morph_name)
-            self.morphs[morph_name] = {fno: fill_mf}
+            self.morphs[morph_name] = VmdFrameDict({fno: fill_mf})
             return fill_mf
         
         # 条件に合致するフレーム番号を探す
         # is_key: 登録対象のキーを探す
         # is_read: データ読み込み時のキーを探す
-        if fno in self.morphs[morph_name] and (not is_key or (is_key and self.morphs[morph_name][fno].key)) and (not is_read or (is_read and self.morphs[morph_name][fno].read)):
+        mf_dict = get_frame_dict(self.morphs, morph_name)
+
+        if fno in mf_dict and (not is_key or (is_key and mf_dict[fno].key)) and (not is_read or (is_read and mf_dict[fno].read)):
             # 合致するキーが見つかった場合、それを返す
-            logger.debug("** find: fill: (%s)%s", fill_mf.fno, self.morphs[morph_name][fno].ratio)
-            return self.morphs[morph_name][fno]
+            logger.debug("** find: fill: (%s)%s", fill_mf.fno, mf_dict[fno].ratio)
+            return mf_dict[fno]
         else:
             # 合致するキーが見つからなかった場合
             if is_key or is_read:
                 # 既存キーのみ探している場合はNone
                 return None
 
-        # 番号より前のフレーム番号
-        cdef list before_fnos = [x for x in sorted(self.morphs[morph_name].keys()) if (x < fno)]
-        # 番号より後のフレーム番号
-        cdef list after_fnos = [x for x in sorted(self.morphs[morph_name].keys()) if (x > fno)]
+        # 番号より前後のフレーム番号（昇順リストを二分探索）
+        cdef list fnos = mf_dict.fnos
+        cdef Py_ssize_t prev_idx = mf_dict.prev_index(fno)
+        cdef Py_ssize_t next_idx = mf_dict.next_index(fno)
 
-        if len(after_fnos) == 0 and len(before_fnos) == 0:
+        if next_idx >= len(fnos) and prev_idx < 0:
             fill_mf.set_name(morph_name)
             return fill_mf
 
-        if len(after_fnos) == 0:
+        if next_idx >= len(fnos):
             # 番号より前があって、後のがない場合、前のをコピーして返す
-            fill_mf = self.morphs[morph_name][before_fnos[-1]].copy()
+            fill_mf = mf_dict[fnos[prev_idx]].copy()
             fill_mf.fno = fno
             fill_mf.key = False
             fill_mf.read = False
             logger.debug("** not after: fill: (%s)%s", fill_mf.fno, fill_mf.ratio)
             return fill_mf
         
-        if len(before_fnos) == 0:
+        if prev_idx < 0:
             # 番号より後があって、前がない場合、後のをコピーして返す
-            fill_mf = self.morphs[morph_name][after_fnos[0]].copy()
+            fill_mf = mf_dict[fnos[next_idx]].copy()
             fill_mf.fno = fno
             fill_mf.key = False
             fill_mf.read = False
             logger.debug("** not before: fill: (%s)%s", fill_mf.fno, fill_mf.ratio)
             return fill_mf
 
-        cdef VmdMorphFrame prev_mf = self.morphs[morph_name][before_fnos[-1]]
-        cdef VmdMorphFrame next_mf = self.morphs[morph_name][after_fnos[0]]
+        cdef VmdMorphFrame prev_mf = mf_dict[fnos[prev_idx]]
+        cdef VmdMorphFrame next_mf = mf_dict[fnos[next_idx]]
         if isnan(prev_mf.ratio) or isinf(prev_mf.ratio):
             logger.debug("** prev_mf: (%s)%s", prev_mf.fno, prev_mf.ratio)
         if isnan(next_mf.ratio) or isinf(next_mf.ratio):
@@ -1360,18 +1991,12 @@ cdef class VmdMotion:
 
     # フィルターをかける
     cdef c_smooth_filter_mf(self, int data_set_no, str morph_name, int loop, dict config, int start_fno, int end_fno, bint is_show_log):
-        cdef OneEuroFilter rxfilter
         cdef int n
-        cdef list fnos
-        cdef prev_sep_fno = 0
+        cdef list fnos, mfs
         cdef VmdMorphFrame now_mf
+        cdef np.ndarray ratios
 
         for n in range(loop):
-            rxfilter = OneEuroFilter(**config)
-
-            fnos = self.get_morph_fnos(morph_name)
-            prev_sep_fno = 0
-
             # キーフレを取得する
             if start_fno < 0 and end_fno < 0:
                 # 範囲指定がない場合、全範囲
@@ -1380,14 +2005,18 @@ cdef class VmdMotion:
                 # 範囲指定がある場合はその範囲内だけ
                 fnos = self.get_morph_fnos(morph_name, start_fno=start_fno, end_fno=end_fno)
 
+            if len(fnos) == 0:
+                continue
+
             # 全区間をフィルタにかける
-            for fno in fnos:
-                now_mf = self.c_calc_mf(morph_name, fno, is_key=False, is_read=False)
-                now_mf.ratio = rxfilter(now_mf.ratio, fno)
+            mfs = [self.c_calc_mf(morph_name, fno, is_key=False, is_read=False) for fno in fnos]
+            ratios = one_euro_filter_array(np.array([now_mf.ratio for now_mf in mfs], dtype=np.float64), timestamps=fnos, **config)
 
-                if is_show_log and data_set_no > 0 and fno // 2000 > prev_sep_fno and fnos[-1] > 0:
-                    logger.info("-- %sフレーム目:終了(%s％)【No.%s - フィルタリング - %s(%s)】", fno, round((fno / fnos[-1]) * 100, 3), data_set_no, morph_name, (n + 1))
-                    prev_sep_fno = fno // 2000
+            for now_mf, ratio in zip(mfs, ratios.tolist()):
+                now_mf.ratio = ratio
+
+            if is_show_log and data_set_no > 0 and fnos[-1] > 0:
+                logger.info("-- %sフレーム目:終了(%s％)【No.%s - フィルタリング - %s(%s)】", fnos[-1], 100, data_set_no, morph_name, (n + 1))
 
     # 無効なキーを物理削除する
     def remove_unkey_mf(self, data_set_no: int, morph_name: str):
@@ -1528,19 +2157,30 @@ cdef class VmdMotion:
         keys = []
         for bone_name in bone_names:
             if bone_name in self.bones:
-                keys.extend([x for x in self.bones[bone_name].keys() if self.bones[bone_name][x].fno >= start_fno and self.bones[bone_name][x].fno <= end_fno and \
-                            (not is_key or (is_key and self.bones[bone_name][x].key)) and (not is_read or (is_read and self.bones[bone_name][x].read))])
+                keys.extend(get_frame_dict(self.bones, bone_name).filter_fnos(start_fno, end_fno, is_key, is_read))
         
+        if len(bone_names) == 1:
+            # 1ボーンのみの場合、既に重複なしの昇順
+            return keys
+
         # 重複を除いた昇順フレーム番号リストを返す
         return sorted(list(set(keys)))
     
     # 指定されたfnoの前後のキーを取得する
     def get_bone_prev_next_fno(self, *bone_names, **kwargs):
+        fno = kwargs["fno"] if "fno" in kwargs else 0
+
+        if len(bone_names) == 1 and bone_names[0] in self.bones:
+            # 1ボーンのみの場合、指定fnoの位置から前後に条件に合致するキーを探す
+            is_key = True if "is_key" in kwargs and kwargs["is_key"] else False
+            is_read = True if "is_read" in kwargs and kwargs["is_read"] else False
+            start_fno = kwargs["start_fno"] if "start_fno" in kwargs and kwargs["start_fno"] else 0
+            end_fno = kwargs["end_fno"] if "end_fno" in kwargs and kwargs["end_fno"] else 9999999999
+            return self.c_get_bone_prev_next_fno(bone_names[0], fno, is_key, is_read, start_fno, end_fno)
+
         # 指定されたボーン名のfnos
         fnos = self.get_bone_fnos(*bone_names, **kwargs)
 
-        fno = kwargs["fno"] if "fno" in kwargs else 0
-
         # 指定より前のキーフレ
         prev_fnos = [x for x in fnos if x < fno]
         # 指定より後のキーフレ
@@ -1553,6 +2193,32 @@ cdef class VmdMotion:
 
         return prev_fno, next_fno
 
+    cdef tuple c_get_bone_prev_next_fno(self, str bone_name, int fno, bint is_key, bint is_read, long long start_fno, long long end_fno):
+        cdef VmdBoneFrame bf
+        cdef Py_ssize_t idx
+        cdef int prev_fno, next_fno
+
+        bf_dict = get_frame_dict(self.bones, bone_name)
+        cdef list fnos = bf_dict.fnos
+
+        # 前のは取れなければ-1で強制的に前の
+        prev_fno = -1
+        for idx in range(bf_dict.prev_index(fno), -1, -1):
+            bf = bf_dict[fnos[idx]]
+            if start_fno <= bf.fno <= end_fno and (not is_key or bf.key) and (not is_read or bf.read):
+                prev_fno = fnos[idx]
+                break
+
+        # 後のは取れなければ最終フレーム＋1
+        next_fno = self.last_motion_frame + 1
+        for idx in range(bf_dict.next_index(fno), len(fnos)):
+            bf = bf_dict[fnos[idx]]
+            if start_fno <= bf.fno <= end_fno and (not is_key or bf.key) and (not is_read or bf.read):
+                next_fno = fnos[idx]
+                break
+
+        return prev_fno, next_fno
+
     # カメラモーション：フレーム番号リスト
     def get_camera_fnos(self):
         if not self.cameras:
@@ -1567,9 +2233,7 @@ cdef class VmdMotion:
         target_fnos = {}
 
         for bone_name, bone_frames in self.bones.items():
-            if bone_name not in ["SIZING_ROOT_BONE", "頭頂", "右つま先実体", "左つま先実体", "右足底辺", "左足底辺", "右足底実体", "左足底実体", "右足ＩＫ底実体", "左足ＩＫ底実体", "右足IK親底実体", "左足IK親底実体", \
-                                 "首根元", "右腕下延長", "左腕下延長", "右腕垂直", "左腕垂直", "センター実体", "左腕ひじ中間", "右腕ひじ中間", "左ひじ手首中間", "右ひじ手首中間", "左手首実体", "右手首実体", \
-                                 "左親指先実体", "左人指先実体", "左中指先実体", "左薬指先実体", "左小指先実体", "右親指先実体", "右人指先実体", "右中指先実体", "右薬指先実体", "右小指先実体"]:
+            if bone_name not in SIZING_BONE_NAMES:
                 # サイジング用ボーンは出力しない
                 target_fnos[bone_name] = self.get_bone_fnos(bone_name, is_key=True)
 
@@ -1588,7 +2252,28 @@ cdef class VmdMotion:
                         total_bone_frames.append(self.bones[bone_name][fno])
         
         return total_bone_frames
-    
+
+    # ボーンモーション：get_bone_frames と同じ並びの配列
+    # (ボーン名バイト列(N), フレーム番号(N), 位置(N×3), 回転(N×4: w, x, y, z), 補間曲線(N×64))
+    def get_bone_frame_arrays(self):
+        cdef list last_arrays = []
+        cdef list other_arrays = []
+
+        for bone_name in list(self.bones.keys()):
+            if bone_name in SIZING_BONE_NAMES:
+                continue
+
+            arrays = get_frame_dict(self.bones, bone_name).key_bone_arrays()
+            if len(arrays[1]) > 0:
+                # 各ボーンの最終キーだけ先に並べ、その後に最後の一つ手前までを並べる
+                last_arrays.append([values[-1:] for values in arrays])
+                other_arrays.append([values[:-1] for values in arrays])
+
+        if not last_arrays:
+            return np.zeros(0, dtype=object), np.zeros(0, dtype=np.int64), np.zeros((0, 3)), np.zeros((0, 4)), np.zeros((0, 64))
+
+        return tuple(np.concatenate(values) for values in zip(*(last_arrays + other_arrays)))
+
     # モーフモーション：一次元配列
     def get_morph_frames(self):
         total_morph_frames = []
@@ -1610,6 +2295,18 @@ cdef class VmdMotion:
         
         return total_morph_frames
 
+    # モーフモーション：get_morph_frames と同じ並びの配列
+    # (モーフ名バイト列(N), フレーム番号(N), 度数(N))
+    def get_morph_frame_arrays(self):
+        cdef list frames = self.get_morph_frames()
+        cdef VmdMorphFrame mf
+        for mf in frames:
+            if not mf.bname:
+                mf.bname = mf.name.encode('cp932').decode('shift_jis').encode('shift_jis')[:15].ljust(15, b'\x00')   # 15文字制限
+
+        return np.array([mf.bname for mf in frames], dtype=object), np.array([mf.fno for mf in frames], dtype=np.int64), \
+            np.array([mf.ratio for mf in frames], dtype=np.float64)
+
     # カメラモーション：一次元配列
     def get_camera_frames(self):
         total_camera_frames = []
@@ -1624,15 +2321,22 @@ cdef class VmdMotion:
     def append_bone_frame(self, frame: VmdBoneFrame):
         if frame.name not in self.bones:
             # まだ該当ボーン名がない場合、追加
-            self.bones[frame.name] = {}
+            self.bones[frame.name] = VmdFrameDict()
         
         self.bones[frame.name][frame.fno] = frame
 
+    # ボーンキーフレを列指向の配列に詰め直す（ボーン名指定なしの場合、全ボーン）
+    # 詰め直したキーフレは参照されるまでVmdBoneFrameを生成しない
+    def compact_bones(self, *bone_names):
+        for bone_name in (bone_names or list(self.bones.keys())):
+            if bone_name in self.bones and len(self.bones[bone_name]) > 0:
+                self.bones[bone_name] = compact_frame_dict(bone_name, self.bones[bone_name])
+
     # モーフキーフレを追加
     def append_morph_frame(self, frame: VmdMorphFrame):
         if frame.name not in self.morphs:
             # まだ該当モーフ名がない場合、追加
-            self.morphs[frame.name] = {}
+            self.morphs[frame.name] = VmdFrameDict()
         
         self.morphs[frame.name][frame.fno] = frame
 
@@ -1641,7 +2345,7 @@ cdef class VmdMotion:
         new_motion = VmdMotion()
 
         for bone_name in self.bones.keys():
-            new_motion.bones[bone_name] = {fno: self.c_calc_bf(bone_name, fno, is_key=False, is_read=False, is_reset_interpolation=False).copy()}
+            new_motion.bones[bone_name] = VmdFrameDict({fno: self.c_calc_bf(bone_name, fno, is_key=False, is_read=False, is_reset_interpolation=False).copy()})
         
         return new_motion
 
@@ -1654,10 +2358,14 @@ cdef class VmdMotion:
         motion.last_motion_frame = cPickle.loads(cPickle.dumps(self.last_motion_frame, -1))
         motion.motion_cnt = cPickle.loads(cPickle.dumps(self.motion_cnt, -1))
 
-        for bone_name, bf_dict in self.bones.items():
-            motion.bones[bone_name] = {}
-            for bf in bf_dict.values():
-                motion.bones[bone_name][bf.fno] = bf.copy()
+        # ボーンキーフレはコピー側だけ列指向に詰め直す（コピー元の辞書は差し替えない）
+        # 配列は書き込み不可で共有し、VmdBoneFrameはそれぞれで参照された時に生成するので、書き換えても互いに影響しない
+        for bone_name in list(self.bones.keys()):
+            if len(self.bones[bone_name]) == 0:
+                motion.bones[bone_name] = VmdFrameDict()
+                continue
+
+            motion.bones[bone_name] = compact_frame_dict(bone_name, self.bones[bone_name]).copy()
 
         motion.morph_cnt = cPickle.loads(cPickle.dumps(self.morph_cnt, -1))
         motion.morphs = cPickle.loads(cPickle.dumps(self.morphs, -1))
@@ -2,15 +2,24 @@
 #
 import struct
 import hashlib
+import mmap
 import re
+import numpy as np
 
-from mmd.VmdData import VmdMotion, VmdBoneFrame, VmdCameraFrame, VmdInfoIk, VmdLightFrame, VmdMorphFrame, VmdShadowFrame, VmdShowIkFrame
+from mmd.VmdData import VmdMotion, VmdFrameDict, VmdBoneFrame, VmdBoneFrameColumns, VmdCameraFrame, VmdInfoIk, VmdLightFrame, VmdMorphFrame, VmdShadowFrame, VmdShowIkFrame
 from module.MMath import MRect, MVector3D, MVector4D, MQuaternion, MMatrix4x4 # noqa
 from utils.MLogger import MLogger # noqa
+from utils import MCacheUtils
 from utils.MException import SizingException, MKilledException, MParseException
 
 logger = MLogger(__name__)
 
+# ボーンキーフレ1件分のレコード(111byte)
+BONE_FRAME_DTYPE = np.dtype([("name", "S15"), ("fno", "<u4"), ("position", "<f4", (3,)), ("rotation", "<f4", (4,)), ("interpolation", "u1", (64,))])
+
+# モーフキーフレ1件分のレコード(23byte)
+MORPH_FRAME_DTYPE = np.dtype([("name", "S15"), ("fno", "<u4"), ("ratio", "<f4")])
+
 
 class VmdReader:
     def __init__(self, file_path):
@@ -18,13 +27,14 @@ class VmdReader:
         self.buffer = None
         self.encoding = None
         self.file_path = file_path
+        self.digest = None
 
     # モデル名だけ取得
     def read_model_name(self):
         model_name = ""
         with open(self.file_path, "rb") as f:
-            # VMDファイルをバイナリ読み込み
-            self.buffer = f.read()
+            # VMDファイルのヘッダだけバイナリ読み込み
+            self.buffer = f.read(50)
 
             # vmdバージョン
             signature = self.unpack(30, "30s")
@@ -42,9 +52,15 @@ class VmdReader:
         motion.path = self.file_path
 
         try:
-            with open(self.file_path, "rb") as f:
-                # VMDファイルをバイナリ読み込み
-                self.buffer = f.read()
+            # 同じファイルの読み込み結果がキャッシュにある場合、そちらを使う
+            digest = self.hexdigest()
+            cache_motion = MCacheUtils.load_data("vmd", digest)
+            if cache_motion is not None:
+                return cache_motion
+
+            with open(self.file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                # VMDファイルをメモリマップで読み込み
+                self.buffer = buffer
 
                 # vmdバージョン
                 signature = self.unpack(30, "30s")
@@ -60,94 +76,14 @@ class VmdReader:
                 logger.test("motion.motion_cnt %s", motion.motion_cnt)
 
                 # 1F分のモーション情報
-
-                prev_n = 0
-                for n in range(motion.motion_cnt):
-                    frame = VmdBoneFrame(0)
-                    frame.key = True
-                    frame.read = True
-
-                    # ボーン ----------------------
-                    # ボーン名
-                    bone_bname, bone_name = self.read_text(15)
-
-                    frame.name = bone_name
-                    frame.bname = bone_bname
-                    logger.test("name: %s, bname %s", bone_name, bone_bname)
-
-                    # フレームIDX
-                    frame.fno = self.read_uint(4)
-                    logger.test("frame.fno %s", frame.fno)
-
-                    # 位置X,Y,Z
-                    frame.position = self.read_Vector3D()
-                    logger.test("frame.position %s", frame.position)
-
-                    # 回転X,Y,Z,scalar
-                    frame.rotation = self.read_Quaternion()
-                    logger.test("frame.rotation %s", frame.rotation)
-                    logger.test("frame.rotation.euler %s", frame.rotation.toEulerAngles())
-                    # オリジナルを保持
-                    frame.org_rotation = frame.rotation.copy()
-
-                    # 補間曲線
-                    frame.interpolation = list(self.unpack(64, "64B", True))
-                    logger.test("interpolation %s", frame.interpolation)
-
-                    if bone_name not in motion.bones:
-                        # まだ辞書にない場合、配列追加
-                        motion.bones[bone_name] = {}
-
-                    # 辞書の該当部分にボーンフレームを追加
-                    if frame.fno not in motion.bones[bone_name]:
-                        motion.bones[bone_name][frame.fno] = frame
-
-                    if frame.fno > motion.last_motion_frame:
-                        # 最終フレームを記録
-                        motion.last_motion_frame = frame.fno
-
-                    if n // 10000 > prev_n:
-                        prev_n = n // 10000
-                        logger.info("-- VMDモーション読み込み キー: %s" % n)
+                self.read_bone_frames(motion)
 
                 # モーフ数
                 motion.morph_cnt = self.read_uint(4)
                 logger.test("motion.morph_cnt %s", motion.morph_cnt)
 
                 # 1F分のモーフ情報
-                prev_n = 0
-                for n in range(motion.morph_cnt):
-                    morph = VmdMorphFrame()
-                    morph.key = True
-                    morph.read = True
-
-                    # モーフ ----------------------
-                    # モーフ名
-                    morph_bname, morph_name = self.read_text(15)
-
-                    morph.name = morph_name
-                    morph.bname = morph_bname
-                    logger.test("name: %s, bname %s", morph_name, morph_bname)
-
-                    # フレームIDX
-                    morph.fno = self.read_uint(4)
-                    logger.test("morph.fno %s", morph.fno)
-
-                    # 度数
-                    morph.ratio = self.read_float(4)
-                    logger.test("morph.ratio %s", morph.ratio)
-
-                    if morph_name not in motion.morphs:
-                        # まだ辞書にない場合、配列追加
-                        motion.morphs[morph_name] = {}
-
-                    if morph.fno not in motion.morphs[morph_name]:
-                        # まだなければ辞書の該当部分にモーフフレームを追加
-                        motion.morphs[morph_name][morph.fno] = morph
-
-                    if n // 1000 > prev_n:
-                        prev_n = n // 1000
-                        logger.info("-- VMDモーション読み込み モーフ: %s" % n)
+                self.read_morph_frames(motion)
 
                 try:
                     # カメラ数
@@ -305,10 +241,14 @@ class VmdReader:
                     # 昔のMMD（MMDv7.39.x64以前）はIK情報がないため、catchして握りつぶす
                     motion.ik_cnt = 0
 
+                self.buffer = None
+
             # ハッシュを設定
-            motion.digest = self.hexdigest()
+            motion.digest = digest
             logger.test("motion: %s, hash: %s", motion.path, motion.digest)
 
+            MCacheUtils.save_data("vmd", digest, motion)
+
             return motion
         except MKilledException as ke:
             # 終了命令
@@ -321,7 +261,105 @@ class VmdReader:
             logger.critical("VMD読み込み処理が意図せぬエラーで終了しました。\n\n%s", traceback.format_exc(), decoration=MLogger.DECORATION_BOX)
             raise e
 
+    # ボーンキーフレをレコード配列でまとめて読み込む
+    def read_bone_frames(self, motion: VmdMotion):
+        records = self.read_records(BONE_FRAME_DTYPE, motion.motion_cnt)
+        if len(records) == 0:
+            return
+
+        for bone_name, bone_bnames, rows in self.group_records(records):
+            if len(bone_bnames) == 1:
+                # 同じフレーム番号が複数ある場合、先のを採用する
+                _, first_idxs = np.unique(records["fno"][rows], return_index=True)
+                rows = rows[first_idxs]
+                bone_records = records[rows]
+                # 回転は x, y, z, scalar の順で格納されている
+                rotations = bone_records["rotation"][:, [3, 0, 1, 2]].astype(np.float64)
+                motion.bones[bone_name] = VmdBoneFrameColumns(bone_name, bone_bnames[0], bone_records["fno"], bone_records["position"], rotations, rotations, \
+                                                              bone_records["interpolation"], np.ones(len(rows), dtype=np.bool_), np.ones(len(rows), dtype=np.bool_))
+            else:
+                # 終端以降のバイトが違う名前が混在している場合、キーフレごとに元のバイト列を保持する
+                motion.bones[bone_name] = VmdFrameDict()
+                for row in rows.tolist():
+                    record = records[row]
+                    if int(record["fno"]) in motion.bones[bone_name]:
+                        continue
+
+                    frame = VmdBoneFrame(int(record["fno"]))
+                    frame.key = True
+                    frame.read = True
+                    frame.name = bone_name
+                    frame.bname = record["name"].ljust(15, b'\x00')
+                    frame.position = MVector3D(*record["position"].astype(np.float64).tolist())
+                    x, y, z, scalar = record["rotation"].astype(np.float64).tolist()
+                    frame.rotation = MQuaternion(scalar, x, y, z)
+                    frame.org_rotation = frame.rotation.copy()
+                    frame.interpolation = record["interpolation"].tolist()
+                    motion.bones[bone_name][frame.fno] = frame
+
+        # 最終フレームを記録
+        motion.last_motion_frame = max(motion.last_motion_frame, int(records["fno"].max()))
+
+        if motion.motion_cnt >= 10000:
+            logger.info("-- VMDモーション読み込み キー: %s" % motion.motion_cnt)
+
+    # モーフキーフレをレコード配列でまとめて読み込む
+    def read_morph_frames(self, motion: VmdMotion):
+        records = self.read_records(MORPH_FRAME_DTYPE, motion.morph_cnt)
+        if len(records) == 0:
+            return
+
+        fnos = records["fno"].tolist()
+        ratios = records["ratio"].tolist()
+        morph_bnames = records["name"].tolist()
+
+        for morph_name, _, rows in self.group_records(records):
+            motion.morphs[morph_name] = VmdFrameDict()
+
+            for row in rows.tolist():
+                if fnos[row] in motion.morphs[morph_name]:
+                    continue
+
+                morph = VmdMorphFrame(fnos[row])
+                morph.key = True
+                morph.read = True
+                morph.name = morph_name
+                morph.bname = morph_bnames[row].ljust(15, b'\x00')
+                morph.ratio = ratios[row]
+                motion.morphs[morph_name][morph.fno] = morph
+
+        if motion.morph_cnt >= 1000:
+            logger.info("-- VMDモーション読み込み モーフ: %s" % motion.morph_cnt)
+
+    # 現在位置から固定長レコードを指定件数分、コピーせずに参照する
+    def read_records(self, dtype: np.dtype, count: int):
+        records = np.frombuffer(self.buffer, dtype=dtype, count=count, offset=self.offset)
+        self.offset += dtype.itemsize * count
+        return records
+
+    # レコードを名前ごとにまとめる（名前のデコードはユニークなバイト列ごとに1回だけ）
+    # (名前, 元のバイト列リスト, ファイル上の順番の行INDEX) を、名前の初出順で返す
+    def group_records(self, records: np.ndarray):
+        unique_bnames, inverse = np.unique(records["name"], return_inverse=True)
+        order = np.argsort(inverse, kind="stable")
+        groups = np.split(order, np.cumsum(np.bincount(inverse, minlength=len(unique_bnames)))[:-1])
+
+        name_groups = {}
+        for bname, rows in sorted(zip(unique_bnames.tolist(), groups), key=lambda g: g[1][0]):
+            # 末尾の\x00は落ちているので戻す
+            bname, name = self.decode_name(bname.ljust(records.dtype["name"].itemsize, b'\x00'))
+            if name not in name_groups:
+                name_groups[name] = ([], [])
+            name_groups[name][0].append(bname)
+            name_groups[name][1].append(rows)
+
+        return [(name, bnames, np.sort(np.concatenate(rows_list))) for name, (bnames, rows_list) in name_groups.items()]
+
+    # ファイルのハッシュ値（同じReaderでは一度だけ求める）
     def hexdigest(self):
+        if self.digest:
+            return self.digest
+
         sha1 = hashlib.sha1()
 
         with open(self.file_path, 'rb') as f:
@@ -333,11 +371,15 @@ class VmdReader:
         # ファイルパスをハッシュに含める
         sha1.update(self.file_path.encode('utf-8'))
 
-        return sha1.hexdigest()
+        self.digest = sha1.hexdigest()
+        return self.digest
 
     def read_text(self, format_size):
         bresult = self.unpack(format_size, "{0}s".format(format_size))
 
+        return self.decode_name(bresult)
+
+    def decode_name(self, bresult):
         if not self.encoding:
             # まだエンコードが確定していない場合、エンコード取得
             self.encoding = self.get_encoding(bresult, False)
@@ -1,11 +1,24 @@
 # -*- coding: utf-8 -*-
 #
 import struct
+import numpy as np
+
 from module.MOptions import MOptionsDataSet
+from mmd.VmdReader import BONE_FRAME_DTYPE, MORPH_FRAME_DTYPE
+from module.MMath import normalized_array
 from utils.MLogger import MLogger # noqa
 
 logger = MLogger(__name__)
 
+# カメラキーフレ1件分のレコード(61byte)
+CAMERA_FRAME_DTYPE = np.dtype([("fno", "<u4"), ("length", "<f4"), ("position", "<f4", (3,)), ("euler", "<f4", (3,)), ("interpolation", "u1", (24,)), ("angle", "<u4"), ("perspective", "i1")])
+
+# 照明キーフレ1件分のレコード(28byte)
+LIGHT_FRAME_DTYPE = np.dtype([("fno", "<u4"), ("color", "<f4", (3,)), ("position", "<f4", (3,))])
+
+# セルフ影キーフレ1件分のレコード(12byte)
+SHADOW_FRAME_DTYPE = np.dtype([("fno", "<u4"), ("type", "<f4"), ("distance", "<f4")])
+
 
 class VmdWriter():
     def __init__(self, data_set: MOptionsDataSet):
@@ -13,16 +26,18 @@ class VmdWriter():
 
     def write(self):
         """Write VMD data to a file"""
+        motion = self.data_set.motion
+
+        bone_bnames, bone_fnos, bone_positions, bone_rotations, bone_interpolations = motion.get_bone_frame_arrays()
+        morph_bnames, morph_fnos, morph_ratios = motion.get_morph_frame_arrays()
+        camera_frames = motion.get_camera_frames()
+
         fout = open(self.data_set.output_vmd_path, "wb")
 
         # header
         fout.write(b'Vocaloid Motion Data 0002\x00\x00\x00\x00\x00')
 
-        bone_frames = self.data_set.motion.get_bone_frames()
-        morph_frames = self.data_set.motion.get_morph_frames()
-        camera_frames = self.data_set.motion.get_camera_frames()
-
-        if len(bone_frames) > 0 or len(morph_frames) > 0:
+        if len(bone_fnos) > 0 or len(morph_fnos) > 0:
             try:
                 # モデル名を20byteで切る
                 model_bname = self.data_set.rep_model.name.encode('cp932').decode('shift_jis').encode('shift_jis')[:20]
@@ -39,25 +54,92 @@ class VmdWriter():
             fout.write(b'\x83J\x83\x81\x83\x89\x81E\x8f\xc6\x96\xbe\x00on Data')
         
         # bone frames
-        fout.write(struct.pack('<L', len(bone_frames)))  # ボーンフレーム数
-        for bf in bone_frames:
-            bf.write(fout)
-        fout.write(struct.pack('<L', len(morph_frames)))  # 表情キーフレーム数
-        for mf in morph_frames:
-            mf.write(fout)
+        fout.write(struct.pack('<L', len(bone_fnos)))  # ボーンフレーム数
+        fout.write(self.create_bone_section(bone_bnames, bone_fnos, bone_positions, bone_rotations, bone_interpolations))
+        fout.write(struct.pack('<L', len(morph_fnos)))  # 表情キーフレーム数
+        fout.write(self.create_morph_section(morph_bnames, morph_fnos, morph_ratios))
         fout.write(struct.pack('<L', len(camera_frames)))  # カメラキーフレーム数
-        for cf in camera_frames:
-            cf.write(fout)
-        fout.write(struct.pack('<L', len(self.data_set.motion.lights)))  # 照明キーフレーム数
-        for cf in self.data_set.motion.lights:
-            cf.write(fout)
-        fout.write(struct.pack('<L', len(self.data_set.motion.shadows)))  # セルフ影キーフレーム数
-        for cf in self.data_set.motion.shadows:
-            cf.write(fout)
+        fout.write(self.create_camera_section(camera_frames))
+        fout.write(struct.pack('<L', len(motion.lights)))  # 照明キーフレーム数
+        fout.write(self.create_light_section(motion.lights))
+        fout.write(struct.pack('<L', len(motion.shadows)))  # セルフ影キーフレーム数
+        fout.write(self.create_shadow_section(motion.shadows))
             
         if len(camera_frames) == 0:
-            fout.write(struct.pack('<L', len(self.data_set.motion.showiks)))  # モデル表示・IK on/offキーフレーム数
-            for sf in self.data_set.motion.showiks:
-                sf.write(fout)
+            fout.write(struct.pack('<L', len(motion.showiks)))  # モデル表示・IK on/offキーフレーム数
+            fout.write(self.create_show_ik_section(motion.showiks))
         
         fout.close()
+
+    # ボーンキーフレのレコードをまとめて生成する
+    def create_bone_section(self, bnames, fnos, positions, rotations, interpolations):
+        records = np.zeros(len(fnos), dtype=BONE_FRAME_DTYPE)
+        records["fno"] = fnos
+        records["position"] = positions
+
+        # x, y, z, scalar の順で出力する
+        with np.errstate(invalid="ignore"):
+            records["rotation"] = normalized_array(rotations)[:, [1, 2, 3, 0]]
+
+        records["interpolation"] = np.clip(interpolations, 0, 127).astype(np.int64)
+
+        return join_records(bnames, records)
+
+    # モーフキーフレのレコードをまとめて生成する
+    def create_morph_section(self, bnames, fnos, ratios):
+        records = np.zeros(len(fnos), dtype=MORPH_FRAME_DTYPE)
+        records["fno"] = fnos
+        records["ratio"] = ratios
+
+        return join_records(bnames, records)
+
+    # カメラキーフレのレコードをまとめて生成する
+    def create_camera_section(self, camera_frames):
+        records = np.zeros(len(camera_frames), dtype=CAMERA_FRAME_DTYPE)
+        for n, cf in enumerate(camera_frames):
+            records[n] = (int(cf.fno), float(cf.length), (float(cf.position.x()), float(cf.position.y()), float(cf.position.z())), \
+                          (float(cf.euler.x()), float(cf.euler.y()), float(cf.euler.z())), [int(min(127, max(0, x))) for x in cf.interpolation], \
+                          int(cf.angle), cf.perspective)
+
+        return records.tobytes()
+
+    # 照明キーフレのレコードをまとめて生成する
+    def create_light_section(self, lights):
+        records = np.zeros(len(lights), dtype=LIGHT_FRAME_DTYPE)
+        for n, lf in enumerate(lights):
+            records[n] = (lf.fno, (lf.color.x(), lf.color.y(), lf.color.z()), (lf.position.x(), lf.position.y(), lf.position.z()))
+
+        return records.tobytes()
+
+    # セルフ影キーフレのレコードをまとめて生成する
+    def create_shadow_section(self, shadows):
+        records = np.zeros(len(shadows), dtype=SHADOW_FRAME_DTYPE)
+        for n, sf in enumerate(shadows):
+            records[n] = (sf.fno, sf.type, sf.distance)
+
+        return records.tobytes()
+
+    # モデル表示・IK on/offキーフレは可変長なので、バイト列を繋げる
+    def create_show_ik_section(self, showiks):
+        values = []
+        for sf in showiks:
+            values.append(struct.pack('<LbL', sf.fno, sf.show, len(sf.ik)))
+            for k in sf.ik:
+                if not k.bname:
+                    k.bname = k.name.encode('cp932').decode('shift_jis').encode('shift_jis')[:20].ljust(20, b'\x00')   # 20文字制限
+                values.append(k.bname)
+                values.append(struct.pack('b', k.onoff))
+
+        return b''.join(values)
+
+
+# 名前を入れてレコードをバイト列にする
+def join_records(bnames, records):
+    name_size = records.dtype["name"].itemsize
+
+    if all([len(bname) == name_size for bname in bnames]):
+        records["name"] = bnames.astype("S{0}".format(name_size))
+        return records.tobytes()
+
+    # 長さの違う名前がある場合、レコード長が揃わないので名前部分だけ差し替えて繋げる
+    return b''.join([bname + record.tobytes()[name_size:] for bname, record in zip(bnames, records)])
@@ -3,10 +3,11 @@
 import hashlib
 import re
 
-from mmd.VmdData import VmdMotion, VmdBoneFrame, VmdCameraFrame, VmdInfoIk, VmdLightFrame, VmdMorphFrame, VmdShadowFrame, VmdShowIkFrame # noqa
+from mmd.VmdData import VmdMotion, VmdFrameDict, VmdBoneFrame, VmdCameraFrame, VmdInfoIk, VmdLightFrame, VmdMorphFrame, VmdShadowFrame, VmdShowIkFrame # noqa
 from module.MMath import MRect, MVector3D, MVector4D, MQuaternion, MMatrix4x4 # noqa
 from utils.MException import MParseException # noqa
 from utils.MLogger import MLogger # noqa
+from utils import MCacheUtils
 from utils.MException import SizingException, MKilledException
 
 logger = MLogger(__name__)
@@ -16,6 +17,7 @@ class VpdReader():
     def __init__(self, file_path):
         self.encoding = None
         self.file_path = file_path
+        self.digest = None
 
     # モデル名だけ取得
     def read_model_name(self):
@@ -46,6 +48,12 @@ class VpdReader():
         lines = []
 
         try:
+            # 同じファイルの読み込み結果がキャッシュにある場合、そちらを使う
+            digest = self.hexdigest()
+            cache_motion = MCacheUtils.load_data("vpd", digest)
+            if cache_motion is not None:
+                return cache_motion
+
             with open(self.file_path, "r", encoding=self.get_file_encoding(self.file_path)) as f:
                 lines = f.readlines()
 
@@ -109,14 +117,16 @@ class VpdReader():
                     # 括弧終了
                     result_values = self.read_line(lines[n], bone_end_pattern, n)
                     if result_values:
-                        motion.bones[bone_name] = {0: frame}
+                        motion.bones[bone_name] = VmdFrameDict({0: frame})
                         frame = None
                         continue
 
             # ハッシュを設定
-            motion.digest = self.hexdigest()
+            motion.digest = digest
             logger.test("motion: %s, hash: %s", motion.path, motion.digest)
 
+            MCacheUtils.save_data("vpd", digest, motion)
+
             return motion
         except MKilledException as ke:
             # 終了命令
@@ -139,7 +149,11 @@ class VpdReader():
         # 正規表現に合致するのが取れなかった場合、None
         return None
  
+    # ファイルのハッシュ値（同じReaderでは一度だけ求める）
     def hexdigest(self):
+        if self.digest:
+            return self.digest
+
         sha1 = hashlib.sha1()
 
         with open(self.file_path, 'rb') as f:
@@ -151,7 +165,8 @@ class VpdReader():
         # ファイルパスをハッシュに含める
         sha1.update(self.file_path.encode('utf-8'))
 
-        return sha1.hexdigest()
+        self.digest = sha1.hexdigest()
+        return self.digest
         
     # ファイルのエンコードを取得する
     def get_file_encoding(self, file_path):
@@ -92,7 +92,7 @@ cdef class MVector2D:
 
 
 cdef class MVector3D:
-    cdef np.ndarray __data
+    cdef double __data[3]
 
     cpdef MVector3D copy(self)
 
@@ -253,7 +253,7 @@ cdef class MVector4D:
 cdef double dotProduct_MVector4D(MVector4D v1, MVector4D v2)
 
 cdef class MQuaternion:
-    cdef np.ndarray __data
+    cdef double __data[4]
 
     cpdef MQuaternion copy(self)
 
@@ -321,9 +321,21 @@ cdef MQuaternion nlerp(MQuaternion q1, MQuaternion q2, double t)
 
 cdef MQuaternion slerp(MQuaternion q1, MQuaternion q2, double t)
 
+cpdef np.ndarray slerp_array(np.ndarray q1s, np.ndarray q2s, np.ndarray ts)
+
+cpdef np.ndarray normalized_array(np.ndarray qs)
+
+cpdef np.ndarray multiply_qq_array(np.ndarray q1s, np.ndarray q2s)
+
+cpdef np.ndarray inverted_qq_array(np.ndarray qs)
+
+cpdef np.ndarray fromAxisAndAngle_array(MVector3D vec3, np.ndarray angles)
+
+cpdef np.ndarray toMatrix4x4_array(np.ndarray qs)
+
 
 cdef class MMatrix4x4:
-    cdef np.ndarray __data
+    cdef double __data[16]
 
     cpdef MMatrix4x4 copy(self)
 
@@ -370,6 +382,96 @@ cdef class MMatrix4x4:
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=2] mul_int(self, DTYPE_INT_t other)
 
 
+cdef class MVector3DArray:
+    cdef np.ndarray __data
+
+    cpdef MVector3DArray copy(self)
+
+    cpdef np.ndarray data(self)
+
+    cpdef list to_list(self)
+
+    cpdef np.ndarray x(self)
+
+    cpdef np.ndarray y(self)
+
+    cpdef np.ndarray z(self)
+
+    cpdef np.ndarray lengthSquared(self)
+
+    cpdef np.ndarray length(self)
+
+    cpdef MVector3DArray normalized(self)
+
+    cpdef normalize(self)
+
+    cpdef MVector3DArray effective(self)
+
+
+cdef class MQuaternionArray:
+    cdef np.ndarray __data
+
+    cpdef MQuaternionArray copy(self)
+
+    cpdef np.ndarray data(self)
+
+    cpdef list to_list(self)
+
+    cpdef np.ndarray scalar(self)
+
+    cpdef np.ndarray x(self)
+
+    cpdef np.ndarray y(self)
+
+    cpdef np.ndarray z(self)
+
+    cpdef MVector3DArray vector(self)
+
+    cpdef np.ndarray length(self)
+
+    cpdef np.ndarray lengthSquared(self)
+
+    cpdef MQuaternionArray inverted(self)
+
+    cpdef MQuaternionArray normalized(self)
+
+    cpdef normalize(self)
+
+    cpdef MQuaternionArray effective(self)
+
+    cpdef MMatrix4x4Array toMatrix4x4(self)
+
+    cpdef MVector3DArray toEulerAngles(self)
+
+    cpdef MVector3DArray toEulerAngles4MMD(self)
+
+    cpdef np.ndarray toDegree(self)
+
+
+cdef class MMatrix4x4Array:
+    cdef np.ndarray __data
+
+    cpdef MMatrix4x4Array copy(self)
+
+    cpdef np.ndarray data(self)
+
+    cpdef list to_list(self)
+
+    cpdef MMatrix4x4Array inverted(self)
+
+    cpdef rotate(self, qqs)
+
+    cpdef translate(self, vec3s)
+
+    cpdef scale(self, vec3s)
+
+    cpdef setToIdentity(self)
+
+    cpdef MVector3DArray mapVector(self, vectors)
+
+    cpdef MQuaternionArray toQuaternion(self)
+
+
 
 cpdef bint is_almost_null(v)    
 
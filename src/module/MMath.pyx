@@ -7,13 +7,31 @@ import quaternion # noqa
 import numpy as np
 cimport numpy as np
 cimport cython
-from libc.math cimport sin, cos, acos, atan2, asin, pi, sqrt
+from libc.math cimport sin, cos, acos, atan2, asin, pi, sqrt, fabs, INFINITY
 from math import degrees, radians, isnan, isinf
 
 from utils.MLogger import MLogger # noqa
 
 logger = MLogger(__name__)
 
+np.import_array()
+
+
+# C配列をそのまま参照するNumPy配列（参照中はownerが破棄されないよう、配列のbaseにする）
+cdef inline np.ndarray as_ndarray(object owner, double* data, int nd, np.npy_intp* shape):
+    cdef np.ndarray arr = np.PyArray_SimpleNewFromData(nd, shape, np.NPY_FLOAT64, <void*>data)
+    np.set_array_base(arr, owner)
+    return arr
+
+
+# NaN, infの場合、0
+cdef inline double effective_value(double v):
+    return v if -INFINITY < v < INFINITY else 0
+
+
+cdef inline bint c_is_almost_null(double v):
+    return fabs(v) < 0.0000001
+
 
 cdef class MRect:
 
@@ -294,41 +312,51 @@ cdef class MVector2D:
 cdef class MVector3D:
 
     def __init__(self, x=0.0, y=0.0, z=0.0):
-        if isinstance(x, float):
-            # 実数の場合
-            self.__data = np.array([x, y, z], dtype=np.float64)
-        elif isinstance(x, MVector3D):
+        if isinstance(x, MVector3D):
             # クラスの場合
-            self.__data = np.array([x.x(), x.y(), x.z()], dtype=np.float64)
+            self.__data = (<MVector3D>x).__data
         elif isinstance(x, np.ndarray):
             # arrayそのものの場合
-            self.__data = np.array([x[0], x[1], x[2]], dtype=np.float64)
+            self.__data[0] = x[0]
+            self.__data[1] = x[1]
+            self.__data[2] = x[2]
         else:
-            self.__data = np.array([x, y, z], dtype=np.float64)
+            # 実数の場合
+            self.__data[0] = x
+            self.__data[1] = y
+            self.__data[2] = z
+
+    def __reduce__(self):
+        return (MVector3D, (self.__data[0], self.__data[1], self.__data[2]))
 
     cpdef MVector3D copy(self):
-        return MVector3D(self.x(), self.y(), self.z())
+        return new_MVector3D(self.__data[0], self.__data[1], self.__data[2])
 
     cpdef double length(self):
-        return float(np.linalg.norm(self.data(), ord=2))
+        return sqrt(self.lengthSquared())
 
     cpdef double lengthSquared(self):
-        return float(np.linalg.norm(self.data(), ord=2)**2)
+        return self.__data[0] * self.__data[0] + self.__data[1] * self.__data[1] + self.__data[2] * self.__data[2]
 
+    @cython.cdivision(True)
     cpdef MVector3D normalized(self):
-        cdef np.ndarray[DTYPE_FLOAT_t, ndim=1] l2 = np.linalg.norm(self.data(), ord=2, axis=-1, keepdims=True)
-        l2[l2 == 0] = 1
-        cdef np.ndarray[DTYPE_FLOAT_t, ndim=1] normv = self.data() / l2
-        return MVector3D(normv[0], normv[1], normv[2])
+        cdef double l2 = self.length()
+        if l2 == 0:
+            l2 = 1
+        return new_MVector3D(self.__data[0] / l2, self.__data[1] / l2, self.__data[2] / l2)
 
+    @cython.cdivision(True)
     cpdef normalize(self):
         self.effective()
-        cdef np.ndarray[DTYPE_FLOAT_t, ndim=1] l2 = np.linalg.norm(self.data(), ord=2, axis=-1, keepdims=True)
-        l2[l2 == 0] = 1
-        self.__data /= l2
+        cdef double l2 = self.length()
+        if l2 == 0:
+            l2 = 1
+        self.__data[0] /= l2
+        self.__data[1] /= l2
+        self.__data[2] /= l2
     
     cpdef double distanceToPoint(self, MVector3D v):
-        return MVector3D(self.data() - v.data()).length()
+        return new_MVector3D(self.__data[0] - v.__data[0], self.__data[1] - v.__data[1], self.__data[2] - v.__data[2]).length()
     
     cpdef MVector3D project(self, MMatrix4x4 modelView, MMatrix4x4 projection, MRect viewport):
         cdef MVector4D tmp = MVector4D(self.x(), self.y(), self.z(), 1)
@@ -366,40 +394,40 @@ cdef class MVector3D:
         return MVector4D(self.__data[0], self.__data[1], self.__data[2], 0)
 
     cpdef bint is_almost_null(self):
-        return (is_almost_null(self.__data[0]) and is_almost_null(self.__data[1]) and is_almost_null(self.__data[2]))
+        return (c_is_almost_null(self.__data[0]) and c_is_almost_null(self.__data[1]) and c_is_almost_null(self.__data[2]))
     
     cpdef MVector3D effective(self):
-        self.__data[np.isnan(self.data())] = 0
-        self.__data[np.isinf(self.data())] = 0
+        self.__data[0] = effective_value(self.__data[0])
+        self.__data[1] = effective_value(self.__data[1])
+        self.__data[2] = effective_value(self.__data[2])
 
         return self
                 
     cpdef MVector3D abs(self):
-        self.setX(abs(get_effective_value(self.x())))
-        self.setY(abs(get_effective_value(self.y())))
-        self.setZ(abs(get_effective_value(self.z())))
+        self.__data[0] = fabs(effective_value(self.__data[0]))
+        self.__data[1] = fabs(effective_value(self.__data[1]))
+        self.__data[2] = fabs(effective_value(self.__data[2]))
 
         return self
                 
     cpdef MVector3D one(self):
         self.effective()
-        self.setX(1 if is_almost_null(self.x()) else self.x())
-        self.setY(1 if is_almost_null(self.y()) else self.y())
-        self.setZ(1 if is_almost_null(self.z()) else self.z())
+        self.__data[0] = 1 if c_is_almost_null(self.__data[0]) else self.__data[0]
+        self.__data[1] = 1 if c_is_almost_null(self.__data[1]) else self.__data[1]
+        self.__data[2] = 1 if c_is_almost_null(self.__data[2]) else self.__data[2]
 
         return self
     
     cpdef MVector3D non_zero(self):
         self.effective()
-        self.setX(0.0000001 if is_almost_null(self.x()) else self.x())
-        self.setY(0.0000001 if is_almost_null(self.y()) else self.y())
-        self.setZ(0.0000001 if is_almost_null(self.z()) else self.z())
+        self.__data[0] = 0.0000001 if c_is_almost_null(self.__data[0]) else self.__data[0]
+        self.__data[1] = 0.0000001 if c_is_almost_null(self.__data[1]) else self.__data[1]
+        self.__data[2] = 0.0000001 if c_is_almost_null(self.__data[2]) else self.__data[2]
 
         return self
     
     cpdef bint isnan(self):
-        self.__data = self.data().astype(np.float64)
-        return np.isnan(self.data()).any()
+        return self.__data[0] != self.__data[0] or self.__data[1] != self.__data[1] or self.__data[2] != self.__data[2]
 
     @classmethod
     def crossProduct(cls, v1, v2):
@@ -409,8 +437,11 @@ cdef class MVector3D:
     def dotProduct(cls, v1, v2):
         return dotProduct_MVector3D(v1, v2)
         
+    # 値はC配列で持っているので、NumPy配列は参照時に作る（配列への変更はそのまま反映される）
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=1] data(self):
-        return self.__data
+        cdef np.npy_intp shape[1]
+        shape[0] = 3
+        return as_ndarray(self, self.__data, 1, shape)
 
     def to_log(self):
         return "x: {0}, y: {1} z: {2}".format(round(self.__data[0], 5), round(self.__data[1], 5), round(self.__data[2], 5))
@@ -425,14 +456,16 @@ cdef class MVector3D:
         return np.all(np.less_equal(self.data(), other.data()))
 
     def __eq__(self, other):
-        cdef np.ndarray[DTYPE_FLOAT_t, ndim=1] d1 = self.data()
+        cdef MVector3D v2
+        if isinstance(other, MVector3D):
+            v2 = other
+            return self.__data[0] == v2.__data[0] and self.__data[1] == v2.__data[1] and self.__data[2] == v2.__data[2]
+
         cdef np.ndarray[DTYPE_FLOAT_t, ndim=1] d2 = other.data()
-        return d1[0] == d2[0] and d1[1] == d2[1] and d1[2] == d2[2]
+        return self.__data[0] == d2[0] and self.__data[1] == d2[1] and self.__data[2] == d2[2]
 
     def __ne__(self, other):
-        cdef np.ndarray[DTYPE_FLOAT_t, ndim=1] d1 = self.data()
-        cdef np.ndarray[DTYPE_FLOAT_t, ndim=1] d2 = other.data()
-        return d1[0] != d2[0] or d1[1] != d2[1] or d1[2] != d2[2]
+        return not self.__eq__(other)
 
     def __gt__(self, other):
         return np.all(np.greater(self.data(), other.data()))
@@ -441,92 +474,117 @@ cdef class MVector3D:
         return np.all(np.greater_equal(self.data(), other.data()))
 
     def __add__(self, other):
-        if isinstance(other, np.float):
-            v = self.add_float(other)
-        elif isinstance(other, MVector3D):
-            v = self.add_MVector3D(other)
-        elif isinstance(other, np.int):
-            v = self.add_int(other)
-        else:
-            v = self.data() + other
-        v2 = self.__class__(v)
+        cdef MVector3D v1 = self
+        cdef MVector3D v2
+        cdef double f
+
+        if isinstance(other, MVector3D):
+            v2 = other
+            return new_effective_MVector3D(v1.__data[0] + v2.__data[0], v1.__data[1] + v2.__data[1], v1.__data[2] + v2.__data[2])
+        elif isinstance(other, (float, int)):
+            f = other
+            return new_effective_MVector3D(v1.__data[0] + f, v1.__data[1] + f, v1.__data[2] + f)
+        elif isinstance(other, MVector3DArray):
+            # 配列側で計算する
+            return NotImplemented
+
+        v2 = v1.__class__(v1.data() + other)
         v2.effective()
         return v2
     
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=1] add_MVector3D(self, MVector3D other):
-        return self.__data + other.__data
+        return self.data() + other.data()
 
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=1] add_float(self, DTYPE_FLOAT_t other):
-        return self.__data + other
+        return self.data() + other
 
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=1] add_int(self, DTYPE_INT_t other):
-        return self.__data + other
+        return self.data() + other
 
     def __sub__(self, other):
-        if isinstance(other, np.float):
-            v = self.sub_float(other)
-        elif isinstance(other, MVector3D):
-            v = self.sub_MVector3D(other)
-        elif isinstance(other, np.int):
-            v = self.sub_int(other)
-        else:
-            v = self.data() - other
-        v2 = self.__class__(v)
+        cdef MVector3D v1 = self
+        cdef MVector3D v2
+        cdef double f
+
+        if isinstance(other, MVector3D):
+            v2 = other
+            return new_effective_MVector3D(v1.__data[0] - v2.__data[0], v1.__data[1] - v2.__data[1], v1.__data[2] - v2.__data[2])
+        elif isinstance(other, (float, int)):
+            f = other
+            return new_effective_MVector3D(v1.__data[0] - f, v1.__data[1] - f, v1.__data[2] - f)
+        elif isinstance(other, MVector3DArray):
+            # 配列側で計算する
+            return NotImplemented
+
+        v2 = v1.__class__(v1.data() - other)
         v2.effective()
         return v2
     
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=1] sub_MVector3D(self, MVector3D other):
-        return self.__data - other.__data
+        return self.data() - other.data()
 
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=1] sub_float(self, DTYPE_FLOAT_t other):
-        return self.__data - other
+        return self.data() - other
 
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=1] sub_int(self, DTYPE_INT_t other):
-        return self.__data - other
+        return self.data() - other
 
     def __mul__(self, other):
-        if isinstance(other, np.float):
-            v = self.mul_float(other)
-        elif isinstance(other, MVector3D):
-            v = self.mul_MVector3D(other)
-        elif isinstance(other, np.int):
-            v = self.mul_int(other)
-        else:
-            v = self.data() * other
-        v2 = self.__class__(v)
+        cdef MVector3D v1 = self
+        cdef MVector3D v2
+        cdef double f
+
+        if isinstance(other, MVector3D):
+            v2 = other
+            return new_effective_MVector3D(v1.__data[0] * v2.__data[0], v1.__data[1] * v2.__data[1], v1.__data[2] * v2.__data[2])
+        elif isinstance(other, (float, int)):
+            f = other
+            return new_effective_MVector3D(v1.__data[0] * f, v1.__data[1] * f, v1.__data[2] * f)
+        elif isinstance(other, MVector3DArray):
+            # 配列側で計算する
+            return NotImplemented
+
+        v2 = v1.__class__(v1.data() * other)
         v2.effective()
         return v2
     
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=1] mul_MVector3D(self, MVector3D other):
-        return self.__data * other.__data
+        return self.data() * other.data()
 
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=1] mul_float(self, DTYPE_FLOAT_t other):
-        return self.__data * other
+        return self.data() * other
 
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=1] mul_int(self, DTYPE_INT_t other):
-        return self.__data * other
+        return self.data() * other
 
+    @cython.cdivision(True)
     def __truediv__(self, other):
-        if isinstance(other, np.float):
-            v = self.truediv_float(other)
-        elif isinstance(other, MVector3D):
-            v = self.truediv_MVector3D(other)
-        elif isinstance(other, np.int):
-            v = self.truediv_int(other)
-        else:
-            v = self.data() / other
-        v2 = self.__class__(v)
+        cdef MVector3D v1 = self
+        cdef MVector3D v2
+        cdef double f
+
+        if isinstance(other, MVector3D):
+            v2 = other
+            return new_effective_MVector3D(v1.__data[0] / v2.__data[0], v1.__data[1] / v2.__data[1], v1.__data[2] / v2.__data[2])
+        elif isinstance(other, (float, int)):
+            f = other
+            return new_effective_MVector3D(v1.__data[0] / f, v1.__data[1] / f, v1.__data[2] / f)
+        elif isinstance(other, MVector3DArray):
+            # 配列側で計算する
+            return NotImplemented
+
+        v2 = v1.__class__(v1.data() / other)
         v2.effective()
         return v2
     
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=1] truediv_MVector3D(self, MVector3D other):
-        return self.__data / other.__data
+        return self.data() / other.data()
 
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=1] truediv_float(self, DTYPE_FLOAT_t other):
-        return self.__data / other
+        return self.data() / other
 
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=1] truediv_int(self, DTYPE_INT_t other):
-        return self.__data / other
+        return self.data() / other
 
     def __floordiv__(self, other):
         if isinstance(other, np.float):
@@ -542,13 +600,13 @@ cdef class MVector3D:
         return v2
     
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=1] floordiv_MVector3D(self, MVector3D other):
-        return self.__data // other.__data
+        return self.data() // other.data()
 
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=1] floordiv_float(self, DTYPE_FLOAT_t other):
-        return self.__data // other
+        return self.data() // other
 
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=1] floordiv_int(self, DTYPE_INT_t other):
-        return self.__data // other
+        return self.data() // other
 
     def __mod__(self, other):
         if isinstance(other, np.float):
@@ -564,13 +622,13 @@ cdef class MVector3D:
         return v2
     
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=1] mod_MVector3D(self, MVector3D other):
-        return self.__data % other.__data
+        return self.data() % other.data()
 
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=1] mod_float(self, DTYPE_FLOAT_t other):
-        return self.__data % other
+        return self.data() % other
 
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=1] mod_int(self, DTYPE_INT_t other):
-        return self.__data % other
+        return self.data() % other
 
     def __lshift__(self, other):
         if isinstance(other, MVector3D):
@@ -609,10 +667,10 @@ cdef class MVector3D:
         return v2
 
     def __neg__(self):
-        return self.__class__(-self.x(), -self.y(), -self.z())
+        return new_MVector3D(-self.__data[0], -self.__data[1], -self.__data[2])
 
     def __pos__(self):
-        return self.__class__(+self.x(), +self.y(), +self.z())
+        return new_MVector3D(+self.__data[0], +self.__data[1], +self.__data[2])
 
     cpdef DTYPE_FLOAT_t x(self):
         return self.__data[0]
@@ -633,13 +691,27 @@ cdef class MVector3D:
         self.__data[2] = z
 
 
+cdef inline MVector3D new_MVector3D(double x, double y, double z):
+    cdef MVector3D v = MVector3D.__new__(MVector3D)
+    v.__data[0] = x
+    v.__data[1] = y
+    v.__data[2] = z
+    return v
+
+
+# 演算結果の無効値は0にする
+cdef inline MVector3D new_effective_MVector3D(double x, double y, double z):
+    return new_MVector3D(effective_value(x), effective_value(y), effective_value(z))
+
+
 cdef MVector3D crossProduct_MVector3D(MVector3D v1, MVector3D v2):
-    cdef np.ndarray[DTYPE_FLOAT_t, ndim=1] crossv = np.cross(v1.data(), v2.data())
-    return MVector3D(crossv[0], crossv[1], crossv[2])
+    cdef double* a = v1.__data
+    cdef double* b = v2.__data
+    return new_MVector3D(a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0])
 
 
 cdef double dotProduct_MVector3D(MVector3D v1, MVector3D v2):
-    return np.dot(v1.data(), v2.data())
+    return v1.__data[0] * v2.__data[0] + v1.__data[1] * v2.__data[1] + v1.__data[2] * v2.__data[2]
 
 
 cdef class MVector4D:
@@ -928,87 +1000,76 @@ cdef double dotProduct_MVector4D(MVector4D v1, MVector4D v2):
 cdef class MQuaternion:
 
     def __init__(self, w=1.0, x=0.0, y=0.0, z=0.0):
-        if isinstance(w, float):
-            self.__data = np.array([w, x, y, z], dtype=np.float64)
-        elif isinstance(w, MQuaternion):
+        if isinstance(w, MQuaternion):
             # クラスの場合
-            self.__data = np.array([w.data().components.w, w.data().components.x, w.data().components.y, w.data().components.z], dtype=np.float64)
+            self.__data = (<MQuaternion>w).__data
         elif isinstance(w, np.quaternion):
             # quaternionの場合
-            self.__data = w.components
+            self.__data[0] = w.w
+            self.__data[1] = w.x
+            self.__data[2] = w.y
+            self.__data[3] = w.z
         elif isinstance(w, np.ndarray):
             # arrayそのものの場合
-            self.__data = np.array([w[0], w[1], w[2], w[3]], dtype=np.float64)
+            self.__data[0] = w[0]
+            self.__data[1] = w[1]
+            self.__data[2] = w[2]
+            self.__data[3] = w[3]
         else:
-            self.__data = np.array([w, x, y, z], dtype=np.float64)
+            self.__data[0] = w
+            self.__data[1] = x
+            self.__data[2] = y
+            self.__data[3] = z
+
+    def __reduce__(self):
+        return (MQuaternion, (self.__data[0], self.__data[1], self.__data[2], self.__data[3]))
 
     cpdef MQuaternion copy(self):
-        return MQuaternion(self.scalar(), self.x(), self.y(), self.z())
+        return new_MQuaternion(self.__data[0], self.__data[1], self.__data[2], self.__data[3])
     
     def __str__(self):
         return "MQuaternion({0}, {1}, {2}, {3})".format(self.scalar(), self.x(), self.y(), self.z())
 
+    @cython.cdivision(True)
     cpdef MQuaternion inverted(self):
-        v = self.data().inverse()
-        return self.__class__(v.w, v.x, v.y, v.z)
+        cdef double norm = self.__data[0] * self.__data[0] + self.__data[1] * self.__data[1] + self.__data[2] * self.__data[2] + self.__data[3] * self.__data[3]
+        return new_MQuaternion(self.__data[0] / norm, -self.__data[1] / norm, -self.__data[2] / norm, -self.__data[3] / norm)
 
     cpdef double length(self):
-        return self.data().abs()
+        return sqrt(self.__data[0] * self.__data[0] + self.__data[1] * self.__data[1] + self.__data[2] * self.__data[2] + self.__data[3] * self.__data[3])
 
     cpdef double lengthSquared(self):
-        return self.data().abs()**2
+        cdef double l = self.length()
+        return l * l
 
+    @cython.cdivision(True)
     cpdef MQuaternion normalized(self):
         self.effective()
-        v = self.data().normalized()
-        return MQuaternion(v.w, v.x, v.y, v.z)
+        cdef double l = self.length()
+        return new_MQuaternion(self.__data[0] / l, self.__data[1] / l, self.__data[2] / l, self.__data[3] / l)
 
+    @cython.cdivision(True)
     cpdef normalize(self):
-        self.__data = self.data().normalized().components
+        cdef double l = self.length()
+        self.__data[0] /= l
+        self.__data[1] /= l
+        self.__data[2] /= l
+        self.__data[3] /= l
 
     cpdef effective(self):
-        self.data().components[np.isnan(self.data().components)] = 0
-        self.data().components[np.isinf(self.data().components)] = 0
         # # Scalarは1がデフォルトとなる
         # self.setScalar(1 if self.scalar() == 0 else self.scalar())
-        if np.isclose(self.data().components, 0).all():
+        if fabs(self.__data[0]) <= 1e-08 and fabs(self.__data[1]) <= 1e-08 and fabs(self.__data[2]) <= 1e-08 and fabs(self.__data[3]) <= 1e-08:
             # すべてが0の場合、scalarだけ1に設定する
-            self.setScalar(1)
+            self.__data[0] = 1
 
     cpdef MMatrix4x4 toMatrix4x4(self):
-        cdef MMatrix4x4 mat = MMatrix4x4()
-        cdef np.ndarray[DTYPE_FLOAT_t, ndim=2] m = mat.data()
-
-        # q(w,x,y,z)から(x,y,z,w)に並べ替え.
-        cdef np.ndarray[DTYPE_FLOAT_t, ndim=1] q2 = np.array([self.data().x, self.data().y, self.data().z, self.data().w], dtype=np.float64)
-
-        m[0, 0] = q2[3] * q2[3] + q2[0] * q2[0] - q2[1] * q2[1] - q2[2] * q2[2]
-        m[0, 1] = 2.0 * q2[0] * q2[1] - 2.0 * q2[3] * q2[2]
-        m[0, 2] = 2.0 * q2[0] * q2[2] + 2.0 * q2[3] * q2[1]
-        m[0, 3] = 0.0
-
-        m[1, 0] = 2.0 * q2[0] * q2[1] + 2.0 * q2[3] * q2[2]
-        m[1, 1] = q2[3] * q2[3] - q2[0] * q2[0] + q2[1] * q2[1] - q2[2] * q2[2]
-        m[1, 2] = 2.0 * q2[1] * q2[2] - 2.0 * q2[3] * q2[0]
-        m[1, 3] = 0.0
-
-        m[2, 0] = 2.0 * q2[0] * q2[2] - 2.0 * q2[3] * q2[1]
-        m[2, 1] = 2.0 * q2[1] * q2[2] + 2.0 * q2[3] * q2[0]
-        m[2, 2] = q2[3] * q2[3] - q2[0] * q2[0] - q2[1] * q2[1] + q2[2] * q2[2]
-        m[2, 3] = 0.0
-
-        m[3, 0] = 0.0
-        m[3, 1] = 0.0
-        m[3, 2] = 0.0
-        m[3, 3] = q2[3] * q2[3] + q2[0] * q2[0] + q2[1] * q2[1] + q2[2] * q2[2]
-
-        m /= m[3, 3]
-        m[3, 3] = 1.0
-
+        cdef MMatrix4x4 mat = MMatrix4x4.__new__(MMatrix4x4)
+        quaternion_to_matrix(self.__data, mat.__data)
         return mat
     
     cpdef MVector4D toVector4D(self):
-        return MVector4D(self.data().x, self.data().y, self.data().z, self.data().w)
+        return MVector4D(self.__data[1], self.__data[2], self.__data[3], self.__data[0])
 
     cpdef MVector3D toEulerAngles4MMD(self):
         # MMDの表記に合わせたオイラー角
@@ -1016,53 +1077,10 @@ cdef class MQuaternion:
 
         return MVector3D(euler.x(), -euler.y(), -euler.z())
 
-    # http://www.j3d.org/matrix_faq/matrfaq_latest.html#Q37
     cpdef MVector3D toEulerAngles(self):
-        cdef DTYPE_FLOAT_t xp = self.data().x
-        cdef DTYPE_FLOAT_t yp = self.data().y
-        cdef DTYPE_FLOAT_t zp = self.data().z
-        cdef DTYPE_FLOAT_t wp = self.data().w
-
-        cdef DTYPE_FLOAT_t xx = xp * xp
-        cdef DTYPE_FLOAT_t xy = xp * yp
-        cdef DTYPE_FLOAT_t xz = xp * zp
-        cdef DTYPE_FLOAT_t xw = xp * wp
-        cdef DTYPE_FLOAT_t yy = yp * yp
-        cdef DTYPE_FLOAT_t yz = yp * zp
-        cdef DTYPE_FLOAT_t yw = yp * wp
-        cdef DTYPE_FLOAT_t zz = zp * zp
-        cdef DTYPE_FLOAT_t zw = zp * wp
-        cdef DTYPE_FLOAT_t lengthSquared = xx + yy + zz + wp * wp
-
-        if not is_almost_null(lengthSquared - 1.0) and not is_almost_null(lengthSquared):
-            xx /= lengthSquared
-            xy /= lengthSquared  # same as (xp / length) * (yp / length)
-            xz /= lengthSquared
-            xw /= lengthSquared
-            yy /= lengthSquared
-            yz /= lengthSquared
-            yw /= lengthSquared
-            zz /= lengthSquared
-            zw /= lengthSquared
-
-        cdef DTYPE_FLOAT_t pitch = asin(max(-1, min(1, -2.0 * (yz - xw))))
-        cdef DTYPE_FLOAT_t yaw = 0
-        cdef DTYPE_FLOAT_t roll = 0
-        
-        if pitch < (pi / 2):
-            if pitch > -(pi / 2):
-                yaw = atan2(2.0 * (xz + yw), 1.0 - 2.0 * (xx + yy))
-                roll = atan2(2.0 * (xy + zw), 1.0 - 2.0 * (xx + zz))
-            else:
-                # not a unique solution
-                roll = 0.0
-                yaw = -atan2(-2.0 * (xy - zw), 1.0 - 2.0 * (yy + zz))
-        else:
-            # not a unique solution
-            roll = 0.0
-            yaw = atan2(-2.0 * (xy - zw), 1.0 - 2.0 * (yy + zz))
-
-        return MVector3D(degrees(pitch), degrees(yaw), degrees(roll))
+        cdef MVector3D euler = MVector3D.__new__(MVector3D)
+        quaternion_to_euler(self.__data, euler.__data)
+        return euler
     
     # 角度に変換
     cpdef double toDegree(self):
@@ -1115,19 +1133,19 @@ cdef class MQuaternion:
         return slerp(q1, q2, t)
 
     cpdef double x(self):
-        return self.data().x
+        return self.__data[1]
 
     cpdef double y(self):
-        return self.data().y
+        return self.__data[2]
 
     cpdef double z(self):
-        return self.data().z
+        return self.__data[3]
 
     cpdef double scalar(self):
-        return self.data().w
+        return self.__data[0]
 
     cpdef MVector3D vector(self):
-        return MVector3D(self.data().x, self.data().y, self.data().z)
+        return new_MVector3D(self.__data[1], self.__data[2], self.__data[3])
 
     cpdef setX(self, x):
         self.__data[1] = x
@@ -1141,6 +1159,7 @@ cdef class MQuaternion:
     cpdef setScalar(self, w):
         self.__data[0] = w
         
+    # 値はC配列で持っているので、quaternionは参照時に作る
     cpdef data(self):
         return np.quaternion(self.__data[0], self.__data[1], self.__data[2], self.__data[3])
 
@@ -1151,10 +1170,15 @@ cdef class MQuaternion:
         return self.data().less_equal(other.data())
 
     def __eq__(self, other):
+        cdef MQuaternion q2
+        if isinstance(other, MQuaternion):
+            q2 = other
+            return self.__data[0] == q2.__data[0] and self.__data[1] == q2.__data[1] and self.__data[2] == q2.__data[2] and self.__data[3] == q2.__data[3]
+
         return self.data().equal(other.data())
 
     def __ne__(self, other):
-        return self.data().not_equal(other.data())
+        return not self.__eq__(other)
 
     def __gt__(self, other):
         return self.data().greater(other.data())
@@ -1163,29 +1187,42 @@ cdef class MQuaternion:
         return self.data().greater_equal(other.data())
 
     def __add__(self, other):
+        cdef MQuaternion q1 = self
+        cdef MQuaternion q2
         if isinstance(other, MQuaternion):
-            v = self.data() + other.data()
-        else:
-            v = self.data() + other
-        return self.__class__(v.w, v.x, v.y, v.z)
+            q2 = other
+            return new_MQuaternion(q1.__data[0] + q2.__data[0], q1.__data[1] + q2.__data[1], q1.__data[2] + q2.__data[2], q1.__data[3] + q2.__data[3])
+
+        v = q1.data() + other
+        return q1.__class__(v.w, v.x, v.y, v.z)
 
     def __sub__(self, other):
+        cdef MQuaternion q1 = self
+        cdef MQuaternion q2
         if isinstance(other, MQuaternion):
-            v = self.data() - other.data()
-        else:
-            v = self.data() - other
-        return self.__class__(v.w, v.x, v.y, v.z)
+            q2 = other
+            return new_MQuaternion(q1.__data[0] - q2.__data[0], q1.__data[1] - q2.__data[1], q1.__data[2] - q2.__data[2], q1.__data[3] - q2.__data[3])
+
+        v = q1.data() - other
+        return q1.__class__(v.w, v.x, v.y, v.z)
 
     def __mul__(self, other):
+        cdef MQuaternion q1 = self
+        cdef double f
         if isinstance(other, MQuaternion):
-            v = self.data() * other.data()
-            return self.__class__(v)
+            return multiply_MQuaternion(q1, other)
         elif isinstance(other, MVector3D):
-            v = self.toMatrix4x4() * other
+            v = q1.toMatrix4x4() * other
             return v
+        elif isinstance(other, (float, int)):
+            f = other
+            return new_MQuaternion(q1.__data[0] * f, q1.__data[1] * f, q1.__data[2] * f, q1.__data[3] * f)
+        elif isinstance(other, (MQuaternionArray, MVector3DArray)):
+            # 配列側で計算する
+            return NotImplemented
         else:
-            v = self.data() * other
-            return self.__class__(v.w, v.x, v.y, v.z)
+            v = q1.data() * other
+            return q1.__class__(v.w, v.x, v.y, v.z)
 
     def __truediv__(self, other):
         if isinstance(other, MQuaternion):
@@ -1235,33 +1272,313 @@ cdef class MQuaternion:
         return self.__class__(v.w, v.x, v.y, v.z)
     
     def __neg__(self):
-        return self.__class__(-self.data().w, -self.data().x, -self.data().y, -self.data().z)
+        return new_MQuaternion(-self.__data[0], -self.__data[1], -self.__data[2], -self.__data[3])
 
     def __pos__(self):
-        return self.__class__(+self.data().w, +self.data().x, +self.data().y, +self.data().z)
+        return new_MQuaternion(+self.__data[0], +self.__data[1], +self.__data[2], +self.__data[3])
 
     def __invert__(self):
         return self.__class__(~self.data().w, ~self.data().x, ~self.data().y, ~self.data().z)
 
 
-cdef double dotProduct_MQuaternion(MQuaternion v1, MQuaternion v2):
-    return np.sum(v1.data().components * v2.data().components)
+cdef inline MQuaternion new_MQuaternion(double w, double x, double y, double z):
+    cdef MQuaternion q = MQuaternion.__new__(MQuaternion)
+    q.__data[0] = w
+    q.__data[1] = x
+    q.__data[2] = y
+    q.__data[3] = z
+    return q
+
+# 以下、C配列に対する計算（単体・配列の両方から使うので、計算順は単体版に合わせる）
+
+cdef double DEG_TO_RAD = pi / 180.0
+cdef double RAD_TO_DEG = 180.0 / pi
+
+cdef inline void cross_vector(double* a, double* b, double* result):
+    cdef double x = a[1] * b[2] - a[2] * b[1]
+    cdef double y = a[2] * b[0] - a[0] * b[2]
+    cdef double z = a[0] * b[1] - a[1] * b[0]
+    result[0] = x
+    result[1] = y
+    result[2] = z
+
+# 長さ0の場合、そのまま
+@cython.cdivision(True)
+cdef inline void normalize_vector(double* v, double* result):
+    cdef double l2 = sqrt(v[0] * v[0] + v[1] * v[1] + v[2] * v[2])
+    if l2 == 0:
+        l2 = 1
+    result[0] = v[0] / l2
+    result[1] = v[1] / l2
+    result[2] = v[2] / l2
+
+# クォータニオンの積（quaternionと同じ計算順）
+cdef inline void multiply_quaternion(double* a, double* b, double* result):
+    cdef double w = a[0] * b[0] - a[1] * b[1] - a[2] * b[2] - a[3] * b[3]
+    cdef double x = a[0] * b[1] + a[1] * b[0] + a[2] * b[3] - a[3] * b[2]
+    cdef double y = a[0] * b[2] - a[1] * b[3] + a[2] * b[0] + a[3] * b[1]
+    cdef double z = a[0] * b[3] + a[1] * b[2] - a[2] * b[1] + a[3] * b[0]
+    result[0] = w
+    result[1] = x
+    result[2] = y
+    result[3] = z
+
+@cython.cdivision(True)
+cdef inline void invert_quaternion(double* q, double* result):
+    cdef double norm = q[0] * q[0] + q[1] * q[1] + q[2] * q[2] + q[3] * q[3]
+    result[0] = q[0] / norm
+    result[1] = -q[1] / norm
+    result[2] = -q[2] / norm
+    result[3] = -q[3] / norm
+
+# すべてが0の場合、scalarだけ1にしてから正規化
+@cython.cdivision(True)
+cdef inline void normalize_quaternion(double* q, double* result):
+    cdef double w = q[0]
+    cdef double l
+
+    if fabs(q[0]) <= 1e-08 and fabs(q[1]) <= 1e-08 and fabs(q[2]) <= 1e-08 and fabs(q[3]) <= 1e-08:
+        w = 1
+
+    l = sqrt(w * w + q[1] * q[1] + q[2] * q[2] + q[3] * q[3])
+    result[0] = w / l
+    result[1] = q[1] / l
+    result[2] = q[2] / l
+    result[3] = q[3] / l
+
+@cython.cdivision(True)
+cdef inline void quaternion_to_matrix(double* q, double* m):
+    cdef double w = q[0]
+    cdef double x = q[1]
+    cdef double y = q[2]
+    cdef double z = q[3]
+    cdef double d
+    cdef int i
+
+    m[0] = w * w + x * x - y * y - z * z
+    m[1] = 2.0 * x * y - 2.0 * w * z
+    m[2] = 2.0 * x * z + 2.0 * w * y
+    m[3] = 0.0
+
+    m[4] = 2.0 * x * y + 2.0 * w * z
+    m[5] = w * w - x * x + y * y - z * z
+    m[6] = 2.0 * y * z - 2.0 * w * x
+    m[7] = 0.0
+
+    m[8] = 2.0 * x * z - 2.0 * w * y
+    m[9] = 2.0 * y * z + 2.0 * w * x
+    m[10] = w * w - x * x - y * y + z * z
+    m[11] = 0.0
+
+    m[12] = 0.0
+    m[13] = 0.0
+    m[14] = 0.0
+    m[15] = w * w + x * x + y * y + z * z
+
+    d = m[15]
+    for i in range(15):
+        m[i] /= d
+    m[15] = 1.0
+
+# オイラー角（度）
+# http://www.j3d.org/matrix_faq/matrfaq_latest.html#Q37
+@cython.cdivision(True)
+cdef inline void quaternion_to_euler(double* q, double* euler):
+    cdef double xp = q[1]
+    cdef double yp = q[2]
+    cdef double zp = q[3]
+    cdef double wp = q[0]
+
+    cdef double xx = xp * xp
+    cdef double xy = xp * yp
+    cdef double xz = xp * zp
+    cdef double xw = xp * wp
+    cdef double yy = yp * yp
+    cdef double yz = yp * zp
+    cdef double yw = yp * wp
+    cdef double zz = zp * zp
+    cdef double zw = zp * wp
+    cdef double lengthSquared = xx + yy + zz + wp * wp
+
+    if not c_is_almost_null(lengthSquared - 1.0) and not c_is_almost_null(lengthSquared):
+        xx /= lengthSquared
+        xy /= lengthSquared  # same as (xp / length) * (yp / length)
+        xz /= lengthSquared
+        xw /= lengthSquared
+        yy /= lengthSquared
+        yz /= lengthSquared
+        yw /= lengthSquared
+        zz /= lengthSquared
+        zw /= lengthSquared
+
+    cdef double sp = -2.0 * (yz - xw)
+    sp = sp if sp < 1 else 1
+    sp = sp if sp > -1 else -1
+
+    cdef double pitch = asin(sp)
+    cdef double yaw = 0
+    cdef double roll = 0
+
+    if pitch < (pi / 2):
+        if pitch > -(pi / 2):
+            yaw = atan2(2.0 * (xz + yw), 1.0 - 2.0 * (xx + yy))
+            roll = atan2(2.0 * (xy + zw), 1.0 - 2.0 * (xx + zz))
+        else:
+            # not a unique solution
+            roll = 0.0
+            yaw = -atan2(-2.0 * (xy - zw), 1.0 - 2.0 * (yy + zz))
+    else:
+        # not a unique solution
+        roll = 0.0
+        yaw = atan2(-2.0 * (xy - zw), 1.0 - 2.0 * (yy + zz))
 
-cdef MQuaternion fromAxisAndAngle(MVector3D vec3, double angle):
-    cdef DTYPE_FLOAT_t x = vec3.x()
-    cdef DTYPE_FLOAT_t y = vec3.y()
-    cdef DTYPE_FLOAT_t z = vec3.z()
-    cdef DTYPE_FLOAT_t length = sqrt(x * x + y * y + z * z)
+    euler[0] = pitch * RAD_TO_DEG
+    euler[1] = yaw * RAD_TO_DEG
+    euler[2] = roll * RAD_TO_DEG
 
-    if not is_almost_null(length - 1.0) and not is_almost_null(length):
+# オイラー角（度）から
+cdef inline void euler_to_quaternion(double pitch, double yaw, double roll, double* q):
+    pitch = pitch * DEG_TO_RAD
+    yaw = yaw * DEG_TO_RAD
+    roll = roll * DEG_TO_RAD
+
+    pitch *= 0.5
+    yaw *= 0.5
+    roll *= 0.5
+
+    cdef double c1 = cos(yaw)
+    cdef double s1 = sin(yaw)
+    cdef double c2 = cos(roll)
+    cdef double s2 = sin(roll)
+    cdef double c3 = cos(pitch)
+    cdef double s3 = sin(pitch)
+    cdef double c1c2 = c1 * c2
+    cdef double s1s2 = s1 * s2
+
+    q[0] = c1c2 * c3 + s1s2 * s3
+    q[1] = c1c2 * s3 + s1s2 * c3
+    q[2] = s1 * c2 * c3 - c1 * s2 * s3
+    q[3] = c1 * s2 * c3 - s1 * c2 * s3
+
+# 軸と角度（度）から
+@cython.cdivision(True)
+cdef inline void axis_angle_to_quaternion(double* axis, double angle, double* q):
+    cdef double x = axis[0]
+    cdef double y = axis[1]
+    cdef double z = axis[2]
+    cdef double length = sqrt(x * x + y * y + z * z)
+
+    if not c_is_almost_null(length - 1.0) and not c_is_almost_null(length):
         x /= length
         y /= length
         z /= length
 
-    cdef DTYPE_FLOAT_t a = radians(angle / 2.0)
-    cdef DTYPE_FLOAT_t s = sin(a)
-    cdef DTYPE_FLOAT_t c = cos(a)
-    return MQuaternion(c, x * s, y * s, z * s).normalized()
+    cdef double a = (angle / 2.0) * DEG_TO_RAD
+    cdef double s = sin(a)
+    cdef double c = cos(a)
+    cdef double tmp[4]
+
+    tmp[0] = c
+    tmp[1] = x * s
+    tmp[2] = y * s
+    tmp[3] = z * s
+    normalize_quaternion(tmp, q)
+
+@cython.cdivision(True)
+cdef inline void rotation_to_quaternion(double* fromv, double* tov, double* q):
+    cdef double v0[3]
+    cdef double v1[3]
+    cdef double axis[3]
+    cdef double unit[3]
+    cdef double tmp[4]
+    cdef double d
+
+    normalize_vector(fromv, v0)
+    normalize_vector(tov, v1)
+    d = v0[0] * v1[0] + v0[1] * v1[1] + v0[2] * v1[2] + 1.0
+
+    # if dest vector is close to the inverse of source vector, ANY axis of rotation is valid
+    if c_is_almost_null(d):
+        unit[0] = 1.0
+        unit[1] = 0.0
+        unit[2] = 0.0
+        cross_vector(unit, v0, axis)
+        if c_is_almost_null(axis[0] * axis[0] + axis[1] * axis[1] + axis[2] * axis[2]):
+            unit[0] = 0.0
+            unit[1] = 1.0
+            cross_vector(unit, v0, axis)
+        axis[0] = effective_value(axis[0])
+        axis[1] = effective_value(axis[1])
+        axis[2] = effective_value(axis[2])
+        normalize_vector(axis, axis)
+        # same as MQuaternion.fromAxisAndAngle(axis, 180.0)
+        tmp[0] = 0.0
+    else:
+        d = sqrt(2.0 * d)
+        cross_vector(v0, v1, axis)
+        axis[0] = effective_value(axis[0] / d)
+        axis[1] = effective_value(axis[1] / d)
+        axis[2] = effective_value(axis[2] / d)
+        tmp[0] = d * 0.5
+
+    tmp[1] = axis[0]
+    tmp[2] = axis[1]
+    tmp[3] = axis[2]
+    normalize_quaternion(tmp, q)
+
+# 0 < t < 1 の範囲で呼ぶ
+cdef inline void nlerp_quaternion(double* q1, double* q2, double t, double* result):
+    cdef double dot = q1[0] * q2[0] + q1[1] * q2[1] + q1[2] * q2[2] + q1[3] * q2[3]
+    cdef double sign = -1.0 if dot < 0.0 else 1.0
+    cdef double tmp[4]
+    cdef int i
+
+    for i in range(4):
+        tmp[i] = q1[i] * (1.0 - t) + (sign * q2[i]) * t
+    normalize_quaternion(tmp, result)
+
+# 0 < t < 1 の範囲で呼ぶ
+@cython.cdivision(True)
+cdef inline void slerp_quaternion(double* q1, double* q2, double t, double* result):
+    # Determine the angle between the two quaternions.
+    cdef double dot = q1[0] * q2[0] + q1[1] * q2[1] + q1[2] * q2[2] + q1[3] * q2[3]
+    cdef double sign = 1.0
+    cdef int i
+
+    if dot < 0.0:
+        sign = -1.0
+        dot = -dot
+
+    # Get the scale factors.  If they are too small,
+    # then revert to simple linear interpolation.
+    cdef double factor1 = 1.0 - t
+    cdef double factor2 = t
+    cdef double angle
+    cdef double sinOfAngle
+
+    if (1.0 - dot) > 0.0000001:
+        angle = acos(max(0, min(1, dot)))
+        sinOfAngle = sin(angle)
+        if sinOfAngle > 0.0000001:
+            factor1 = sin((1.0 - t) * angle) / sinOfAngle
+            factor2 = sin(t * angle) / sinOfAngle
+
+    # Construct the result quaternion.
+    for i in range(4):
+        result[i] = q1[i] * factor1 + (sign * q2[i]) * factor2
+
+cdef inline MQuaternion multiply_MQuaternion(MQuaternion q1, MQuaternion q2):
+    cdef MQuaternion q = MQuaternion.__new__(MQuaternion)
+    multiply_quaternion(q1.__data, q2.__data, q.__data)
+    return q
+
+cdef double dotProduct_MQuaternion(MQuaternion v1, MQuaternion v2):
+    return v1.__data[0] * v2.__data[0] + v1.__data[1] * v2.__data[1] + v1.__data[2] * v2.__data[2] + v1.__data[3] * v2.__data[3]
+
+cdef MQuaternion fromAxisAndAngle(MVector3D vec3, double angle):
+    cdef MQuaternion q = MQuaternion.__new__(MQuaternion)
+    axis_angle_to_quaternion(vec3.__data, angle, q.__data)
+    return q
 
 cdef MQuaternion fromAxisAndQuaternion(MVector3D vec3, MQuaternion qq):
     qq.normalize()
@@ -1339,47 +1656,14 @@ cdef MQuaternion fromRotationMatrix(np.ndarray[DTYPE_FLOAT_t, ndim=2] rot3x3):
     return MQuaternion(scalar, axis[0], axis[1], axis[2])
 
 cdef MQuaternion rotationTo(MVector3D fromv, MVector3D tov):
-    cdef MVector3D v0 = fromv.normalized()
-    cdef MVector3D v1 = tov.normalized()
-    cdef double d = MVector3D.dotProduct(v0, v1) + 1.0
-    cdef MVector3D axis
-
-    # if dest vector is close to the inverse of source vector, ANY axis of rotation is valid
-    if is_almost_null(d):
-        axis = crossProduct_MVector3D(MVector3D(1.0, 0.0, 0.0), v0)
-        if is_almost_null(axis.lengthSquared()):
-            axis = crossProduct_MVector3D(MVector3D(0.0, 1.0, 0.0), v0)
-        axis.normalize()
-        # same as MQuaternion.fromAxisAndAngle(axis, 180.0)
-        return MQuaternion(0.0, axis.x(), axis.y(), axis.z()).normalized()
-
-    d = sqrt(2.0 * d)
-    axis = crossProduct_MVector3D(v0, v1) / d
-    return MQuaternion(d * 0.5, axis.x(), axis.y(), axis.z()).normalized()
+    cdef MQuaternion q = MQuaternion.__new__(MQuaternion)
+    rotation_to_quaternion(fromv.__data, tov.__data, q.__data)
+    return q
 
 cdef MQuaternion fromEulerAngles(double pitch, double yaw, double roll):
-    pitch = radians(pitch)
-    yaw = radians(yaw)
-    roll = radians(roll)
-
-    pitch *= 0.5
-    yaw *= 0.5
-    roll *= 0.5
-
-    cdef double c1 = cos(yaw)
-    cdef double s1 = sin(yaw)
-    cdef double c2 = cos(roll)
-    cdef double s2 = sin(roll)
-    cdef double c3 = cos(pitch)
-    cdef double s3 = sin(pitch)
-    cdef double c1c2 = c1 * c2
-    cdef double s1s2 = s1 * s2
-    cdef double w = c1c2 * c3 + s1s2 * s3
-    cdef double x = c1c2 * s3 + s1s2 * c3
-    cdef double y = s1 * c2 * c3 - c1 * s2 * s3
-    cdef double z = c1 * s2 * c3 - s1 * c2 * s3
-
-    return MQuaternion(w, x, y, z)
+    cdef MQuaternion q = MQuaternion.__new__(MQuaternion)
+    euler_to_quaternion(pitch, yaw, roll, q.__data)
+    return q
 
 cdef MQuaternion nlerp(MQuaternion q1, MQuaternion q2, double t):
     # Handle the easy cases first.
@@ -1387,16 +1671,10 @@ cdef MQuaternion nlerp(MQuaternion q1, MQuaternion q2, double t):
         return q1
     elif t >= 1.0:
         return q2
-        
-    # Determine the angle between the two quaternions.
-    cdef MQuaternion q2b = MQuaternion(q2.scalar(), q2.x(), q2.y(), q2.z())
-    
-    cdef double dot = dotProduct_MQuaternion(q1, q2)
-    if dot < 0.0:
-        q2b = -q2b
-    
-    # Perform the linear interpolation.
-    return (q1 * (1.0 - t) + q2b * t).normalized()
+
+    cdef MQuaternion q = MQuaternion.__new__(MQuaternion)
+    nlerp_quaternion(q1.__data, q2.__data, t, q.__data)
+    return q
 
 cdef MQuaternion slerp(MQuaternion q1, MQuaternion q2, double t):
     # Handle the easy cases first.
@@ -1405,56 +1683,56 @@ cdef MQuaternion slerp(MQuaternion q1, MQuaternion q2, double t):
     elif t >= 1.0:
         return q2
 
-    # Determine the angle between the two quaternions.
-    cdef MQuaternion q2b = MQuaternion(q2.scalar(), q2.x(), q2.y(), q2.z())
-    cdef double dot = dotProduct_MQuaternion(q1, q2)
-    
-    if dot < 0.0:
-        q2b = -q2b
-        dot = -dot
-
-    # Get the scale factors.  If they are too small,
-    # then revert to simple linear interpolation.
-    cdef double factor1 = 1.0 - t
-    cdef double factor2 = t
-    cdef double angle
-    cdef double sinOfAngle
-
-    if (1.0 - dot) > 0.0000001:
-        angle = acos(max(0, min(1, dot)))
-        sinOfAngle = sin(angle)
-        if sinOfAngle > 0.0000001:
-            factor1 = sin((1.0 - t) * angle) / sinOfAngle
-            factor2 = sin(t * angle) / sinOfAngle
-
-    # Construct the result quaternion.
-    return q1 * factor1 + q2b * factor2
+    cdef MQuaternion q = MQuaternion.__new__(MQuaternion)
+    slerp_quaternion(q1.__data, q2.__data, t, q.__data)
+    return q
 
 
 cdef class MMatrix4x4:
     
     def __init__(self, m11=1.0, m12=0.0, m13=0.0, m14=0.0, m21=0.0, m22=1.0, m23=0.0, m24=0.0, m31=0.0, m32=0.0, m33=1.0, m34=0.0, m41=0.0, m42=0.0, m43=0.0, m44=1.0):
-        if isinstance(m11, float):
-            self.__data = np.array([[m11, m12, m13, m14], [m21, m22, m23, m24], [m31, m32, m33, m34], [m41, m42, m43, m44]], dtype=np.float64)
-        elif isinstance(m11, MMatrix4x4):
+        cdef int i
+
+        if isinstance(m11, MMatrix4x4):
             # 行列クラスの場合
-            self.__data = np.array([[m11.__data[0, 0], m11.__data[0, 1], m11.__data[0, 2], m11.__data[0, 3]], \
-                                    [m11.__data[1, 0], m11.__data[1, 1], m11.__data[1, 2], m11.__data[1, 3]], \
-                                    [m11.__data[2, 0], m11.__data[2, 1], m11.__data[2, 2], m11.__data[2, 3]], \
-                                    [m11.__data[3, 0], m11.__data[3, 1], m11.__data[3, 2], m11.__data[3, 3]]], dtype=np.float64)
+            self.__data = (<MMatrix4x4>m11).__data
         elif isinstance(m11, np.ndarray):
             # 行列そのものの場合
-            self.__data = np.array([[m11[0, 0], m11[0, 1], m11[0, 2], m11[0, 3]], [m11[1, 0], m11[1, 1], m11[1, 2], m11[1, 3]], \
-                                    [m11[2, 0], m11[2, 1], m11[2, 2], m11[2, 3]], [m11[3, 0], m11[3, 1], m11[3, 2], m11[3, 3]]], dtype=np.float64)
+            for i in range(16):
+                self.__data[i] = m11[i // 4, i % 4]
         else:
             # べた値の場合
-            self.__data = np.array([[m11, m12, m13, m14], [m21, m22, m23, m24], [m31, m32, m33, m34], [m41, m42, m43, m44]], dtype=np.float64)
+            self.__data[0] = m11
+            self.__data[1] = m12
+            self.__data[2] = m13
+            self.__data[3] = m14
+            self.__data[4] = m21
+            self.__data[5] = m22
+            self.__data[6] = m23
+            self.__data[7] = m24
+            self.__data[8] = m31
+            self.__data[9] = m32
+            self.__data[10] = m33
+            self.__data[11] = m34
+            self.__data[12] = m41
+            self.__data[13] = m42
+            self.__data[14] = m43
+            self.__data[15] = m44
+
+    def __reduce__(self):
+        return (MMatrix4x4, tuple([self.__data[i] for i in range(16)]))
 
     cpdef MMatrix4x4 copy(self):
-        return MMatrix4x4(self.data())
+        cdef MMatrix4x4 mat = MMatrix4x4.__new__(MMatrix4x4)
+        mat.__data = self.__data
+        return mat
     
+    # 値はC配列で持っているので、NumPy配列は参照時に作る（配列への変更はそのまま反映される）
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=2] data(self):
-        return self.__data
+        cdef np.npy_intp shape[2]
+        shape[0] = 4
+        shape[1] = 4
+        return as_ndarray(self, self.__data, 2, shape)
 
     # 逆行列
     cpdef MMatrix4x4 inverted(self):
@@ -1462,28 +1740,34 @@ cdef class MMatrix4x4:
 
     # 回転行列
     cpdef rotate(self, qq):
-        self.__data = self.data().dot(qq.toMatrix4x4().data())
+        cdef MMatrix4x4 mat = qq.toMatrix4x4()
+        multiply_matrix(self.__data, mat.__data, self.__data)
 
     # 平行移動行列
     cpdef translate(self, MVector3D vec3):
-        cdef np.ndarray[DTYPE_FLOAT_t, ndim=2] vec_mat = np.array([[vec3.x(), vec3.y(), vec3.z()], 
-                                                                   [vec3.x(), vec3.y(), vec3.z()], 
-                                                                   [vec3.x(), vec3.y(), vec3.z()], 
-                                                                   [vec3.x(), vec3.y(), vec3.z()]], dtype=np.float64)
-        cdef np.ndarray[DTYPE_FLOAT_t, ndim=2] data_mat = self.__data[:, :3] * vec_mat
-        self.__data[:, 3] += np.sum(data_mat, axis=1)
+        cdef double x = vec3.__data[0]
+        cdef double y = vec3.__data[1]
+        cdef double z = vec3.__data[2]
+        cdef int i
+
+        for i in range(4):
+            self.__data[i * 4 + 3] += self.__data[i * 4] * x + self.__data[i * 4 + 1] * y + self.__data[i * 4 + 2] * z
 
     # 縮尺行列
     cpdef scale(self, MVector3D vec3):
-        cdef np.ndarray[DTYPE_FLOAT_t, ndim=2] vec_mat = np.array([[vec3.x(), vec3.y(), vec3.z()], 
-                                                                   [vec3.x(), vec3.y(), vec3.z()], 
-                                                                   [vec3.x(), vec3.y(), vec3.z()], 
-                                                                   [vec3.x(), vec3.y(), vec3.z()]], dtype=np.float64)
-        self.__data[:, :3] *= vec_mat
+        cdef int i
+
+        for i in range(4):
+            self.__data[i * 4] *= vec3.__data[0]
+            self.__data[i * 4 + 1] *= vec3.__data[1]
+            self.__data[i * 4 + 2] *= vec3.__data[2]
         
     # 単位行列
     cpdef setToIdentity(self):
-        self.__data = np.eye(4, dtype=np.float64)
+        cdef int i
+
+        for i in range(16):
+            self.__data[i] = 1.0 if i % 5 == 0 else 0.0
     
     cpdef lookAt(self, MVector3D eye, MVector3D center, MVector3D up):
         cdef MVector3D forward = center - eye
@@ -1496,10 +1780,11 @@ cdef class MMatrix4x4:
         cdef MVector3D upVector = crossProduct_MVector3D(side, forward)
 
         cdef MMatrix4x4 m = MMatrix4x4()
-        m.__data[0, :-1] = side.data()
-        m.__data[1, :-1] = upVector.data()
-        m.__data[2, :-1] = -forward.data()
-        m.__data[-1, -1] = 1.0
+        cdef np.ndarray[DTYPE_FLOAT_t, ndim=2] m_data = m.data()
+        m_data[0, :-1] = side.data()
+        m_data[1, :-1] = upVector.data()
+        m_data[2, :-1] = -forward.data()
+        m_data[-1, -1] = 1.0
 
         self *= m
         self.translate(-eye)
@@ -1518,58 +1803,25 @@ cdef class MMatrix4x4:
         cdef double clip = farPlane - nearPlane
 
         cdef MMatrix4x4 m = MMatrix4x4()
-        m.__data[0, 0] = cotan / aspectRatio
-        m.__data[1, 1] = cotan
-        m.__data[2, 2] = -(nearPlane + farPlane) / clip
-        m.__data[2, 3] = -(2 * nearPlane * farPlane) / clip
-        m.__data[3, 2] = -1
+        m.__data[0] = cotan / aspectRatio
+        m.__data[5] = cotan
+        m.__data[10] = -(nearPlane + farPlane) / clip
+        m.__data[11] = -(2 * nearPlane * farPlane) / clip
+        m.__data[14] = -1
 
         self *= m
     
     cpdef MVector3D mapVector(self, MVector3D vector):
-        cdef np.ndarray[DTYPE_FLOAT_t, ndim=1] vec_mat = np.array([vector.x(), vector.y(), vector.z()])
-        cdef np.ndarray[DTYPE_FLOAT_t, ndim=1] xyz = np.sum(vec_mat * self.__data[:3, :3], axis=1)
+        cdef double x = vector.__data[0]
+        cdef double y = vector.__data[1]
+        cdef double z = vector.__data[2]
+        cdef double* m = self.__data
 
-        return MVector3D(xyz[0], xyz[1], xyz[2])
+        return new_MVector3D(m[0] * x + m[1] * y + m[2] * z, m[4] * x + m[5] * y + m[6] * z, m[8] * x + m[9] * y + m[10] * z)
     
     cpdef MQuaternion toQuaternion(self):
-        cdef np.ndarray[DTYPE_FLOAT_t, ndim=2] a = np.array([[self.__data[0, 0], self.__data[0, 1], self.__data[0, 2], self.__data[0, 3]],
-                                                             [self.__data[1, 0], self.__data[1, 1], self.__data[1, 2], self.__data[1, 3]],
-                                                             [self.__data[2, 0], self.__data[2, 1], self.__data[2, 2], self.__data[2, 3]],
-                                                             [self.__data[3, 0], self.__data[3, 1], self.__data[3, 2], self.__data[3, 3]]], dtype=np.float64)
-        
-        cdef MQuaternion q = MQuaternion()
-        cdef DTYPE_FLOAT_t trace, s
-
-        # I removed + 1
-        trace = a[0,0] + a[1,1] + a[2,2]
-        # I changed M_EPSILON to 0
-        if trace > 0:
-            s = 0.5 / sqrt(trace + 1)
-            q.setScalar(0.25 / s)
-            q.setX((a[2,1] - a[1,2]) * s)
-            q.setY((a[0,2] - a[2,0]) * s)
-            q.setZ((a[1,0] - a[0,1]) * s)
-        else:
-            if a[0,0] > a[1,1] and a[0,0] > a[2,2]:
-                s = 2 * sqrt(1 + a[0,0] - a[1,1] - a[2,2])
-                q.setScalar((a[2,1] - a[1,2]) / s)
-                q.setX(0.25 * s)
-                q.setY((a[0,1] + a[1,0]) / s)
-                q.setZ((a[0,2] + a[2,0]) / s)
-            elif a[1,1] > a[2,2]:
-                s = 2 * sqrt(1 + a[1,1] - a[0,0] - a[2,2])
-                q.setScalar((a[0,2] - a[2,0]) / s)
-                q.setX((a[0,1] + a[1,0]) / s)
-                q.setY(0.25 * s)
-                q.setZ((a[1,2] + a[2,1]) / s)
-            else:
-                s = 2 * sqrt(1 + a[2,2] - a[0,0] - a[1,1])
-                q.setScalar((a[1,0] - a[0,1]) / s)
-                q.setX((a[0,2] + a[2,0]) / s)
-                q.setY((a[1,2] + a[2,1]) / s)
-                q.setZ(0.25 * s)
-
+        cdef MQuaternion q = MQuaternion.__new__(MQuaternion)
+        matrix_to_quaternion(self.__data, q.__data)
         return q
 
     def __str__(self):
@@ -1582,9 +1834,27 @@ cdef class MMatrix4x4:
         return np.all(np.less_equal(self.data(), other.data()))
 
     def __eq__(self, other):
+        cdef MMatrix4x4 mat
+        cdef int i
+        if isinstance(other, MMatrix4x4):
+            mat = other
+            for i in range(16):
+                if not self.__data[i] == mat.__data[i]:
+                    return False
+            return True
+
         return np.all(np.equal(self.data(), other.data()))
 
     def __ne__(self, other):
+        cdef MMatrix4x4 mat
+        cdef int i
+        if isinstance(other, MMatrix4x4):
+            mat = other
+            for i in range(16):
+                if self.__data[i] != mat.__data[i]:
+                    return True
+            return False
+
         return np.any(np.not_equal(self.data(), other.data()))
 
     def __gt__(self, other):
@@ -1594,122 +1864,990 @@ cdef class MMatrix4x4:
         return np.all(np.greater_equal(self.data(), other.data()))
 
     def __add__(self, other):
-        if isinstance(other, np.float):
-            v = self.add_float(other)
-        elif isinstance(other, MMatrix4x4):
-            v = self.add_MMatrix4x4(other)
-        elif isinstance(other, np.int):
-            v = self.add_int(other)
-        else:
-            v = self.data() + other
-        v2 = self.__class__(v)
-        return v2
+        cdef MMatrix4x4 m1 = self
+        cdef MMatrix4x4 m2
+        cdef MMatrix4x4 mat
+        cdef double f
+        cdef int i
+
+        if isinstance(other, MMatrix4x4):
+            m2 = other
+            mat = MMatrix4x4.__new__(MMatrix4x4)
+            for i in range(16):
+                mat.__data[i] = m1.__data[i] + m2.__data[i]
+            return mat
+        elif isinstance(other, (float, int)):
+            f = other
+            mat = MMatrix4x4.__new__(MMatrix4x4)
+            for i in range(16):
+                mat.__data[i] = m1.__data[i] + f
+            return mat
+
+        return m1.__class__(m1.data() + other)
     
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=2] add_MMatrix4x4(self, MMatrix4x4 other):
-        return self.__data + other.__data
+        return self.data() + other.data()
 
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=2] add_float(self, DTYPE_FLOAT_t other):
-        return self.__data + other
+        return self.data() + other
 
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=2] add_int(self, DTYPE_INT_t other):
-        return self.__data + other
+        return self.data() + other
 
     def __sub__(self, other):
-        if isinstance(other, np.float):
-            v = self.sub_float(other)
-        elif isinstance(other, MMatrix4x4):
-            v = self.sub_MMatrix4x4(other)
-        elif isinstance(other, np.int):
-            v = self.sub_int(other)
-        else:
-            v = self.data() - other
-        v2 = self.__class__(v)
-        return v2
+        cdef MMatrix4x4 m1 = self
+        cdef MMatrix4x4 m2
+        cdef MMatrix4x4 mat
+        cdef double f
+        cdef int i
+
+        if isinstance(other, MMatrix4x4):
+            m2 = other
+            mat = MMatrix4x4.__new__(MMatrix4x4)
+            for i in range(16):
+                mat.__data[i] = m1.__data[i] - m2.__data[i]
+            return mat
+        elif isinstance(other, (float, int)):
+            f = other
+            mat = MMatrix4x4.__new__(MMatrix4x4)
+            for i in range(16):
+                mat.__data[i] = m1.__data[i] - f
+            return mat
+
+        return m1.__class__(m1.data() - other)
     
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=2] sub_MMatrix4x4(self, MMatrix4x4 other):
-        return self.__data - other.__data
+        return self.data() - other.data()
 
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=2] sub_float(self, DTYPE_FLOAT_t other):
-        return self.__data - other
+        return self.data() - other
 
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=2] sub_int(self, DTYPE_INT_t other):
-        return self.__data - other
+        return self.data() - other
 
     def __mul__(self, other):
-        if isinstance(other, np.float):
-            v = self.mul_float(other)
-        elif isinstance(other, MMatrix4x4):
-            v = self.mul_MMatrix4x4(other)
+        cdef MMatrix4x4 m1 = self
+        cdef MMatrix4x4 m2
+        cdef MMatrix4x4 mat
+        cdef double f
+        cdef int i
+
+        if isinstance(other, MMatrix4x4):
+            m2 = other
+            mat = MMatrix4x4.__new__(MMatrix4x4)
+            multiply_matrix(m1.__data, m2.__data, mat.__data)
+            return mat
         elif isinstance(other, MVector3D):
-            return self.mul_MVector3D(other)
+            return m1.mul_MVector3D(other)
         elif isinstance(other, MVector4D):
-            return self.mul_MVector4D(other)
-        elif isinstance(other, np.int):
-            v = self.mul_int(other)
-        else:
-            v = self.data() * other
-        v2 = self.__class__(v)
-        return v2
+            return m1.mul_MVector4D(other)
+        elif isinstance(other, (float, int)):
+            f = other
+            mat = MMatrix4x4.__new__(MMatrix4x4)
+            for i in range(16):
+                mat.__data[i] = m1.__data[i] * f
+            return mat
+        elif isinstance(other, (MMatrix4x4Array, MVector3DArray)):
+            # 配列側で計算する
+            return NotImplemented
+
+        return m1.__class__(m1.data() * other)
     
     cpdef MVector3D mul_MVector3D(self, MVector3D other):
-        cdef np.ndarray[DTYPE_FLOAT_t, ndim=2] vec_mat = np.array([[other.x(), other.y(), other.z()], 
-                                                                   [other.x(), other.y(), other.z()], 
-                                                                   [other.x(), other.y(), other.z()], 
-                                                                   [other.x(), other.y(), other.z()]], dtype=np.float64)
-        cdef np.ndarray[DTYPE_FLOAT_t, ndim=1] data_sum = np.sum(vec_mat * self.__data[:, :3], axis=1) + self.__data[:, 3]
-
-        cdef DTYPE_FLOAT_t x = data_sum[0]
-        cdef DTYPE_FLOAT_t y = data_sum[1]
-        cdef DTYPE_FLOAT_t z = data_sum[2]
-        cdef DTYPE_FLOAT_t w = data_sum[3]
-
-        if w == 1.0:
-            return MVector3D(x, y, z)
-        elif w == 0.0:
-            return MVector3D()
-        else:
-            return MVector3D(x / w, y / w, z / w)
+        cdef MVector3D v = MVector3D.__new__(MVector3D)
+        transform_vector(self.__data, other.__data, v.__data)
+        return v
 
     cpdef MVector4D mul_MVector4D(self, MVector4D other):
-        cdef np.ndarray[DTYPE_FLOAT_t, ndim=2] vec_mat = np.array([[other.x(), other.y(), other.z(), other.w()], 
-                                                                   [other.x(), other.y(), other.z(), other.w()], 
-                                                                   [other.x(), other.y(), other.z(), other.w()], 
-                                                                   [other.x(), other.y(), other.z(), other.w()]], dtype=np.float64)
-        cdef np.ndarray[DTYPE_FLOAT_t, ndim=1] data_sum = np.sum(vec_mat * self.__data, axis=1)
+        cdef double vx = other.x()
+        cdef double vy = other.y()
+        cdef double vz = other.z()
+        cdef double vw = other.w()
+        cdef double* m = self.__data
 
-        cdef DTYPE_FLOAT_t x = data_sum[0]
-        cdef DTYPE_FLOAT_t y = data_sum[1]
-        cdef DTYPE_FLOAT_t z = data_sum[2]
-        cdef DTYPE_FLOAT_t w = data_sum[3]
+        cdef DTYPE_FLOAT_t x = m[0] * vx + m[1] * vy + m[2] * vz + m[3] * vw
+        cdef DTYPE_FLOAT_t y = m[4] * vx + m[5] * vy + m[6] * vz + m[7] * vw
+        cdef DTYPE_FLOAT_t z = m[8] * vx + m[9] * vy + m[10] * vz + m[11] * vw
+        cdef DTYPE_FLOAT_t w = m[12] * vx + m[13] * vy + m[14] * vz + m[15] * vw
 
         return MVector4D(x, y, z, w)
 
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=2] mul_MMatrix4x4(self, MMatrix4x4 other):
-        return np.dot(self.data(), other.data())
+        cdef MMatrix4x4 mat = MMatrix4x4.__new__(MMatrix4x4)
+        multiply_matrix(self.__data, other.__data, mat.__data)
+        return mat.data()
 
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=2] mul_float(self, DTYPE_FLOAT_t other):
-        return self.__data * other
+        return self.data() * other
 
     cpdef np.ndarray[DTYPE_FLOAT_t, ndim=2] mul_int(self, DTYPE_INT_t other):
-        return self.__data * other
+        return self.data() * other
 
     def __iadd__(self, other):
-        self.__data = self.data() + other.data().T
+        self.data()[:] = self.data() + other.data().T
         return self
 
     def __isub__(self, other):
-        self.__data = self.data() + other.data().T
+        self.data()[:] = self.data() + other.data().T
         return self
 
     def __imul__(self, other):
-        self.__data = np.dot(self.data(), other.data())
+        cdef MMatrix4x4 mat = other
+        multiply_matrix(self.__data, mat.__data, self.__data)
 
         return self
 
     def __itruediv__(self, other):
-        self.__data = self.data() / other.data().T
+        self.data()[:] = self.data() / other.data().T
+        return self
+
+
+# 行列の積（4x4、行優先。結果は一旦別の領域で計算するので、m1, m2と同じ領域でもよい）
+cdef inline void multiply_matrix(double* m1, double* m2, double* result):
+    cdef double tmp[16]
+    cdef int i, j
+
+    for i in range(4):
+        for j in range(4):
+            tmp[i * 4 + j] = m1[i * 4] * m2[j] + m1[i * 4 + 1] * m2[4 + j] + m1[i * 4 + 2] * m2[8 + j] + m1[i * 4 + 3] * m2[12 + j]
+
+    for i in range(16):
+        result[i] = tmp[i]
+
+
+# 行列×ベクトル（w成分で割る）
+@cython.cdivision(True)
+cdef inline void transform_vector(double* m, double* v, double* result):
+    cdef double x = m[0] * v[0] + m[1] * v[1] + m[2] * v[2] + m[3]
+    cdef double y = m[4] * v[0] + m[5] * v[1] + m[6] * v[2] + m[7]
+    cdef double z = m[8] * v[0] + m[9] * v[1] + m[10] * v[2] + m[11]
+    cdef double w = m[12] * v[0] + m[13] * v[1] + m[14] * v[2] + m[15]
+
+    if w == 1.0:
+        result[0] = x
+        result[1] = y
+        result[2] = z
+    elif w == 0.0:
+        result[0] = 0
+        result[1] = 0
+        result[2] = 0
+    else:
+        result[0] = x / w
+        result[1] = y / w
+        result[2] = z / w
+
+
+# 回転行列からクォータニオン
+cdef inline int matrix_to_quaternion(double* a, double* q) except -1:
+    cdef double trace, s
+
+    q[0] = 1.0
+    q[1] = 0.0
+    q[2] = 0.0
+    q[3] = 0.0
+
+    # I removed + 1
+    trace = a[0] + a[5] + a[10]
+    # I changed M_EPSILON to 0
+    if trace > 0:
+        s = 0.5 / sqrt(trace + 1)
+        q[0] = 0.25 / s
+        q[1] = (a[9] - a[6]) * s
+        q[2] = (a[2] - a[8]) * s
+        q[3] = (a[4] - a[1]) * s
+    else:
+        if a[0] > a[5] and a[0] > a[10]:
+            s = 2 * sqrt(1 + a[0] - a[5] - a[10])
+            q[0] = (a[9] - a[6]) / s
+            q[1] = 0.25 * s
+            q[2] = (a[1] + a[4]) / s
+            q[3] = (a[2] + a[8]) / s
+        elif a[5] > a[10]:
+            s = 2 * sqrt(1 + a[5] - a[0] - a[10])
+            q[0] = (a[2] - a[8]) / s
+            q[1] = (a[1] + a[4]) / s
+            q[2] = 0.25 * s
+            q[3] = (a[6] + a[9]) / s
+        else:
+            s = 2 * sqrt(1 + a[10] - a[0] - a[5])
+            q[0] = (a[4] - a[1]) / s
+            q[1] = (a[2] + a[8]) / s
+            q[2] = (a[6] + a[9]) / s
+            q[3] = 0.25 * s
+
+    return 0
+
+
+# 配列の件数（片方が1件の場合、全件に同じ値を使う）
+cdef Py_ssize_t broadcast_count(Py_ssize_t n1, Py_ssize_t n2) except -1:
+    if n1 == n2 or n2 == 1:
+        return n1
+    if n1 == 1:
+        return n2
+    raise ValueError("array length mismatch: %s, %s" % (n1, n2))
+
+
+cdef inline double* array_ptr(np.ndarray arr):
+    return <double*>np.PyArray_DATA(arr)
+
+
+# 係数の配列（N件、またはスカラー）
+cdef np.ndarray scalar_values(object values):
+    return np.ascontiguousarray(values, dtype=np.float64).reshape(-1)
+
+
+# N×3[x, y, z]
+cdef np.ndarray vector3d_values(object values):
+    if isinstance(values, MVector3DArray):
+        return (<MVector3DArray>values).__data
+    elif isinstance(values, MVector3D):
+        return np.array([(<MVector3D>values).__data], dtype=np.float64)
+    elif isinstance(values, (list, tuple)):
+        return np.array([v.data() if isinstance(v, MVector3D) else v for v in values], dtype=np.float64).reshape(-1, 3)
+
+    return np.ascontiguousarray(values, dtype=np.float64).reshape(-1, 3)
+
+
+# N×4[w, x, y, z]
+cdef np.ndarray quaternion_values(object values):
+    if isinstance(values, MQuaternionArray):
+        return (<MQuaternionArray>values).__data
+    elif isinstance(values, MQuaternion):
+        return np.array([(<MQuaternion>values).__data], dtype=np.float64)
+    elif isinstance(values, (list, tuple)):
+        return np.array([[v.scalar(), v.x(), v.y(), v.z()] if isinstance(v, MQuaternion) else v for v in values], dtype=np.float64).reshape(-1, 4)
+    elif isinstance(values, np.ndarray) and values.dtype == np.quaternion:
+        return np.ascontiguousarray(quaternion.as_float_array(values), dtype=np.float64).reshape(-1, 4)
+
+    return np.ascontiguousarray(values, dtype=np.float64).reshape(-1, 4)
+
+
+# N×4×4
+cdef np.ndarray matrix4x4_values(object values):
+    if isinstance(values, MMatrix4x4Array):
+        return (<MMatrix4x4Array>values).__data
+    elif isinstance(values, MMatrix4x4):
+        return np.array([(<MMatrix4x4>values).__data], dtype=np.float64).reshape(-1, 4, 4)
+    elif isinstance(values, (list, tuple)):
+        return np.array([v.data() if isinstance(v, MMatrix4x4) else v for v in values], dtype=np.float64).reshape(-1, 4, 4)
+
+    return np.ascontiguousarray(values, dtype=np.float64).reshape(-1, 4, 4)
+
+
+# 演算用の値（ベクトルはN×3、1次元配列は要素ごとの係数としてN×1）
+cdef object vector3d_operand(object v):
+    if isinstance(v, (MVector3DArray, MVector3D)):
+        return vector3d_values(v)
+    elif isinstance(v, np.ndarray) and v.ndim == 1:
+        return v.reshape(-1, 1)
+    return v
+
+
+# NaN, infは0にする
+cdef np.ndarray effective_values(np.ndarray values):
+    values[~np.isfinite(values)] = 0
+    return values
+
+
+# 3次元ベクトルの配列（1トラック分などをまとめて計算する）
+cdef class MVector3DArray:
+
+    def __init__(self, values=None):
+        if values is None:
+            self.__data = np.zeros((0, 3), dtype=np.float64)
+        else:
+            self.__data = np.array(vector3d_values(values), dtype=np.float64)
+
+    def __reduce__(self):
+        return (MVector3DArray, (self.__data,))
+
+    cpdef MVector3DArray copy(self):
+        return new_MVector3DArray(self.__data.copy())
+
+    def __len__(self):
+        return len(self.__data)
+
+    def __getitem__(self, idx):
+        cdef double* v
+        cdef Py_ssize_t i
+        if isinstance(idx, (int, np.integer)):
+            i = idx if idx >= 0 else idx + len(self.__data)
+            if not 0 <= i < len(self.__data):
+                raise IndexError(idx)
+            v = array_ptr(self.__data) + i * 3
+            return new_MVector3D(v[0], v[1], v[2])
+
+        return new_MVector3DArray(np.array(self.__data[idx], dtype=np.float64).reshape(-1, 3))
+
+    def __setitem__(self, idx, value):
+        self.__data[idx] = vector3d_values(value)
+
+    def __str__(self):
+        return "MVector3DArray({0})".format(self.__data)
+
+    # N×3（配列への変更はそのまま反映される）
+    cpdef np.ndarray data(self):
+        return self.__data
+
+    cpdef list to_list(self):
+        cdef double* v = array_ptr(self.__data)
+        cdef Py_ssize_t i
+        return [new_MVector3D(v[i * 3], v[i * 3 + 1], v[i * 3 + 2]) for i in range(len(self.__data))]
+
+    cpdef np.ndarray x(self):
+        return self.__data[:, 0]
+
+    cpdef np.ndarray y(self):
+        return self.__data[:, 1]
+
+    cpdef np.ndarray z(self):
+        return self.__data[:, 2]
+
+    cpdef np.ndarray lengthSquared(self):
+        cdef double* v = array_ptr(self.__data)
+        cdef np.ndarray result = np.empty(len(self.__data), dtype=np.float64)
+        cdef double* r = array_ptr(result)
+        cdef Py_ssize_t i
+
+        for i in range(len(self.__data)):
+            r[i] = v[i * 3] * v[i * 3] + v[i * 3 + 1] * v[i * 3 + 1] + v[i * 3 + 2] * v[i * 3 + 2]
+
+        return result
+
+    cpdef np.ndarray length(self):
+        return np.sqrt(self.lengthSquared())
+
+    cpdef MVector3DArray normalized(self):
+        cdef MVector3DArray result = new_MVector3DArray(np.empty_like(self.__data))
+        cdef double* v = array_ptr(self.__data)
+        cdef double* r = array_ptr(result.__data)
+        cdef Py_ssize_t i
+
+        for i in range(len(self.__data)):
+            normalize_vector(v + i * 3, r + i * 3)
+
+        return result
+
+    cpdef normalize(self):
+        self.effective()
+        cdef double* v = array_ptr(self.__data)
+        cdef Py_ssize_t i
+
+        for i in range(len(self.__data)):
+            normalize_vector(v + i * 3, v + i * 3)
+
+    cpdef MVector3DArray effective(self):
+        effective_values(self.__data)
+        return self
+
+    @classmethod
+    def crossProduct(cls, v1s, v2s):
+        cdef np.ndarray a = vector3d_values(v1s)
+        cdef np.ndarray b = vector3d_values(v2s)
+        cdef Py_ssize_t cnt = broadcast_count(len(a), len(b))
+        cdef Py_ssize_t a_step = 0 if len(a) == 1 else 3
+        cdef Py_ssize_t b_step = 0 if len(b) == 1 else 3
+        cdef MVector3DArray result = new_MVector3DArray(np.empty((cnt, 3), dtype=np.float64))
+        cdef double* pa = array_ptr(a)
+        cdef double* pb = array_ptr(b)
+        cdef double* r = array_ptr(result.__data)
+        cdef Py_ssize_t i
+
+        for i in range(cnt):
+            cross_vector(pa + i * a_step, pb + i * b_step, r + i * 3)
+
+        return result
+
+    @classmethod
+    def dotProduct(cls, v1s, v2s):
+        cdef np.ndarray a = vector3d_values(v1s)
+        cdef np.ndarray b = vector3d_values(v2s)
+        cdef Py_ssize_t cnt = broadcast_count(len(a), len(b))
+        cdef Py_ssize_t a_step = 0 if len(a) == 1 else 3
+        cdef Py_ssize_t b_step = 0 if len(b) == 1 else 3
+        cdef np.ndarray result = np.empty(cnt, dtype=np.float64)
+        cdef double* pa = array_ptr(a)
+        cdef double* pb = array_ptr(b)
+        cdef double* r = array_ptr(result)
+        cdef Py_ssize_t i
+
+        for i in range(cnt):
+            r[i] = pa[i * a_step] * pb[i * b_step] + pa[i * a_step + 1] * pb[i * b_step + 1] + pa[i * a_step + 2] * pb[i * b_step + 2]
+
+        return result
+
+    # 演算は要素ごと（MVector3Dは全件に、1次元配列は件数分の係数として適用する）
+    def __add__(self, other):
+        return new_MVector3DArray(effective_values(np.add(vector3d_operand(self), vector3d_operand(other), dtype=np.float64)))
+
+    def __sub__(self, other):
+        return new_MVector3DArray(effective_values(np.subtract(vector3d_operand(self), vector3d_operand(other), dtype=np.float64)))
+
+    def __mul__(self, other):
+        if isinstance(self, MMatrix4x4):
+            return transform_vectors(matrix4x4_values(self), vector3d_values(other))
+        elif isinstance(self, MQuaternion):
+            return transform_vectors(matrix4x4_values(self.toMatrix4x4()), vector3d_values(other))
+
+        return new_MVector3DArray(effective_values(np.multiply(vector3d_operand(self), vector3d_operand(other), dtype=np.float64)))
+
+    def __truediv__(self, other):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return new_MVector3DArray(effective_values(np.true_divide(vector3d_operand(self), vector3d_operand(other), dtype=np.float64)))
+
+    def __neg__(self):
+        return new_MVector3DArray(-self.__data)
+
+
+cdef inline MVector3DArray new_MVector3DArray(np.ndarray values):
+    cdef MVector3DArray vs = MVector3DArray.__new__(MVector3DArray)
+    vs.__data = np.ascontiguousarray(values, dtype=np.float64).reshape(-1, 3)
+    return vs
+
+
+# クォータニオンの配列（1トラック分などをまとめて計算する）
+cdef class MQuaternionArray:
+
+    def __init__(self, values=None):
+        if values is None:
+            self.__data = np.zeros((0, 4), dtype=np.float64)
+        else:
+            self.__data = np.array(quaternion_values(values), dtype=np.float64)
+
+    def __reduce__(self):
+        return (MQuaternionArray, (self.__data,))
+
+    cpdef MQuaternionArray copy(self):
+        return new_MQuaternionArray(self.__data.copy())
+
+    def __len__(self):
+        return len(self.__data)
+
+    def __getitem__(self, idx):
+        cdef double* q
+        cdef Py_ssize_t i
+        if isinstance(idx, (int, np.integer)):
+            i = idx if idx >= 0 else idx + len(self.__data)
+            if not 0 <= i < len(self.__data):
+                raise IndexError(idx)
+            q = array_ptr(self.__data) + i * 4
+            return new_MQuaternion(q[0], q[1], q[2], q[3])
+
+        return new_MQuaternionArray(np.array(self.__data[idx], dtype=np.float64).reshape(-1, 4))
+
+    def __setitem__(self, idx, value):
+        self.__data[idx] = quaternion_values(value)
+
+    def __str__(self):
+        return "MQuaternionArray({0})".format(self.__data)
+
+    # N×4[w, x, y, z]（配列への変更はそのまま反映される）
+    cpdef np.ndarray data(self):
+        return self.__data
+
+    cpdef list to_list(self):
+        cdef double* q = array_ptr(self.__data)
+        cdef Py_ssize_t i
+        return [new_MQuaternion(q[i * 4], q[i * 4 + 1], q[i * 4 + 2], q[i * 4 + 3]) for i in range(len(self.__data))]
+
+    cpdef np.ndarray scalar(self):
+        return self.__data[:, 0]
+
+    cpdef np.ndarray x(self):
+        return self.__data[:, 1]
+
+    cpdef np.ndarray y(self):
+        return self.__data[:, 2]
+
+    cpdef np.ndarray z(self):
+        return self.__data[:, 3]
+
+    cpdef MVector3DArray vector(self):
+        return new_MVector3DArray(self.__data[:, 1:])
+
+    cpdef np.ndarray length(self):
+        cdef double* q = array_ptr(self.__data)
+        cdef np.ndarray result = np.empty(len(self.__data), dtype=np.float64)
+        cdef double* r = array_ptr(result)
+        cdef Py_ssize_t i
+
+        for i in range(len(self.__data)):
+            r[i] = sqrt(q[i * 4] * q[i * 4] + q[i * 4 + 1] * q[i * 4 + 1] + q[i * 4 + 2] * q[i * 4 + 2] + q[i * 4 + 3] * q[i * 4 + 3])
+
+        return result
+
+    cpdef np.ndarray lengthSquared(self):
+        cdef np.ndarray l = self.length()
+        return l * l
+
+    cpdef MQuaternionArray inverted(self):
+        cdef MQuaternionArray result = new_MQuaternionArray(np.empty_like(self.__data))
+        cdef double* q = array_ptr(self.__data)
+        cdef double* r = array_ptr(result.__data)
+        cdef Py_ssize_t i
+
+        for i in range(len(self.__data)):
+            invert_quaternion(q + i * 4, r + i * 4)
+
+        return result
+
+    cpdef MQuaternionArray normalized(self):
+        cdef MQuaternionArray result = new_MQuaternionArray(np.empty_like(self.__data))
+        cdef double* q = array_ptr(self.__data)
+        cdef double* r = array_ptr(result.__data)
+        cdef Py_ssize_t i
+
+        for i in range(len(self.__data)):
+            normalize_quaternion(q + i * 4, r + i * 4)
+
+        return result
+
+    cpdef normalize(self):
+        cdef double* q = array_ptr(self.__data)
+        cdef Py_ssize_t i
+
+        for i in range(len(self.__data)):
+            normalize_quaternion(q + i * 4, q + i * 4)
+
+    cpdef MQuaternionArray effective(self):
+        cdef double* q = array_ptr(self.__data)
+        cdef Py_ssize_t i
+
+        for i in range(len(self.__data)):
+            if fabs(q[i * 4]) <= 1e-08 and fabs(q[i * 4 + 1]) <= 1e-08 and fabs(q[i * 4 + 2]) <= 1e-08 and fabs(q[i * 4 + 3]) <= 1e-08:
+                # すべてが0の場合、scalarだけ1に設定する
+                q[i * 4] = 1
+
         return self
 
+    cpdef MMatrix4x4Array toMatrix4x4(self):
+        cdef MMatrix4x4Array result = new_MMatrix4x4Array(np.empty((len(self.__data), 4, 4), dtype=np.float64))
+        cdef double* q = array_ptr(self.__data)
+        cdef double* m = array_ptr(result.__data)
+        cdef Py_ssize_t i
+
+        for i in range(len(self.__data)):
+            quaternion_to_matrix(q + i * 4, m + i * 16)
+
+        return result
+
+    cpdef MVector3DArray toEulerAngles(self):
+        cdef MVector3DArray result = new_MVector3DArray(np.empty((len(self.__data), 3), dtype=np.float64))
+        cdef double* q = array_ptr(self.__data)
+        cdef double* e = array_ptr(result.__data)
+        cdef Py_ssize_t i
+
+        for i in range(len(self.__data)):
+            quaternion_to_euler(q + i * 4, e + i * 3)
+
+        return result
+
+    cpdef MVector3DArray toEulerAngles4MMD(self):
+        # MMDの表記に合わせたオイラー角
+        cdef MVector3DArray result = self.toEulerAngles()
+        result.__data[:, 1:] *= -1
+        return result
+
+    # 角度に変換
+    cpdef np.ndarray toDegree(self):
+        cdef double* q = array_ptr(self.__data)
+        cdef np.ndarray result = np.empty(len(self.__data), dtype=np.float64)
+        cdef double* r = array_ptr(result)
+        cdef double w
+        cdef Py_ssize_t i
+
+        for i in range(len(self.__data)):
+            w = q[i * 4]
+            w = w if w > -1 else -1
+            w = w if w < 1 else 1
+            r[i] = (2 * acos(w)) * RAD_TO_DEG
+
+        return result
+
+    @classmethod
+    def dotProduct(cls, q1s, q2s):
+        cdef np.ndarray a = quaternion_values(q1s)
+        cdef np.ndarray b = quaternion_values(q2s)
+        cdef Py_ssize_t cnt = broadcast_count(len(a), len(b))
+        cdef Py_ssize_t a_step = 0 if len(a) == 1 else 4
+        cdef Py_ssize_t b_step = 0 if len(b) == 1 else 4
+        cdef np.ndarray result = np.empty(cnt, dtype=np.float64)
+        cdef double* pa = array_ptr(a)
+        cdef double* pb = array_ptr(b)
+        cdef double* r = array_ptr(result)
+        cdef Py_ssize_t i, j
+
+        for i in range(cnt):
+            j = i * a_step
+            r[i] = pa[j] * pb[i * b_step] + pa[j + 1] * pb[i * b_step + 1] + pa[j + 2] * pb[i * b_step + 2] + pa[j + 3] * pb[i * b_step + 3]
+
+        return result
+
+    # axes: MVector3D or MVector3DArray, angles: 度
+    @classmethod
+    def fromAxisAndAngle(cls, axes, angles):
+        cdef np.ndarray v = vector3d_values(axes)
+        cdef np.ndarray a = scalar_values(angles)
+        cdef Py_ssize_t cnt = broadcast_count(len(v), len(a))
+        cdef Py_ssize_t v_step = 0 if len(v) == 1 else 3
+        cdef Py_ssize_t a_step = 0 if len(a) == 1 else 1
+        cdef MQuaternionArray result = new_MQuaternionArray(np.empty((cnt, 4), dtype=np.float64))
+        cdef double* pv = array_ptr(v)
+        cdef double* pa = array_ptr(a)
+        cdef double* r = array_ptr(result.__data)
+        cdef Py_ssize_t i
+
+        for i in range(cnt):
+            axis_angle_to_quaternion(pv + i * v_step, pa[i * a_step], r + i * 4)
+
+        return result
+
+    # pitches, yaws, rolls: 度
+    @classmethod
+    def fromEulerAngles(cls, pitches, yaws, rolls):
+        cdef np.ndarray p = scalar_values(pitches)
+        cdef np.ndarray y = scalar_values(yaws)
+        cdef np.ndarray ro = scalar_values(rolls)
+        cdef Py_ssize_t cnt = broadcast_count(broadcast_count(len(p), len(y)), len(ro))
+        cdef Py_ssize_t p_step = 0 if len(p) == 1 else 1
+        cdef Py_ssize_t y_step = 0 if len(y) == 1 else 1
+        cdef Py_ssize_t ro_step = 0 if len(ro) == 1 else 1
+        cdef MQuaternionArray result = new_MQuaternionArray(np.empty((cnt, 4), dtype=np.float64))
+        cdef double* pp = array_ptr(p)
+        cdef double* py = array_ptr(y)
+        cdef double* pr = array_ptr(ro)
+        cdef double* r = array_ptr(result.__data)
+        cdef Py_ssize_t i
+
+        for i in range(cnt):
+            euler_to_quaternion(pp[i * p_step], py[i * y_step], pr[i * ro_step], r + i * 4)
+
+        return result
+
+    @classmethod
+    def rotationTo(cls, fromvs, tovs):
+        cdef np.ndarray a = vector3d_values(fromvs)
+        cdef np.ndarray b = vector3d_values(tovs)
+        cdef Py_ssize_t cnt = broadcast_count(len(a), len(b))
+        cdef Py_ssize_t a_step = 0 if len(a) == 1 else 3
+        cdef Py_ssize_t b_step = 0 if len(b) == 1 else 3
+        cdef MQuaternionArray result = new_MQuaternionArray(np.empty((cnt, 4), dtype=np.float64))
+        cdef double* pa = array_ptr(a)
+        cdef double* pb = array_ptr(b)
+        cdef double* r = array_ptr(result.__data)
+        cdef Py_ssize_t i
+
+        for i in range(cnt):
+            rotation_to_quaternion(pa + i * a_step, pb + i * b_step, r + i * 4)
+
+        return result
+
+    @classmethod
+    def nlerp(cls, q1s, q2s, ts):
+        return interpolate_quaternions(quaternion_values(q1s), quaternion_values(q2s), scalar_values(ts), False)
+
+    @classmethod
+    def slerp(cls, q1s, q2s, ts):
+        return interpolate_quaternions(quaternion_values(q1s), quaternion_values(q2s), scalar_values(ts), True)
+
+    def __mul__(self, other):
+        if isinstance(self, MQuaternionArray) and isinstance(other, (MVector3DArray, MVector3D)):
+            # 各クォータニオンでベクトルを回す
+            return self.toMatrix4x4() * other
+        elif isinstance(self, (MQuaternionArray, MQuaternion)) and isinstance(other, (MQuaternionArray, MQuaternion)):
+            return multiply_quaternions(quaternion_values(self), quaternion_values(other))
+        elif isinstance(self, MQuaternionArray) and isinstance(other, (float, int, np.ndarray)):
+            return new_MQuaternionArray(np.multiply((<MQuaternionArray>self).__data, np.reshape(other, (-1, 1)), dtype=np.float64))
+        elif isinstance(other, MQuaternionArray) and isinstance(self, (float, int, np.ndarray)):
+            return new_MQuaternionArray(np.multiply(np.reshape(self, (-1, 1)), (<MQuaternionArray>other).__data, dtype=np.float64))
+
+        return NotImplemented
+
+    def __neg__(self):
+        return new_MQuaternionArray(-self.__data)
+
+
+cdef inline MQuaternionArray new_MQuaternionArray(np.ndarray values):
+    cdef MQuaternionArray qs = MQuaternionArray.__new__(MQuaternionArray)
+    qs.__data = np.ascontiguousarray(values, dtype=np.float64).reshape(-1, 4)
+    return qs
+
+
+cdef MQuaternionArray multiply_quaternions(np.ndarray a, np.ndarray b):
+    cdef Py_ssize_t cnt = broadcast_count(len(a), len(b))
+    cdef Py_ssize_t a_step = 0 if len(a) == 1 else 4
+    cdef Py_ssize_t b_step = 0 if len(b) == 1 else 4
+    cdef MQuaternionArray result = new_MQuaternionArray(np.empty((cnt, 4), dtype=np.float64))
+    cdef double* pa = array_ptr(a)
+    cdef double* pb = array_ptr(b)
+    cdef double* r = array_ptr(result.__data)
+    cdef Py_ssize_t i
+
+    for i in range(cnt):
+        multiply_quaternion(pa + i * a_step, pb + i * b_step, r + i * 4)
+
+    return result
+
+
+# 端（t <= 0, 1 <= t）は補間しない
+cdef MQuaternionArray interpolate_quaternions(np.ndarray q1s, np.ndarray q2s, np.ndarray ts, bint is_slerp):
+    cdef Py_ssize_t cnt = broadcast_count(broadcast_count(len(q1s), len(q2s)), len(ts))
+    cdef Py_ssize_t q1_step = 0 if len(q1s) == 1 else 4
+    cdef Py_ssize_t q2_step = 0 if len(q2s) == 1 else 4
+    cdef Py_ssize_t t_step = 0 if len(ts) == 1 else 1
+    cdef MQuaternionArray result = new_MQuaternionArray(np.empty((cnt, 4), dtype=np.float64))
+    cdef double* q1 = array_ptr(q1s)
+    cdef double* q2 = array_ptr(q2s)
+    cdef double* t = array_ptr(ts)
+    cdef double* r = array_ptr(result.__data)
+    cdef Py_ssize_t i, j
+
+    for i in range(cnt):
+        if t[i * t_step] <= 0.0:
+            for j in range(4):
+                r[i * 4 + j] = q1[i * q1_step + j]
+        elif t[i * t_step] >= 1.0:
+            for j in range(4):
+                r[i * 4 + j] = q2[i * q2_step + j]
+        elif is_slerp:
+            slerp_quaternion(q1 + i * q1_step, q2 + i * q2_step, t[i * t_step], r + i * 4)
+        else:
+            nlerp_quaternion(q1 + i * q1_step, q2 + i * q2_step, t[i * t_step], r + i * 4)
+
+    return result
+
+
+# 4x4行列の配列（1トラック分などをまとめて計算する）
+cdef class MMatrix4x4Array:
+
+    def __init__(self, values=None):
+        if values is None:
+            self.__data = np.zeros((0, 4, 4), dtype=np.float64)
+        else:
+            self.__data = np.array(matrix4x4_values(values), dtype=np.float64)
+
+    def __reduce__(self):
+        return (MMatrix4x4Array, (self.__data,))
+
+    # 単位行列をcnt件
+    @classmethod
+    def identity(cls, cnt):
+        return new_MMatrix4x4Array(np.tile(np.eye(4, dtype=np.float64), (cnt, 1, 1)))
+
+    cpdef MMatrix4x4Array copy(self):
+        return new_MMatrix4x4Array(self.__data.copy())
+
+    def __len__(self):
+        return len(self.__data)
+
+    def __getitem__(self, idx):
+        cdef MMatrix4x4 mat
+        cdef double* m
+        cdef Py_ssize_t i, j
+        if isinstance(idx, (int, np.integer)):
+            i = idx if idx >= 0 else idx + len(self.__data)
+            if not 0 <= i < len(self.__data):
+                raise IndexError(idx)
+            m = array_ptr(self.__data) + i * 16
+            mat = MMatrix4x4.__new__(MMatrix4x4)
+            for j in range(16):
+                mat.__data[j] = m[j]
+            return mat
+
+        return new_MMatrix4x4Array(np.array(self.__data[idx], dtype=np.float64).reshape(-1, 4, 4))
+
+    def __setitem__(self, idx, value):
+        self.__data[idx] = matrix4x4_values(value)
+
+    def __str__(self):
+        return "MMatrix4x4Array({0})".format(self.__data)
+
+    # N×4×4（配列への変更はそのまま反映される）
+    cpdef np.ndarray data(self):
+        return self.__data
+
+    cpdef list to_list(self):
+        return [self[i] for i in range(len(self.__data))]
+
+    # 逆行列
+    cpdef MMatrix4x4Array inverted(self):
+        return new_MMatrix4x4Array(np.linalg.inv(self.__data))
+
+    # 回転行列
+    cpdef rotate(self, qqs):
+        cdef np.ndarray q = quaternion_values(qqs)
+        cdef Py_ssize_t q_step = 0 if len(q) == 1 else 4
+        cdef double* pq = array_ptr(q)
+        cdef double* m = array_ptr(self.__data)
+        cdef double rot[16]
+        cdef Py_ssize_t i
+
+        broadcast_count(len(self.__data), len(q))
+        for i in range(len(self.__data)):
+            quaternion_to_matrix(pq + i * q_step, rot)
+            multiply_matrix(m + i * 16, rot, m + i * 16)
+
+    # 平行移動行列
+    cpdef translate(self, vec3s):
+        cdef np.ndarray v = vector3d_values(vec3s)
+        cdef Py_ssize_t v_step = 0 if len(v) == 1 else 3
+        cdef double* pv = array_ptr(v)
+        cdef double* m = array_ptr(self.__data)
+        cdef double x, y, z
+        cdef Py_ssize_t i, j, k
+
+        broadcast_count(len(self.__data), len(v))
+        for i in range(len(self.__data)):
+            x = pv[i * v_step]
+            y = pv[i * v_step + 1]
+            z = pv[i * v_step + 2]
+            for j in range(4):
+                k = i * 16 + j * 4
+                m[k + 3] += m[k] * x + m[k + 1] * y + m[k + 2] * z
+
+    # 縮尺行列
+    cpdef scale(self, vec3s):
+        cdef np.ndarray v = vector3d_values(vec3s)
+        cdef Py_ssize_t v_step = 0 if len(v) == 1 else 3
+        cdef double* pv = array_ptr(v)
+        cdef double* m = array_ptr(self.__data)
+        cdef Py_ssize_t i, j, k
+
+        broadcast_count(len(self.__data), len(v))
+        for i in range(len(self.__data)):
+            for j in range(4):
+                k = i * 16 + j * 4
+                m[k] *= pv[i * v_step]
+                m[k + 1] *= pv[i * v_step + 1]
+                m[k + 2] *= pv[i * v_step + 2]
+
+    # 単位行列
+    cpdef setToIdentity(self):
+        self.__data[:] = np.eye(4, dtype=np.float64)
+
+    cpdef MVector3DArray mapVector(self, vectors):
+        cdef np.ndarray v = vector3d_values(vectors)
+        cdef Py_ssize_t cnt = broadcast_count(len(self.__data), len(v))
+        cdef Py_ssize_t m_step = 0 if len(self.__data) == 1 else 16
+        cdef Py_ssize_t v_step = 0 if len(v) == 1 else 3
+        cdef MVector3DArray result = new_MVector3DArray(np.empty((cnt, 3), dtype=np.float64))
+        cdef double* m = array_ptr(self.__data)
+        cdef double* pv = array_ptr(v)
+        cdef double* r = array_ptr(result.__data)
+        cdef double x, y, z
+        cdef Py_ssize_t i
+
+        for i in range(cnt):
+            x = pv[i * v_step]
+            y = pv[i * v_step + 1]
+            z = pv[i * v_step + 2]
+            r[i * 3] = m[i * m_step] * x + m[i * m_step + 1] * y + m[i * m_step + 2] * z
+            r[i * 3 + 1] = m[i * m_step + 4] * x + m[i * m_step + 5] * y + m[i * m_step + 6] * z
+            r[i * 3 + 2] = m[i * m_step + 8] * x + m[i * m_step + 9] * y + m[i * m_step + 10] * z
+
+        return result
+
+    cpdef MQuaternionArray toQuaternion(self):
+        cdef MQuaternionArray result = new_MQuaternionArray(np.empty((len(self.__data), 4), dtype=np.float64))
+        cdef double* m = array_ptr(self.__data)
+        cdef double* r = array_ptr(result.__data)
+        cdef Py_ssize_t i
+
+        for i in range(len(self.__data)):
+            matrix_to_quaternion(m + i * 16, r + i * 4)
+
+        return result
+
+    def __mul__(self, other):
+        if isinstance(self, (MMatrix4x4Array, MMatrix4x4)) and isinstance(other, (MMatrix4x4Array, MMatrix4x4)):
+            return multiply_matrices(matrix4x4_values(self), matrix4x4_values(other))
+        elif isinstance(self, (MMatrix4x4Array, MMatrix4x4)) and isinstance(other, (MVector3DArray, MVector3D)):
+            return transform_vectors(matrix4x4_values(self), vector3d_values(other))
+        elif isinstance(self, MMatrix4x4Array) and isinstance(other, (float, int)):
+            return new_MMatrix4x4Array((<MMatrix4x4Array>self).__data * other)
+        elif isinstance(other, MMatrix4x4Array) and isinstance(self, (float, int)):
+            return new_MMatrix4x4Array(self * (<MMatrix4x4Array>other).__data)
+
+        return NotImplemented
+
+    def __imul__(self, other):
+        cdef np.ndarray m2 = matrix4x4_values(other)
+        cdef Py_ssize_t m2_step = 0 if len(m2) == 1 else 16
+        cdef double* pm1 = array_ptr(self.__data)
+        cdef double* pm2 = array_ptr(m2)
+        cdef Py_ssize_t i
+
+        broadcast_count(len(self.__data), len(m2))
+        for i in range(len(self.__data)):
+            multiply_matrix(pm1 + i * 16, pm2 + i * m2_step, pm1 + i * 16)
+
+        return self
+
+
+cdef inline MMatrix4x4Array new_MMatrix4x4Array(np.ndarray values):
+    cdef MMatrix4x4Array ms = MMatrix4x4Array.__new__(MMatrix4x4Array)
+    ms.__data = np.ascontiguousarray(values, dtype=np.float64).reshape(-1, 4, 4)
+    return ms
+
+
+cdef MMatrix4x4Array multiply_matrices(np.ndarray m1s, np.ndarray m2s):
+    cdef Py_ssize_t cnt = broadcast_count(len(m1s), len(m2s))
+    cdef Py_ssize_t m1_step = 0 if len(m1s) == 1 else 16
+    cdef Py_ssize_t m2_step = 0 if len(m2s) == 1 else 16
+    cdef MMatrix4x4Array result = new_MMatrix4x4Array(np.empty((cnt, 4, 4), dtype=np.float64))
+    cdef double* pm1 = array_ptr(m1s)
+    cdef double* pm2 = array_ptr(m2s)
+    cdef double* r = array_ptr(result.__data)
+    cdef Py_ssize_t i
+
+    for i in range(cnt):
+        multiply_matrix(pm1 + i * m1_step, pm2 + i * m2_step, r + i * 16)
+
+    return result
+
+
+cdef MVector3DArray transform_vectors(np.ndarray ms, np.ndarray vs):
+    cdef Py_ssize_t cnt = broadcast_count(len(ms), len(vs))
+    cdef Py_ssize_t m_step = 0 if len(ms) == 1 else 16
+    cdef Py_ssize_t v_step = 0 if len(vs) == 1 else 3
+    cdef MVector3DArray result = new_MVector3DArray(np.empty((cnt, 3), dtype=np.float64))
+    cdef double* pm = array_ptr(ms)
+    cdef double* pv = array_ptr(vs)
+    cdef double* r = array_ptr(result.__data)
+    cdef Py_ssize_t i
+
+    for i in range(cnt):
+        transform_vector(pm + i * m_step, pv + i * v_step, r + i * 3)
+
+    return result
+
+
+# 以下、配列版の関数（N×4[w, x, y, z]の配列のまま受け渡す）
+
+# slerpの配列版（q1s, q2s: N×4[w, x, y, z], ts: N）
+cpdef np.ndarray slerp_array(np.ndarray q1s, np.ndarray q2s, np.ndarray ts):
+    return interpolate_quaternions(quaternion_values(q1s), quaternion_values(q2s), scalar_values(ts), True).__data
+
+# normalizedの配列版（qs: N×4[w, x, y, z]）
+cpdef np.ndarray normalized_array(np.ndarray qs):
+    return new_MQuaternionArray(quaternion_values(qs)).normalized().__data
+
+# クォータニオン積の配列版（q1s, q2s: N×4[w, x, y, z]）
+cpdef np.ndarray multiply_qq_array(np.ndarray q1s, np.ndarray q2s):
+    return multiply_quaternions(quaternion_values(q1s), quaternion_values(q2s)).__data
+
+# invertedの配列版（qs: N×4[w, x, y, z]）
+cpdef np.ndarray inverted_qq_array(np.ndarray qs):
+    return new_MQuaternionArray(quaternion_values(qs)).inverted().__data
+
+# fromAxisAndAngleの配列版（angles: N、度）
+cpdef np.ndarray fromAxisAndAngle_array(MVector3D vec3, np.ndarray angles):
+    return MQuaternionArray.fromAxisAndAngle(vec3, angles).data()
+
+# toMatrix4x4の配列版（qs: N×4[w, x, y, z] -> N×4×4）
+cpdef np.ndarray toMatrix4x4_array(np.ndarray qs):
+    return new_MQuaternionArray(quaternion_values(qs)).toMatrix4x4().__data
+
 
 cpdef bint is_almost_null(v):
     return abs(v) < 0.0000001
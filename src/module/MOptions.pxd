@@ -75,6 +75,7 @@ cdef class MNoiseOptions:
     cdef public int max_workers
     cdef public bint finger_noise_flg
     cdef public bint motivation_flg
+    cdef public object noise_seed
 
 
 cdef class MArmIKtoFKOptions:
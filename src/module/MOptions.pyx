@@ -71,7 +71,7 @@ cdef class MParentOptions:
 cdef class MNoiseOptions:
 
     def __init__(self, str version_name, int logging_level, int max_workers, VmdMotion motion, PmxModel model, int noise_size, int copy_cnt, \
-                 bint finger_noise_flg, bint motivation_flg, str output_path, object monitor, bint is_file, str outout_datetime):
+                 bint finger_noise_flg, bint motivation_flg, str output_path, object monitor, bint is_file, str outout_datetime, object noise_seed=None):
         self.version_name = version_name
         self.logging_level = logging_level
         self.motion = motion
@@ -85,6 +85,8 @@ cdef class MNoiseOptions:
         self.is_file = is_file
         self.outout_datetime = outout_datetime
         self.max_workers = max_workers
+        # 乱数シード（Noneの場合、実行ごとに生成する）
+        self.noise_seed = noise_seed
 
 
 cdef class MArmIKtoFKOptions:
@@ -1,6 +1,22 @@
 # -*- coding: utf-8 -*-
 #
+cimport numpy as np
 
 cdef class BoneLinks:
     cdef dict __links
 
+
+cdef class BoneLinkPlan:
+    cdef readonly tuple names
+    cdef readonly dict name_idxs
+    cdef readonly np.ndarray indexes
+    cdef readonly np.ndarray parent_idxs
+    cdef readonly np.ndarray positions
+    cdef readonly np.ndarray parent_positions
+    cdef readonly tuple position_vs
+    cdef readonly tuple parent_position_vs
+    cdef readonly tuple is_model_bones
+    cdef readonly tuple fixed_axes
+    cdef readonly tuple effect_parents
+    cdef readonly tuple effect_names
+    cdef readonly tuple local_x_qqs
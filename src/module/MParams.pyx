@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 #
+import numpy as np
+cimport numpy as np
 
 
 cdef class BoneLinks:
@@ -136,4 +138,36 @@ cdef class BoneLinks:
         return "<BoneLinks links:{0}".format(self.__links)
 
 
+# ボーンリンクの計算用情報（PmxModel.get_link_planで生成する）
+# リンクの並び順（親→子）で、各ボーンの計算に必要な値を保持する
+cdef class BoneLinkPlan:
+
+    def __init__(self, names, indexes, positions, parent_positions, is_model_bones, fixed_axes, effect_parents, local_x_qqs):
+        # リンクのボーン名
+        self.names = tuple(names)
+        self.name_idxs = {name: n for n, name in enumerate(self.names)}
+        # モデルのボーンINDEX（モデルにない場合、-1）
+        self.indexes = np.array(indexes, dtype=np.int64)
+        # リンク内の親のINDEX（一番親は-1）
+        self.parent_idxs = np.arange(len(self.names), dtype=np.int64) - 1
+        # 初期位置と親の初期位置(L×3)（一番親の親は原点）
+        self.positions = np.array([v.data() for v in positions], dtype=np.float64).reshape(-1, 3)
+        self.parent_positions = np.array([v.data() for v in parent_positions], dtype=np.float64).reshape(-1, 3)
+        self.position_vs = tuple(positions)
+        self.parent_position_vs = tuple(parent_positions)
+        # モデルにボーンがあるか
+        self.is_model_bones = tuple(is_model_bones)
+        # 軸制限
+        self.fixed_axes = tuple(fixed_axes)
+        # 付与親の連鎖（付与親のボーン名, 付与率）
+        self.effect_parents = tuple([tuple(effects) for effects in effect_parents])
+        self.effect_names = tuple([tuple([ename for ename, _ in effects]) for effects in self.effect_parents])
+        # ローカルX軸の向き（モデルにボーンがない場合、None）
+        self.local_x_qqs = tuple(local_x_qqs)
+
+    def size(self):
+        return len(self.names)
+
+    def __str__(self):
+        return "<BoneLinkPlan names:{0}".format(self.names)
 
@@ -14,7 +14,8 @@ from mmd.VmdData import VmdMotion, VmdBoneFrame, VmdCameraFrame, VmdInfoIk, VmdL
 from mmd.VmdWriter import VmdWriter
 from module.MParams import BoneLinks # noqa
 from module.MMath import MRect, MVector3D, MVector4D, MQuaternion, MMatrix4x4 # noqa
-from utils import MServiceUtils, MBezierUtils # noqa
+from utils import MServiceUtils, MBezierUtils, MProcessUtils # noqa
+from utils.MProcessUtils import MotionTask
 from utils.MLogger import MLogger # noqa
 from utils.MException import SizingException, MKilledException
 
@@ -60,32 +61,39 @@ class ConvertArmIKtoFKService():
 
     # 腕ＩＫ変換処理実行
     def convert_ik2fk(self):
-        futures = []
+        ik_bones = []
+        for bone in self.options.ik_model.bones.values():
+            if "右腕ＩＫ" == bone.name or "右腕IK" == bone.name or "左腕ＩＫ" == bone.name or "左腕IK" == bone.name:
+                # 腕IK系の場合、処理開始
+                ik_bones.append(bone)
+
+        if MProcessUtils.is_process_mode(self.options.max_workers, MProcessUtils.SHARDS_PER_WORKER):
+            # IK計算をフレーム範囲ごとにプロセスで処理する場合、腕IKは順番に処理する
+            # （処理中にモデルにボーンを追加するので、並行してワーカープロセスに渡さない）
+            for bone in ik_bones:
+                if not self.convert_target_ik2fk(bone):
+                    return False
+        else:
+            futures = []
 
-        with ThreadPoolExecutor(thread_name_prefix="ik2fk", max_workers=self.options.max_workers) as executor:
-            for bone in self.options.ik_model.bones.values():
-                if "右腕ＩＫ" == bone.name or "右腕IK" == bone.name or "左腕ＩＫ" == bone.name or "左腕IK" == bone.name:
-                    # 腕IK系の場合、処理開始
+            with ThreadPoolExecutor(thread_name_prefix="ik2fk", max_workers=self.options.max_workers) as executor:
+                for bone in ik_bones:
                     futures.append(executor.submit(self.convert_target_ik2fk, bone))
 
-        concurrent.futures.wait(futures, timeout=None, return_when=concurrent.futures.FIRST_EXCEPTION)
+            concurrent.futures.wait(futures, timeout=None, return_when=concurrent.futures.FIRST_EXCEPTION)
 
-        for f in futures:
-            if not f.result():
-                return False
+            for f in futures:
+                if not f.result():
+                    return False
 
         if self.options.remove_unnecessary_flg:
             # 不要キー削除処理
-            futures = []
-
-            with ThreadPoolExecutor(thread_name_prefix="remove", max_workers=self.options.max_workers) as executor:
-                for bone_name in ["右腕", "右ひじ", "右手首", "左腕", "左ひじ", "左手首"]:
-                    futures.append(executor.submit(self.remove_unnecessary_bf, bone_name))
+            tasks = []
+            for bone_name in ["右腕", "右ひじ", "右手首", "左腕", "左ひじ", "左手首"]:
+                tasks.append(MotionTask("remove_unnecessary_bf", bone_name, bone_names=[bone_name]))
 
-            concurrent.futures.wait(futures, timeout=None, return_when=concurrent.futures.FIRST_EXCEPTION)
-
-            for f in futures:
-                if not f.result():
+            for result in MProcessUtils.execute_motion_tasks(self, "remove", tasks):
+                if not result:
                     return False
 
         return True
@@ -221,39 +229,58 @@ class ConvertArmIKtoFKService():
         if wrist_twist_bone_name in motion.bones:
             del motion.bones[wrist_twist_bone_name]
 
-        prev_sep_fno = 0
-        for fidx, fno in enumerate(fnos):
-            # グローバル位置計算(元モーションの位置)
-            target_ik_global_3ds = MServiceUtils.calc_global_pos(ik_model, target_links, org_motion, fno)
-            target_effector_pos = target_ik_global_3ds[bone_name]
-
-            # IK計算実行
-            MServiceUtils.calc_IK(ik_model, effector_links, fk_motion, fno, target_effector_pos, ik_links, max_count=10)
+        # グローバル位置計算(元モーションの位置)
+        target_ik_global_3ds_list = MServiceUtils.calc_global_pos_frames(ik_model, target_links, org_motion, fnos)
+        target_effector_poss = {fno: target_ik_global_3ds[bone_name] for fno, target_ik_global_3ds in zip(fnos, target_ik_global_3ds_list)}
 
-            # 現在のエフェクタ位置
-            now_global_3ds = MServiceUtils.calc_global_pos(ik_model, transferee_links, fk_motion, fno)
-            now_effector_pos = now_global_3ds[transferee_bone.name]
-            logger.debug("(%s) target_effector_pos: %s [%s] ------------------", fno, bone_name, target_effector_pos.to_log())
-            logger.debug("(%s) now_effector_pos: %s [%s]", fno, bone_name, now_effector_pos.to_log())
+        # IK計算実行（各フレームのIKはそのフレームのキーだけで決まるので、フレーム範囲ごとに分けて処理する）
+        ik_link_names = list(ik_links.all().keys())[1:]
+        for result in MProcessUtils.execute_frame_shards(self, "ik2fk", fk_motion, "calc_target_ik2fk", fnos, ik_link_names, \
+                                                         bone_name, effector_links, ik_links, transferee_links, transferee_bone.name, \
+                                                         fno_values=target_effector_poss, count_title="【腕ＩＫ変換 - {0}】".format(bone_name)):
+            if not result:
+                return False
 
-            for link_name in list(ik_links.all().keys())[1:]:
+        for fno in fnos:
+            for link_name in ik_link_names:
                 fk_bf = fk_motion.calc_bf(link_name, fno)
-                logger.debug("確定bf(%s): %s [%s]", fno, link_name, fk_bf.rotation.toEulerAngles4MMD().to_log())
 
                 # 確定した角度をそのまま登録
                 bf = motion.calc_bf(link_name, fno)
                 bf.rotation = fk_bf.rotation.copy()
                 motion.regist_bf(bf, link_name, fno)
 
-            if fno // 500 > prev_sep_fno:
-                logger.count("【腕ＩＫ変換 - {0}】".format(bone_name), fno, fnos)
-                prev_sep_fno = fno // 500
-
         # 終わったら手首FK再計算
         self.recalc_wrist_fk(ik_bone, target_links, effector_links, fnos, org_motion, effector_bone)
 
         return True
 
+    # フレーム範囲に対する腕ＩＫ計算
+    # fk_motion: IK計算結果を登録するモーション（フレーム範囲分のみの場合あり）
+    # target_effector_poss: フレーム番号ごとのIKの目標位置
+    def calc_target_ik2fk(self, fk_motion: VmdMotion, fnos: list, target_effector_poss: dict, bone_name: str, effector_links: BoneLinks, \
+                          ik_links: BoneLinks, transferee_links: BoneLinks, transferee_bone_name: str):
+        ik_model = self.options.ik_model
+
+        for fno in fnos:
+            target_effector_pos = target_effector_poss[fno]
+
+            # IK計算実行
+            MServiceUtils.calc_IK(ik_model, effector_links, fk_motion, fno, target_effector_pos, ik_links, max_count=10)
+
+            if logger.total_level <= logging.DEBUG:
+                # 現在のエフェクタ位置
+                now_global_3ds = MServiceUtils.calc_global_pos(ik_model, transferee_links, fk_motion, fno)
+                now_effector_pos = now_global_3ds[transferee_bone_name]
+                logger.debug("(%s) target_effector_pos: %s [%s] ------------------", fno, bone_name, target_effector_pos.to_log())
+                logger.debug("(%s) now_effector_pos: %s [%s]", fno, bone_name, now_effector_pos.to_log())
+
+                for link_name in list(ik_links.all().keys())[1:]:
+                    fk_bf = fk_motion.calc_bf(link_name, fno)
+                    logger.debug("確定bf(%s): %s [%s]", fno, link_name, fk_bf.rotation.toEulerAngles4MMD().to_log())
+
+        return True
+
     # IKターゲットの回転量移管先を取得
     # 現在のターゲットが表示されてない場合、子で同じ位置にあるのを採用
     def get_transferee_bone(self, ik_bone: Bone, effector_bone: Bone):
@@ -5,8 +5,6 @@ import numpy as np
 import logging
 import os
 import traceback
-import concurrent.futures
-from concurrent.futures import ThreadPoolExecutor
 
 from module.MOptions import MArmTwistOffOptions, MOptionsDataSet
 from mmd.PmxData import PmxModel, Bone # noqa
@@ -14,7 +12,8 @@ from mmd.VmdData import VmdMotion, VmdBoneFrame, VmdCameraFrame, VmdInfoIk, VmdL
 from mmd.VmdWriter import VmdWriter
 from module.MParams import BoneLinks # noqa
 from module.MMath import MRect, MVector3D, MVector4D, MQuaternion, MMatrix4x4 # noqa
-from utils import MServiceUtils, MBezierUtils # noqa
+from utils import MServiceUtils, MBezierUtils, MProcessUtils # noqa
+from utils.MProcessUtils import MotionTask
 from utils.MLogger import MLogger # noqa
 from utils.MException import SizingException, MKilledException
 
@@ -67,16 +66,15 @@ class ConvertArmTwistOffService():
 
     # 捩りOFF変換処理実行
     def convert_twist_off(self):
-        futures = []
-
-        with ThreadPoolExecutor(thread_name_prefix="twist_off", max_workers=self.options.max_workers) as executor:
-            futures.append(executor.submit(self.convert_target_twist_off, "右"))
-            futures.append(executor.submit(self.convert_target_twist_off, "左"))
-
-        concurrent.futures.wait(futures, timeout=None, return_when=concurrent.futures.FIRST_EXCEPTION)
-
-        for f in futures:
-            if not f.result():
+        tasks = []
+        for direction in ["右", "左"]:
+            # 腕から手首までのリンク（捩りボーンを含む）が書き戻し対象
+            finger_links = self.options.model.create_link_2_top_one(f"{direction}人指先実体", is_defined=False)
+            bone_names = list(finger_links.to_links(f"{direction}腕").all().keys()) + [f"{direction}腕捩", f"{direction}手捩"]
+            tasks.append(MotionTask("convert_target_twist_off", direction, bone_names=bone_names, is_full_motion=True))
+
+        for result in MProcessUtils.execute_motion_tasks(self, "twist_off", tasks):
+            if not result:
                 return False
 
         return True
@@ -176,14 +174,10 @@ class ConvertArmTwistOffService():
             del motion.bones[wrist_twist_bone_name]
 
         if self.options.remove_unnecessary_flg:
-            futures = []
-
-            with ThreadPoolExecutor(thread_name_prefix="remove", max_workers=self.options.max_workers) as executor:
-                for bone_name in [f"{direction}腕", f"{direction}ひじ", f"{direction}手首"]:
-                    futures.append(executor.submit(self.remove_unnecessary_bf, bone_name))
-
-            concurrent.futures.wait(futures, timeout=None, return_when=concurrent.futures.FIRST_EXCEPTION)
+            tasks = []
+            for bone_name in [f"{direction}腕", f"{direction}ひじ", f"{direction}手首"]:
+                tasks.append(MotionTask("remove_unnecessary_bf", bone_name, bone_names=[bone_name]))
 
-            for f in futures:
-                if not f.result():
+            for result in MProcessUtils.execute_motion_tasks(self, "remove", tasks):
+                if not result:
                     return False
@@ -3,21 +3,24 @@
 import logging
 import os
 import traceback
-import concurrent.futures
-from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
 from module.MOptions import MLegFKtoIKOptions, MOptionsDataSet
 from mmd.PmxData import PmxModel # noqa
 from mmd.VmdData import VmdMotion, VmdBoneFrame, VmdCameraFrame, VmdInfoIk, VmdLightFrame, VmdMorphFrame, VmdShadowFrame, VmdShowIkFrame # noqa
 from mmd.VmdWriter import VmdWriter
-from module.MMath import MRect, MVector3D, MVector4D, MQuaternion, MMatrix4x4 # noqa
-from utils import MServiceUtils, MBezierUtils # noqa
+from module.MMath import MRect, MVector3D, MVector4D, MQuaternion, MMatrix4x4, MVector3DArray, MQuaternionArray, MMatrix4x4Array # noqa
+from module.MParams import BoneLinks # noqa
+from utils import MServiceUtils, MBezierUtils, MProcessUtils # noqa
+from utils.MProcessUtils import MotionTask
 from utils.MLogger import MLogger # noqa
 from utils.MException import SizingException, MKilledException
 
 logger = MLogger(__name__, level=MLogger.INFO)
 
+# 足IKブレ固定の一括判定で一度に並べる要素数の上限（区間数×区間幅）
+LOCK_DETECT_CHUNK_ELEMENTS = 200000
+
 
 class ConvertLegFKtoIKService():
     def __init__(self, options: MLegFKtoIKOptions):
@@ -52,17 +55,20 @@ class ConvertLegFKtoIKService():
             if self.options.ground_leg_flg:
                 self.prepare_ground()
 
-            futures = []
-
-            with ThreadPoolExecutor(thread_name_prefix="leffk", max_workers=self.options.max_workers) as executor:
-                futures.append(executor.submit(self.convert_leg_fk2ik, "右"))
-                futures.append(executor.submit(self.convert_leg_fk2ik, "左"))
-
-            concurrent.futures.wait(futures, timeout=None, return_when=concurrent.futures.FIRST_EXCEPTION)
+            tasks = []
+            for direction in ["右", "左"]:
+                tasks.append(MotionTask("convert_leg_fk2ik", direction, bone_names=["{0}足ＩＫ".format(direction)], is_full_motion=True))
 
-            for f in futures:
-                if not f.result():
+            for result in MProcessUtils.execute_motion_tasks(self, "leffk", tasks):
+                if not result:
                     return False
+
+            # IKon
+            for direction in ["右", "左"]:
+                for showik in self.options.motion.showiks:
+                    for ikf in showik.ik:
+                        if ikf.name == "{0}足ＩＫ".format(direction) or ikf.name == "{0}つま先ＩＫ".format(direction):
+                            ikf.onoff = 1
             
             # 最後に出力
             VmdWriter(MOptionsDataSet(self.options.motion, None, self.options.model, self.options.output_path, False, False, [], None, 0, [])).write()
@@ -108,26 +114,15 @@ class ConvertLegFKtoIKService():
         # 指定範囲内の足FKキーフレを取得
         fnos = motion.get_bone_fnos("左足", "左ひざ", "左足首", "右足", "右ひざ", "右足首", "下半身", center_x_bone_name, center_y_bone_name, center_z_bone_name)
 
-        # センター調整
-        prev_sep_fno = 0
-        min_ys = []
-        for fidx, fno in enumerate(fnos):
-            right_fk_3ds = MServiceUtils.calc_global_pos(model, right_fk_links, motion, fno)
-            right_toe_pos = right_fk_3ds["右つま先実体"]
-            right_sole_pos = right_fk_3ds["右足底実体"]
-
-            left_fk_3ds = MServiceUtils.calc_global_pos(model, left_fk_links, motion, fno)
-            left_toe_pos = left_fk_3ds["左つま先実体"]
-            left_sole_pos = left_fk_3ds["左足底実体"]
+        # センター調整（全キーフレのグローバル位置をまとめて求める）
+        right_bone_names, right_fk_poses, _ = MServiceUtils.calc_global_pos_array(model, right_fk_links, motion, fnos)
+        left_bone_names, left_fk_poses, _ = MServiceUtils.calc_global_pos_array(model, left_fk_links, motion, fnos)
 
-            min_ys.append(right_sole_pos.y())
-            min_ys.append(left_sole_pos.y())
-            min_ys.append(right_toe_pos.y())
-            min_ys.append(left_toe_pos.y())
+        min_ys = np.stack([right_fk_poses[:, right_bone_names.index("右足底実体"), 1], left_fk_poses[:, left_bone_names.index("左足底実体"), 1], \
+                           right_fk_poses[:, right_bone_names.index("右つま先実体"), 1], left_fk_poses[:, left_bone_names.index("左つま先実体"), 1]], axis=1).flatten()
 
-            if fno // 500 > prev_sep_fno:
-                logger.count("【足ＩＫ接地準備】", fno, fnos)
-                prev_sep_fno = fno // 500
+        if len(fnos) > 0:
+            logger.count("【足ＩＫ接地準備】", fnos[-1], fnos)
 
         # 中央の値は大体接地していると見なす
         median_leg_y = np.median(min_ys)
@@ -188,93 +183,91 @@ class ConvertLegFKtoIKService():
 
         ik_parent_name = ik_links.get(leg_ik_bone_name, offset=-1).name
 
-        # 足IKの移植
-        prev_sep_fno = 0
+        # 足IKの移植（全キーフレをまとめて計算する）
 
-        # 移植
-        fno = 0
-        for fno in fnos:
-            leg_fk_3ds_dic = MServiceUtils.calc_global_pos(model, fk_links, motion, fno)
-            _, leg_ik_matrixs = MServiceUtils.calc_global_pos(model, ik_links, motion, fno, return_matrix=True)
+        # 足首・つま先（足首の子ボーン）のグローバル位置
+        fk_bone_names, leg_fk_poses, _ = MServiceUtils.calc_global_pos_array(model, fk_links, motion, fnos)
+        toe_fk_bone_names, leg_toe_fk_poses, _ = MServiceUtils.calc_global_pos_array(model, toe_fk_links, motion, fnos)
+        ankle_global_poses = leg_fk_poses[:, fk_bone_names.index(ankle_bone_name)]
+        ankle_child_global_poses = leg_toe_fk_poses[:, toe_fk_bone_names.index(ankle_child_bone_name)]
 
-            # 足首の角度がある状態での、つま先までのグローバル位置
-            leg_toe_fk_3ds_dic = MServiceUtils.calc_global_pos(model, toe_fk_links, motion, fno)
+        # IKの親から見た相対位置
+        ik_bone_names, _, leg_ik_matrixs = MServiceUtils.calc_global_pos_array(model, ik_links, motion, fnos)
+        leg_ik_parent_inverted_matrixs = MMatrix4x4Array(leg_ik_matrixs[:, ik_bone_names.index(ik_parent_name)]).inverted()
 
-            # IKの親から見た相対位置
-            leg_ik_parent_matrix = leg_ik_matrixs[ik_parent_name]
+        # 足ＩＫの位置は、足ＩＫの親から見た足首のローカル位置（足首位置マイナス）
+        leg_ik_poses = (leg_ik_parent_inverted_matrixs * \
+                        MVector3DArray(ankle_global_poses - (model.bones[ankle_bone_name].position - model.bones[ik_parent_name].position).data())).data()
+        leg_ik_poses[leg_ik_poses[:, 1] < 0, 1] = 0
 
-            bf = motion.calc_bf(leg_ik_bone_name, fno)
-            # 足ＩＫの位置は、足ＩＫの親から見た足首のローカル位置（足首位置マイナス）
-            bf.position = leg_ik_parent_matrix.inverted() * (leg_fk_3ds_dic[ankle_bone_name] - (model.bones[ankle_bone_name].position - model.bones[ik_parent_name].position))
-            if bf.position.y() < 0:
-                bf.position.setY(0)
-            bf.rotation = MQuaternion()
+        # 一旦足ＩＫの位置が決まった時点で登録
+        leg_ik_qqs = np.zeros((len(fnos), 4), dtype=np.float64)
+        leg_ik_qqs[:, 0] = 1
+        motion.regist_bone_values(leg_ik_bone_name, fnos, leg_ik_poses, leg_ik_qqs)
 
-            # 一旦足ＩＫの位置が決まった時点で登録
-            motion.regist_bf(bf, leg_ik_bone_name, fno)
-            # 足ＩＫ回転なし状態でのつま先までのグローバル位置
-            leg_ik_3ds_dic, leg_ik_matrisxs = MServiceUtils.calc_global_pos(model, toe_ik_links, motion, fno, return_matrix=True)
-            [logger.debug("f: %s, leg_ik_3ds_dic[%s]: %s", fno, k, v.to_log()) for k, v in leg_ik_3ds_dic.items()]
-
-            # つま先のローカル位置
-            toe_global_pos = leg_ik_3ds_dic[toe_ik_bone_name]
-            ankle_child_initial_local_pos = leg_ik_matrisxs[leg_ik_bone_name].inverted() * toe_global_pos
-            ankle_child_global_pos = leg_toe_fk_3ds_dic[ankle_child_bone_name]
-            ankle_child_local_pos = leg_ik_matrisxs[leg_ik_bone_name].inverted() * ankle_child_global_pos
-            ankle_horizonal_pos = leg_ik_matrisxs[leg_ik_bone_name].inverted() * MVector3D(ankle_child_global_pos.x(), model.bones[ankle_child_bone_name].position.y(), ankle_child_global_pos.z())
-
-            ankle_slope = abs(MVector3D.dotProduct(ankle_horizonal_pos.normalized(), ankle_child_local_pos.normalized()))
-            if (self.options.ankle_horizonal_flg and (ankle_slope > 0.95)) or toe_global_pos.y() < 0:
-                logger.debug("f: %s, %s水平 %s ankle_child_local_pos: %s, ankle_horizonal_pos: %s", fno, direction, ankle_slope, ankle_child_local_pos.to_log(), ankle_horizonal_pos.to_log())
-                # 大体水平の場合、地面に対して水平
-                ankle_child_local_pos = ankle_horizonal_pos
-
-            logger.debug("f: %s, ankle_child_initial_local_pos: %s", fno, ankle_child_initial_local_pos.to_log())
-            logger.debug("f: %s, ankle_child_local_pos: %s", fno, ankle_child_local_pos.to_log())
-
-            # 足ＩＫの回転は、足首から見たつま先の方向
-            bf.rotation = MQuaternion.rotationTo(ankle_child_initial_local_pos, ankle_child_local_pos)
-            logger.debug("f: %s, ik_rotation: %s", fno, bf.rotation.toEulerAngles4MMD().to_log())
+        # 足ＩＫ回転なし状態でのつま先までのグローバル位置
+        toe_ik_bone_names, toe_ik_poses, toe_ik_matrixs = MServiceUtils.calc_global_pos_array(model, toe_ik_links, motion, fnos)
+        toe_global_poses = toe_ik_poses[:, toe_ik_bone_names.index(toe_ik_bone_name)]
+        leg_ik_inverted_matrixs = MMatrix4x4Array(toe_ik_matrixs[:, toe_ik_bone_names.index(leg_ik_bone_name)]).inverted()
 
-            motion.regist_bf(bf, leg_ik_bone_name, fno)
+        # つま先のローカル位置
+        ankle_child_initial_local_poses = leg_ik_inverted_matrixs * MVector3DArray(toe_global_poses)
+        ankle_child_local_poses = (leg_ik_inverted_matrixs * MVector3DArray(ankle_child_global_poses)).data()
+        ankle_child_horizonal_poses = ankle_child_global_poses.copy()
+        ankle_child_horizonal_poses[:, 1] = model.bones[ankle_child_bone_name].position.y()
+        ankle_horizonal_poses = (leg_ik_inverted_matrixs * MVector3DArray(ankle_child_horizonal_poses)).data()
 
-            if fno // 500 > prev_sep_fno and fnos[-1] > 0:
-                logger.count(f"【足ＩＫ変換 - {leg_ik_bone_name}】", fno, fnos)
-                prev_sep_fno = fno // 500
+        ankle_slopes = np.abs(MVector3DArray.dotProduct(MVector3DArray(ankle_horizonal_poses).normalized(), MVector3DArray(ankle_child_local_poses).normalized()))
+        is_horizonals = (toe_global_poses[:, 1] < 0)
+        if self.options.ankle_horizonal_flg:
+            is_horizonals |= (ankle_slopes > 0.95)
+
+        # 大体水平の場合、地面に対して水平
+        ankle_child_local_poses[is_horizonals] = ankle_horizonal_poses[is_horizonals]
+        logger.debug("%s水平: %s", direction, np.asarray(fnos)[is_horizonals].tolist())
+
+        # 足ＩＫの回転は、足首から見たつま先の方向
+        leg_ik_qqs = MQuaternionArray.rotationTo(ankle_child_initial_local_poses, MVector3DArray(ankle_child_local_poses)).data()
+        motion.regist_bone_values(leg_ik_bone_name, fnos, rotations=leg_ik_qqs)
+
+        if len(fnos) > 0 and fnos[-1] > 0:
+            logger.count(f"【足ＩＫ変換 - {leg_ik_bone_name}】", fnos[-1], fnos)
 
         logger.info("変換完了　【%s足ＩＫ】", direction, decoration=MLogger.DECORATION_LINE)
 
-        if self.options.leg_error_tolerance > 0:
+        if self.options.leg_error_tolerance > 0 and len(fnos) > 3:
             logger.info("足ＩＫブレ固定　【%s足ＩＫ】", direction, decoration=MLogger.DECORATION_LINE)
 
+            leg_ik_bone_y = model.bones[leg_ik_bone_name].position.y()
+            toe_ik_bone_y = model.bones[toe_ik_bone_name].position.y()
+
+            # 全フレームの足IK・つま先IKのグローバル位置と足IKの行列（固定した範囲だけ計算し直す）
+            sole_global_poses, toe_global_poses, sole_matrixs = \
+                self.calc_leg_ik_global_array(ik_links, toe_ik_links, leg_ik_bone_name, toe_ik_bone_name, np.arange(fnos[-1] + 1))
+
+            prev_fnos = np.array(fnos[:-3], dtype=np.int64)
+            next_fnos = np.array(fnos[3:], dtype=np.int64)
+
+            # 全区間の固定種別を一括で判定しておく
+            lock_types = self.detect_leg_lock_types(prev_fnos, next_fnos, sole_global_poses, toe_global_poses, leg_ik_bone_y, toe_ik_bone_y)
+
             prev_sep_fno = 0
-            for prev_fno, next_fno in zip(fnos[:-3], fnos[3:]):
-                # つま先IK末端の位置
-                toe_ik_3ds = MServiceUtils.calc_global_pos(model, toe_ik_links, motion, prev_fno)
-                prev_toe_pos = toe_ik_3ds[toe_ik_bone_name]
-
-                # 足IKの位置
-                sole_ik_3ds = MServiceUtils.calc_global_pos(model, ik_links, motion, prev_fno)
-                prev_sole_pos = sole_ik_3ds[leg_ik_bone_name]
-
-                toe_poses = []
-                sole_poses = []
-                for fno in range(prev_fno + 1, next_fno + 1):
-                    # つま先IK末端の位置(Yはボーンの高さまで無視)
-                    toe_ik_3ds = MServiceUtils.calc_global_pos(model, toe_ik_links, motion, fno)
-                    toe_poses.append(np.array([toe_ik_3ds[toe_ik_bone_name].x(), max(model.bones[toe_ik_bone_name].position.y(), toe_ik_3ds[toe_ik_bone_name].y()), toe_ik_3ds[toe_ik_bone_name].z()]))
-
-                    # 足IKの位置(Yはボーンの高さまで無視)
-                    sole_ik_3ds = MServiceUtils.calc_global_pos(model, ik_links, motion, fno)
-                    sole_poses.append(np.array([sole_ik_3ds[leg_ik_bone_name].x(), max(model.bones[leg_ik_bone_name].position.y(), sole_ik_3ds[leg_ik_bone_name].y()), sole_ik_3ds[leg_ik_bone_name].z()]))
-                
-                # つま先IKの二点間距離
-                toe_distances = np.linalg.norm(np.array(toe_poses) - prev_toe_pos.data(), ord=2, axis=1)
-                
-                # 足IKの二点間距離
-                sole_distances = np.linalg.norm(np.array(sole_poses) - prev_sole_pos.data(), ord=2, axis=1)
-
-                if np.max(sole_distances) <= self.options.leg_error_tolerance and prev_sole_pos.y() < 0.5 + model.bones[leg_ik_bone_name].position.y():
+            for widx, (prev_fno, next_fno) in enumerate(zip(fnos[:-3], fnos[3:])):
+                lock_type = lock_types[widx]
+
+                if lock_type > 0 or logger.total_level <= logging.DEBUG:
+                    # 足IK・つま先IKの二点間距離
+                    sole_distances, toe_distances, toe_poses = \
+                        self.calc_leg_lock_distances(prev_fno, next_fno, sole_global_poses, toe_global_poses, leg_ik_bone_y, toe_ik_bone_y)
+
+                if lock_type > 0:
+                    # 固定で値が変わる範囲（固定範囲の次のキーまで補間結果が変わる）
+                    bf_dict = motion.bones[leg_ik_bone_name]
+                    next_key_idx = bf_dict.next_index(next_fno)
+                    update_end_fno = min(fnos[-1], bf_dict.fnos[next_key_idx] if next_key_idx < len(bf_dict.fnos) else fnos[-1])
+                    update_fnos = np.arange(prev_fno, update_end_fno + 1)
+
+                if lock_type == 1:
                     logger.debug("%s足固定(%s-%s): sole: %s", direction, prev_fno, next_fno, sole_distances)
 
                     # 足IKがブレの許容範囲内である場合、固定
@@ -284,26 +277,22 @@ class ConvertLegFKtoIKService():
                     prev_bf.position.setY(0)
                     motion.regist_bf(prev_bf, leg_ik_bone_name, prev_fno)
 
-                    # つま先IKのグローバル位置を再計算
-                    toe_ik_3ds = MServiceUtils.calc_global_pos(model, toe_ik_links, motion, prev_fno)
-                    toe_ik_global_pos = toe_ik_3ds[toe_ik_bone_name]
+                    motion.regist_bone_values(leg_ik_bone_name, np.arange(prev_fno + 1, next_fno + 1), \
+                                              np.tile(prev_bf.position.data(), (next_fno - prev_fno, 1)))
 
-                    for fno in range(prev_fno + 1, next_fno + 1):
-                        bf = motion.calc_bf(leg_ik_bone_name, fno)
-                        bf.position = prev_bf.position.copy()
-                        motion.regist_bf(bf, leg_ik_bone_name, fno)
+                    # つま先IKのグローバル位置を再計算
+                    self.update_leg_ik_global_array(ik_links, toe_ik_links, leg_ik_bone_name, toe_ik_bone_name, update_fnos, \
+                                                    sole_global_poses, toe_global_poses, sole_matrixs)
 
                     for fno in range(prev_fno, next_fno + 1):
-                        # つま先IKのグローバル位置を再計算
-                        toe_ik_3ds = MServiceUtils.calc_global_pos(model, toe_ik_links, motion, fno)
-                        toe_ik_global_pos = toe_ik_3ds[toe_ik_bone_name]
+                        toe_ik_global_pos = MVector3D(toe_global_poses[fno])
 
                         if toe_ik_global_pos.y() < 0:
-                            # 足IKの行列を再計算
-                            sole_ik_3ds, sole_mats = MServiceUtils.calc_global_pos(model, ik_links, motion, fno, return_matrix=True)
+                            # 足IKの行列
+                            sole_inverted_matrix = MMatrix4x4(sole_matrixs[fno]).inverted()
 
-                            toe_ik_local_prev_pos = sole_mats[leg_ik_bone_name].inverted() * toe_ik_global_pos
-                            toe_ik_local_now_pos = sole_mats[leg_ik_bone_name].inverted() * MVector3D(toe_ik_global_pos.x(), model.bones[toe_ik_bone_name].position.y(), toe_ik_global_pos.z())
+                            toe_ik_local_prev_pos = sole_inverted_matrix * toe_ik_global_pos
+                            toe_ik_local_now_pos = sole_inverted_matrix * MVector3D(toe_ik_global_pos.x(), toe_ik_bone_y, toe_ik_global_pos.z())
 
                             adjust_toe_qq = MQuaternion.rotationTo(toe_ik_local_prev_pos, toe_ik_local_now_pos)
                             logger.debug("%sつま先ゼロ(%s-%s): toe_ik_global_pos: %s, adjust_toe_qq: %s", direction, prev_fno, next_fno, toe_ik_global_pos.to_log(),
@@ -320,35 +309,110 @@ class ConvertLegFKtoIKService():
                                 
                             motion.regist_bf(bf, leg_ik_bone_name, fno)
 
-                elif np.max(toe_distances) <= self.options.leg_error_tolerance and prev_sole_pos.y() < 0.5 + model.bones[leg_ik_bone_name].position.y():
+                    # 回転を変えた分を計算し直す
+                    self.update_leg_ik_global_array(ik_links, toe_ik_links, leg_ik_bone_name, toe_ik_bone_name, update_fnos, \
+                                                    sole_global_poses, toe_global_poses, sole_matrixs)
+
+                elif lock_type == 2:
                     logger.debug("%sつま先固定(%s-%s): sole: %s", direction, prev_fno, next_fno, toe_distances)
 
+                    # つま先IK末端の位置
+                    prev_toe_pos = MVector3D(toe_global_poses[prev_fno])
+
                     # つま先位置がブレの許容範囲内である場合、つま先を固定する位置に足IKを置く
                     prev_bf = motion.calc_bf(leg_ik_bone_name, prev_fno)
 
-                    for fidx, fno in enumerate(range(prev_fno + 1, next_fno + 1)):
-                        # つま先のグローバル位置
-                        toe_pos = MVector3D(toe_poses[fidx])
+                    motion.regist_bone_values(leg_ik_bone_name, np.arange(prev_fno + 1, next_fno + 1), \
+                                              prev_bf.position.data() - (toe_poses - prev_toe_pos.data()))
+
+                    self.update_leg_ik_global_array(ik_links, toe_ik_links, leg_ik_bone_name, toe_ik_bone_name, update_fnos, \
+                                                    sole_global_poses, toe_global_poses, sole_matrixs)
+                elif logger.total_level <= logging.DEBUG:
+                    logger.debug("×%s固定なし(%s-%s): prev: %s, sole: %s, toe: %s", direction, prev_fno, next_fno, \
+                                 MVector3D(sole_global_poses[prev_fno]).to_log(), sole_distances, toe_distances)
 
-                        bf = motion.calc_bf(leg_ik_bone_name, fno)
-                        bf.position = prev_bf.position.copy() - (toe_pos - prev_toe_pos)
-                        motion.regist_bf(bf, leg_ik_bone_name, fno)
-                else:
-                    logger.debug("×%s固定なし(%s-%s): prev: %s, sole: %s, toe: %s", direction, prev_fno, next_fno, prev_sole_pos.to_log(), sole_distances, toe_distances)
+                if lock_type > 0:
+                    # 固定で位置が変わった範囲に掛かる後続区間だけ判定し直す
+                    redetect_end = widx + 1 + int(np.searchsorted(prev_fnos[(widx + 1):], update_end_fno, side="right"))
+                    if redetect_end > widx + 1:
+                        lock_types[(widx + 1):redetect_end] = \
+                            self.detect_leg_lock_types(prev_fnos[(widx + 1):redetect_end], next_fnos[(widx + 1):redetect_end], \
+                                                       sole_global_poses, toe_global_poses, leg_ik_bone_y, toe_ik_bone_y)
 
                 if prev_fno // 500 > prev_sep_fno:
                     logger.count(f"【{direction}足ＩＫブレ固定】", prev_fno, fnos)
                     prev_sep_fno = prev_fno // 500
 
-        # IKon
-        for showik in self.options.motion.showiks:
-            for ikf in showik.ik:
-                if ikf.name == leg_ik_bone_name or ikf.name == toe_ik_bone_name:
-                    ikf.onoff = 1
-
         # 不要キー削除処理
         if self.options.remove_unnecessary_flg:
             self.options.motion.remove_unnecessary_bf(0, leg_ik_bone_name, self.options.model.bones[leg_ik_bone_name].getRotatable(), \
                                                       self.options.model.bones[leg_ik_bone_name].getTranslatable())
         
         return True
+
+    # 各区間(prev_fno-next_fno)の固定種別（0: 固定なし, 1: 足IK固定, 2: つま先固定）を一括判定
+    def detect_leg_lock_types(self, prev_fnos: np.ndarray, next_fnos: np.ndarray, sole_global_poses: np.ndarray, toe_global_poses: np.ndarray, \
+                              leg_ik_bone_y: float, toe_ik_bone_y: float):
+        lock_types = np.zeros(len(prev_fnos), dtype=np.int8)
+        if len(prev_fnos) == 0:
+            return lock_types
+
+        # 区間内のフレームを並べた行列で距離の最大値を求める（区間幅が大きい時は分割）
+        max_width = max(1, int(np.max(next_fnos - prev_fnos)))
+        chunk_size = max(1, LOCK_DETECT_CHUNK_ELEMENTS // max_width)
+
+        for sidx in range(0, len(prev_fnos), chunk_size):
+            chunk_prev_fnos = prev_fnos[sidx:(sidx + chunk_size)]
+            chunk_next_fnos = next_fnos[sidx:(sidx + chunk_size)]
+
+            # 区間の幅に満たない分は区間末尾のフレームで埋める（最大値は変わらない）
+            width = max(1, int(np.max(chunk_next_fnos - chunk_prev_fnos)))
+            window_fnos = np.minimum(chunk_prev_fnos[:, np.newaxis] + np.arange(1, width + 1), chunk_next_fnos[:, np.newaxis])
+
+            # つま先IK末端・足IKの位置(Yはボーンの高さまで無視)
+            toe_poses = toe_global_poses[window_fnos]
+            toe_poses[:, :, 1] = np.maximum(toe_ik_bone_y, toe_poses[:, :, 1])
+            sole_poses = sole_global_poses[window_fnos]
+            sole_poses[:, :, 1] = np.maximum(leg_ik_bone_y, sole_poses[:, :, 1])
+
+            toe_max_distances = np.max(np.linalg.norm(toe_poses - toe_global_poses[chunk_prev_fnos][:, np.newaxis], ord=2, axis=2), axis=1)
+            sole_max_distances = np.max(np.linalg.norm(sole_poses - sole_global_poses[chunk_prev_fnos][:, np.newaxis], ord=2, axis=2), axis=1)
+
+            # 開始フレームで足IKが接地している区間だけ固定対象
+            is_grounded = sole_global_poses[chunk_prev_fnos, 1] < 0.5 + leg_ik_bone_y
+
+            chunk_lock_types = lock_types[sidx:(sidx + chunk_size)]
+            chunk_lock_types[is_grounded & (toe_max_distances <= self.options.leg_error_tolerance)] = 2
+            chunk_lock_types[is_grounded & (sole_max_distances <= self.options.leg_error_tolerance)] = 1
+
+        return lock_types
+
+    # 区間内の足IK・つま先IKの開始フレームからの距離
+    def calc_leg_lock_distances(self, prev_fno: int, next_fno: int, sole_global_poses: np.ndarray, toe_global_poses: np.ndarray, \
+                                leg_ik_bone_y: float, toe_ik_bone_y: float):
+        # つま先IK末端の位置(Yはボーンの高さまで無視)
+        toe_poses = toe_global_poses[(prev_fno + 1):(next_fno + 1)].copy()
+        toe_poses[:, 1] = np.maximum(toe_ik_bone_y, toe_poses[:, 1])
+
+        # 足IKの位置(Yはボーンの高さまで無視)
+        sole_poses = sole_global_poses[(prev_fno + 1):(next_fno + 1)].copy()
+        sole_poses[:, 1] = np.maximum(leg_ik_bone_y, sole_poses[:, 1])
+
+        sole_distances = np.linalg.norm(sole_poses - sole_global_poses[prev_fno], ord=2, axis=1)
+        toe_distances = np.linalg.norm(toe_poses - toe_global_poses[prev_fno], ord=2, axis=1)
+
+        return sole_distances, toe_distances, toe_poses
+
+    # 足IK・つま先IKのグローバル位置と足IKの行列（配列版）
+    def calc_leg_ik_global_array(self, ik_links: BoneLinks, toe_ik_links: BoneLinks, leg_ik_bone_name: str, toe_ik_bone_name: str, fnos: np.ndarray):
+        ik_bone_names, sole_poses, sole_matrixs = MServiceUtils.calc_global_pos_array(self.options.model, ik_links, self.options.motion, fnos)
+        toe_ik_bone_names, toe_poses, _ = MServiceUtils.calc_global_pos_array(self.options.model, toe_ik_links, self.options.motion, fnos)
+
+        return sole_poses[:, ik_bone_names.index(leg_ik_bone_name)], toe_poses[:, toe_ik_bone_names.index(toe_ik_bone_name)], \
+            sole_matrixs[:, ik_bone_names.index(leg_ik_bone_name)]
+
+    # 全フレームの配列のうち、指定フレームの分だけ計算し直す
+    def update_leg_ik_global_array(self, ik_links: BoneLinks, toe_ik_links: BoneLinks, leg_ik_bone_name: str, toe_ik_bone_name: str, fnos: np.ndarray, \
+                                   sole_global_poses: np.ndarray, toe_global_poses: np.ndarray, sole_matrixs: np.ndarray):
+        sole_global_poses[fnos], toe_global_poses[fnos], sole_matrixs[fnos] = \
+            self.calc_leg_ik_global_array(ik_links, toe_ik_links, leg_ik_bone_name, toe_ik_bone_name, fnos)
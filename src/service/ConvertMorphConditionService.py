@@ -29,6 +29,15 @@ from utils.MException import SizingException, MKilledException
 
 logger = MLogger(__name__, level=1)
 
+# 条件名ごとの判定（等しい場合は、厳密にイコールだと誤差が出る可能性があるので、クローズで比較する）
+MORPH_CONDITIONS = {
+    "より大きい(＞)": np.greater,
+    "以上(≧)": np.greater_equal,
+    "等しい(＝)": np.isclose,
+    "以下(≦)": np.less_equal,
+    "より小さい(＜)": np.less,
+}
+
 
 class ConvertMorphConditionService:
     def __init__(self, options: MMorphConditionOptions):
@@ -94,18 +103,25 @@ class ConvertMorphConditionService:
 
     # モーフ条件調整変換処理実行
     def convert_morph_condition(self):
+        # 同じモーフに対する条件は、指定順にまとめて処理する
+        morph_conditions = {}
+        for target_morph in self.options.target_morphs:
+            if target_morph[0] in self.options.motion.morphs:
+                if target_morph[0] not in morph_conditions:
+                    morph_conditions[target_morph[0]] = []
+                morph_conditions[target_morph[0]].append(target_morph)
+            else:
+                logger.warning(
+                    "モーションに存在しないモーフ名（%s）が条件になっているため、処理をスキップします", target_morph[0], decoration=MLogger.DECORATION_BOX
+                )
+
         futures = []
 
         with ThreadPoolExecutor(
             thread_name_prefix="morph_condition", max_workers=self.options.max_workers
         ) as executor:
-            for target_morph in self.options.target_morphs:
-                if target_morph[0] in self.options.motion.morphs:
-                    futures.append(executor.submit(self.convert_target_morph_condition, target_morph))
-                else:
-                    logger.warning(
-                        "モーションに存在しないモーフ名（%s）が条件になっているため、処理をスキップします", target_morph[0], decoration=MLogger.DECORATION_BOX
-                    )
+            for org_morph_name, target_morphs in morph_conditions.items():
+                futures.append(executor.submit(self.convert_target_morph_condition, org_morph_name, target_morphs))
 
         concurrent.futures.wait(futures, timeout=None, return_when=concurrent.futures.FIRST_EXCEPTION)
 
@@ -115,42 +131,38 @@ class ConvertMorphConditionService:
 
         return True
 
-    # 1つのボーンに対するモーフ条件調整変換処理
-    def convert_target_morph_condition(self, target_morph: list):
-        org_morph_name, condition_value, condition_name, ratio = target_morph
-
+    # 1つのモーフに対するモーフ条件調整変換処理
+    def convert_target_morph_condition(self, org_morph_name: str, target_morphs: list):
         motion = self.options.motion
 
-        prev_sep_fno = 0
-        fnos = list(motion.morphs[org_morph_name].keys())
-        for fno, morph in motion.morphs[org_morph_name].items():
-            condition_result = False
-            if condition_name == "より大きい(＞)":
-                condition_result = bool(np.all(np.greater(morph.ratio, condition_value)))
-            elif condition_name == "以上(≧)":
-                condition_result = bool(np.all(np.greater_equal(morph.ratio, condition_value)))
-            elif condition_name == "等しい(＝)":
-                # 厳密にイコールだと誤差が出る可能性があるので、クローズで比較する
-                condition_result = bool(np.all(np.isclose(morph.ratio, condition_value)))
-            elif condition_name == "以下(≦)":
-                condition_result = bool(np.all(np.less_equal(morph.ratio, condition_value)))
-            elif condition_name == "より小さい(＜)":
-                condition_result = bool(np.all(np.less(morph.ratio, condition_value)))
-
-            if condition_result:
-                logger.info(
-                    "-- モーフ条件調整:【%s: %sF】【%s x %s → %s】",
-                    org_morph_name,
-                    fno,
-                    round(morph.ratio, 3),
-                    ratio,
-                    round(morph.ratio * ratio, 3),
-                )
-                morph.ratio *= ratio
+        # モーフの値をまとめて配列に読み込む
+        morphs = list(motion.morphs[org_morph_name].values())
+        ratios = np.array([morph.ratio for morph in morphs], dtype=np.float64)
+        changed = np.zeros(len(ratios), dtype=np.bool_)
+
+        for _, condition_value, condition_name, ratio in target_morphs:
+            if condition_name in MORPH_CONDITIONS:
+                condition_results = MORPH_CONDITIONS[condition_name](ratios, condition_value)
+            else:
+                condition_results = np.zeros(len(ratios), dtype=np.bool_)
+
+            # キーフレの値と同じく、単精度に丸めてから次の条件を判定する
+            ratios[condition_results] = (ratios[condition_results] * ratio).astype(np.float32)
+            changed |= condition_results
+
+            logger.info(
+                "-- モーフ条件調整:【%s】【%s%s → x%s】 %s/%sキー",
+                org_morph_name,
+                condition_value,
+                condition_name,
+                ratio,
+                np.count_nonzero(condition_results),
+                len(ratios),
+            )
 
-            if fno // 500 > prev_sep_fno and fno > 0:
-                logger.count(f"【モーフ条件調整 - {org_morph_name}】", fno, fnos)
-                prev_sep_fno = fno // 500
+        # 値が変わったキーフレだけ書き戻す
+        for midx in np.flatnonzero(changed).tolist():
+            morphs[midx].ratio = ratios[midx]
 
         logger.info("-- モーフ条件調整:終了【%s】", org_morph_name)
 
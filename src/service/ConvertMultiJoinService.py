@@ -94,23 +94,29 @@ class ConvertMultiJoinService():
 
         logger.info("-- 準備完了【%s】", bone_name)
 
+        # 統合元ボーンの値は全フレーム分をまとめて求めておく
+        sampled_bones = {}
+        for bn in [rrxbn, rrybn, rrzbn, rmxbn, rmybn, rmzbn]:
+            if len(bn) > 0 and bn not in sampled_bones:
+                sampled_bones[bn] = motion.sample_bone(bn, range(fnos[-1] + 1))
+
         prev_sep_fno = 0
         fno = 0
         for fno in range(fnos[-1] + 1):
             bf = motion.calc_bf(bone_name, fno)
 
             if model.bones[bone_name].getRotatable():
-                rx_bf = motion.calc_bf(rrxbn, fno) if len(rrxbn) > 0 else VmdBoneFrame(fno)
-                ry_bf = motion.calc_bf(rrybn, fno) if len(rrybn) > 0 else VmdBoneFrame(fno)
-                rz_bf = motion.calc_bf(rrzbn, fno) if len(rrzbn) > 0 else VmdBoneFrame(fno)
-                bf.rotation = ry_bf.rotation * rx_bf.rotation * rz_bf.rotation
-                logger.debug(f"{fno}, {bone_name}, rx: {rx_bf.rotation.toEulerAngles4MMD().to_log()}, ry: {ry_bf.rotation.toEulerAngles4MMD().to_log()}, rz: {rz_bf.rotation.toEulerAngles4MMD().to_log()}")
+                rx_qq = MQuaternion(*sampled_bones[rrxbn][1][fno].tolist()) if len(rrxbn) > 0 else MQuaternion()
+                ry_qq = MQuaternion(*sampled_bones[rrybn][1][fno].tolist()) if len(rrybn) > 0 else MQuaternion()
+                rz_qq = MQuaternion(*sampled_bones[rrzbn][1][fno].tolist()) if len(rrzbn) > 0 else MQuaternion()
+                bf.rotation = ry_qq * rx_qq * rz_qq
+                logger.debug(f"{fno}, {bone_name}, rx: {rx_qq.toEulerAngles4MMD().to_log()}, ry: {ry_qq.toEulerAngles4MMD().to_log()}, rz: {rz_qq.toEulerAngles4MMD().to_log()}")
 
             if model.bones[bone_name].getTranslatable():
-                mx_bf = motion.calc_bf(rmxbn, fno) if len(rmxbn) > 0 else VmdBoneFrame(fno)
-                my_bf = motion.calc_bf(rmybn, fno) if len(rmybn) > 0 else VmdBoneFrame(fno)
-                mz_bf = motion.calc_bf(rmzbn, fno) if len(rmzbn) > 0 else VmdBoneFrame(fno)
-                bf.position = my_bf.position + mx_bf.position + mz_bf.position
+                mx_pos = MVector3D(*sampled_bones[rmxbn][0][fno].tolist()) if len(rmxbn) > 0 else MVector3D()
+                my_pos = MVector3D(*sampled_bones[rmybn][0][fno].tolist()) if len(rmybn) > 0 else MVector3D()
+                mz_pos = MVector3D(*sampled_bones[rmzbn][0][fno].tolist()) if len(rmzbn) > 0 else MVector3D()
+                bf.position = my_pos + mx_pos + mz_pos
 
             motion.regist_bf(bf, bone_name, fno)
 
@@ -12,7 +12,8 @@ from mmd.PmxData import PmxModel # noqa
 from mmd.VmdData import VmdMotion, VmdBoneFrame, VmdCameraFrame, VmdInfoIk, VmdLightFrame, VmdMorphFrame, VmdShadowFrame, VmdShowIkFrame # noqa
 from mmd.VmdWriter import VmdWriter
 from module.MMath import MRect, MVector3D, MVector4D, MQuaternion, MMatrix4x4 # noqa
-from utils import MServiceUtils, MBezierUtils # noqa
+from utils import MServiceUtils, MBezierUtils, MProcessUtils # noqa
+from utils.MProcessUtils import MotionTask
 from utils.MLogger import MLogger # noqa
 from utils.MException import SizingException, MKilledException
 
@@ -76,29 +77,20 @@ class ConvertMultiSplitService():
                     
             if self.options.remove_unnecessary_flg:
                 # 不要キー削除
-                futures = []
-                with ThreadPoolExecutor(thread_name_prefix="remove", max_workers=self.options.max_workers) as executor:
-                    for (bone_name, rrxbn, rrybn, rrzbn, rmxbn, rmybn, rmzbn) in self.options.target_bones:
-                        if model.bones[bone_name].getRotatable():
-                            if len(rrxbn) > 0:
-                                futures.append(executor.submit(self.remove_unnecessary_bf, rrxbn))
-                            if len(rrybn) > 0:
-                                futures.append(executor.submit(self.remove_unnecessary_bf, rrybn))
-                            if len(rrzbn) > 0:
-                                futures.append(executor.submit(self.remove_unnecessary_bf, rrzbn))
-
-                        if model.bones[bone_name].getTranslatable():
-                            if len(rmxbn) > 0:
-                                futures.append(executor.submit(self.remove_unnecessary_bf, rmxbn))
-                            if len(rmybn) > 0:
-                                futures.append(executor.submit(self.remove_unnecessary_bf, rmybn))
-                            if len(rmzbn) > 0:
-                                futures.append(executor.submit(self.remove_unnecessary_bf, rmzbn))
-
-                concurrent.futures.wait(futures, timeout=None, return_when=concurrent.futures.FIRST_EXCEPTION)
-
-                for f in futures:
-                    if not f.result():
+                tasks = []
+                for (bone_name, rrxbn, rrybn, rrzbn, rmxbn, rmybn, rmzbn) in self.options.target_bones:
+                    split_bone_names = []
+                    if model.bones[bone_name].getRotatable():
+                        split_bone_names.extend([rrxbn, rrybn, rrzbn])
+                    if model.bones[bone_name].getTranslatable():
+                        split_bone_names.extend([rmxbn, rmybn, rmzbn])
+
+                    for split_bone_name in split_bone_names:
+                        if len(split_bone_name) > 0:
+                            tasks.append(MotionTask("remove_unnecessary_bf", split_bone_name, bone_names=[split_bone_name]))
+
+                for result in MProcessUtils.execute_motion_tasks(self, "remove", tasks):
+                    if not result:
                         return False
                 
             # 最後に出力
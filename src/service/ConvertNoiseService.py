@@ -1,24 +1,28 @@
 # -*- coding: utf-8 -*-
 #
-import math
 import numpy as np
 import logging
 import os
 import traceback
-import concurrent.futures
-from concurrent.futures import ThreadPoolExecutor
 
 from module.MOptions import MNoiseOptions, MOptionsDataSet
 from mmd.PmxData import PmxModel # noqa
-from mmd.VmdData import VmdMotion, VmdBoneFrame, VmdCameraFrame, VmdInfoIk, VmdLightFrame, VmdMorphFrame, VmdShadowFrame, VmdShowIkFrame # noqa
+from mmd.VmdData import VmdMotion, VmdFrameDict, VmdBoneFrameColumns, VmdBoneFrame, VmdCameraFrame, VmdInfoIk, VmdLightFrame, VmdMorphFrame, VmdShadowFrame, VmdShowIkFrame # noqa
 from mmd.VmdWriter import VmdWriter
-from module.MMath import MRect, MVector3D, MVector4D, MQuaternion, MMatrix4x4 # noqa
-from utils import MServiceUtils, MBezierUtils # noqa
+from module.MMath import MRect, MVector3D, MVector4D, MQuaternion, MMatrix4x4, MQuaternionArray # noqa
+from utils import MServiceUtils, MBezierUtils, MProcessUtils # noqa
+from utils.MProcessUtils import MotionTask
 from utils.MLogger import MLogger # noqa
 from utils.MException import SizingException, MKilledException
 
 logger = MLogger(__name__, level=1)
 
+# 移動補間曲線（X, Y, Z）・回転補間曲線のINDEX（1つ目の値を4箇所に設定する）
+MOVE_BZ_IDXS = np.array([MBezierUtils.MX_x1_idxs, MBezierUtils.MX_y1_idxs, MBezierUtils.MX_x2_idxs, MBezierUtils.MX_y2_idxs, \
+                         MBezierUtils.MY_x1_idxs, MBezierUtils.MY_y1_idxs, MBezierUtils.MY_x2_idxs, MBezierUtils.MY_y2_idxs, \
+                         MBezierUtils.MZ_x1_idxs, MBezierUtils.MZ_y1_idxs, MBezierUtils.MZ_x2_idxs, MBezierUtils.MZ_y2_idxs], dtype=np.int64)
+ROTATION_BZ_IDXS = np.array([MBezierUtils.R_x1_idxs, MBezierUtils.R_y1_idxs, MBezierUtils.R_x2_idxs, MBezierUtils.R_y2_idxs], dtype=np.int64)
+
 
 class ConvertNoiseService():
     def __init__(self, options: MNoiseOptions):
@@ -39,21 +43,27 @@ class ConvertNoiseService():
             service_data_txt = "{service_data_txt}　指ゆらぎ: {finger_noise}\n".format(service_data_txt=service_data_txt,
                                     finger_noise=self.options.finger_noise_flg) # noqa
 
-            logger.info(service_data_txt, decoration=MLogger.DECORATION_BOX)
+            seed_seq = np.random.SeedSequence(self.options.noise_seed)
+            service_data_txt = "{service_data_txt}　乱数シード: {noise_seed}\n".format(service_data_txt=service_data_txt,
+                                    noise_seed=seed_seq.entropy) # noqa
 
-            futures = []
+            logger.info(service_data_txt, decoration=MLogger.DECORATION_BOX)
 
-            with ThreadPoolExecutor(thread_name_prefix="move", max_workers=self.options.max_workers) as executor:
-                for copy_no in range(self.options.copy_cnt):
-                    # やる気係数を適用する場合、シード生成
-                    seed = np.random.randint(85, 115) / 100 if self.options.motivation_flg else 1
-                    futures.append(executor.submit(self.convert_noise, copy_no, seed))
+            # 複製ごとに独立した乱数生成器（同じシードであれば、処理順に関わらず同じ結果になる）
+            tasks = []
+            seeds = []
+            for copy_no, copy_seed_seq in enumerate(seed_seq.spawn(self.options.copy_cnt)):
+                rng = np.random.default_rng(copy_seed_seq)
+                # やる気係数を適用する場合、シード生成
+                seed = rng.integers(85, 115) / 100 if self.options.motivation_flg else 1
+                tasks.append(MotionTask("convert_noise", copy_no, seed, rng, is_full_motion=True))
+                seeds.append(seed)
 
-            concurrent.futures.wait(futures, timeout=None, return_when=concurrent.futures.FIRST_EXCEPTION)
+            # 出力は全複製が揃ってからまとめて行う（途中で停止した場合、1つも出力しない）
+            noise_motions = MProcessUtils.execute_motion_tasks(self, "move", tasks)
 
-            for f in futures:
-                if not f.result():
-                    return False
+            for copy_no, (seed, noise_motion) in enumerate(zip(seeds, noise_motions)):
+                self.write_noise_motion(copy_no, seed, noise_motion)
 
             return True
         except MKilledException:
@@ -65,102 +75,118 @@ class ConvertNoiseService():
         finally:
             logging.shutdown()
 
-    # ゆらぎ複製処理実行
-    def convert_noise(self, copy_no: int, seed: float):
+    # ゆらぎ複製処理実行（ゆらぎを付けたモーションを返す）
+    def convert_noise(self, copy_no: int, seed: float, rng: np.random.Generator):
         logger.info("ゆらぎ複製　【No.%s】", (copy_no + 1), decoration=MLogger.DECORATION_LINE)
 
         # データをコピーしてそっちを弄る
         motion = self.options.motion.copy()
 
-        for bone_name in motion.bones.keys():
+        for bone_name in list(motion.bones.keys()):
             if not self.options.finger_noise_flg and "指" in bone_name:
                 logger.info("-- 指スキップ【No.%s - %s】", copy_no + 1, bone_name)
                 continue
 
-            fnos = motion.get_bone_fnos(bone_name)
-            prev_fno = 0
-            prev_sep_fno = 0
+            # 元モーションのキー（ゆらぎを付けるのはこのキーのみ）
+            org_frames = self.options.motion.bones[bone_name]
+            org_fnos, org_positions, _, _ = (org_frames if isinstance(org_frames, VmdFrameDict) else VmdFrameDict(org_frames)).bone_arrays()
 
             # 事前に細分化
             self.prepare_split_stance(motion, bone_name)
             logger.info("-- 準備完了【No.%s - %s】", copy_no + 1, bone_name)
 
-            for fno in fnos:
-                bf = motion.bones[bone_name][fno]
-                org_bf = self.options.motion.calc_bf(bone_name, fno)
-
-                # 移動
-                if bf.position != MVector3D():
-                    prev_org_bf = self.options.motion.calc_bf(bone_name, prev_fno)
-
-                    if org_bf.position == prev_org_bf.position and fno > 0:
-                        bf.position = motion.calc_bf(bone_name, prev_fno).position
-                    else:
-                        # 0だったら動かさない
-                        if round(org_bf.position.x(), 1) != 0:
-                            if self.options.motivation_flg:
-                                bf.position.setX(bf.position.x() * seed + (0.5 - np.random.rand()) * (self.options.noise_size / 10))
-                            else:
-                                bf.position.setX(bf.position.x() + (0.5 - np.random.rand()) * (self.options.noise_size / 10))
-                        if round(org_bf.position.y(), 1) != 0 and "足ＩＫ" not in bone_name:
-                            # 足ＩＫのＹは動かさない
-                            if self.options.motivation_flg:
-                                if org_bf.position.y() < 0:
-                                    # Yはオリジナルがマイナスの場合は、マイナスのみに動かす
-                                    bf.position.setY(bf.position.y() * seed + (0 - np.random.rand()) * (self.options.noise_size / 10))
-                                elif org_bf.position.y() > 0:
-                                    bf.position.setY(bf.position.y() * seed + (0.5 - np.random.rand()) * (self.options.noise_size / 10))
-                            else:
-                                bf.position.setY(bf.position.y() + (0.5 - np.random.rand()) * (self.options.noise_size / 10))
-                        if round(org_bf.position.z(), 1) != 0:
-                            if self.options.motivation_flg:
-                                bf.position.setZ(bf.position.z() * seed + (0.5 - np.random.rand()) * (self.options.noise_size / 10))
-                            else:
-                                bf.position.setZ(bf.position.z() + (0.5 - np.random.rand()) * (self.options.noise_size / 10))
-
-                        # 移動補間曲線
-                        for (bz_idx1, bz_idx2, bz_idx3, bz_idx4) in [MBezierUtils.MX_x1_idxs, MBezierUtils.MX_y1_idxs, MBezierUtils.MX_x2_idxs, MBezierUtils.MX_y2_idxs, \
-                                                                     MBezierUtils.MY_x1_idxs, MBezierUtils.MY_y1_idxs, MBezierUtils.MY_x2_idxs, MBezierUtils.MY_y2_idxs, \
-                                                                     MBezierUtils.MZ_x1_idxs, MBezierUtils.MZ_y1_idxs, MBezierUtils.MZ_x2_idxs, MBezierUtils.MZ_y2_idxs]:
-                            noise_interpolation = bf.interpolation[bz_idx1] + math.ceil((0.5 - np.random.rand()) * self.options.noise_size)
-                            bf.interpolation[bz_idx1] = bf.interpolation[bz_idx2] = bf.interpolation[bz_idx3] = bf.interpolation[bz_idx4] = int(noise_interpolation)
-                
-                # 回転
-                euler = bf.rotation.toEulerAngles()
-                # 回転は元が0であっても動かす(足は除く)
-                if "足" not in bone_name and "ひざ" not in bone_name and "足首" not in bone_name:
-                    if self.options.motivation_flg:
-                        euler.setX(euler.x() * seed + (0.5 - np.random.rand()) * self.options.noise_size)
-                        euler.setY(euler.y() * seed + (0.5 - np.random.rand()) * self.options.noise_size)
-                        euler.setZ(euler.z() * seed + (0.5 - np.random.rand()) * self.options.noise_size)
-                    else:
-                        euler.setX(euler.x() + (0.5 - np.random.rand()) * self.options.noise_size)
-                        euler.setY(euler.y() + (0.5 - np.random.rand()) * self.options.noise_size)
-                        euler.setZ(euler.z() + (0.5 - np.random.rand()) * self.options.noise_size)
-                bf.rotation = MQuaternion.fromEulerAngles(euler.x(), euler.y(), euler.z())
-
-                # 回転補間曲線
-                for (bz_idx1, bz_idx2, bz_idx3, bz_idx4) in [MBezierUtils.R_x1_idxs, MBezierUtils.R_y1_idxs, MBezierUtils.R_x2_idxs, MBezierUtils.R_y2_idxs]:
-                    noise_interpolation = bf.interpolation[bz_idx1] + math.ceil((0.5 - np.random.rand()) * self.options.noise_size)
-
-                    bf.interpolation[bz_idx1] = bf.interpolation[bz_idx2] = bf.interpolation[bz_idx3] = bf.interpolation[bz_idx4] = int(noise_interpolation)
-                
-                # 前回fno保持
-                prev_fno = fno
-
-                if fno // 2000 > prev_sep_fno and fnos[-1] > 0:
-                    logger.count(f"【No.{copy_no + 1} - {bone_name}】", fno, fnos)
-                    prev_sep_fno = fno // 2000
+            # 細分化後のキーを配列に詰め直して、まとめてゆらぎを付ける
+            frames = motion.bones[bone_name]
+            frames = frames.compact() if isinstance(frames, VmdBoneFrameColumns) else VmdBoneFrameColumns.from_frames(bone_name, frames)
+            motion.bones[bone_name] = self.apply_noise_columns(frames, org_fnos, org_positions, seed, rng)
 
+            logger.info("-- ゆらぎ完了【No.%s - %s】", copy_no + 1, bone_name)
+
+        return motion
+
+    # ゆらぎを付けたモーションを出力
+    def write_noise_motion(self, copy_no: int, seed: float, motion: VmdMotion):
         output_path = self.options.output_path.replace("nxxx", "n{0:03d}".format(copy_no + 1))
         output_path = output_path.replace("axxx", "a{0:+03d}".format(int(seed * 100) - 100))
 
-        # 最後に出力
+        logger.info("ゆらぎ出力　【No.%s】", (copy_no + 1), decoration=MLogger.DECORATION_LINE)
+
         VmdWriter(MOptionsDataSet(motion, None, self.options.model, output_path, False, False, [], None, 0, [])).write()
 
         logger.info("出力成功: %s", os.path.basename(output_path), decoration=MLogger.DECORATION_BOX)
 
-        return True
+    # 1ボーン分のキー配列にゆらぎを付けた配列を返す
+    def apply_noise_columns(self, frames: VmdBoneFrameColumns, org_fnos: np.ndarray, org_positions: np.ndarray, seed: float, rng: np.random.Generator):
+        bone_name = frames.name
+        noise_size = self.options.noise_size
+        cnt = len(org_fnos)
+
+        positions = frames.positions.copy()
+        interpolations = frames.interpolations.astype(np.int64)
+
+        # 元モーションのキーの行
+        rows = np.searchsorted(frames.fno_values, org_fnos)
+
+        # ゆらぎは使う使わないに関わらず、キー数分まとめて生成する（生成順を固定して再現できるようにする）
+        position_noises = rng.random((cnt, 3))
+        move_interpolation_noises = rng.random((cnt, len(MOVE_BZ_IDXS)))
+        euler_noises = rng.random((cnt, 3))
+        rotation_interpolation_noises = rng.random((cnt, len(ROTATION_BZ_IDXS)))
+
+        # 移動 ---------------
+        base_positions = positions[rows]
+
+        # ひとつ前のキー（先頭はフレーム0）の元の位置
+        prev_org_positions = np.vstack([org_positions[:1], org_positions[:-1]])
+
+        # 0だったら動かさない
+        is_moved = np.any(base_positions != 0, axis=1)
+        # 元が前のキーと同じ位置の場合、前のキーの位置をそのまま使う
+        is_same_prev = is_moved & np.all(org_positions == prev_org_positions, axis=1) & (org_fnos > 0)
+        is_noised = is_moved & ~is_same_prev
+
+        # 軸ごとに0だったら動かさない（足ＩＫのＹは動かさない）
+        axis_noised = is_noised[:, np.newaxis] & (np.round(org_positions, 1) != 0)
+        if "足ＩＫ" in bone_name:
+            axis_noised[:, 1] = False
+
+        # Yはオリジナルがマイナスの場合は、マイナスのみに動かす
+        noise_centers = np.full((cnt, 3), 0.5)
+        if self.options.motivation_flg:
+            noise_centers[org_positions[:, 1] < 0, 1] = 0
+
+        noised_positions = np.where(axis_noised, base_positions * seed + (noise_centers - position_noises) * (noise_size / 10), base_positions)
+
+        # 前のキーの位置を使うキーは、直近のゆらぎを付けたキーから埋める
+        src_idxs = np.maximum.accumulate(np.where(is_same_prev, -1, np.arange(cnt)))
+        positions[rows] = np.where((src_idxs >= 0)[:, np.newaxis], noised_positions[np.maximum(src_idxs, 0)], base_positions)
+
+        # 移動補間曲線
+        move_interpolations = interpolations[rows[is_noised]]
+        move_interpolations[:, MOVE_BZ_IDXS.T] = \
+            (move_interpolations[:, MOVE_BZ_IDXS[:, 0]] + np.ceil((0.5 - move_interpolation_noises[is_noised]) * noise_size).astype(np.int64))[:, np.newaxis]
+        interpolations[rows[is_noised]] = move_interpolations
+
+        # 回転 ---------------
+        # 回転はまとめてオイラー角に変換しておく
+        eulers = MQuaternionArray(frames.rotations[rows]).toEulerAngles().data()
+
+        # 回転は元が0であっても動かす(足は除く)
+        if "足" not in bone_name and "ひざ" not in bone_name and "足首" not in bone_name:
+            eulers = eulers * seed + (0.5 - euler_noises) * noise_size
+
+        rotations = frames.rotations.copy()
+        rotations[rows] = MQuaternionArray.fromEulerAngles(eulers[:, 0], eulers[:, 1], eulers[:, 2]).data()
+
+        # 回転補間曲線
+        rotation_interpolations = interpolations[rows]
+        rotation_interpolations[:, ROTATION_BZ_IDXS.T] = \
+            (rotation_interpolations[:, ROTATION_BZ_IDXS[:, 0]] + np.ceil((0.5 - rotation_interpolation_noises) * noise_size).astype(np.int64))[:, np.newaxis]
+        interpolations[rows] = rotation_interpolations
+
+        # 補間曲線はMMDの範囲に収める
+        return VmdBoneFrameColumns(bone_name, frames.bname, frames.fno_values, positions, rotations, frames.org_rotations, \
+                                   np.clip(interpolations, 0, 127), frames.key_flags, frames.read_flags)
 
     # スタンス用細分化
     def prepare_split_stance(self, motion: VmdMotion, target_bone_name: str):
@@ -3,15 +3,14 @@
 import logging
 import os
 import traceback
-import concurrent.futures
-from concurrent.futures import ThreadPoolExecutor
 
 from module.MOptions import MParentOptions, MOptionsDataSet
 from mmd.PmxData import PmxModel # noqa
 from mmd.VmdData import VmdMotion, VmdBoneFrame, VmdCameraFrame, VmdInfoIk, VmdLightFrame, VmdMorphFrame, VmdShadowFrame, VmdShowIkFrame # noqa
 from mmd.VmdWriter import VmdWriter
 from module.MMath import MRect, MVector3D, MVector4D, MQuaternion, MMatrix4x4 # noqa
-from utils import MServiceUtils, MBezierUtils # noqa
+from utils import MServiceUtils, MBezierUtils, MProcessUtils # noqa
+from utils.MProcessUtils import MotionTask
 from utils.MLogger import MLogger # noqa
 from utils.MException import SizingException, MKilledException
 
@@ -268,16 +267,12 @@ class ConvertParentService():
         logger.info("移植完了", decoration=MLogger.DECORATION_LINE)
 
         if self.options.remove_unnecessary_flg:
-            futures = []
+            tasks = []
+            for bone_name in [center_bone_name, upper_bone_name, lower_bone_name, right_leg_ik_bone_name, left_leg_ik_bone_name]:
+                tasks.append(MotionTask("remove_unnecessary_bf", bone_name, bone_names=[bone_name]))
 
-            with ThreadPoolExecutor(thread_name_prefix="remove", max_workers=self.options.max_workers) as executor:
-                for bone_name in [center_bone_name, upper_bone_name, lower_bone_name, right_leg_ik_bone_name, left_leg_ik_bone_name]:
-                    futures.append(executor.submit(self.remove_unnecessary_bf, bone_name))
-
-            concurrent.futures.wait(futures, timeout=None, return_when=concurrent.futures.FIRST_EXCEPTION)
-
-            for f in futures:
-                if not f.result():
+            for result in MProcessUtils.execute_motion_tasks(self, "remove", tasks):
+                if not result:
                     return False
         
         return True
@@ -5,16 +5,15 @@ import numpy as np
 import logging
 import os
 import traceback
-import concurrent.futures
-from concurrent.futures import ThreadPoolExecutor
 
 from module.MOptions import MSmoothOptions, MOptionsDataSet
 from mmd.PmxData import PmxModel # noqa
 from mmd.VmdData import VmdMotion, VmdBoneFrame, VmdCameraFrame, VmdInfoIk, VmdLightFrame, VmdMorphFrame, VmdShadowFrame, VmdShowIkFrame # noqa
 from mmd.VmdWriter import VmdWriter
 import module.MMath as MMath
-from module.MMath import MRect, MVector3D, MVector4D, MQuaternion, MMatrix4x4 # noqa
-from utils import MServiceUtils, MBezierUtils # noqa
+from module.MMath import MRect, MVector3D, MVector4D, MQuaternion, MMatrix4x4, MQuaternionArray # noqa
+from utils import MServiceUtils, MBezierUtils, MProcessUtils # noqa
+from utils.MProcessUtils import MotionTask
 from utils.MLogger import MLogger # noqa
 from utils.MException import SizingException
 
@@ -66,75 +65,70 @@ class ConvertSmoothService():
     def convert_smooth(self):
         # 最初に全打ち
 
-        futures = []
-        with ThreadPoolExecutor(thread_name_prefix="prepare", max_workers=self.options.max_workers) as executor:
-            for bone_name in self.options.motion.bones.keys():
-                if bone_name in self.options.model.bones and bone_name in self.options.bone_list and bone_name not in ["両目"]:
-                    # if bone_name in self.options.model.bones and bone_name in self.options.bone_list:
-                    if self.options.interpolation == 0 and len(self.options.motion.bones[bone_name].keys()) >= 2:
-                        # 線形補間の場合、そのまま全打ち
-                        futures.append(executor.submit(self.prepare_linear, bone_name))
-                    elif self.options.interpolation == 1:
-                        if len(self.options.motion.bones[bone_name].keys()) > 2:
-                            # 円形補間の場合、円形全打ち
-                            futures.append(executor.submit(self.prepare_circle, bone_name))
-                        else:
-                            # 円形補間でキー数が足りない場合、線形補間
-                            logger.warning("円形補間が指定されましたが、キー数が3つに満たないため、計算出来ません。ボーン名: %s", bone_name)
-                            futures.append(executor.submit(self.prepare_linear, bone_name))
-                    elif self.options.interpolation == 2:
-                        if len(self.options.motion.bones[bone_name].keys()) > 2:
-                            # 曲線補間の場合、カトマル曲線全打ち
-                            futures.append(executor.submit(self.prepare_curve, bone_name))
-                        else:
-                            # 曲線補間でキー数が足りない場合、線形補間
-                            logger.warning("曲線補間が指定されましたが、キー数が3つに満たないため、計算出来ません。ボーン名: %s", bone_name)
-                            futures.append(executor.submit(self.prepare_linear, bone_name))
-
-            for morph_name in self.options.motion.morphs.keys():
-                if morph_name in self.options.model.morphs and morph_name in self.options.bone_list:
-                    if self.options.interpolation == 0 and len(self.options.motion.morphs[morph_name].keys()) >= 2:
-                        # 線形補間の場合、そのまま全打ち
-                        futures.append(executor.submit(self.prepare_linear, morph_name, is_morph=True))
-                    elif self.options.interpolation == 1:
-                        if len(self.options.motion.morphs[morph_name].keys()) > 2:
-                            # 円形補間の場合、モーフはそのまま
-                            logger.warning("円形補間が指定されましたが、モーフは円形補間計算が出来ません。モーフ名: %s", morph_name)
-                            futures.append(executor.submit(self.prepare_linear, morph_name, is_morph=True))
-                        else:
-                            # 円形補間でキー数が足りない場合、線形補間
-                            logger.warning("円形補間が指定されましたが、キー数が3つに満たないため、計算出来ません。モーフ名: %s", morph_name)
-                            futures.append(executor.submit(self.prepare_linear, morph_name, is_morph=True))
-                    elif self.options.interpolation == 2:
-                        if len(self.options.motion.morphs[morph_name].keys()) > 2:
-                            # 曲線補間の場合、カトマル曲線全打ち
-                            futures.append(executor.submit(self.prepare_curve_morph, morph_name))
-                        else:
-                            # 曲線補間でキー数が足りない場合、線形補間
-                            logger.warning("曲線補間が指定されましたが、キー数が3つに満たないため、計算出来ません。モーフ名: %s", morph_name)
-                            futures.append(executor.submit(self.prepare_linear, morph_name, is_morph=True))
-
-        concurrent.futures.wait(futures, timeout=None, return_when=concurrent.futures.FIRST_EXCEPTION)
-
-        for f in futures:
-            if not f.result():
+        tasks = []
+        for bone_name in self.options.motion.bones.keys():
+            if bone_name in self.options.model.bones and bone_name in self.options.bone_list and bone_name not in ["両目"]:
+                # if bone_name in self.options.model.bones and bone_name in self.options.bone_list:
+                if self.options.interpolation == 0 and len(self.options.motion.bones[bone_name].keys()) >= 2:
+                    # 線形補間の場合、そのまま全打ち
+                    tasks.append(MotionTask("prepare_linear", bone_name, bone_names=[bone_name]))
+                elif self.options.interpolation == 1:
+                    if len(self.options.motion.bones[bone_name].keys()) > 2:
+                        # 円形補間の場合、円形全打ち
+                        tasks.append(MotionTask("prepare_circle", bone_name, bone_names=[bone_name]))
+                    else:
+                        # 円形補間でキー数が足りない場合、線形補間
+                        logger.warning("円形補間が指定されましたが、キー数が3つに満たないため、計算出来ません。ボーン名: %s", bone_name)
+                        tasks.append(MotionTask("prepare_linear", bone_name, bone_names=[bone_name]))
+                elif self.options.interpolation == 2:
+                    if len(self.options.motion.bones[bone_name].keys()) > 2:
+                        # 曲線補間の場合、カトマル曲線全打ち
+                        tasks.append(MotionTask("prepare_curve", bone_name, bone_names=[bone_name]))
+                    else:
+                        # 曲線補間でキー数が足りない場合、線形補間
+                        logger.warning("曲線補間が指定されましたが、キー数が3つに満たないため、計算出来ません。ボーン名: %s", bone_name)
+                        tasks.append(MotionTask("prepare_linear", bone_name, bone_names=[bone_name]))
+
+        for morph_name in self.options.motion.morphs.keys():
+            if morph_name in self.options.model.morphs and morph_name in self.options.bone_list:
+                if self.options.interpolation == 0 and len(self.options.motion.morphs[morph_name].keys()) >= 2:
+                    # 線形補間の場合、そのまま全打ち
+                    tasks.append(MotionTask("prepare_linear", morph_name, morph_names=[morph_name], is_morph=True))
+                elif self.options.interpolation == 1:
+                    if len(self.options.motion.morphs[morph_name].keys()) > 2:
+                        # 円形補間の場合、モーフはそのまま
+                        logger.warning("円形補間が指定されましたが、モーフは円形補間計算が出来ません。モーフ名: %s", morph_name)
+                        tasks.append(MotionTask("prepare_linear", morph_name, morph_names=[morph_name], is_morph=True))
+                    else:
+                        # 円形補間でキー数が足りない場合、線形補間
+                        logger.warning("円形補間が指定されましたが、キー数が3つに満たないため、計算出来ません。モーフ名: %s", morph_name)
+                        tasks.append(MotionTask("prepare_linear", morph_name, morph_names=[morph_name], is_morph=True))
+                elif self.options.interpolation == 2:
+                    if len(self.options.motion.morphs[morph_name].keys()) > 2:
+                        # 曲線補間の場合、カトマル曲線全打ち
+                        tasks.append(MotionTask("prepare_curve_morph", morph_name, morph_names=[morph_name]))
+                    else:
+                        # 曲線補間でキー数が足りない場合、線形補間
+                        logger.warning("曲線補間が指定されましたが、キー数が3つに満たないため、計算出来ません。モーフ名: %s", morph_name)
+                        tasks.append(MotionTask("prepare_linear", morph_name, morph_names=[morph_name], is_morph=True))
+
+        for result in MProcessUtils.execute_motion_tasks(self, "prepare", tasks):
+            if not result:
                 return False
         
         # 処理回数が2回以上の場合、不要キー削除
         if self.options.loop_cnt >= 2:
-            futures = []
-            with ThreadPoolExecutor(thread_name_prefix="remove", max_workers=self.options.max_workers) as executor:
-                for bone_name in self.options.motion.bones.keys():
-                    if bone_name in self.options.model.bones and bone_name in self.options.bone_list and bone_name not in ["両目"] and len(self.options.motion.bones[bone_name].keys()) > 2:
-                        # if bone_name in self.options.model.bones and bone_name in self.options.bone_list:
-                        futures.append(executor.submit(self.remove_filterd_bf, bone_name))
-                for morph_name in self.options.motion.morphs.keys():
-                    if morph_name in self.options.model.morphs and morph_name in self.options.bone_list and len(self.options.motion.morphs[morph_name].keys()) > 2:
-                        futures.append(executor.submit(self.remove_filterd_mf, morph_name))
-            concurrent.futures.wait(futures, timeout=None, return_when=concurrent.futures.FIRST_EXCEPTION)
-
-            for f in futures:
-                if not f.result():
+            tasks = []
+            for bone_name in self.options.motion.bones.keys():
+                if bone_name in self.options.model.bones and bone_name in self.options.bone_list and bone_name not in ["両目"] and len(self.options.motion.bones[bone_name].keys()) > 2:
+                    # if bone_name in self.options.model.bones and bone_name in self.options.bone_list:
+                    tasks.append(MotionTask("remove_filterd_bf", bone_name, bone_names=[bone_name]))
+            for morph_name in self.options.motion.morphs.keys():
+                if morph_name in self.options.model.morphs and morph_name in self.options.bone_list and len(self.options.motion.morphs[morph_name].keys()) > 2:
+                    tasks.append(MotionTask("remove_filterd_mf", morph_name, morph_names=[morph_name]))
+
+            for result in MProcessUtils.execute_motion_tasks(self, "remove", tasks):
+                if not result:
                     return False
 
         return True
@@ -268,26 +262,16 @@ class ConvertSmoothService():
             # 全キーフレを取得
             fnos = self.options.motion.get_bone_fnos(bone_name, is_read=True)
 
-            rx_values = []
-            ry_values = []
-            rz_values = []
-            mx_values = []
-            my_values = []
-            mz_values = []
-            
-            for fno in fnos:
-                bf = self.options.motion.calc_bf(bone_name, fno)
-                
-                if self.options.model.bones[bone_name].getRotatable():
-                    euler = bf.rotation.toEulerAngles()
-                    rx_values.append(euler.x())
-                    ry_values.append(euler.y())
-                    rz_values.append(euler.z())
-                
-                if self.options.model.bones[bone_name].getTranslatable():
-                    mx_values.append(bf.position.x())
-                    my_values.append(bf.position.y())
-                    mz_values.append(bf.position.z())
+            # 読み込みキーの値をまとめて取得し、回転はまとめてオイラー角に変換する
+            positions, rotations = self.options.motion.sample_bone(bone_name, fnos)
+            eulers = MQuaternionArray(rotations).toEulerAngles()
+
+            rx_values = eulers.x().tolist()
+            ry_values = eulers.y().tolist()
+            rz_values = eulers.z().tolist()
+            mx_values = positions[:, 0].tolist()
+            my_values = positions[:, 1].tolist()
+            mz_values = positions[:, 2].tolist()
             
             if self.options.model.bones[bone_name].getRotatable():
                 rx_all_values = MBezierUtils.calc_value_from_catmullrom(bone_name, fnos, rx_values)
@@ -328,9 +312,10 @@ class ConvertSmoothService():
                     mz_all_values = [0]
 
             # カトマル曲線で生成した値を全打ち
-            for fno, (rx, ry, rz, mx, my, mz) in enumerate(zip(rx_all_values, ry_all_values, rz_all_values, mx_all_values, my_all_values, mz_all_values)):
+            all_rotations = MQuaternionArray.fromEulerAngles(rx_all_values, ry_all_values, rz_all_values).to_list()
+            for fno, (rotation, mx, my, mz) in enumerate(zip(all_rotations, mx_all_values, my_all_values, mz_all_values)):
                 bf = self.options.motion.calc_bf(bone_name, fno)
-                bf.rotation = MQuaternion.fromEulerAngles(rx, ry, rz)
+                bf.rotation = rotation
                 bf.position = MVector3D(mx, my, mz)
                 self.options.motion.regist_bf(bf, bone_name, fno)
                 
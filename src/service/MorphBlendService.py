@@ -10,7 +10,7 @@ import random
 from datetime import datetime
 
 from mmd.VmdWriter import VmdWriter
-from mmd.VmdData import VmdMotion, VmdMorphFrame # noqa
+from mmd.VmdData import VmdMotion, VmdFrameDict, VmdMorphFrame # noqa
 from module.MOptions import MBlendOptions, MOptionsDataSet
 from utils import MFileUtils
 from utils.MException import SizingException
@@ -73,7 +73,7 @@ class MorphBlendService():
         for mk, mv in self.options.model.morphs.items():
             if mv.display and mv.name in target_morphs:
                 all_morphs.append(mv)
-                bone_motion.morphs[mk] = {}
+                bone_motion.morphs[mk] = VmdFrameDict()
 
         # 変化量(少ない方のの割合を多くする)
         ratio_values = [self.options.inc_value * x for x in range(math.ceil(self.options.min_value / self.options.inc_value), \
@@ -2,8 +2,6 @@ from setuptools import Extension
 from numpy import get_include   # cimport numpy を使うため
 import os
 
-bezier_path = '../bezier/src/fortran/include'
-
 kwargs = {"output_dir": "./build/output", "build_dir": "./build/"}
 
 
@@ -25,7 +23,7 @@ def get_ext():
     for source in sources:
         path = source.replace(os.sep, ".").replace(".pyx", "").replace(".py", "")
         print("%s -> %s" % (source, path))
-        ext.append(Extension(path, sources=[source], include_dirs=['.', bezier_path, get_include()], define_macros=[("NPY_NO_DEPRECATED_API", "NPY_1_7_API_VERSION")]))
+        ext.append(Extension(path, sources=[source], include_dirs=['.', get_include()], define_macros=[("NPY_NO_DEPRECATED_API", "NPY_1_7_API_VERSION")]))
     
     return ext
 
@@ -11,12 +11,28 @@ cpdef np.ndarray calc_value_from_catmullrom(str bone_name, list fnos, list value
 
 cdef tuple c_join_value_2_bezier(int fno, str bone_name, list values, double offset, double diff_limit)
 
+cdef np.ndarray bezier_transform(int n)
+
+cdef np.ndarray fit_cubic_bezier(np.ndarray xs, np.ndarray ys)
+
+cdef np.ndarray fit_cubic_bezier_many(np.ndarray xs, np.ndarray ys)
+
+cdef list c_join_values_2_bezier(np.ndarray values, np.ndarray starts, np.ndarray ends, np.ndarray diff_limits, double offset)
+
 cdef list fit_bezier_mmd(list bzs)
 
 cdef tuple convert_catmullrom_2_bezier(np.ndarray xs, np.ndarray ys)
 
+cdef double solve_bezier_t(double x1, double x2, double x) nogil
+
+cdef double bezier_y(double y1, double y2, double t) nogil
+
 cdef tuple c_evaluate(int x1v, int y1v, int x2v, int y2v, int start, int now, int end)
 
+cdef tuple c_evaluate_array(np.ndarray x1vs, np.ndarray y1vs, np.ndarray x2vs, np.ndarray y2vs, np.ndarray starts, np.ndarray nows, np.ndarray ends)
+
+cdef tuple c_evaluate_many(np.ndarray curve_params, np.ndarray xs)
+
 cdef tuple c_evaluate_by_t(int x1v, int y1v, int x2v, int y2v, int start, int end, double t)
 
 cdef tuple split_bezier(int x1v, int y1v, int x2v, int y2v, int start, int now, int end)
@@ -4,8 +4,8 @@ from module.MMath import MRect, MVector2D, MVector3D, MVector4D, MQuaternion, MM
 from utils.MLogger import MLogger # noqa
 import numpy as np
 cimport numpy as np
-import bezier
-cimport bezier._curve
+cimport cython
+from libc.math cimport fabs
 
 logger = MLogger(__name__, level=MLogger.DEBUG_INFO)
 
@@ -161,28 +161,10 @@ cdef tuple c_join_value_2_bezier(int fno, str bone_name, list values, double off
         ys = np.array(values, dtype=np.float)
         logger.test("%s: %s, ys: %s", fno, bone_name, ys)
 
-        # https://github.com/dhermes/bezier/issues/242
-        s_vals = np.linspace(0, 1, len(values))
-        logger.test("%s: %s, s_vals: %s", fno, bone_name, s_vals)
-
-        representative = bezier.Curve.from_nodes(np.eye(4))
-        logger.test("%s: %s, representative: %s", fno, bone_name, representative)
-
-        transform = representative.evaluate_multi(s_vals).T
-        logger.test("%s: %s, transform: %s", fno, bone_name, transform)
-        
-        # ノードを求める
-        nodes = np.vstack([xs, ys])
+        # 3次ベジェ曲線で最小二乗近似する
+        nodes = fit_cubic_bezier(xs, ys)
         logger.test("%s: %s, nodes: %s", fno, bone_name, nodes)
 
-        reduced_t, residuals, rank, _ = np.linalg.lstsq(transform, nodes.T, rcond=None)
-        logger.test("%s: %s, reduced_t: %s, residuals: %s, rank: %s", fno, bone_name, reduced_t, residuals, rank)
-
-        reduced = reduced_t.T
-
-        joined_curve = bezier.Curve.from_nodes(reduced)
-        logger.test("%s: %s, joined_curve: %s", fno, bone_name, joined_curve.nodes)
-
         # # カトマル曲線をベジェ曲線に変換する
         # (bz_x, bz_y) = convert_catmullrom_2_bezier(np.concatenate([[None], xs, [None]]), np.concatenate([[None], ys, [None]]))
         # logger.test("bz_x: %s, bz_y: %s", list(bz_x), list(bz_y))
@@ -265,8 +247,6 @@ cdef tuple c_join_value_2_bezier(int fno, str bone_name, list values, double off
         # logger.debug("f: %s, %s, full_ys: %s", fno, bone_name, list(full_ys))
 
         # 差が一定未満である場合、ベジェ曲線をMMD補間曲線に合わせる
-        nodes = joined_curve.nodes
-
         # 次数を減らしたベジェ曲線をMMD用補間曲線に変換
         joined_org_bz = scale_bezier(MVector2D(nodes[0, 0], nodes[1, 0]), MVector2D(nodes[0, 1], nodes[1, 1]), \
                                      MVector2D(nodes[0, 2], nodes[1, 2]), MVector2D(nodes[0, 3], nodes[1, 3]))
@@ -274,13 +254,12 @@ cdef tuple c_join_value_2_bezier(int fno, str bone_name, list values, double off
         # 強制的に合わせる
         joined_bz = fit_bezier_mmd(joined_org_bz)
 
-        logger.debug_info("f: %s, %s, joined_bz: [%s, %s] -> [%s, %s], values: %s, nodes: %s", fno, bone_name, joined_org_bz[1], joined_org_bz[2], joined_bz[1], joined_bz[2], list(values), joined_curve.nodes)
+        logger.debug_info("f: %s, %s, joined_bz: [%s, %s] -> [%s, %s], values: %s, nodes: %s", fno, bone_name, joined_org_bz[1], joined_org_bz[2], joined_bz[1], joined_bz[2], list(values), nodes)
 
         # MMD用補間曲線で各xに対応するyを求める
-        reduced_ys = np.array([ys[0]], dtype=np.float)
-        for ridx, (xv, yv) in enumerate(zip(xs[1:], ys[1:])):
-            x, y, t = c_evaluate(joined_bz[1].x(), joined_bz[1].y(), joined_bz[2].x(), joined_bz[2].y(), int(xs[0]), int(xv), int(xs[-1]))
-            reduced_ys = np.append(reduced_ys, ys[0] + (ys[-1] - ys[0]) * y)
+        # 補間曲線の値は整数（c_evaluateと同じく小数点以下は切り捨て）
+        bz_ys, _ = c_evaluate_many(np.array([int(joined_bz[1].x()), int(joined_bz[1].y()), int(joined_bz[2].x()), int(joined_bz[2].y())]), xs / xs[-1])
+        reduced_ys = ys[0] + (ys[-1] - ys[0]) * bz_ys
         logger.debug_info("f: %s, %s, reduced_ys: %s", fno, bone_name, list(reduced_ys))
 
         # 交点の差を取得する(前後は必ず一致)
@@ -303,6 +282,112 @@ cdef tuple c_join_value_2_bezier(int fno, str bone_name, list values, double off
         return (None, [])
 
 
+# 等間隔のパラメータでの3次ベジェ曲線の基底（フレーム数 x 4）
+# bezier.Curve.from_nodes(np.eye(4)).evaluate_multi と同じ計算順で求める
+cdef np.ndarray bezier_transform(int n):
+    cdef np.ndarray s = np.linspace(0, 1, n)
+    cdef np.ndarray r = 1 - s
+    cdef np.ndarray transform = np.empty((n, 4))
+
+    transform[:, 0] = r * r * r
+    transform[:, 1] = 3.0 * s * r * r
+    transform[:, 2] = 3.0 * (s * s) * r
+    transform[:, 3] = s * (s * s)
+
+    return transform
+
+
+# 等間隔に並んだ値を3次ベジェ曲線で最小二乗近似し、制御点（2x4）を返す
+# https://github.com/dhermes/bezier/issues/242
+cdef np.ndarray fit_cubic_bezier(np.ndarray xs, np.ndarray ys):
+    return np.linalg.lstsq(bezier_transform(len(xs)), np.vstack([xs, ys]).T, rcond=None)[0].T
+
+
+# 同じフレーム数の複数チャンネル分（チャンネル x フレーム）をまとめて近似し、チャンネルごとの制御点（チャンネル x 2 x 4）を返す
+cdef np.ndarray fit_cubic_bezier_many(np.ndarray xs, np.ndarray ys):
+    cdef np.ndarray transform = bezier_transform(len(xs))
+    cdef np.ndarray nodes = np.empty((len(ys), 2, 4))
+    cdef int i
+
+    for i in range(len(ys)):
+        nodes[i] = np.linalg.lstsq(transform, np.vstack([xs, ys[i]]).T, rcond=None)[0].T
+
+    return nodes
+
+
+# 複数区間・複数チャンネルの値を、まとめてMMD補間曲線で結合してみる
+# values: チャンネル x フレームの値
+# starts, ends: 結合してみる区間の開始・終了INDEX（valuesのフレーム方向）
+# diff_limits: チャンネルごとの許容誤差（判定はjoin_value_2_bezierと同じく diff_limit * (offset + 1) まで）
+# 戻り値: 区間ごとに、全チャンネル結合できた場合はチャンネルごとの補間曲線のリスト、できなかった場合はNone
+def join_values_2_bezier(values, starts, ends, diff_limits, offset=0):
+    return c_join_values_2_bezier(np.asarray(values, dtype=np.float64), np.asarray(starts), np.asarray(ends), np.asarray(diff_limits, dtype=np.float64), offset)
+
+cdef list c_join_values_2_bezier(np.ndarray values, np.ndarray starts, np.ndarray ends, np.ndarray diff_limits, double offset):
+    cdef int ccnt = len(values)
+    cdef list results = []
+    cdef list curve_params = []
+    cdef list eval_counts = []
+    cdef list eval_sidxs = []
+    cdef list eval_values = []
+    cdef list eval_limits = []
+    cdef dict fit_groups = {}
+    cdef list fit_items, joined_bz
+    cdef np.ndarray span_values, nodes, xs
+    cdef int sidx, cidx, n, i
+
+    for sidx in range(len(starts)):
+        span_values = values[:, starts[sidx]:(ends[sidx] + 1)]
+        n = len(span_values[0])
+
+        # 次数が1か変化がほぼない場合、線形補間
+        results.append([LINEAR_MMD_INTERPOLATION for cidx in range(ccnt)])
+
+        if n > 2 and not np.isfinite(span_values).all(axis=1).all():
+            # 値が壊れている（NaN/inf）チャンネルがある場合、近似できないので結合不可
+            results[sidx] = None
+        elif n > 2:
+            # 近似するチャンネルは、フレーム数ごとにまとめて近似する
+            for cidx in np.where(np.ptp(span_values, axis=1) >= diff_limits / 100)[0].tolist():
+                if n not in fit_groups:
+                    fit_groups[n] = []
+                fit_groups[n].append((sidx, cidx))
+
+    for n, fit_items in fit_groups.items():
+        xs = np.arange(0, n, dtype=np.float64)
+        nodes = fit_cubic_bezier_many(xs, np.array([values[cidx, starts[sidx]:(ends[sidx] + 1)] for sidx, cidx in fit_items]))
+
+        for i, (sidx, cidx) in enumerate(fit_items):
+            joined_bz = fit_bezier_mmd(scale_bezier(MVector2D(nodes[i, 0, 0], nodes[i, 1, 0]), MVector2D(nodes[i, 0, 1], nodes[i, 1, 1]), \
+                                                    MVector2D(nodes[i, 0, 2], nodes[i, 1, 2]), MVector2D(nodes[i, 0, 3], nodes[i, 1, 3])))
+            results[sidx][cidx] = joined_bz
+
+            curve_params.append((int(joined_bz[1].x()), int(joined_bz[1].y()), int(joined_bz[2].x()), int(joined_bz[2].y())))
+            eval_counts.append(n)
+            eval_sidxs.append(sidx)
+            eval_values.append(values[cidx, starts[sidx]:(ends[sidx] + 1)])
+            eval_limits.append(diff_limits[cidx] * (offset + 1))
+
+    if not curve_params:
+        return results
+
+    # 全区間・全チャンネルの各フレームでの補間曲線の値をまとめて求める
+    cdef np.ndarray counts = np.array(eval_counts)
+    cdef np.ndarray offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    cdef np.ndarray frame_idxs = np.arange(np.sum(counts)) - np.repeat(offsets, counts)
+    cdef np.ndarray all_values = np.concatenate(eval_values)
+    cdef np.ndarray first_values = np.repeat(all_values[offsets], counts)
+    cdef np.ndarray last_values = np.repeat(all_values[offsets + counts - 1], counts)
+    cdef np.ndarray bz_ys = c_evaluate_many(np.repeat(np.array(curve_params), counts, axis=0), frame_idxs / np.repeat(counts - 1, counts))[0]
+
+    # 差が大きい箇所がある区間は結合不可
+    cdef np.ndarray diff_large = np.abs(all_values - (first_values + (last_values - first_values) * bz_ys)) > np.repeat(eval_limits, counts)
+    for sidx in np.unique(np.array(eval_sidxs)[np.add.reduceat(diff_large, offsets) > 0]):
+        results[sidx] = None
+
+    return results
+
+
 cdef list fit_bezier_mmd(list bzs):
     cdef list new_bzs = [MVector2D(), MVector2D(), MVector2D(), MVector2D(INTERPOLATION_MMD_MAX, INTERPOLATION_MMD_MAX)]
 
@@ -379,46 +464,63 @@ cdef tuple convert_catmullrom_2_bezier(np.ndarray xs, np.ndarray ys):
     return (np.array(bz_x, dtype=np.float64), np.array(bz_y, dtype=np.float64))
 
 
-# 指定された複数のXと交わるそれぞれのYを返す
-cdef np.ndarray intersect_by_x(curve, np.ndarray xs):
-    cdef double x
-    cdef list ys = []
-    cdef np.ndarray[np.float_t, ndim=1] s_vals
-    cdef np.ndarray[np.float_t, ndim=2] intersections
+# 補間曲線を求める
+# http://d.hatena.ne.jp/edvakf/20111016/1318716097
+# https://pomax.github.io/bezierinfo
+# https://shspage.hatenadiary.org/entry/20140625/1403702735
+# 補間曲線 x(t) = x となる t を求める
+# 制御点のxが0～1の範囲内であれば x(t) は単調増加なので、ニュートン法で解き、範囲外に出る場合は二分法に切り替える
+# 以前の15回の二分法による解との差は、tで 2^-16（約1.5e-5）以内、yで 5e-5 以内
+@cython.cdivision(True)
+cdef double solve_bezier_t(double x1, double x2, double x) nogil:
+    cdef double cx = 3 * x1
+    cdef double bx = 3 * (x2 - x1) - cx
+    cdef double ax = 1 - cx - bx
+    cdef double lo = 0
+    cdef double hi = 1
+    cdef double t = x
+    cdef double ft, dt, step
+    cdef int i
+
+    if x <= 0:
+        return 0
+    if x >= 1:
+        return 1
+
+    for i in range(64):
+        ft = ((ax * t + bx) * t + cx) * t - x
+        if ft == 0:
+            return t
 
-    ys = []
+        if ft > 0:
+            hi = t
+        else:
+            lo = t
+
+        dt = (3 * ax * t + 2 * bx) * t + cx
+        step = ft / dt if dt > 1e-6 else 1
+        if lo < t - step < hi:
+            t -= step
+            if fabs(step) < 1e-12:
+                return t
+        else:
+            # 傾きがない、もしくは範囲外に出る場合は二分法
+            t = (lo + hi) * 0.5
+            if hi - lo < 1e-12:
+                return t
 
-    for x in xs:
-        # 交点を求める為のX線上の直線
-        line1 = bezier.Curve(np.asfortranarray([[x, x], [-9999999999, 9999999999]]), degree=1)
+    return t
 
-        try:
-            # 交点を求める（高精度は求めない）
-            intersections = curve.intersect(line1, _verify=False)
 
-            # tからyを求め直す
-            s_vals = np.asfortranarray(intersections[0, :])
+# 補間曲線の t における y
+cdef double bezier_y(double y1, double y2, double t) nogil:
+    cdef double cy = 3 * y1
+    cdef double by = 3 * (y2 - y1) - cy
+    cdef double ay = 1 - cy - by
 
-            # 評価する
-            es = curve.evaluate_multi(s_vals)
-            
-            # 値が取れている場合、その値を設定する
-            if es.shape == (2, 1):
-                ys.append(es[1][0])
-            # 取れていない場合、無視
-            else:
-                ys.append(0)
-        except:
-            # エラーが起きた場合、無視
-            ys.append(0)
-    
-    return np.array(ys, dtype=np.float)
+    return ((ay * t + by) * t + cy) * t
 
 
-# 補間曲線を求める
-# http://d.hatena.ne.jp/edvakf/20111016/1318716097
-# https://pomax.github.io/bezierinfo
-# https://shspage.hatenadiary.org/entry/20140625/1403702735
 # https://bezier.readthedocs.io/en/stable/python/reference/bezier.curve.html#bezier.curve.Curve.evaluate
 def evaluate(x1v: int, y1v: int, x2v: int, y2v: int, start: int, now: int, end: int):
     return_tuple = c_evaluate(x1v, y1v, x2v, y2v, start, now, end)
@@ -428,36 +530,56 @@ cdef tuple c_evaluate(int x1v, int y1v, int x2v, int y2v, int start, int now, in
     if (now - start) == 0 or (end - start) == 0:
         return (0, 0, 0)
     
-    cdef double x, x1, x2, y1, y2, t, s, ft, y
-    cdef int i
+    cdef double x, t, y
         
     x = (now - start) / (end - start)
-    x1 = x1v / INTERPOLATION_MMD_MAX
-    x2 = x2v / INTERPOLATION_MMD_MAX
-    y1 = y1v / INTERPOLATION_MMD_MAX
-    y2 = y2v / INTERPOLATION_MMD_MAX
+    t = solve_bezier_t(x1v / INTERPOLATION_MMD_MAX, x2v / INTERPOLATION_MMD_MAX, x)
+    y = bezier_y(y1v / INTERPOLATION_MMD_MAX, y2v / INTERPOLATION_MMD_MAX, t)
 
-    t = 0.5
-    s = 0.5
+    return (x, y, t)
 
-    # 二分法
-    # logger.test("x1: %s, x2: %s, y1: %s, y2: %s, x: %s", x1, x2, y1, y2, x)
-    for i in range(15):
-        ft = (3 * (s * s) * t * x1) + (3 * s * (t * t) * x2) + (t * t * t) - x
-        # logger.test("i: %s, 4 << i: %s, ft: %s(%s), t: %s, s: %s", i, (4 << i), ft, abs(ft) < 0.00001, t, s)
+# 補間曲線の評価（配列版）
+# 各引数は同じ長さの配列で、要素ごとの計算はc_evaluateと同じ
+def evaluate_array(x1vs, y1vs, x2vs, y2vs, starts, nows, ends):
+    return c_evaluate_array(np.asarray(x1vs), np.asarray(y1vs), np.asarray(x2vs), np.asarray(y2vs), np.asarray(starts), np.asarray(nows), np.asarray(ends))
 
-        if ft > 0:
-            t -= 1 / (4 << i)
-        else:
-            t += 1 / (4 << i)
-        
-        s = 1 - t
+cdef tuple c_evaluate_array(np.ndarray x1vs, np.ndarray y1vs, np.ndarray x2vs, np.ndarray y2vs, np.ndarray starts, np.ndarray nows, np.ndarray ends):
+    cdef np.ndarray is_zero = ((nows - starts) == 0) | ((ends - starts) == 0)
+    cdef np.ndarray x = (nows - starts).astype(np.float64) / np.where(is_zero, 1, ends - starts).astype(np.float64)
+    cdef np.ndarray curve_params = np.stack([x1vs, y1vs, x2vs, y2vs], axis=-1)
+    cdef np.ndarray y, t
 
-    y = (3 * (s * s) * t * y1) + (3 * s * (t * t) * y2) + (t * t * t)
+    y, t = c_evaluate_many(curve_params, x)
 
-    # logger.test("y: %s, t: %s, s: %s", y, t, s)
+    return (np.where(is_zero, 0, x), np.where(is_zero, 0, y), np.where(is_zero, 0, t))
 
-    return (x, y, t)
+# 補間曲線の評価（複数件）
+# curve_params: 補間曲線の制御点 (x1, y1, x2, y2)（0～127）のリスト。1件だけ指定した場合、全xで共通
+# xs: 補間曲線上の経過割合（0～1）のリスト
+# 戻り値: xsの各要素に対する (y, t) の配列
+def evaluate_many(curve_params, xs):
+    return c_evaluate_many(np.asarray(curve_params), np.asarray(xs))
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef tuple c_evaluate_many(np.ndarray curve_params, np.ndarray xs):
+    cdef np.ndarray[np.float64_t, ndim=2] params = np.ascontiguousarray(curve_params, dtype=np.float64).reshape(-1, 4) / INTERPOLATION_MMD_MAX
+    cdef np.ndarray[np.float64_t, ndim=1] xvs = np.ascontiguousarray(xs, dtype=np.float64).reshape(-1)
+    cdef Py_ssize_t cnt = len(xvs)
+    cdef Py_ssize_t pcnt = len(params)
+    cdef np.ndarray[np.float64_t, ndim=1] ys = np.empty(cnt)
+    cdef np.ndarray[np.float64_t, ndim=1] ts = np.empty(cnt)
+    cdef Py_ssize_t i, pi
+
+    if pcnt != 1 and pcnt != cnt:
+        raise ValueError("curve_params length mismatch: {0} != {1}".format(pcnt, cnt))
+
+    for i in range(cnt):
+        pi = i if pcnt > 1 else 0
+        ts[i] = solve_bezier_t(params[pi, 0], params[pi, 2], xvs[i])
+        ys[i] = bezier_y(params[pi, 1], params[pi, 3], ts[i])
+
+    return (ys.reshape(np.shape(xs)), ts.reshape(np.shape(xs)))
 
 
 # 指定されたtになるフレーム番号を取得する
@@ -470,24 +592,17 @@ cdef tuple c_evaluate_by_t(int x1v, int y1v, int x2v, int y2v, int start, int en
         # 差が1以内の場合、終了
         return (start, 0, t)
     
-    cdef double x1, x2, y1, y2
+    cdef double x, y
     cdef int fno
 
-    x1 = x1v / INTERPOLATION_MMD_MAX
-    x2 = x2v / INTERPOLATION_MMD_MAX
-    y1 = y1v / INTERPOLATION_MMD_MAX
-    y2 = y2v / INTERPOLATION_MMD_MAX
-
-    # 補間曲線
-    curve1 = bezier.Curve(np.asfortranarray([[0, x1, x2, 1], [0, y1, y2, 1]]), degree=3)
-
-    # 単一の評価(x, y)
-    es = curve1.evaluate(t)
+    # 補間曲線上の単一の評価(x, y)
+    x = bezier_y(x1v / INTERPOLATION_MMD_MAX, x2v / INTERPOLATION_MMD_MAX, t)
+    y = bezier_y(y1v / INTERPOLATION_MMD_MAX, y2v / INTERPOLATION_MMD_MAX, t)
 
     # xに相当するフレーム番号
-    fno = int(round_integer(start + ((end - start) * es[0, 0])))
+    fno = int(round_integer(start + ((end - start) * x)))
     
-    return (fno, es[1, 0], t)
+    return (fno, y, t)
 
 
 # 3次ベジェ曲線の分割
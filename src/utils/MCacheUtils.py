@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#
+import os
+import glob
+import hashlib
+import _pickle as cPickle
+
+from utils.MLogger import MLogger # noqa
+
+logger = MLogger(__name__)
+
+# キャッシュ形式のバージョン（読み込み結果のデータ構造を変えた場合に上げる）
+CACHE_FORMAT_VERSION = 3
+# キャッシュファイルの拡張子
+CACHE_EXT = ".cache"
+# キャッシュディレクトリの上限サイズ（初期値: 1GB）
+DEFAULT_MAX_CACHE_SIZE = 1024 * 1024 * 1024
+
+# キャッシュディレクトリ（未設定の場合はキャッシュしない）
+cache_dir_path = None
+# exeバージョン（バージョンが変わったら古いキャッシュは使わない）
+cache_version_name = ""
+# キャッシュディレクトリの上限サイズ
+max_cache_size = DEFAULT_MAX_CACHE_SIZE
+
+
+# キャッシュの初期化
+def initialize(dir_path: str, version_name="", max_size=DEFAULT_MAX_CACHE_SIZE):
+    global cache_dir_path, cache_version_name, max_cache_size
+
+    cache_dir_path = dir_path
+    cache_version_name = version_name
+    max_cache_size = max_size
+
+
+# キャッシュファイルのパス
+# kind: 読み込み種別（読み込み設定で結果が変わる場合、設定も含める）
+# digest: ファイルのハッシュ値
+def get_cache_path(kind: str, digest: str):
+    key = "{0}:{1}:{2}:{3}".format(CACHE_FORMAT_VERSION, cache_version_name, kind, digest)
+    return os.path.join(cache_dir_path, "{0}{1}".format(hashlib.sha1(key.encode('utf-8')).hexdigest(), CACHE_EXT))
+
+
+# キャッシュから読み込み結果を取得する（ない場合、None）
+def load_data(kind: str, digest: str):
+    if not cache_dir_path or not digest:
+        return None
+
+    cache_path = get_cache_path(kind, digest)
+
+    try:
+        with open(cache_path, "rb") as f:
+            data = cPickle.load(f)
+
+        # 最後に使った日時を更新する（古いものから削除するため）
+        os.utime(cache_path)
+
+        logger.debug("キャッシュ読み込み: %s", os.path.basename(cache_path))
+
+        return data
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # 壊れているキャッシュは削除して、ファイルから読み直す
+        logger.debug("キャッシュ読み込み失敗: %s, %s", os.path.basename(cache_path), e)
+        remove_file(cache_path)
+
+        return None
+
+
+# 読み込み結果をキャッシュに保存する
+def save_data(kind: str, digest: str, data):
+    if not cache_dir_path or not digest:
+        return
+
+    cache_path = get_cache_path(kind, digest)
+    tmp_cache_path = "{0}.{1}.tmp".format(cache_path, os.getpid())
+
+    try:
+        os.makedirs(cache_dir_path, exist_ok=True)
+
+        # 書きかけのファイルを読まないよう、一時ファイルに書いてから置き換える
+        with open(tmp_cache_path, "wb") as f:
+            cPickle.dump(data, f, -1)
+        os.replace(tmp_cache_path, cache_path)
+
+        logger.debug("キャッシュ保存: %s", os.path.basename(cache_path))
+    except Exception as e:
+        # キャッシュに保存できなくても、読み込み自体は成功とする
+        logger.debug("キャッシュ保存失敗: %s, %s", os.path.basename(cache_path), e)
+        remove_file(tmp_cache_path)
+        return
+
+    evict()
+
+
+# 上限サイズを超えた分を、最後に使った日時が古い順に削除する
+def evict():
+    cache_files = []
+    for cache_path in glob.glob(os.path.join(cache_dir_path, "*{0}".format(CACHE_EXT))):
+        try:
+            stat = os.stat(cache_path)
+            cache_files.append((stat.st_mtime, stat.st_size, cache_path))
+        except OSError:
+            pass
+
+    total_size = sum([size for _, size, _ in cache_files])
+
+    for _, size, cache_path in sorted(cache_files):
+        if total_size <= max_cache_size:
+            break
+
+        if remove_file(cache_path):
+            total_size -= size
+
+
+# キャッシュ全削除
+def clear():
+    if not cache_dir_path:
+        return
+
+    for cache_path in glob.glob(os.path.join(cache_dir_path, "*{0}".format(CACHE_EXT))):
+        remove_file(cache_path)
+
+
+def remove_file(file_path: str):
+    try:
+        os.remove(file_path)
+        return True
+    except OSError:
+        # 他で使用中などの場合、そのまま残す
+        return False
@@ -6,6 +6,10 @@ class SizingException(Exception):
     def __init__(self, message):
         self.message = message
 
+    # プロセス間で受け渡せるように
+    def __reduce__(self):
+        return (self.__class__, (self.message,))
+
 
 class MParseException(SizingException):
     def __init__(self, message):
@@ -16,3 +20,6 @@ class MKilledException(SizingException):
     def __init__(self):
         self.message = None
 
+    def __reduce__(self):
+        return (self.__class__, ())
+
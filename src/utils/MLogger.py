@@ -33,6 +33,8 @@ class MLogger:
     total_level = logging.INFO
     is_file = False
     outout_datetime = ""
+    # ワーカープロセスへの停止命令（ワーカープロセス内でのみ設定）
+    kill_event = None
 
     logger = None
 
@@ -154,6 +156,10 @@ class MLogger:
             # 停止命令が出ている場合、エラー
             raise MKilledException()
 
+        if MLogger.kill_event is not None and MLogger.kill_event.is_set():
+            # ワーカープロセスに停止命令が出ている場合、エラー
+            raise MKilledException()
+
         target_level = kwargs.pop("level", logging.INFO)
         # if self.logger.isEnabledFor(target_level) and self.default_level <= target_level:
         if self.total_level <= target_level and self.default_level <= target_level:
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+#
+import io
+import os
+import sys
+import copy
+import contextlib
+import threading
+import multiprocessing
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from mmd.VmdData import VmdMotion, VmdFrameDict
+from utils.MLogger import MLogger # noqa
+from utils.MException import MKilledException
+
+logger = MLogger(__name__)
+
+# ワーカープロセス内のサービス（プロセス内ではさらにプロセスを立ち上げない）
+process_service = None
+
+# フレーム範囲の処理単位の大きさ（プロセスで処理しない場合）
+DEFAULT_SHARD_SIZE = 500
+# フレーム範囲の処理単位の最小の大きさ（プロセスで処理する場合）
+MIN_SHARD_SIZE = 100
+# ワーカープロセス1つあたりのフレーム範囲の処理単位数（処理時間のばらつきを均す）
+SHARDS_PER_WORKER = 4
+
+
+# モーションに対する処理単位
+# method_name: サービスのメソッド名
+# bone_names, morph_names: 処理結果としてモーションに書き戻すボーン・モーフ
+# is_full_motion: Trueの場合、モーション全体を渡す（Falseの場合、書き戻し対象だけを渡す）
+class MotionTask():
+    def __init__(self, method_name: str, *args, bone_names=None, morph_names=None, is_full_motion=False, **kwargs):
+        self.method_name = method_name
+        self.args = args
+        self.kwargs = kwargs
+        self.bone_names = bone_names or []
+        self.morph_names = morph_names or []
+        self.is_full_motion = is_full_motion
+
+
+# プロセスプールで処理するか
+def is_process_mode(max_workers: int, task_cnt: int):
+    # ハイスペック版で複数の処理単位がある場合のみ（ワーカープロセス内はスレッドで処理）
+    return max_workers > 1 and task_cnt > 1 and (os.cpu_count() or 1) > 1 and not process_service
+
+
+# 処理単位をまとめて実行し、結果リストを返す
+def execute_motion_tasks(service, thread_name_prefix: str, tasks: list):
+    options = service.options
+
+    if not is_process_mode(options.max_workers, len(tasks)):
+        # スレッドで処理
+        futures = []
+        with ThreadPoolExecutor(thread_name_prefix=thread_name_prefix, max_workers=options.max_workers) as executor:
+            for task in tasks:
+                futures.append(executor.submit(getattr(service, task.method_name), *task.args, **task.kwargs))
+
+        concurrent.futures.wait(futures, timeout=None, return_when=concurrent.futures.FIRST_EXCEPTION)
+
+        return [f.result() for f in futures]
+
+    motion = options.motion
+
+    def task_calls():
+        for task in tasks:
+            if task.is_full_motion:
+                task_motion = motion
+            else:
+                # 書き戻し対象のトラックだけを持つモーション
+                task_motion = VmdMotion()
+                task_motion.bones = {bone_name: motion.bones[bone_name] for bone_name in task.bone_names if bone_name in motion.bones}
+                task_motion.morphs = {morph_name: motion.morphs[morph_name] for morph_name in task.morph_names if morph_name in motion.morphs}
+
+            yield (execute_process_task, task, task_motion)
+
+    futures = execute_process_calls(service, len(tasks), task_calls())
+
+    # 全部終わってから、処理単位の順番で書き戻す
+    results = []
+    for f in futures:
+        result, bones, morphs, log_text = f.result()
+
+        if log_text:
+            sys.stdout.write(log_text)
+
+        for bone_name, bone_frames in bones.items():
+            if bone_frames is None:
+                # 処理単位の中で削除されたボーン
+                if bone_name in motion.bones:
+                    del motion.bones[bone_name]
+            else:
+                motion.bones[bone_name] = bone_frames
+
+        for morph_name, morph_frames in morphs.items():
+            if morph_frames is None:
+                if morph_name in motion.morphs:
+                    del motion.morphs[morph_name]
+            else:
+                motion.morphs[morph_name] = morph_frames
+
+        results.append(result)
+
+    return results
+
+
+# フレーム範囲ごとに処理単位を分けて実行し、結果リストを返す
+# 各フレームの結果がそのフレームのキーだけで決まる処理のみ（処理単位間で結果が依存しない）
+# method_name: サービスのメソッド名。(モーション, フレーム番号リスト, フレーム番号ごとの値, *args, **kwargs)で呼び出す
+# bone_names: 処理結果としてモーションに書き戻すボーン（処理単位のフレーム範囲のキーのみ）
+# fno_values: フレーム番号ごとの値(key:フレーム番号)。処理単位には、そのフレーム範囲の分だけ渡す
+# count_title: 進捗ログのタイトル（処理単位をまたいで集計する）
+def execute_frame_shards(service, thread_name_prefix: str, motion: VmdMotion, method_name: str, fnos: list, bone_names: list, *args, \
+                         fno_values=None, count_title="", **kwargs):
+    options = service.options
+    fno_values = fno_values or {}
+
+    if not fnos:
+        return []
+
+    # 処理単位ごとのフレーム番号リスト（連続したフレーム範囲）
+    shard_size = max(MIN_SHARD_SIZE, -(-len(fnos) // max(1, options.max_workers * SHARDS_PER_WORKER)))
+    if not is_process_mode(options.max_workers, -(-len(fnos) // shard_size)):
+        shard_size = DEFAULT_SHARD_SIZE
+    shard_fnos_list = [fnos[n:(n + shard_size)] for n in range(0, len(fnos), shard_size)]
+
+    results = []
+    done_cnt = 0
+
+    if not is_process_mode(options.max_workers, len(shard_fnos_list)):
+        # プロセスで処理しない場合、モーションをそのまま順番に処理する
+        for shard_fnos in shard_fnos_list:
+            shard_values = {fno: fno_values[fno] for fno in shard_fnos if fno in fno_values}
+            results.append(getattr(service, method_name)(motion, shard_fnos, shard_values, *args, **kwargs))
+
+            done_cnt += len(shard_fnos)
+            if count_title:
+                logger.count(count_title, fnos[done_cnt - 1], fnos)
+
+        return results
+
+    def shard_calls():
+        for shard_fnos in shard_fnos_list:
+            shard_values = {fno: fno_values[fno] for fno in shard_fnos if fno in fno_values}
+            # 処理単位のフレーム範囲のモーション
+            shard_motion = slice_motion(motion, shard_fnos[0], shard_fnos[-1])
+
+            yield (execute_process_shard, method_name, shard_motion, shard_fnos, shard_values, bone_names, args, kwargs)
+
+    def count_shard(call_idx: int):
+        nonlocal done_cnt
+
+        # 終わった処理単位の分だけ進める
+        done_cnt += len(shard_fnos_list[call_idx])
+        if count_title:
+            logger.count(count_title, fnos[done_cnt - 1], fnos)
+
+    futures = execute_process_calls(service, len(shard_fnos_list), shard_calls(), on_done=count_shard)
+
+    # 全部終わってから、処理単位の順番で書き戻す
+    for f in futures:
+        result, bones, log_text = f.result()
+
+        if log_text:
+            sys.stdout.write(log_text)
+
+        for bone_name, bone_frames in bones.items():
+            if bone_name not in motion.bones:
+                motion.bones[bone_name] = VmdFrameDict()
+
+            for fno, bf in bone_frames.items():
+                motion.bones[bone_name][fno] = bf
+
+        results.append(result)
+
+    return results
+
+
+# ワーカープロセスで処理単位をまとめて実行し、全部終わったFutureのリストを処理単位の順番で返す
+# calls: (関数, 引数, ...) の処理単位
+# on_done: 処理単位が終わるたびに、その処理単位の順番で呼び出す
+# 停止命令が出た場合やエラーの場合、実行中の処理単位もワーカープロセスごと止める
+def execute_process_calls(service, call_cnt: int, calls, on_done=None):
+    options = service.options
+
+    # ワーカープロセスに渡すオプション（コンソールは渡せないので、ログは処理単位ごとにまとめて受け取る）
+    process_options = copy.copy(options)
+    process_options.monitor = None
+    process_options.motion = VmdMotion()
+
+    # ワーカープロセスへの停止命令（ワーカープロセス内のロガー出力で止まる）
+    kill_event = multiprocessing.Event()
+
+    futures = []
+    executor = ProcessPoolExecutor(max_workers=min(options.max_workers, os.cpu_count(), call_cnt), \
+                                   initializer=initialize_process, initargs=(service.__class__, process_options, MLogger.total_level, kill_event))
+    try:
+        for func, *args in calls:
+            futures.append(executor.submit(func, *args))
+
+        done_futures = set()
+        while True:
+            done, not_done = concurrent.futures.wait(futures, timeout=1, return_when=concurrent.futures.FIRST_EXCEPTION)
+
+            if is_killed():
+                raise MKilledException()
+
+            for call_idx, f in enumerate(futures):
+                if f in done and f not in done_futures:
+                    if f.exception():
+                        raise f.exception()
+
+                    done_futures.add(f)
+                    if on_done:
+                        on_done(call_idx)
+
+            if not not_done:
+                break
+    except BaseException:
+        # 未着手の処理単位は破棄して、実行中の処理単位はワーカープロセスごと止める
+        kill_event.set()
+        for f in futures:
+            f.cancel()
+        terminate_process_pool(executor)
+        raise
+    finally:
+        executor.shutdown(wait=False)
+
+    return futures
+
+
+# プロセスプールのワーカープロセスを止める（実行中の処理単位はキャンセルできないため）
+def terminate_process_pool(executor: ProcessPoolExecutor):
+    processes = list((getattr(executor, "_processes", None) or {}).values())
+
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+    for process in processes:
+        process.join()
+
+
+# 指定フレーム範囲の計算に必要なキーだけを持つモーション（範囲の前後のキーも補間用に含める）
+def slice_motion(motion: VmdMotion, start_fno: int, end_fno: int):
+    shard_motion = VmdMotion()
+    shard_motion.last_motion_frame = motion.last_motion_frame
+
+    for bone_name, bone_frames in motion.bones.items():
+        shard_motion.bones[bone_name] = slice_frame_dict(bone_frames, start_fno, end_fno)
+
+    for morph_name, morph_frames in motion.morphs.items():
+        shard_motion.morphs[morph_name] = slice_frame_dict(morph_frames, start_fno, end_fno)
+
+    return shard_motion
+
+
+def slice_frame_dict(frame_dict: VmdFrameDict, start_fno: int, end_fno: int):
+    if not isinstance(frame_dict, VmdFrameDict):
+        frame_dict = VmdFrameDict(frame_dict)
+
+    start_idx, end_idx = frame_dict.range_indexes(start_fno, end_fno)
+
+    return VmdFrameDict({fno: frame_dict[fno] for fno in frame_dict.fnos[start_idx:end_idx]})
+
+
+# 呼び出し元スレッドに停止命令が出ているか
+def is_killed():
+    kwargs = getattr(threading.current_thread(), "_kwargs", None) or {}
+    return "is_killed" in kwargs and kwargs["is_killed"]
+
+
+# ワーカープロセスの初期化（モデル等はプロセスごとに1回だけ受け取る）
+def initialize_process(service_class, options, total_level: int, kill_event):
+    global process_service
+
+    MLogger.total_level = total_level
+    MLogger.kill_event = kill_event
+    process_service = service_class(options)
+
+
+# ワーカープロセス内での処理単位実行
+def execute_process_task(task: MotionTask, motion: VmdMotion):
+    monitor = io.StringIO()
+    process_service.options.monitor = monitor
+    process_service.options.motion = motion
+
+    with contextlib.redirect_stdout(monitor):
+        result = getattr(process_service, task.method_name)(*task.args, **task.kwargs)
+
+    bones = {bone_name: motion.bones.get(bone_name, None) for bone_name in task.bone_names}
+    morphs = {morph_name: motion.morphs.get(morph_name, None) for morph_name in task.morph_names}
+
+    return result, bones, morphs, monitor.getvalue()
+
+
+# ワーカープロセス内でのフレーム範囲の処理単位実行
+def execute_process_shard(method_name: str, motion: VmdMotion, fnos: list, fno_values: dict, bone_names: list, args: tuple, kwargs: dict):
+    monitor = io.StringIO()
+    process_service.options.monitor = monitor
+
+    with contextlib.redirect_stdout(monitor):
+        result = getattr(process_service, method_name)(motion, fnos, fno_values, *args, **kwargs)
+
+    bones = {}
+    for bone_name in bone_names:
+        if bone_name in motion.bones:
+            bones[bone_name] = {fno: motion.bones[bone_name][fno] for fno in fnos if fno in motion.bones[bone_name]}
+
+    return result, bones, monitor.getvalue()
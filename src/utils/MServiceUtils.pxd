@@ -4,15 +4,29 @@ cimport numpy as np
 
 from mmd.PmxData cimport PmxModel, Bone
 from mmd.VmdData cimport VmdMotion, VmdBoneFrame
-from module.MParams cimport BoneLinks # noqa
+from module.MParams cimport BoneLinks, BoneLinkPlan # noqa
 from module.MMath cimport MRect, MVector2D, MVector3D, MVector4D, MQuaternion, MMatrix4x4 # noqa
 
 cdef c_calc_IK(PmxModel model, BoneLinks links, VmdMotion motion, int fno, MVector3D target_pos, BoneLinks ik_links, int max_count)
 
+cdef MMatrix4x4 c_calc_link_matrix(MVector3D v, MQuaternion q)
+
+cdef c_calc_parent_matrixs(list matrixs, list parent_mats, int start_idx)
+
 cdef tuple c_separate_local_qq(int fno, str bone_name, MQuaternion qq, MVector3D global_x_axis)
 
 cdef tuple c_calc_global_pos(PmxModel model, BoneLinks links, VmdMotion motion, int fno, BoneLinks limit_links, bint return_matrix, bint is_local_x)
 
+cdef tuple c_calc_global_pos_array(PmxModel model, BoneLinks links, VmdMotion motion, np.ndarray fnos, BoneLinks limit_links, bint is_local_x)
+
+cdef tuple c_calc_relative_array(PmxModel model, BoneLinks links, VmdMotion motion, np.ndarray fnos, BoneLinks limit_links)
+
+cdef tuple sample_bone_cache(VmdMotion motion, str bone_name, np.ndarray fnos, dict sampled_bones)
+
+cdef np.ndarray c_deform_rotation_array(BoneLinkPlan plan, int link_idx, VmdMotion motion, np.ndarray rotations, np.ndarray fnos, dict sampled_bones)
+
+cdef np.ndarray c_deform_fix_rotation_array(str bone_name, MVector3D fixed_axis, np.ndarray rots)
+
 cpdef dict calc_global_pos_by_direction(MQuaternion direction_qq, dict target_pos_3ds_dic)
 
 cdef list c_calc_relative_position(PmxModel model, BoneLinks links, VmdMotion motion, int fno, BoneLinks limit_links)
@@ -21,6 +35,12 @@ cdef list c_calc_relative_rotation(PmxModel model, BoneLinks links, VmdMotion mo
 
 cpdef MQuaternion deform_rotation(PmxModel model, VmdMotion motion, VmdBoneFrame bf)
 
+cdef MQuaternion c_deform_rotation(PmxModel model, VmdMotion motion, VmdBoneFrame bf, dict ik_qqs)
+
+cdef MQuaternion c_deform_link_rotation(BoneLinkPlan plan, int link_idx, VmdMotion motion, VmdBoneFrame bf, dict ik_qqs)
+
+cdef MQuaternion c_get_local_x_qq(PmxModel model, BoneLinkPlan plan, int link_idx)
+
 cpdef MQuaternion deform_fix_rotation(str bone_name, MVector3D fixed_axis, MQuaternion rot)
 
 cdef MQuaternion c_calc_direction_qq(PmxModel model, BoneLinks links, VmdMotion motion, int fno, BoneLinks limit_links)
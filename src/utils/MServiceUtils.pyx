@@ -6,8 +6,9 @@ import numpy as np
 cimport numpy as np
 from libc.math cimport sin, cos, acos, atan2, asin, pi, sqrt
 
-from module.MParams import BoneLinks # noqa
+from module.MParams import BoneLinks, BoneLinkPlan # noqa
 from module.MMath import MRect, MVector2D, MVector3D, MVector4D, MQuaternion, MMatrix4x4 # noqa
+from module.MMath import normalized_array, multiply_qq_array, inverted_qq_array, fromAxisAndAngle_array, toMatrix4x4_array # noqa
 from mmd.PmxData import PmxModel, Bone, Vertex, Material, Morph, DisplaySlot, RigidBody, Joint # noqa
 from mmd.VmdData import VmdMotion, VmdBoneFrame, VmdCameraFrame, VmdInfoIk, VmdLightFrame, VmdMorphFrame, VmdShadowFrame, VmdShowIkFrame # noqa
 from module.MOptions import MOptionsDataSet # noqa
@@ -39,12 +40,45 @@ cdef c_calc_IK(PmxModel model, BoneLinks links, VmdMotion motion, int fno, MVect
     local_effector_pos = MVector3D()
     local_target_pos = MVector3D()
 
+    # IKリンクの登録済みbf（計算中の回転量はik_qqsに保持し、最後に一度だけ書き戻す）
+    cdef dict ik_bfs = {}
+    cdef dict ik_qqs = {}
+    for bone_name in bone_name_list:
+        bf = motion.c_calc_bf(bone_name, fno, is_key=False, is_read=False, is_reset_interpolation=False)
+        ik_bfs[bone_name] = bf
+        ik_qqs[bone_name] = bf.rotation
+
+    # リンクの位置は変わらないので、最初に一度だけ求める
+    cdef BoneLinkPlan plan = model.c_get_link_plan(links)
+    cdef tuple link_names = plan.names
+    cdef list trans_vs = c_calc_relative_position(model, links, motion, fno, None)
+    cdef list fill_bfs = []
+    cdef list matrixs = []
+    cdef dict dirty_link_idxs = {}
+    cdef int n
+    cdef str lname
+    cdef str effect_bone_name
+
+    for n, lname in enumerate(link_names):
+        bf = motion.c_calc_bf(lname, fno, is_key=False, is_read=False, is_reset_interpolation=False)
+        fill_bfs.append(bf)
+        matrixs.append(c_calc_link_matrix(trans_vs[n], c_deform_link_rotation(plan, n, motion, bf, ik_qqs)))
+
+        # IKリンクの回転が変わった時に、再計算が必要なリンク（自身もしくは付与親がIKリンク）
+        for effect_bone_name in (bf.name,) + plan.effect_names[n]:
+            if effect_bone_name in ik_qqs:
+                dirty_link_idxs.setdefault(effect_bone_name, []).append(n)
+
+    # 各リンクの親までの累積行列
+    cdef list parent_mats = [None for _ in range(len(link_names))]
+    c_calc_parent_matrixs(matrixs, parent_mats, 0)
+
+    cdef int effector_idx = plan.name_idxs[ik_links.first_name()]
+
     cdef int cnt
     cdef int ik_idx
     cdef str joint_name
     cdef Bone ik_bone
-    cdef dict global_3ds_dic
-    cdef dict total_mats
     cdef MVector3D global_effector_pos
     cdef MMatrix4x4 joint_mat
     cdef MMatrix4x4 inv_coord
@@ -58,21 +92,21 @@ cdef c_calc_IK(PmxModel model, BoneLinks links, VmdMotion motion, int fno, MVect
     cdef MQuaternion new_ik_qq
     cdef MQuaternion x_qq, y_qq, z_qq, yz_qq
     cdef double euler_x, euler_y, euler_z
+    cdef list dirty_idxs
+    cdef int joint_idx
 
     for cnt in range(max_count):
         # 規定回数ループ
         for ik_idx, joint_name in enumerate(bone_name_list):
             # 処理対象IKボーン
             ik_bone = ik_links.get(joint_name)
+            joint_idx = plan.name_idxs[joint_name]
 
-            # 現在のボーングローバル位置と行列を取得
-            global_3ds_dic, total_mats = c_calc_global_pos(model, links, motion, fno, limit_links=None, return_matrix=True, is_local_x=False)
-
-            # エフェクタ（末端）
-            global_effector_pos = global_3ds_dic[ik_links.first_name()]
+            # エフェクタ（末端）の現在のグローバル位置
+            global_effector_pos = parent_mats[effector_idx] * trans_vs[effector_idx]
 
             # 注目ノード（実際に動かすボーン）
-            joint_mat = total_mats[joint_name]
+            joint_mat = parent_mats[joint_idx] * matrixs[joint_idx]
 
             # ワールド座標系から注目ノードの局所座標系への変換
             inv_coord = joint_mat.inverted()
@@ -104,8 +138,7 @@ cdef c_calc_IK(PmxModel model, BoneLinks links, VmdMotion motion, int fno, MVect
                 correct_qq = MQuaternion.fromAxisAndAngle(rotation_axis, min(rotation_degree, ik_bone.degree_limit))
 
                 # ジョイントに補正をかける
-                bf = motion.c_calc_bf(joint_name, fno, is_key=False, is_read=False, is_reset_interpolation=False)
-                new_ik_qq = bf.rotation * correct_qq
+                new_ik_qq = ik_qqs[joint_name] * correct_qq
 
                 # IK軸制限がある場合、上限下限をチェック
                 if ik_bone.ik_limit_min != MVector3D() and ik_bone.ik_limit_max != MVector3D():
@@ -122,14 +155,47 @@ cdef c_calc_IK(PmxModel model, BoneLinks links, VmdMotion motion, int fno, MVect
 
                     new_ik_qq = MQuaternion.fromEulerAngles(euler_x, euler_y, euler_z)
 
-                bf.rotation = new_ik_qq
+                ik_qqs[joint_name] = new_ik_qq
+
+                # 回転が変わったリンクの行列と、それより下流の累積行列だけ再計算
+                dirty_idxs = dirty_link_idxs.get(joint_name, [])
+                for n in dirty_idxs:
+                    matrixs[n] = c_calc_link_matrix(trans_vs[n], c_deform_link_rotation(plan, n, motion, fill_bfs[n], ik_qqs))
+                if dirty_idxs:
+                    c_calc_parent_matrixs(matrixs, parent_mats, min(dirty_idxs) + 1)
 
         # 位置の差がほとんどない場合、終了
         if (local_effector_pos - local_target_pos).lengthSquared() < 0.0001:
-            return
-        
+            break
+
+    # 確定した回転量をモーションに書き戻す
+    for bone_name in bone_name_list:
+        ik_bfs[bone_name].rotation = ik_qqs[bone_name]
+
     return
 
+# リンクの行列（移動してから回転）
+cdef MMatrix4x4 c_calc_link_matrix(MVector3D v, MQuaternion q):
+    cdef MMatrix4x4 mm = MMatrix4x4()
+    mm.setToIdentity()
+    mm.translate(v)
+    mm.rotate(q)
+    return mm
+
+# 各リンクの親までの累積行列を、start_idx以降だけ計算し直す
+cdef c_calc_parent_matrixs(list matrixs, list parent_mats, int start_idx):
+    cdef int n
+    cdef MMatrix4x4 mm
+
+    for n in range(max(0, start_idx), len(matrixs)):
+        if n == 0:
+            mm = MMatrix4x4()
+            mm.setToIdentity()
+        elif n == 1:
+            mm = matrixs[0].copy()
+        else:
+            mm = parent_mats[n - 1] * matrixs[n - 1]
+        parent_mats[n] = mm
 
 # クォータニオンをローカル軸の回転量に分離
 def separate_local_qq(fno: int, bone_name: str, qq: MQuaternion, global_x_axis: MVector3D):
@@ -288,22 +354,18 @@ cdef tuple c_calc_global_pos(PmxModel model, BoneLinks links, VmdMotion motion,
     cdef dict global_3ds_dic = {}
 
     cdef MMatrix4x4 local_x_matrix
-    cdef MVector3D local_axis
-    cdef MQuaternion local_axis_qq
+    cdef BoneLinkPlan plan = model.c_get_link_plan(links)
 
-    for n, (lname, v) in enumerate(zip(links.all().keys(), trans_vs)):
+    for n, (lname, v) in enumerate(zip(plan.names, trans_vs)):
         if n == 0:
             mm = MMatrix4x4()
             mm.setToIdentity()
-
-        for m in range(n):
-            # 最後のひとつ手前までループ
-            if m == 0:
-                # 0番目の位置を初期値とする
-                mm = matrixs[0].copy()
-            else:
-                # 自分より前の行列結果を掛け算する
-                mm *= matrixs[m]
+        elif n == 1:
+            # 0番目の位置を初期値とする
+            mm = matrixs[0].copy()
+        else:
+            # ひとつ手前までの行列結果に、直前の行列を掛け算する
+            mm = mm * matrixs[n - 1]
         
         # 自分は、位置だけ掛ける
         global_3ds_dic[lname] = mm * v
@@ -316,24 +378,178 @@ cdef tuple c_calc_global_pos(PmxModel model, BoneLinks links, VmdMotion motion,
             # ボーン自身にローカル軸が設定されているか
             local_x_matrix = MMatrix4x4()
             local_x_matrix.setToIdentity()
+            local_x_matrix.rotate(c_get_local_x_qq(model, plan, n))
 
-            local_axis_qq = MQuaternion()
+            total_mats[lname] *= local_x_matrix
 
-            if model.bones[lname].local_x_vector == MVector3D():
-                # ローカル軸が設定されていない場合、計算
+    return (global_3ds_dic, total_mats)
 
-                # 自身から親を引いた軸の向き
-                local_axis = model.bones[lname].position - links.get(lname, offset=-1).position
-                local_axis_qq = MQuaternion.fromDirection(local_axis.normalized(), MVector3D(0, 0, 1))
-            else:
-                # ローカル軸が設定されている場合、その値を採用
-                local_axis_qq = MQuaternion.fromDirection(model.bones[lname].local_x_vector.normalized(), MVector3D(0, 0, 1))
-            
-            local_x_matrix.rotate(local_axis_qq)
 
-            total_mats[lname] *= local_x_matrix
+# 複数フレームのグローバル位置算出
+# 戻り値はフレームごとのグローバル位置（と行列）の辞書リスト
+def calc_global_pos_frames(model: PmxModel, links: BoneLinks, motion: VmdMotion, fnos, limit_links=None, return_matrix=False, is_local_x=False):
+    bone_names, global_poses, total_mats = c_calc_global_pos_array(model, links, motion, np.asarray(fnos, dtype=np.int64).reshape(-1), limit_links, is_local_x)
 
-    return (global_3ds_dic, total_mats)
+    global_3ds_dics = []
+    total_mats_dics = []
+    for fidx in range(len(global_poses)):
+        global_3ds_dics.append({lname: MVector3D(global_poses[fidx, n]) for n, lname in enumerate(bone_names)})
+        if return_matrix:
+            total_mats_dics.append({lname: MMatrix4x4(total_mats[fidx, n].copy()) for n, lname in enumerate(bone_names)})
+
+    if not return_matrix:
+        return global_3ds_dics
+    else:
+        # 行列も返す場合
+        return global_3ds_dics, total_mats_dics
+
+# 複数フレームのグローバル位置算出（配列版）
+# 戻り値: ボーン名リスト, グローバル位置(F×L×3), 行列(F×L×4×4)
+def calc_global_pos_array(model: PmxModel, links: BoneLinks, motion: VmdMotion, fnos, limit_links=None, is_local_x=False):
+    return_tuple = c_calc_global_pos_array(model, links, motion, np.asarray(fnos, dtype=np.int64).reshape(-1), limit_links, is_local_x)
+    return return_tuple[0], return_tuple[1], return_tuple[2]
+
+cdef tuple c_calc_global_pos_array(PmxModel model, BoneLinks links, VmdMotion motion, np.ndarray fnos, BoneLinks limit_links, bint is_local_x):
+    cdef BoneLinkPlan plan = model.c_get_link_plan(links)
+    cdef list bone_names = list(plan.names)
+    cdef int fcnt = len(fnos)
+    cdef int lcnt = len(bone_names)
+    cdef np.ndarray trans_vs
+    cdef np.ndarray add_qs
+
+    (trans_vs, add_qs) = c_calc_relative_array(model, links, motion, fnos, limit_links)
+
+    # 行列（移動してから回転）
+    cdef np.ndarray matrixs = np.zeros((fcnt, lcnt, 4, 4), dtype=np.float64)
+    matrixs[:, :, :, :] = toMatrix4x4_array(add_qs.reshape(-1, 4)).reshape(fcnt, lcnt, 4, 4)
+    matrixs[:, :, :3, 3] = trans_vs
+
+    cdef np.ndarray global_poses = np.zeros((fcnt, lcnt, 3), dtype=np.float64)
+    cdef np.ndarray total_mats = np.zeros((fcnt, lcnt, 4, 4), dtype=np.float64)
+    cdef np.ndarray mm = np.tile(np.eye(4, dtype=np.float64), (fcnt, 1, 1))
+    cdef np.ndarray data_sum
+    cdef np.ndarray ws
+    cdef int n
+    cdef str lname
+
+    for n, lname in enumerate(bone_names):
+        if n > 0:
+            # ひとつ手前までの行列結果に、直前の行列を掛け算する
+            mm = np.matmul(mm, matrixs[:, n - 1])
+
+        # 自分は、位置だけ掛ける
+        data_sum = np.sum(trans_vs[:, n, np.newaxis, :] * mm[:, :, :3], axis=2) + mm[:, :, 3]
+        ws = data_sum[:, 3:]
+        global_poses[:, n] = np.where(ws == 0, 0, data_sum[:, :3] / np.where(ws == 0, 1, ws))
+
+        # 最後の行列をかけ算する
+        total_mats[:, n] = np.matmul(mm, matrixs[:, n])
+
+        # ローカル軸の向きを調整する
+        if n > 0 and is_local_x:
+            total_mats[:, n] = np.matmul(total_mats[:, n], c_get_local_x_qq(model, plan, n).toMatrix4x4().data())
+
+    return (bone_names, global_poses, total_mats)
+
+# 各ボーンの相対位置・相対回転情報（配列版）
+# 戻り値: 相対位置(F×L×3), 相対回転(F×L×4)
+cdef tuple c_calc_relative_array(PmxModel model, BoneLinks links, VmdMotion motion, np.ndarray fnos, BoneLinks limit_links):
+    cdef BoneLinkPlan plan = model.c_get_link_plan(links)
+    cdef int fcnt = len(fnos)
+    cdef int lcnt = len(plan.names)
+    cdef np.ndarray trans_vs = np.zeros((fcnt, lcnt, 3), dtype=np.float64)
+    cdef np.ndarray add_qs = np.zeros((fcnt, lcnt, 4), dtype=np.float64)
+    cdef dict sampled_bones = {}
+    cdef int link_idx
+    cdef str link_bone_name
+    cdef np.ndarray positions
+    cdef np.ndarray rotations
+
+    for link_idx, link_bone_name in enumerate(plan.names):
+        if not limit_links or (limit_links and limit_links.get(link_bone_name)):
+            # 上限リンクがある場合、ボーンが存在している場合のみ、モーション内のキー情報を取得
+            positions, rotations = sample_bone_cache(motion, link_bone_name, fnos, sampled_bones)
+        else:
+            # 上限リンクでボーンがない場合、ボーンは初期値
+            positions = np.zeros((fcnt, 3), dtype=np.float64)
+            rotations = np.zeros((fcnt, 4), dtype=np.float64)
+            rotations[:, 0] = 1
+
+        # 位置
+        if link_idx == 0:
+            # 一番親は、グローバル座標を考慮
+            trans_vs[:, link_idx] = plan.positions[link_idx] + positions
+        else:
+            # 位置：自身から親の位置を引いた相対位置
+            trans_vs[:, link_idx] = plan.positions[link_idx] + positions - plan.parent_positions[link_idx]
+
+        # 実際の回転量を計算
+        add_qs[:, link_idx] = c_deform_rotation_array(plan, link_idx, motion, rotations, fnos, sampled_bones)
+
+    return (trans_vs, add_qs)
+
+# モーションのボーンをまとめて取得（同じボーンは一度だけ補間する）
+cdef tuple sample_bone_cache(VmdMotion motion, str bone_name, np.ndarray fnos, dict sampled_bones):
+    if bone_name not in sampled_bones:
+        sampled_bones[bone_name] = motion.c_sample_bone(bone_name, fnos)
+    return sampled_bones[bone_name]
+
+# 指定リンクのボーンの実際の回転情報（配列版）
+cdef np.ndarray c_deform_rotation_array(BoneLinkPlan plan, int link_idx, VmdMotion motion, np.ndarray rotations, np.ndarray fnos, dict sampled_bones):
+    cdef np.ndarray rots = np.zeros((len(fnos), 4), dtype=np.float64)
+    rots[:, 0] = 1
+
+    if not plan.is_model_bones[link_idx]:
+        return rots
+
+    cdef str bone_name = plan.names[link_idx]
+    rots = normalized_array(rotations)
+    rots = c_deform_fix_rotation_array(bone_name, plan.fixed_axes[link_idx], rots)
+
+    cdef str effect_bone_name
+    cdef double effect_factor
+    cdef int cnt
+    cdef np.ndarray effect_rots
+
+    for cnt, (effect_bone_name, effect_factor) in enumerate(plan.effect_parents[link_idx]):
+        # 付与親が取得できたら、該当する付与親の回転を取得する
+        _, effect_rots = sample_bone_cache(motion, effect_bone_name, fnos, sampled_bones)
+
+        # 自身の回転量に付与親の回転量を付与率を加味して付与する
+        if effect_factor == 0:
+            # ゼロの場合、とりあえず初期化
+            logger.debug(f"ボーン「{bone_name if cnt == 0 else plan.effect_names[link_idx][cnt - 1]}」の付与率がゼロ")
+            rots = np.zeros((len(fnos), 4), dtype=np.float64)
+            rots[:, 0] = 1
+        elif effect_factor < 0:
+            # マイナス付与の場合、逆回転
+            rots = multiply_qq_array(rots, inverted_qq_array(effect_rots * abs(effect_factor)))
+        else:
+            rots = multiply_qq_array(rots, effect_rots * effect_factor)
+
+    return rots
+
+# 軸制限回転を求め直す（配列版）
+cdef np.ndarray c_deform_fix_rotation_array(str bone_name, MVector3D fixed_axis, np.ndarray rots):
+    if fixed_axis == MVector3D():
+        return rots
+
+    cdef double fixed_x = fixed_axis.x()
+    cdef np.ndarray is_rot = np.any(rots != np.array([1, 0, 0, 0], dtype=np.float64), axis=1)
+    cdef np.ndarray is_flip = np.zeros(len(rots), dtype=np.bool_)
+
+    # 回転補正（コロン式ミクさん等軸反転パターンも含む）
+    if "右" in bone_name:
+        is_flip |= ((rots[:, 1] > 0) & (fixed_x <= 0)) | ((rots[:, 1] < 0) & (fixed_x > 0))
+    if "左" in bone_name:
+        is_flip |= ((rots[:, 1] < 0) & (fixed_x >= 0)) | ((rots[:, 1] > 0) & (fixed_x < 0))
+
+    rots = rots.copy()
+    rots[is_rot & is_flip, :2] *= -1
+    rots[is_rot] = normalized_array(rots[is_rot])
+
+    # 軸固定の場合、回転を制限する
+    return fromAxisAndAngle_array(fixed_axis, np.degrees(2 * np.arccos(np.clip(rots[:, 0], -1, 1))))
 
 
 # 指定された方向に向いた場合の位置情報を返す
@@ -367,18 +583,16 @@ def calc_relative_position(model: PmxModel, links: BoneLinks, motion: VmdMotion,
     return c_calc_relative_position(model, links, motion, fno, limit_links)
 
 cdef list c_calc_relative_position(PmxModel model, BoneLinks links, VmdMotion motion, int fno, BoneLinks limit_links):
+    cdef BoneLinkPlan plan = model.c_get_link_plan(links)
     cdef list trans_vs = []
     cdef int link_idx
     cdef str link_bone_name
-    cdef Bone link_bone
     cdef VmdBoneFrame fill_bf
 
-    for link_idx, link_bone_name in enumerate(links.all()):
-        link_bone = links.get(link_bone_name)
-
+    for link_idx, link_bone_name in enumerate(plan.names):
         if not limit_links or (limit_links and limit_links.get(link_bone_name)):
             # 上限リンクがある倍、ボーンが存在している場合のみ、モーション内のキー情報を取得
-            fill_bf = motion.c_calc_bf(link_bone.name, fno, is_key=False, is_read=False, is_reset_interpolation=False)
+            fill_bf = motion.c_calc_bf(link_bone_name, fno, is_key=False, is_read=False, is_reset_interpolation=False)
         else:
             # 上限リンクでボーンがない場合、ボーンは初期値
             fill_bf = VmdBoneFrame(fno=fno)
@@ -387,10 +601,10 @@ cdef list c_calc_relative_position(PmxModel model, BoneLinks links, VmdMotion mo
         # 位置
         if link_idx == 0:
             # 一番親は、グローバル座標を考慮
-            trans_vs.append(link_bone.position + fill_bf.position)
+            trans_vs.append(plan.position_vs[link_idx] + fill_bf.position)
         else:
             # 位置：自身から親の位置を引いた相対位置
-            trans_vs.append(link_bone.position + fill_bf.position - links.get(link_bone_name, offset=-1).position)
+            trans_vs.append(plan.position_vs[link_idx] + fill_bf.position - plan.parent_position_vs[link_idx])
 
     return trans_vs
 
@@ -400,26 +614,24 @@ def calc_relative_rotation(model: PmxModel, links: BoneLinks, motion: VmdMotion,
     return c_calc_relative_rotation(model, links, motion, fno, limit_links)
 
 cdef list c_calc_relative_rotation(PmxModel model, BoneLinks links, VmdMotion motion, int fno, BoneLinks limit_links):
+    cdef BoneLinkPlan plan = model.c_get_link_plan(links)
     cdef list add_qs = []
     cdef int link_idx
     cdef str link_bone_name
-    cdef Bone link_bone
     cdef VmdBoneFrame fill_bf
     cdef MQuaternion rot
 
-    for link_idx, link_bone_name in enumerate(links.all()):
-        link_bone = links.get(link_bone_name)
-
+    for link_idx, link_bone_name in enumerate(plan.names):
         if not limit_links or (limit_links and limit_links.get(link_bone_name)):
             # 上限リンクがある場合、ボーンが存在している場合のみ、モーション内のキー情報を取得
-            fill_bf = motion.c_calc_bf(link_bone.name, fno, is_key=False, is_read=False, is_reset_interpolation=False)
+            fill_bf = motion.c_calc_bf(link_bone_name, fno, is_key=False, is_read=False, is_reset_interpolation=False)
         else:
             # 上限リンクでボーンがない場合、ボーンは初期値
             fill_bf = VmdBoneFrame(fno=fno)
             fill_bf.set_name(link_bone_name)
         
         # 実際の回転量を計算
-        rot = deform_rotation(model, motion, fill_bf)
+        rot = c_deform_link_rotation(plan, link_idx, motion, fill_bf, None)
 
         add_qs.append(rot)
 
@@ -428,11 +640,15 @@ cdef list c_calc_relative_rotation(PmxModel model, BoneLinks links, VmdMotion mo
 
 # 指定ボーンの実際の回転情報
 cpdef MQuaternion deform_rotation(PmxModel model, VmdMotion motion, VmdBoneFrame bf):
+    return c_deform_rotation(model, motion, bf, None)
+
+# ik_qqs: 計算中の回転量（モーションより優先）
+cdef MQuaternion c_deform_rotation(PmxModel model, VmdMotion motion, VmdBoneFrame bf, dict ik_qqs):
     if bf.name not in model.bones:
         return MQuaternion()
 
     cdef Bone bone = model.bones[bf.name]
-    cdef MQuaternion rot = bf.rotation.normalized().copy()
+    cdef MQuaternion rot = (ik_qqs[bf.name] if ik_qqs and bf.name in ik_qqs else bf.rotation).normalized().copy()
 
     rot = deform_fix_rotation(bf.name, bone.fixed_axis, rot)
 
@@ -440,6 +656,7 @@ cpdef MQuaternion deform_rotation(PmxModel model, VmdMotion motion, VmdBoneFrame
     cdef Bone effect_bone
     cdef int cnt
     cdef VmdBoneFrame effect_bf
+    cdef MQuaternion effect_qq
 
     if bone.getExternalRotationFlag() and bone.effect_index in model.bone_indexes:
         
@@ -449,7 +666,11 @@ cpdef MQuaternion deform_rotation(PmxModel model, VmdMotion motion, VmdBoneFrame
 
         while cnt < 100:
             # 付与親が取得できたら、該当する付与親の回転を取得する
-            effect_bf = motion.c_calc_bf(effect_bone.name, bf.fno, is_key=False, is_read=False, is_reset_interpolation=False)
+            if ik_qqs and effect_bone.name in ik_qqs:
+                effect_qq = ik_qqs[effect_bone.name]
+            else:
+                effect_bf = motion.c_calc_bf(effect_bone.name, bf.fno, is_key=False, is_read=False, is_reset_interpolation=False)
+                effect_qq = effect_bf.rotation
 
             # 自身の回転量に付与親の回転量を付与率を加味して付与する
             if effect_parent_bone.effect_factor == 0:
@@ -458,9 +679,9 @@ cpdef MQuaternion deform_rotation(PmxModel model, VmdMotion motion, VmdBoneFrame
                 rot = MQuaternion()
             elif effect_parent_bone.effect_factor < 0:
                 # マイナス付与の場合、逆回転
-                rot = rot * (effect_bf.rotation * abs(effect_parent_bone.effect_factor)).inverted()
+                rot = rot * (effect_qq * abs(effect_parent_bone.effect_factor)).inverted()
             else:
-                rot = rot * (effect_bf.rotation * effect_parent_bone.effect_factor)
+                rot = rot * (effect_qq * effect_parent_bone.effect_factor)
 
             if effect_bone.getExternalRotationFlag() and effect_bone.effect_index in model.bone_indexes:
                 # 付与親の親として現在のeffectboneを保持
@@ -475,6 +696,49 @@ cpdef MQuaternion deform_rotation(PmxModel model, VmdMotion motion, VmdBoneFrame
     return rot
 
 
+# 指定リンクのボーンの実際の回転情報（c_deform_rotationと同じ値）
+# ik_qqs: 計算中の回転量（モーションより優先）
+cdef MQuaternion c_deform_link_rotation(BoneLinkPlan plan, int link_idx, VmdMotion motion, VmdBoneFrame bf, dict ik_qqs):
+    if not plan.is_model_bones[link_idx]:
+        return MQuaternion()
+
+    cdef MQuaternion rot = (ik_qqs[bf.name] if ik_qqs and bf.name in ik_qqs else bf.rotation).normalized().copy()
+
+    rot = deform_fix_rotation(bf.name, plan.fixed_axes[link_idx], rot)
+
+    cdef str effect_bone_name
+    cdef double effect_factor
+    cdef int cnt
+    cdef MQuaternion effect_qq
+
+    for cnt, (effect_bone_name, effect_factor) in enumerate(plan.effect_parents[link_idx]):
+        # 付与親が取得できたら、該当する付与親の回転を取得する
+        if ik_qqs and effect_bone_name in ik_qqs:
+            effect_qq = ik_qqs[effect_bone_name]
+        else:
+            effect_qq = motion.c_calc_bf(effect_bone_name, bf.fno, is_key=False, is_read=False, is_reset_interpolation=False).rotation
+
+        # 自身の回転量に付与親の回転量を付与率を加味して付与する
+        if effect_factor == 0:
+            # ゼロの場合、とりあえず初期化
+            logger.debug(f"ボーン「{bf.name if cnt == 0 else plan.effect_names[link_idx][cnt - 1]}」の付与率がゼロ")
+            rot = MQuaternion()
+        elif effect_factor < 0:
+            # マイナス付与の場合、逆回転
+            rot = rot * (effect_qq * abs(effect_factor)).inverted()
+        else:
+            rot = rot * (effect_qq * effect_factor)
+
+    return rot
+
+# 指定リンクのボーンのローカルX軸の向き
+cdef MQuaternion c_get_local_x_qq(PmxModel model, BoneLinkPlan plan, int link_idx):
+    if plan.local_x_qqs[link_idx] is None:
+        # モデルにボーンがない場合
+        raise KeyError(plan.names[link_idx])
+    return plan.local_x_qqs[link_idx]
+
+
 # 軸制限回転を求め直す
 cpdef MQuaternion deform_fix_rotation(str bone_name, MVector3D fixed_axis, MQuaternion rot):
     if fixed_axis != MVector3D():